@@ -1,8 +1,9 @@
 """
 Main Flask application entry point
 """
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
+import json
 import logging
 import os
 import sys
@@ -13,8 +14,12 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 from src.config import config
 from src.services.openai_service import OpenAIService
 from src.services.vector_service import VectorService
+from src.services.sharding import ShardedVectorService, parse_shards
+from src.services.bulk_ingest import BulkIngestService
+from src.services.job_queue import JobQueue, create_job_broker
 from src.services.cache_service import CacheService
 from src.services.content_generator import ContentGenerator
+from src.services.reranker import CrossEncoderReranker
 from src.utils.logger import setup_logger
 from src.utils.metrics import MetricsCollector
 
@@ -33,10 +38,67 @@ def create_app(config_name='default'):
     # Initialize services
     cache_service = CacheService(app.config)
     openai_service = OpenAIService(app.config)
-    vector_service = VectorService(app.config)
-    content_generator = ContentGenerator(openai_service, vector_service, cache_service)
+    # VECTOR_SHARDS spreads the index over shard_worker.py processes; otherwise it lives in this process
+    if app.config['VECTOR_SHARDS']:
+        vector_service = ShardedVectorService(app.config)
+    else:
+        vector_service = VectorService(app.config, cache_service)
+    reranker = CrossEncoderReranker(app.config, cache_service) if app.config['RERANK_ENABLED'] else None
+    content_generator = ContentGenerator(openai_service, vector_service, cache_service, app.config, reranker)
+    bulk_ingest = BulkIngestService(vector_service, app.config, cache_service)
+    job_queue = JobQueue(create_job_broker(app.config, cache_service), app.config)
     metrics_collector = MetricsCollector()
     
+    # Background job handlers; each gets the job payload and returns a JSON-serializable result
+    def ingest_job(payload):
+        documents = payload.get('documents') or []
+        return {'processed_count': vector_service.add_documents(documents, upsert=bool(payload.get('upsert')))}
+    
+    def rebuild_index_job(payload):
+        if not vector_service.rebuild_index():
+            raise RuntimeError('Index rebuild failed')
+        return {'index_version': vector_service.snapshot_generation}
+    
+    def compact_job(payload):
+        return {'compacted': vector_service.compact()}
+    
+    def crawl_job(payload):
+        # Imported here: the crawler pulls in nltk, pandas and aiohttp
+        from dataclasses import asdict
+        from src.services.data_crawler import WebCrawler, DataProcessor
+        
+        crawled = WebCrawler(app.config).crawl_urls(payload.get('urls') or [])
+        documents = DataProcessor(app.config).process_documents([asdict(doc) for doc in crawled])
+        return {
+            'crawled_count': len(crawled),
+            'processed_count': vector_service.add_documents(documents, upsert=bool(payload.get('upsert')))
+        }
+    
+    job_queue.register('ingest', ingest_job)
+    job_queue.register('rebuild_index', rebuild_index_job)
+    job_queue.register('compact', compact_job)
+    job_queue.register('crawl', crawl_job)
+    
+    if isinstance(vector_service, ShardedVectorService):
+        def rebalance_shards_job(payload):
+            removed = set(parse_shards(payload.get('remove')))
+            shards = [name for name in vector_service.shard_names if name not in removed]
+            shards += [name for name in parse_shards(payload.get('add')) if name not in shards]
+            return vector_service.rebalance(shards)
+        
+        job_queue.register('rebalance_shards', rebalance_shards_job)
+    
+    # Worker threads do not survive a fork; with --preload gunicorn.conf.py starts them in each worker
+    if app.config['JOB_WORKERS_ENABLED'] and app.config['EMBEDDINGS_LOAD_MODE'] != 'preload':
+        job_queue.start()
+    if reranker is not None and app.config['EMBEDDINGS_LOAD_MODE'] in ('eager', 'background'):
+        reranker.warm_up()
+    
+    # Reachable from gunicorn hooks (see gunicorn.conf.py) and worker.py
+    app.extensions['vector_service'] = vector_service
+    app.extensions['job_queue'] = job_queue
+    app.extensions['reranker'] = reranker
+    
     @app.route('/')
     def index():
         """Welcome page with API documentation"""
@@ -46,9 +108,14 @@ def create_app(config_name='default'):
             'status': 'running',
             'endpoints': {
                 'health': '/api/health',
+                'ready': '/api/ready',
                 'generate': 'POST /api/generate',
+                'generate_stream': 'POST /api/generate/stream',
                 'search': 'POST /api/search',
+                'search_batch': 'POST /api/search/batch',
                 'ingest': 'POST /api/ingest',
+                'jobs': 'POST /api/jobs',
+                'shards': '/api/shards',
                 'metrics': '/api/metrics'
             },
             'docs': 'See API_DOCUMENTATION.md for details'
@@ -81,6 +148,16 @@ def create_app(config_name='default'):
                 'error': str(e)
             }), 500
     
+    @app.route('/api/ready', methods=['GET'])
+    def readiness_check():
+        """Readiness endpoint: 503 while the embedding model is still loading"""
+        readiness = vector_service.readiness()
+        return jsonify({
+            **readiness,
+            'status': 'ready' if readiness['ready'] else readiness['state'],
+            'timestamp': metrics_collector.get_current_timestamp()
+        }), 200 if readiness['ready'] else 503
+    
     @app.route('/api/generate', methods=['POST'])
     def generate_content():
         """Generate content using RAG"""
@@ -120,6 +197,60 @@ def create_app(config_name='default'):
             logger.error(f"Content generation failed: {str(e)}")
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/generate/stream', methods=['POST'])
+    def generate_content_stream():
+        """Generate content using RAG, streamed as Server-Sent Events"""
+        start_time = metrics_collector.start_timer()
+        
+        data = request.get_json(silent=True)
+        if not data or 'query' not in data:
+            metrics_collector.record_request('generate_stream', metrics_collector.end_timer(start_time), False)
+            return jsonify({'error': 'Query is required'}), 400
+        
+        events = content_generator.generate_with_rag_streaming(
+            query=data['query'],
+            max_length=data.get('max_length', 500),
+            temperature=data.get('temperature', app.config['OPENAI_TEMPERATURE'])
+        )
+        
+        def stream():
+            time_to_first_token = None
+            summary = None
+            try:
+                # Sent before retrieval starts, so the client sees the response open at once
+                yield ': stream open\n\n'
+                for event, payload in events:
+                    if event == 'token' and time_to_first_token is None:
+                        time_to_first_token = metrics_collector.end_timer(start_time)
+                    elif event == 'done':
+                        summary = payload = {
+                            **payload,
+                            'response_time_ms': metrics_collector.end_timer(start_time),
+                            'time_to_first_token_ms': time_to_first_token,
+                            'timestamp': metrics_collector.get_current_timestamp()
+                        }
+                    yield f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+            except Exception as e:
+                logger.error(f"Streaming content generation failed: {str(e)}")
+                yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            finally:
+                # Also runs when the client disconnects, which closes the upstream completion
+                events.close()
+                metrics_collector.record_request(
+                    'generate_stream',
+                    metrics_collector.end_timer(start_time),
+                    summary is not None,
+                    tokens_used=summary['tokens_used'] if summary else 0,
+                    cache_hit=bool(summary and summary['cached']),
+                    time_to_first_token_ms=time_to_first_token
+                )
+        
+        # X-Accel-Buffering stops nginx from holding the events back in its proxy buffers
+        return Response(stream(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    
     @app.route('/api/search', methods=['POST'])
     def semantic_search():
         """Perform semantic search"""
@@ -133,9 +264,24 @@ def create_app(config_name='default'):
             
             query = data['query']
             limit = data.get('limit', app.config['MAX_SEARCH_RESULTS'])
+            rerank = bool(data.get('rerank')) and reranker is not None
             
-            # Perform search
-            results = vector_service.search(query, limit)
+            # Perform search (nprobe / ef_search tune IVF and HNSW indexes per request)
+            try:
+                results = vector_service.search(
+                    query,
+                    max(limit, app.config['RERANK_CANDIDATES']) if rerank else limit,
+                    nprobe=data.get('nprobe'),
+                    ef_search=data.get('ef_search'),
+                    filters=data.get('filters'),
+                    mode=data.get('mode')
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            rerank_report = None
+            if rerank:
+                results, rerank_report = reranker.rerank(query, results, limit)
             
             # Record metrics
             response_time = metrics_collector.end_timer(start_time)
@@ -144,6 +290,7 @@ def create_app(config_name='default'):
             return jsonify({
                 'results': results,
                 'count': len(results),
+                'rerank': rerank_report,
                 'response_time_ms': response_time,
                 'timestamp': metrics_collector.get_current_timestamp()
             }), 200
@@ -154,9 +301,63 @@ def create_app(config_name='default'):
             logger.error(f"Search failed: {str(e)}")
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/search/batch', methods=['POST'])
+    def batch_search():
+        """Semantic search for many queries with one batched encode and index search"""
+        start_time = metrics_collector.start_timer()
+        
+        try:
+            data = request.get_json()
+            
+            if not data or not isinstance(data.get('queries'), list) or not data['queries']:
+                return jsonify({'error': 'A non-empty list of queries is required'}), 400
+            
+            queries = data['queries']
+            if len(queries) > app.config['BATCH_SEARCH_MAX_QUERIES']:
+                return jsonify({
+                    'error': f"At most {app.config['BATCH_SEARCH_MAX_QUERIES']} queries per request"
+                }), 400
+            if not all(isinstance(query, str) for query in queries):
+                return jsonify({'error': 'Queries must be strings'}), 400
+            
+            limit = data.get('limit', app.config['MAX_SEARCH_RESULTS'])
+            
+            try:
+                results = vector_service.search_many(
+                    queries,
+                    limit,
+                    nprobe=data.get('nprobe'),
+                    ef_search=data.get('ef_search'),
+                    filters=data.get('filters'),
+                    mode=data.get('mode')
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            # Record metrics
+            response_time = metrics_collector.end_timer(start_time)
+            metrics_collector.record_request('search_batch', response_time, True)
+            
+            return jsonify({
+                'results': [
+                    {'query': query, 'results': found, 'count': len(found)}
+                    for query, found in zip(queries, results)
+                ],
+                'query_count': len(queries),
+                'response_time_ms': response_time,
+                'per_query_ms': response_time / len(queries),
+                'timestamp': metrics_collector.get_current_timestamp()
+            }), 200
+            
+        except Exception as e:
+            response_time = metrics_collector.end_timer(start_time)
+            metrics_collector.record_request('search_batch', response_time, False)
+            logger.error(f"Batch search failed: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+    
     @app.route('/api/ingest', methods=['POST'])
     def ingest_documents():
-        """Ingest new documents into the knowledge base"""
+        """Queue new documents for the knowledge base; an ingest job adds them off the request threads"""
         start_time = metrics_collector.start_timer()
         
         try:
@@ -166,24 +367,219 @@ def create_app(config_name='default'):
                 return jsonify({'error': 'Documents are required'}), 400
             
             documents = data['documents']
+            if not isinstance(documents, list):
+                return jsonify({'error': 'Documents must be a list'}), 400
+            upsert = bool(data.get('upsert', False))
             
-            # Process and add documents
-            processed_count = vector_service.add_documents(documents)
+            job, created = job_queue.submit(
+                'ingest', {'documents': documents, 'upsert': upsert}, request.headers.get('Idempotency-Key')
+            )
             
             # Record metrics
             response_time = metrics_collector.end_timer(start_time)
             metrics_collector.record_request('ingest', response_time, True)
             
             return jsonify({
-                'processed_count': processed_count,
+                'job_id': job.job_id,
+                'status': job.status,
+                'created': created,
+                'document_count': len(documents),
+                'status_url': f"/api/jobs/{job.job_id}",
                 'response_time_ms': response_time,
                 'timestamp': metrics_collector.get_current_timestamp()
-            }), 200
+            }), 202
             
         except Exception as e:
             response_time = metrics_collector.end_timer(start_time)
             metrics_collector.record_request('ingest', response_time, False)
-            logger.error(f"Document ingestion failed: {str(e)}")
+            logger.error(f"Document ingestion failed to start: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/ingest/bulk', methods=['POST'])
+    def bulk_ingest_documents():
+        """Start a background ingest of an NDJSON upload (one document per line)"""
+        start_time = metrics_collector.start_timer()
+        
+        try:
+            upsert = request.args.get('upsert', 'false').lower() == 'true'
+            job = bulk_ingest.submit(request.stream, upsert=upsert)
+            
+            response_time = metrics_collector.end_timer(start_time)
+            if job is None:
+                metrics_collector.record_request('bulk_ingest', response_time, False)
+                response = jsonify({'error': 'Too many bulk ingest jobs running, retry later'})
+                response.headers['Retry-After'] = '30'
+                return response, 429
+            
+            metrics_collector.record_request('bulk_ingest', response_time, True)
+            return jsonify({
+                'job_id': job.job_id,
+                'status': job.status,
+                'bytes': job.bytes_total,
+                'status_url': f"/api/ingest/jobs/{job.job_id}",
+                'timestamp': metrics_collector.get_current_timestamp()
+            }), 202
+            
+        except Exception as e:
+            response_time = metrics_collector.end_timer(start_time)
+            metrics_collector.record_request('bulk_ingest', response_time, False)
+            logger.error(f"Bulk ingest failed to start: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/ingest/jobs/<job_id>', methods=['GET'])
+    def get_ingest_job(job_id):
+        """Progress, throughput and back-pressure of a bulk ingest job"""
+        job = bulk_ingest.get_job(job_id)
+        if job is None:
+            return jsonify({'error': f'Job {job_id} not found'}), 404
+        return jsonify(job), 200
+    
+    @app.route('/api/documents/<doc_id>', methods=['DELETE'])
+    def delete_document(doc_id):
+        """Delete a document (or all chunks of a chunked document) from the knowledge base"""
+        start_time = metrics_collector.start_timer()
+        
+        try:
+            deleted = vector_service.delete_document(doc_id)
+            
+            response_time = metrics_collector.end_timer(start_time)
+            metrics_collector.record_request('delete', response_time, True, method='DELETE')
+            
+            if not deleted:
+                return jsonify({'error': f'Document {doc_id} not found'}), 404
+            
+            return jsonify({
+                'deleted': doc_id,
+                'response_time_ms': response_time,
+                'timestamp': metrics_collector.get_current_timestamp()
+            }), 200
+            
+        except Exception as e:
+            response_time = metrics_collector.end_timer(start_time)
+            metrics_collector.record_request('delete', response_time, False, method='DELETE')
+            logger.error(f"Document deletion failed: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/jobs', methods=['POST'])
+    def submit_job():
+        """Queue a background job; a repeated idempotency key returns the original job"""
+        start_time = metrics_collector.start_timer()
+        
+        try:
+            data = request.get_json()
+            
+            if not data or 'type' not in data:
+                return jsonify({'error': 'Job type is required'}), 400
+            
+            idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+            try:
+                job, created = job_queue.submit(data['type'], data.get('payload'), idempotency_key)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            response_time = metrics_collector.end_timer(start_time)
+            metrics_collector.record_request('jobs', response_time, True)
+            
+            return jsonify({
+                **job.to_dict(),
+                'created': created,
+                'status_url': f"/api/jobs/{job.job_id}",
+                'timestamp': metrics_collector.get_current_timestamp()
+            }), 202 if created else 200
+            
+        except Exception as e:
+            response_time = metrics_collector.end_timer(start_time)
+            metrics_collector.record_request('jobs', response_time, False)
+            logger.error(f"Job submission failed: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        """Status, attempts and result of a background job"""
+        try:
+            job = job_queue.get(job_id)
+            if job is None:
+                return jsonify({'error': f'Job {job_id} not found'}), 404
+            return jsonify(job.to_dict()), 200
+        except Exception as e:
+            logger.error(f"Job lookup failed: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/index/rebuild', methods=['POST'])
+    def rebuild_index():
+        """Queue an index rebuild; searches keep using the current version until it is swapped in"""
+        start_time = metrics_collector.start_timer()
+        
+        try:
+            job, _ = job_queue.submit('rebuild_index', {}, request.headers.get('Idempotency-Key'))
+            
+            response_time = metrics_collector.end_timer(start_time)
+            metrics_collector.record_request('rebuild', response_time, True)
+            
+            return jsonify({
+                'job_id': job.job_id,
+                'status': job.status,
+                'status_url': f"/api/jobs/{job.job_id}",
+                'index_version': vector_service.snapshot_generation,
+                'timestamp': metrics_collector.get_current_timestamp()
+            }), 202
+            
+        except Exception as e:
+            response_time = metrics_collector.end_timer(start_time)
+            metrics_collector.record_request('rebuild', response_time, False)
+            logger.error(f"Index rebuild failed to start: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/shards', methods=['GET'])
+    def get_shards():
+        """Shard list with per-shard document counts and health"""
+        if not isinstance(vector_service, ShardedVectorService):
+            return jsonify({'error': 'The index is not sharded (VECTOR_SHARDS is empty)'}), 400
+        try:
+            stats = vector_service.get_stats()
+            return jsonify({
+                'sharding': stats['sharding'],
+                'shards': stats['shards'],
+                'timestamp': metrics_collector.get_current_timestamp()
+            }), 200
+        except Exception as e:
+            logger.error(f"Shard status failed: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/shards', methods=['POST'])
+    def rebalance_shards():
+        """Queue adding or removing shards; documents move to their new owners in the background"""
+        if not isinstance(vector_service, ShardedVectorService):
+            return jsonify({'error': 'The index is not sharded (VECTOR_SHARDS is empty)'}), 400
+        start_time = metrics_collector.start_timer()
+        
+        try:
+            data = request.get_json() or {}
+            payload = {'add': parse_shards(data.get('add')), 'remove': parse_shards(data.get('remove'))}
+            
+            if not payload['add'] and not payload['remove']:
+                return jsonify({'error': 'Shards to add or remove are required'}), 400
+            if not set(vector_service.shard_names) - set(payload['remove']) and not payload['add']:
+                return jsonify({'error': 'At least one shard must remain'}), 400
+            
+            job, created = job_queue.submit('rebalance_shards', payload, request.headers.get('Idempotency-Key'))
+            
+            response_time = metrics_collector.end_timer(start_time)
+            metrics_collector.record_request('shards', response_time, True)
+            
+            return jsonify({
+                'job_id': job.job_id,
+                'status': job.status,
+                'created': created,
+                'status_url': f"/api/jobs/{job.job_id}",
+                'shards': vector_service.shard_names,
+                'timestamp': metrics_collector.get_current_timestamp()
+            }), 202 if created else 200
+            
+        except Exception as e:
+            response_time = metrics_collector.end_timer(start_time)
+            metrics_collector.record_request('shards', response_time, False)
+            logger.error(f"Shard rebalance failed to start: {str(e)}")
             return jsonify({'error': str(e)}), 500
     
     @app.route('/api/metrics', methods=['GET'])
@@ -191,6 +587,7 @@ def create_app(config_name='default'):
         """Get system metrics"""
         try:
             metrics = metrics_collector.get_metrics()
+            metrics['content_generator'] = content_generator.get_stats()
             return jsonify(metrics), 200
         except Exception as e:
             logger.error(f"Metrics retrieval failed: {str(e)}")
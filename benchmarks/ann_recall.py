@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Recall vs latency report for the FAISS index types supported by VectorService
+Compares IVF-Flat, IVF-PQ and HNSW against the exact flat index
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.config import Config
+from src.services.index_factory import IndexSettings, evaluate_recall
+
+def load_vectors(args) -> np.ndarray:
+    """Corpus vectors: synthetic clusters, or the existing knowledge base"""
+    if args.synthetic:
+        rng = np.random.default_rng(7)
+        centers = rng.normal(size=(max(1, args.synthetic // 500), args.dim)).astype('float32')
+        assignments = rng.integers(0, len(centers), args.synthetic)
+        vectors = centers[assignments] + 0.3 * rng.normal(size=(args.synthetic, args.dim)).astype('float32')
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    from src.services.vector_service import VectorService
+    service = VectorService({k: getattr(Config, k) for k in dir(Config) if k.isupper()})
+    texts = [doc['content'] for doc in service.documents]
+    vectors = service.model.encode(texts, convert_to_tensor=False, show_progress_bar=True)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--synthetic', type=int, default=0, help='Use N synthetic vectors instead of the knowledge base')
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nlist', type=int, default=Config.FAISS_NLIST)
+    parser.add_argument('--pq-m', type=int, default=Config.FAISS_PQ_M)
+    parser.add_argument('--hnsw-m', type=int, default=Config.FAISS_HNSW_M)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    vectors = load_vectors(args).astype('float32')
+
+    # Queries are perturbed corpus vectors so every query has real neighbours
+    rng = np.random.default_rng(11)
+    rows = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = vectors[rows] + 0.05 * rng.normal(size=(len(rows), vectors.shape[1])).astype('float32')
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    nprobe_sweep = [{'nprobe': n} for n in (1, 4, 16, 64) if n <= args.nlist]
+    candidates = [
+        {'settings': IndexSettings(index_type='ivf_flat', nlist=args.nlist), 'sweep': nprobe_sweep},
+        {'settings': IndexSettings(index_type='ivf_pq', nlist=args.nlist, pq_m=args.pq_m), 'sweep': nprobe_sweep},
+        {
+            'settings': IndexSettings(index_type='hnsw', hnsw_m=args.hnsw_m),
+            'sweep': [{'ef_search': e} for e in (16, 32, 64, 128)]
+        }
+    ]
+
+    report = evaluate_recall(vectors, queries, candidates, k=args.k)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{len(vectors)} vectors, {len(queries)} queries, recall@{args.k}")
+    print(f"{'index':<10} {'params':<18} {'recall':>8} {'ms/query':>10} {'build s':>8}")
+    for row in report:
+        params = ','.join(f"{k}={v}" for k, v in row['params'].items()) or '-'
+        print(f"{row['index_type']:<10} {params:<18} {row['recall_at_k']:>8.3f} "
+              f"{row['latency_ms']:>10.3f} {row['build_time_s']:>8.2f}")
+
+if __name__ == '__main__':
+    main()
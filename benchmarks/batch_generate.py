@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Throughput of OpenAIService.batch_generate against a local mock OpenAI-compatible server
+The server answers /v1/chat/completions (streamed or not) after a fixed latency, echoes each prompt so result order can be checked,
+and can enforce its own requests/min quota with 429s to show what the client-side rate limiter avoids
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.config import Config
+from src.services.openai_service import GenerationResult, OpenAIService
+from src.services.rate_limiter import TokenBucket
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Concurrent batch calls all connect at once
+    request_queue_size = 256
+
+    def __init__(self, latency: float, requests_per_minute: float = 0, burst_seconds: float = 10):
+        super().__init__(('127.0.0.1', 0), MockHandler)
+        self.latency = latency
+        self.quota = TokenBucket(requests_per_minute, max(1.0, requests_per_minute * burst_seconds / 60)) \
+            if requests_per_minute > 0 else None
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.in_flight = 0
+            self.stats = {'requests': 0, 'rejected': 0, 'max_in_flight': 0}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+class MockHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+
+        with server.lock:
+            server.stats['requests'] += 1
+            # Take a request from the quota only if one is there, like the API does
+            rejected = server.quota is not None and server.quota.get_stats()['level'] < 1
+            if rejected:
+                server.stats['rejected'] += 1
+            elif server.quota is not None:
+                server.quota.acquire(1)
+        if rejected:
+            self._send(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}}, {'retry-after-ms': '200'})
+            return
+
+        with server.lock:
+            server.in_flight += 1
+            server.stats['max_in_flight'] = max(server.stats['max_in_flight'], server.in_flight)
+        time.sleep(server.latency)
+        with server.lock:
+            server.in_flight -= 1
+
+        prompt = request['messages'][-1]['content']
+        prompt_tokens = len(prompt) // 4
+        if request.get('stream'):
+            self._stream(request, f"Answer to: {prompt}", prompt_tokens)
+            return
+        self._send(200, {
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request['model'],
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': f"Answer to: {prompt}"},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 8, 'total_tokens': prompt_tokens + 8}
+        })
+
+    def _stream(self, request: dict, answer: str, prompt_tokens: int):
+        """Server-sent chunks of one word each, then one with the usage; stops if the client hangs up"""
+        def chunk(choices, usage=None):
+            return {'id': 'chatcmpl-mock', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                    'model': request['model'], 'choices': choices, 'usage': usage}
+
+        words = answer.split(' ')
+        events = [chunk([{'index': 0, 'delta': {'content': word + (' ' if i < len(words) - 1 else '')},
+                          'finish_reason': None}]) for i, word in enumerate(words)]
+        events.append(chunk([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+        events.append(chunk([], {'prompt_tokens': prompt_tokens, 'completion_tokens': 8,
+                                 'total_tokens': prompt_tokens + 8}))
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        try:
+            for event in events:
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(self.server.latency / len(events))
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+def sequential_baseline(service: OpenAIService, prompts):
+    """batch_generate as it was: one call at a time with a 0.1s pause"""
+    results = []
+    for prompt in prompts:
+        results.append(service.generate_content(prompt=prompt, max_tokens=50))
+        time.sleep(0.1)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--prompts', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--rpm', type=float, default=300,
+                        help='Requests/min quota enforced by the mock server in the rate-limited runs')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.latency_ms / 1000)
+    quota_server = MockOpenAIServer(args.latency_ms / 1000, args.rpm)
+    for mock in (server, quota_server):
+        threading.Thread(target=mock.serve_forever, daemon=True).start()
+
+    config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    config.update({'OPENAI_API_KEY': 'mock', 'OPENAI_MODEL': 'mock-model'})
+    prompts = [f"Prompt number {i}: write one sentence about topic {i % 17}." for i in range(args.prompts)]
+
+    runs = [('sequential (old)', server, {'OPENAI_BATCH_CONCURRENCY': 1})]
+    runs += [(f'concurrency {c}', server, {'OPENAI_BATCH_CONCURRENCY': c}) for c in args.concurrency]
+    limited = max(args.concurrency)
+    runs += [
+        (f'c{limited}, quota, no limiter', quota_server, {'OPENAI_BATCH_CONCURRENCY': limited}),
+        # A little under the quota, since the server's window starts when the first burst arrives
+        (f'c{limited}, quota, limiter', quota_server,
+         {'OPENAI_BATCH_CONCURRENCY': limited, 'OPENAI_REQUESTS_PER_MINUTE': args.rpm * 0.95})
+    ]
+
+    report = []
+    for label, mock, overrides in runs:
+        if mock.quota is not None and mock.stats['requests']:
+            # Let the server's quota refill
+            time.sleep(12)
+        mock.reset()
+        service = OpenAIService({**config, 'OPENAI_BASE_URL': mock.base_url, **overrides})
+
+        start = time.perf_counter()
+        if label.startswith('sequential'):
+            results = sequential_baseline(service, prompts)
+        else:
+            results = service.batch_generate(prompts, max_tokens=50)
+        elapsed = time.perf_counter() - start
+
+        report.append({
+            'run': label,
+            'seconds': elapsed,
+            'prompts_per_s': len(prompts) / elapsed,
+            'in_order': all(result.content == f"Answer to: {prompt}" for result, prompt in zip(results, prompts)),
+            'failed': sum(isinstance(result, GenerationResult) and result.finish_reason == 'error' for result in results),
+            **mock.stats
+        })
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    # "rejected" counts 429s from the mock, retried after its retry-after delay by the OpenAI client, or with
+    # the limiter on, by generate_content once the paused limiter admits them
+    print(f"{args.prompts} prompts, {args.latency_ms:.0f}ms per call, quota {args.rpm:.0f} requests/min")
+    print(f"{'run':<28} {'seconds':>8} {'prompts/s':>10} {'in order':>9} {'failed':>7} {'requests':>9} {'429s':>6} {'max in flight':>14}")
+    for row in report:
+        print(f"{row['run']:<28} {row['seconds']:>8.2f} {row['prompts_per_s']:>10.1f} {str(row['in_order']):>9} "
+              f"{row['failed']:>7} {row['requests']:>9} {row['rejected']:>6} {row['max_in_flight']:>14}")
+
+if __name__ == '__main__':
+    main()
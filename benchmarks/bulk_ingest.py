@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Bulk NDJSON ingest throughput
+Compares one add_documents call with BulkIngestService jobs at several process pool sizes, on a temporary index
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.config import Config
+from src.services.vector_service import VectorService
+from src.services.bulk_ingest import BulkIngestService
+
+TOPICS = ['neural networks', 'databases', 'cooking', 'astronomy', 'finance', 'music', 'travel', 'biology']
+
+def make_documents(count: int, prefix: str):
+    return [
+        {
+            'id': f'{prefix}_{i}',
+            'title': f'Document {i}',
+            'url': f'https://example.com/{prefix}/{i}',
+            'content': f'Document {i} ({prefix}) discusses {TOPICS[i % len(TOPICS)]} and related subject {i % 97}. ' * 4
+        }
+        for i in range(count)
+    ]
+
+def make_config(args) -> dict:
+    config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    config.update({
+        'FAISS_INDEX_PATH': os.path.join(tempfile.mkdtemp(), 'bench'),
+        # Every document is new, so the cache would only add writes
+        'EMBEDDING_CACHE_ENABLED': False,
+        'INDEX_WATCH_INTERVAL': 0,
+        'EMBEDDINGS_LOAD_MODE': 'eager',
+        'BULK_INGEST_BATCH_SIZE': args.batch_size,
+        'BULK_INGEST_MAX_INFLIGHT': args.max_inflight,
+        'BULK_INGEST_SPOOL_DIR': tempfile.mkdtemp()
+    })
+    return config
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documents', type=int, default=5000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--batch-size', type=int, default=Config.BULK_INGEST_BATCH_SIZE)
+    parser.add_argument('--max-inflight', type=int, default=Config.BULK_INGEST_MAX_INFLIGHT)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    report = []
+
+    service = VectorService(make_config(args))
+    start = time.perf_counter()
+    added = service.add_documents(make_documents(args.documents, 'sync'))
+    elapsed = time.perf_counter() - start
+    report.append({'mode': 'add_documents', 'workers': '-', 'records': added, 'seconds': elapsed,
+                   'docs_per_second': args.documents / elapsed, 'backpressure_waits': 0})
+
+    for workers in args.workers:
+        config = make_config(args)
+        config['BULK_INGEST_WORKERS'] = workers
+        service = VectorService(config)
+        bulk = BulkIngestService(service, config)
+
+        payload = '\n'.join(json.dumps(doc) for doc in make_documents(args.documents, f'bulk{workers}'))
+        if workers:
+            # Start the pool (and load the model in it) outside the timed run
+            bulk._encoder(bulk._get_pool())(['warm up'])
+
+        start = time.perf_counter()
+        job = bulk.submit(io.BytesIO(payload.encode('utf-8')))
+        while job.status in ('queued', 'running'):
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+
+        result = job.to_dict()
+        report.append({'mode': 'bulk', 'workers': workers, 'records': result['records_indexed'],
+                       'seconds': elapsed, 'docs_per_second': args.documents / elapsed,
+                       'backpressure_waits': result['backpressure_waits'], 'status': result['status']})
+        if bulk._pool is not None:
+            bulk._pool.shutdown()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{args.documents} documents, batch {args.batch_size}, {args.max_inflight} batches in flight")
+    print(f"{'mode':<14} {'workers':>7} {'records':>8} {'seconds':>8} {'docs/s':>8} {'waits':>6}")
+    for row in report:
+        print(f"{row['mode']:<14} {row['workers']:>7} {row['records']:>8} {row['seconds']:>8.2f} "
+              f"{row['docs_per_second']:>8.1f} {row['backpressure_waits']:>6}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Embedding backend comparison: PyTorch vs ONNX Runtime vs ONNX int8
+Reports load time, single-query and batch latency, RSS growth and cosine parity with PyTorch
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import psutil
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.config import Config
+from src.services.embedding_backend import BACKENDS, PARITY_TEXTS, create_embedding_backend, parity_check
+
+def rss_mb() -> float:
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+def measure(backend, texts, repeats: int) -> dict:
+    backend.encode(texts[:8])  # warm-up
+
+    start = time.perf_counter()
+    for i in range(repeats):
+        backend.encode([texts[i % len(texts)]])
+    single_ms = (time.perf_counter() - start) * 1000 / repeats
+
+    start = time.perf_counter()
+    backend.encode(texts, batch_size=32)
+    batch_ms = (time.perf_counter() - start) * 1000 / len(texts)
+
+    return {'single_query_ms': single_ms, 'batch_ms_per_text': batch_ms}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--texts', type=int, default=256)
+    parser.add_argument('--repeats', type=int, default=100)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    texts = [PARITY_TEXTS[i % len(PARITY_TEXTS)] + f" ({i})" for i in range(args.texts)]
+
+    reference = None
+    report = []
+    for name in args.backends:
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        backend = create_embedding_backend(config, name)
+        load_s = time.perf_counter() - start
+        if backend.backend != name:
+            print(f"{name}: not available, skipped")
+            continue
+
+        row = {'backend': name, 'load_s': load_s, **measure(backend, texts, args.repeats),
+               'rss_growth_mb': rss_mb() - rss_before}
+
+        embeddings = np.asarray(backend.encode(texts), dtype='float32')
+        if reference is None and name == 'sentence-transformers':
+            reference = embeddings
+        if reference is not None:
+            row.update(parity_check(reference, embeddings))
+        report.append(row)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'backend':<22} {'load s':>7} {'1 query ms':>11} {'batch ms/text':>14} {'RSS MB':>8} {'min cos':>8}")
+    for row in report:
+        min_cos = f"{row['min_cosine']:.4f}" if 'min_cosine' in row else '-'
+        print(f"{row['backend']:<22} {row['load_s']:>7.2f} {row['single_query_ms']:>11.2f} "
+              f"{row['batch_ms_per_text']:>14.2f} {row['rss_growth_mb']:>8.1f} {min_cos:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Startup cost of the document id mapping and document records at 1M chunks
+Compares the pickled id dict with the memory-mapped IdTable, and the legacy JSON docs file with the DocumentStore.
+Each format is loaded in a fresh interpreter, which reports load time, RSS growth and lookup latency.
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+
+from src.services.document_store import DocumentStore
+from src.services.id_table import IdTable
+
+FORMATS = ('pickle', 'id_table', 'json_docs', 'docstore')
+
+# Runs in a child process so each format starts from the same baseline
+CHILD = """
+import json, pickle, random, sys, time
+import psutil
+sys.path.insert(0, {root!r})
+from src.services.document_store import DocumentStore
+from src.services.id_table import IdTable
+
+process = psutil.Process()
+rss_before = process.memory_info().rss
+start = time.perf_counter()
+if {fmt!r} == 'pickle':
+    with open({path!r}, 'rb') as f:
+        table = pickle.load(f)
+elif {fmt!r} == 'id_table':
+    table = IdTable.load({path!r})
+elif {fmt!r} == 'json_docs':
+    with open({path!r}, 'r', encoding='utf-8') as f:
+        table = json.load(f)
+else:
+    table = DocumentStore({path!r})
+load_s = time.perf_counter() - start
+rss_loaded = process.memory_info().rss
+
+random.seed(5)
+if {fmt!r} in ('pickle', 'id_table'):
+    keys = [{id_format!r}.format(random.randrange({count})) for _ in range({lookups})]
+    start = time.perf_counter()
+    found = sum(table.get(key) is not None for key in keys)
+else:
+    keys = [random.randrange({count}) for _ in range({lookups})]
+    start = time.perf_counter()
+    found = sum(table[key] is not None for key in keys)
+lookup_us = (time.perf_counter() - start) * 1e6 / len(keys)
+
+print(json.dumps({{
+    'load_s': load_s,
+    'rss_load_mb': (rss_loaded - rss_before) / 2 ** 20,
+    'rss_after_lookups_mb': (process.memory_info().rss - rss_before) / 2 ** 20,
+    'lookup_us': lookup_us,
+    'found': found
+}}))
+"""
+
+def make_files(directory: str, count: int, doc_chars: int, formats) -> dict:
+    """Write every requested format for count synthetic chunks"""
+    id_format = 'doc_' + hashlib.md5(b'bench').hexdigest() + '_chunk_{}'
+    ids = [id_format.format(i) for i in range(count)]
+    paths = {}
+
+    if 'pickle' in formats:
+        paths['pickle'] = os.path.join(directory, 'faiss_index_mapping.pkl')
+        with open(paths['pickle'], 'wb') as f:
+            pickle.dump({doc_id: row for row, doc_id in enumerate(ids)}, f)
+
+    if 'id_table' in formats:
+        paths['id_table'] = os.path.join(directory, 'faiss_index_ids.bin')
+        IdTable.from_rows(ids, range(count)).save(paths['id_table'])
+
+    filler = ('lorem ipsum dolor sit amet ' * (doc_chars // 27 + 1))[:doc_chars]
+
+    def chunk(row: int) -> dict:
+        return {
+            'id': ids[row],
+            'content': filler,
+            'title': f'Document {row // 10}',
+            'url': f'https://example.com/{row // 10}',
+            'metadata': {'parent_doc_id': ids[row].rsplit('_chunk_', 1)[0], 'chunk_index': row % 10, 'is_chunk': True}
+        }
+
+    if 'json_docs' in formats:
+        paths['json_docs'] = os.path.join(directory, 'faiss_index_docs.json')
+        with open(paths['json_docs'], 'w', encoding='utf-8') as f:
+            # As the vector store used to write it
+            json.dump([chunk(row) for row in range(count)], f, indent=2)
+
+    if 'docstore' in formats:
+        paths['docstore'] = os.path.join(directory, 'faiss_index')
+        store = DocumentStore(paths['docstore'])
+        for start in range(0, count, 10000):
+            store.extend([chunk(row) for row in range(start, min(count, start + 10000))])
+
+    return {'id_format': id_format, 'paths': paths}
+
+def file_mb(fmt: str, path: str) -> float:
+    # The document store path is the base of its blob and offsets files
+    files = [f"{path}_docstore.blob", f"{path}_docstore.offsets"] if fmt == 'docstore' else [path]
+    return sum(os.path.getsize(f) for f in files) / 2 ** 20
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chunks', type=int, default=1000000)
+    parser.add_argument('--doc-chars', type=int, default=500, help='Content length of each synthetic chunk')
+    parser.add_argument('--formats', nargs='+', default=list(FORMATS), choices=FORMATS)
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    start = time.time()
+    files = make_files(directory, args.chunks, args.doc_chars, args.formats)
+    print(f"Wrote {args.chunks} chunks in {time.time() - start:.1f}s", file=sys.stderr)
+
+    report = []
+    for fmt in args.formats:
+        path = files['paths'][fmt]
+        for run in range(args.runs):
+            child = CHILD.format(
+                root=ROOT, fmt=fmt, path=path, id_format=files['id_format'],
+                count=args.chunks, lookups=args.lookups
+            )
+            output = subprocess.run(
+                [sys.executable, '-c', child], capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            report.append({'format': fmt, 'run': run, 'file_mb': file_mb(fmt, path), **json.loads(output)})
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    # RSS of a memory-mapped format counts only the pages touched so far, which are shared between processes
+    print(f"{args.chunks} chunks, {args.lookups} random lookups per run")
+    print(f"{'format':<10} {'run':>3} {'file MB':>8} {'load s':>8} {'RSS MB':>8} {'RSS+lookups':>12} {'lookup us':>10}")
+    for row in report:
+        print(f"{row['format']:<10} {row['run']:>3} {row['file_mb']:>8.1f} {row['load_s']:>8.3f} "
+              f"{row['rss_load_mb']:>8.1f} {row['rss_after_lookups_mb']:>12.1f} {row['lookup_us']:>10.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Cross-encoder rerank latency per candidate count and batch size
+Reranks synthetic candidates with CrossEncoderReranker (no budget) and reports cold and cached time,
+then how many candidates fit into each latency budget
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.config import Config
+from src.services.reranker import CrossEncoderReranker
+from src.services.vector_service import SearchResult
+
+TOPICS = ['neural networks', 'databases', 'cooking', 'astronomy', 'finance', 'music', 'travel', 'biology']
+
+def candidates(count: int, run: int):
+    return [
+        SearchResult(
+            id=f'bench_{run}_{i}',
+            content=f'Passage {run}-{i} explains {TOPICS[i % len(TOPICS)]} with details about subject {i % 97}. ' * 4,
+            title=f'Document {i}',
+            score=1.0 - i / count,
+            metadata={},
+            url=f'https://example.com/{i}'
+        )
+        for i in range(count)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--candidates', type=int, nargs='+', default=[10, 30, 100])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--budgets-ms', type=float, nargs='+', default=[50, 150, 300])
+    parser.add_argument('--model', default=Config.RERANK_MODEL)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    reranker = CrossEncoderReranker({'RERANK_MODEL': args.model, 'RERANK_BUDGET_MS': float('inf')})
+    reranker.warm_up()
+    reranker._load_thread.join()
+    if not reranker.ready:
+        sys.exit(f"Could not load {args.model}: {reranker.model_error}")
+    query = 'how do neural networks learn from data'
+
+    report = []
+    for count in args.candidates:
+        for batch_size in args.batch_sizes:
+            reranker.batch_size = batch_size
+            results = candidates(count, len(report))
+            start = time.perf_counter()
+            reranker.rerank(query, results, 5)
+            cold_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            reranker.rerank(query, results, 5)
+            cached_ms = (time.perf_counter() - start) * 1000
+            report.append({
+                'candidates': count,
+                'batch_size': batch_size,
+                'cold_ms': cold_ms,
+                'cached_ms': cached_ms,
+                'pairs_per_second': count / (cold_ms / 1000)
+            })
+
+    budgets = []
+    reranker.batch_size = Config.RERANK_BATCH_SIZE
+    for budget in args.budgets_ms:
+        reranker.budget_ms = budget
+        _, stage = reranker.rerank(query, candidates(max(args.candidates), 1000 + len(budgets)), 5)
+        budgets.append({'budget_ms': budget, 'scored': stage['scored'], 'time_ms': stage['time_ms']})
+
+    if args.json:
+        print(json.dumps({'latency': report, 'budgets': budgets}, indent=2))
+        return
+
+    print(f"{'candidates':>10} {'batch':>6} {'cold ms':>9} {'cached ms':>10} {'pairs/s':>9}")
+    for row in report:
+        print(f"{row['candidates']:>10} {row['batch_size']:>6} {row['cold_ms']:>9.1f} "
+              f"{row['cached_ms']:>10.2f} {row['pairs_per_second']:>9.1f}")
+    print()
+    print(f"{'budget ms':>9} {'scored':>7} {'time ms':>8}  (of {max(args.candidates)} candidates)")
+    for row in budgets:
+        print(f"{row['budget_ms']:>9.0f} {row['scored']:>7} {row['time_ms']:>8.1f}")
+
+if __name__ == '__main__':
+    main()
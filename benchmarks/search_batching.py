@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Search throughput with and without micro-batching, and with VectorService.search_many
+Runs concurrent VectorService.search calls from a thread pool against a temporary index,
+then the same number of queries through search_many in chunks (latency is per query, amortized)
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.config import Config
+from src.services.vector_service import VectorService
+
+def run(service: VectorService, queries, concurrency: int) -> dict:
+    latencies = []
+
+    def timed_search(query):
+        start = time.perf_counter()
+        service.search(query, 10)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed_search, queries))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'qps': len(queries) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95))
+    }
+
+def run_many(service: VectorService, queries, size: int) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), size):
+        chunk = queries[i:i + size]
+        begin = time.perf_counter()
+        service.search_many(chunk, 10)
+        latencies += [(time.perf_counter() - begin) * 1000 / len(chunk)] * len(chunk)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'concurrency': 1,
+        'qps': len(queries) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--max-batch', type=int, default=Config.SEARCH_BATCH_MAX_SIZE)
+    parser.add_argument('--wait-ms', type=float, default=Config.SEARCH_BATCH_WAIT_MS)
+    parser.add_argument('--many-size', type=int, default=64, help='Queries per search_many call')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    config.update({
+        'FAISS_INDEX_PATH': os.path.join(tempfile.mkdtemp(), 'bench'),
+        'EMBEDDING_CACHE_ENABLED': False,
+        # Every query is distinct, and the LRU is off, so each one is encoded
+        'QUERY_EMBEDDING_CACHE_SIZE': 0,
+        'SEARCH_BATCH_ENABLED': True,
+        'SEARCH_BATCH_MAX_SIZE': args.max_batch,
+        'SEARCH_BATCH_WAIT_MS': args.wait_ms
+    })
+    service = VectorService(config)
+    batcher = service.search_batcher
+
+    topics = ['neural networks', 'databases', 'cooking', 'astronomy', 'finance', 'music', 'travel', 'biology']
+    service.add_documents([
+        {
+            'id': f'bench_{i}',
+            'title': f'Document {i}',
+            'url': f'https://example.com/{i}',
+            'content': f'Document {i} discusses {topics[i % len(topics)]} and related subject {i % 97}.'
+        }
+        for i in range(args.documents)
+    ])
+
+    report = []
+    for concurrency in args.concurrency:
+        queries = [f'question {concurrency}-{i} about {topics[i % len(topics)]}' for i in range(args.queries)]
+
+        service.search_batcher = None
+        report.append({'mode': 'per-request', **run(service, queries, concurrency)})
+
+        service.search_batcher = batcher
+        report.append({'mode': 'batched', **run(service, [f'{q} again' for q in queries], concurrency)})
+
+    queries = [f'question many-{i} about {topics[i % len(topics)]}' for i in range(args.queries)]
+    report.append({'mode': 'search_many', **run_many(service, queries, args.many_size)})
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{args.documents} documents, {args.queries} queries per run, "
+          f"batch <= {args.max_batch} / {args.wait_ms}ms")
+    print(f"{'mode':<12} {'threads':>7} {'qps':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for row in report:
+        print(f"{row['mode']:<12} {row['concurrency']:>7} {row['qps']:>9.1f} "
+              f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f}")
+    print(f"batcher: {batcher.get_stats()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Semantic cache threshold sweep and lookup latency
+Embeds paraphrase pairs (same answer) and near-miss pairs (similar wording, different answer) with the service's
+embedding model and reports, per threshold, how many paraphrases would hit and how many near misses would falsely hit,
+then the SemanticCache lookup time at several index sizes
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.config import Config
+from src.services.semantic_cache import SemanticCache
+from src.services.vector_service import VectorService
+
+PARAPHRASES = [
+    ('What is machine learning?', 'Can you explain what machine learning is?'),
+    ('How do neural networks learn?', 'How does a neural network learn from data?'),
+    ('What are the benefits of cloud computing?', 'Why should a company use cloud computing?'),
+    ('Explain the difference between TCP and UDP', 'How is TCP different from UDP?'),
+    ('How do I make a REST API in Flask?', 'How can I build a REST API with Flask?'),
+    ('What causes inflation?', 'Why does inflation happen?'),
+    ('Summarize the theory of relativity', 'Give me a summary of the theory of relativity'),
+    ('What is a vector database used for?', 'What are vector databases used for?'),
+    ('Tips for writing a good blog post', 'How do I write a good blog post?'),
+    ('How does photosynthesis work?', 'Explain how photosynthesis works'),
+]
+
+NEAR_MISSES = [
+    ('What is machine learning?', 'What is deep learning?'),
+    ('How do neural networks learn?', 'How do neural networks make predictions?'),
+    ('What are the benefits of cloud computing?', 'What are the risks of cloud computing?'),
+    ('Explain the difference between TCP and UDP', 'Explain the difference between HTTP and HTTPS'),
+    ('How do I make a REST API in Flask?', 'How do I make a REST API in Django?'),
+    ('What causes inflation?', 'What causes deflation?'),
+    ('Summarize the theory of relativity', 'Summarize the theory of evolution'),
+    ('What is a vector database used for?', 'What is a graph database used for?'),
+    ('Tips for writing a good blog post', 'Tips for writing a good cover letter'),
+    ('How does photosynthesis work?', 'How does cellular respiration work?'),
+]
+
+def pair_similarities(service: VectorService, pairs) -> np.ndarray:
+    return np.array([float(service.embed_query(a) @ service.embed_query(b)) for a, b in pairs])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.80, 0.85, 0.90, 0.92, 0.95])
+    parser.add_argument('--entries', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--lookups', type=int, default=500)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    config['FAISS_INDEX_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench')
+    service = VectorService(config)
+
+    paraphrase = pair_similarities(service, PARAPHRASES)
+    near_miss = pair_similarities(service, NEAR_MISSES)
+    sweep = [{
+        'threshold': threshold,
+        'paraphrase_hit_rate': float(np.mean(paraphrase >= threshold)),
+        'near_miss_hit_rate': float(np.mean(near_miss >= threshold))
+    } for threshold in args.thresholds]
+
+    dim = len(service.embed_query(PARAPHRASES[0][0]))
+    rng = np.random.default_rng(5)
+    latency = []
+    for entries in args.entries:
+        cache = SemanticCache(threshold=0.92, max_entries=entries)
+        vectors = rng.normal(size=(entries, dim)).astype('float32')
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        for i, vector in enumerate(vectors):
+            cache.add(vector, (500, 0.7, 'default'), f'query {i}', f'key {i}')
+
+        queries = vectors[rng.integers(0, entries, args.lookups)]
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            cache.lookup(query, (500, 0.7, 'default'))
+            timings.append((time.perf_counter() - start) * 1000)
+        latency.append({'entries': entries, 'p50_ms': float(np.percentile(timings, 50)),
+                        'p95_ms': float(np.percentile(timings, 95))})
+
+    report = {
+        'model': config.get('EMBEDDINGS_MODEL'),
+        'paraphrase_similarity': {'min': float(paraphrase.min()), 'mean': float(paraphrase.mean())},
+        'near_miss_similarity': {'max': float(near_miss.max()), 'mean': float(near_miss.mean())},
+        'sweep': sweep,
+        'lookup_latency': latency
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"paraphrase similarity: min {paraphrase.min():.3f}, mean {paraphrase.mean():.3f}; "
+          f"near miss: max {near_miss.max():.3f}, mean {near_miss.mean():.3f}")
+    print(f"{'threshold':>9} {'paraphrase hits':>16} {'near-miss hits':>15}")
+    for row in sweep:
+        print(f"{row['threshold']:>9.2f} {row['paraphrase_hit_rate']:>16.0%} {row['near_miss_hit_rate']:>15.0%}")
+    print()
+    print(f"{'entries':>8} {'lookup p50 ms':>14} {'lookup p95 ms':>14}")
+    for row in latency:
+        print(f"{row['entries']:>8} {row['p50_ms']:>14.3f} {row['p95_ms']:>14.3f}")
+
+if __name__ == '__main__':
+    main()
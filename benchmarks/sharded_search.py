@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Ingest, search and rebalance cost of a sharded index against a single VectorService
+Starts K local shard processes per run (the stand-in for shard_worker.py on separate hosts),
+ingests the same documents, runs concurrent searches and then adds one shard
+"""
+import argparse
+import json
+import os
+import secrets
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.config import Config
+from src.services.sharding import ShardedVectorService, spawn_local_shards
+from src.services.vector_service import VectorService
+
+TOPICS = ['neural networks', 'databases', 'cooking', 'astronomy', 'finance', 'music', 'travel', 'biology']
+
+def make_documents(count: int):
+    return [
+        {
+            'id': f'bench_{i}',
+            'title': f'Document {i}',
+            'url': f'https://example.com/{i}',
+            'content': f'Document {i} discusses {TOPICS[i % len(TOPICS)]} and related subject {i % 97}.'
+        }
+        for i in range(count)
+    ]
+
+def run_searches(service, queries, concurrency: int) -> dict:
+    latencies = []
+
+    def timed_search(query):
+        start = time.perf_counter()
+        service.search(query, 10)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed_search, queries))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'qps': len(queries) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95))
+    }
+
+def benchmark(service, documents, queries, concurrency: int) -> dict:
+    start = time.perf_counter()
+    for i in range(0, len(documents), 500):
+        service.add_documents(documents[i:i + 500])
+    ingest_time = time.perf_counter() - start
+
+    run_searches(service, queries[:20], 1)
+    return {'ingest_s': ingest_time, **run_searches(service, queries, concurrency)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documents', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    config.update({
+        'EMBEDDING_CACHE_ENABLED': False,
+        'QUERY_EMBEDDING_CACHE_SIZE': 0,
+        'EMBEDDINGS_LOAD_MODE': 'eager',
+        'INDEX_WATCH_INTERVAL': 0.5,
+        # The local shards only need a key shared with this process
+        'VECTOR_SHARD_AUTHKEY': Config.VECTOR_SHARD_AUTHKEY or secrets.token_hex(16)
+    })
+    documents = make_documents(args.documents)
+    queries = [f'question {i} about {TOPICS[i % len(TOPICS)]}' for i in range(args.queries)]
+
+    base_path = tempfile.mkdtemp()
+    single = VectorService({**config, 'FAISS_INDEX_PATH': os.path.join(base_path, 'single', 'faiss_index')})
+    report = [{'shards': 0, **benchmark(single, documents, queries, args.concurrency), 'rebalance_s': None}]
+
+    for count in args.shards:
+        run_path = os.path.join(base_path, f'run_{count}')
+        # One extra process is started up front so the rebalance does not time a model load
+        spawned = spawn_local_shards(config, count + 1, run_path)
+        try:
+            addresses = [address for address, _ in spawned]
+            service = ShardedVectorService(
+                {**config, 'VECTOR_SHARD_MAP_PATH': os.path.join(run_path, 'shards.json')}, addresses[:count]
+            )
+            row = {'shards': count, **benchmark(service, documents, queries, args.concurrency)}
+            rebalance = service.add_shard(addresses[count])
+            row.update({'rebalance_s': rebalance['time_s'], 'moved_records': rebalance['moved_records']})
+            report.append(row)
+        finally:
+            for _, process in spawned:
+                process.terminate()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    # Shards here share one machine's CPUs; the rebalance time includes the 2 x INDEX_WATCH_INTERVAL settle wait
+    print(f"{args.documents} documents, {args.queries} queries at concurrency {args.concurrency}")
+    print(f"{'shards':<7} {'ingest s':>9} {'qps':>9} {'p50 ms':>9} {'p95 ms':>9} {'+1 shard s':>11} {'moved':>7}")
+    for row in report:
+        label = str(row['shards']) if row['shards'] else 'local'
+        rebalance = f"{row['rebalance_s']:>11.2f} {row['moved_records']:>7}" if row['rebalance_s'] is not None else f"{'-':>11} {'-':>7}"
+        print(f"{label:<7} {row['ingest_s']:>9.2f} {row['qps']:>9.1f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {rebalance}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Worker startup time for each EMBEDDINGS_LOAD_MODE
+Starts a fresh interpreter per run and reports time until create_app() returns and until /api/ready is 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Runs in a child process so imports (torch, faiss, ...) are timed from a cold interpreter
+CHILD = """
+import json, os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+client = app.test_client()
+while client.get('/api/ready').status_code != 200 and time.perf_counter() - start < {timeout}:
+    time.sleep(0.05)
+ready = time.perf_counter()
+first = client.post('/api/search', json={{'query': 'startup benchmark query', 'limit': 1}})
+searched = time.perf_counter()
+print(json.dumps({{
+    'import_s': imported - start,
+    'create_app_s': created - start,
+    'ready_s': ready - start,
+    'first_search_s': searched - start,
+    'first_search_status': first.status_code
+}}))
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--modes', nargs='+', default=['eager', 'background', 'lazy'])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    report = []
+    for mode in args.modes:
+        for run in range(args.runs):
+            env = {**os.environ, 'EMBEDDINGS_LOAD_MODE': mode}
+            output = subprocess.run(
+                [sys.executable, '-c', CHILD.format(root=ROOT, timeout=args.timeout)],
+                cwd=ROOT, env=env, capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            report.append({'mode': mode, 'run': run, **json.loads(output)})
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'mode':<11} {'run':>3} {'import s':>9} {'create_app s':>13} {'ready s':>8} {'1st search s':>13}")
+    for row in report:
+        print(f"{row['mode']:<11} {row['run']:>3} {row['import_s']:>9.2f} {row['create_app_s']:>13.2f} "
+              f"{row['ready_s']:>8.2f} {row['first_search_s']:>13.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Memory and recall of the FAISS_STORAGE modes against the exact IndexFlatIP
+Reports index bytes per million vectors and recall@k with and without exact float32 re-scoring of the top candidates
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from ann_recall import load_vectors
+from src.config import Config
+from src.services.index_factory import STORAGE_TYPES, IndexSettings, build_index, describe_storage
+from src.services.vector_file import rescore
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(np.intersect1d(found[i], truth[i])) for i in range(len(truth)))
+    return hits / float(truth.size)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--synthetic', type=int, default=0, help='Use N synthetic vectors instead of the knowledge base')
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--storage', nargs='+', default=list(STORAGE_TYPES), choices=STORAGE_TYPES)
+    parser.add_argument('--rescore-factors', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--pq-m', type=int, default=Config.FAISS_PQ_M)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    vectors = np.ascontiguousarray(load_vectors(args), dtype='float32')
+    rng = np.random.default_rng(11)
+    rows = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = vectors[rows] + 0.05 * rng.normal(size=(len(rows), vectors.shape[1])).astype('float32')
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    k = min(args.k, len(vectors))
+
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    report = []
+    for storage in args.storage:
+        settings = IndexSettings(index_type='flat', storage=storage, pq_m=args.pq_m)
+        start = time.time()
+        index = build_index(vectors, vectors.shape[1], settings)
+        build_time = time.time() - start
+        # Serialized size is what the index holds in RAM, less the small IndexIDMap2 id table
+        index_bytes = len(faiss.serialize_index(index)) / len(vectors)
+
+        factors = [0] + ([f for f in args.rescore_factors if f > 0] if storage != 'float32' else [])
+        for factor in factors:
+            fetch = min(len(vectors), k * max(factor, 1))
+            start = time.time()
+            scores, found = index.search(queries, fetch)
+            if factor:
+                # In-memory copy of what VectorService reads from the memory-mapped side file
+                scores, found = rescore(vectors, queries, found, k)
+            latency = (time.time() - start) * 1000 / len(queries)
+
+            report.append({
+                'storage': describe_storage(index),
+                'rescore_factor': factor,
+                'index_mb_per_million': index_bytes,
+                'side_file_mb_per_million': vectors.shape[1] * 4 if storage != 'float32' else 0,
+                'recall_at_k': recall(found[:, :k], truth),
+                'latency_ms': latency,
+                'build_time_s': build_time
+            })
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    # bytes per vector equals MB per million vectors
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, recall@{k} vs IndexFlatIP")
+    print(f"{'storage':<8} {'rescore':>7} {'index MB/1M':>12} {'side MB/1M':>11} {'recall':>7} {'ms/query':>9} {'build s':>8}")
+    for row in report:
+        rescore_label = f"x{row['rescore_factor']}" if row['rescore_factor'] else '-'
+        print(f"{row['storage']:<8} {rescore_label:>7} {row['index_mb_per_million']:>12.0f} "
+              f"{row['side_file_mb_per_million']:>11.0f} {row['recall_at_k']:>7.3f} "
+              f"{row['latency_ms']:>9.3f} {row['build_time_s']:>8.2f}")
+
+if __name__ == '__main__':
+    main()
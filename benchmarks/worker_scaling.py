@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Search throughput and memory per gunicorn worker count, with and without --preload
+Starts gunicorn with gunicorn.conf.py for each configuration, loads /api/search from a thread pool,
+and reports requests/s and the RSS, USS and PSS of the workers (PSS counts shared pages once)
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import psutil
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def request(url: str, payload=None, timeout: float = 30):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.status
+
+def wait_ready(base: str, workers: int, timeout: float):
+    """Wait until /api/ready answers 200 on enough consecutive requests to have hit every worker"""
+    deadline = time.time() + timeout
+    ready = 0
+    while ready < workers * 4:
+        if time.time() > deadline:
+            raise TimeoutError(f"gunicorn not ready after {timeout}s")
+        try:
+            ready = ready + 1 if request(f"{base}/api/ready", timeout=5) == 200 else 0
+        except Exception:
+            ready = 0
+            time.sleep(0.2)
+
+def worker_memory(master: psutil.Process) -> dict:
+    totals = {'rss_mb': 0.0, 'uss_mb': 0.0, 'pss_mb': 0.0}
+    for child in master.children():
+        info = child.memory_full_info()
+        totals['rss_mb'] += info.rss / (1024 * 1024)
+        totals['uss_mb'] += info.uss / (1024 * 1024)
+        totals['pss_mb'] += getattr(info, 'pss', 0) / (1024 * 1024)
+    return totals
+
+def run(workers: int, preload: bool, args) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        'PORT': str(port),
+        'WEB_CONCURRENCY': str(workers),
+        'GUNICORN_PRELOAD': str(preload),
+        'EMBEDDINGS_LOAD_MODE': 'preload' if preload else 'eager',
+        'FAISS_MMAP': str(preload)
+    }
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn.conf.py'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        start = time.perf_counter()
+        wait_ready(base, workers, args.timeout)
+        ready_s = time.perf_counter() - start
+
+        latencies = []
+
+        def search(i):
+            query = {'query': f'benchmark question {i % args.distinct} about search', 'limit': 5}
+            begin = time.perf_counter()
+            request(f"{base}/api/search", query)
+            latencies.append((time.perf_counter() - begin) * 1000)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(search, range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+        return {
+            'workers': workers,
+            'preload': preload,
+            'ready_s': ready_s,
+            'rps': args.requests / elapsed,
+            'p95_ms': float(np.percentile(latencies, 95)),
+            **worker_memory(psutil.Process(server.pid))
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--distinct', type=int, default=200, help='Distinct queries (the rest hit the query cache)')
+    parser.add_argument('--no-compare', action='store_true', help='Only run with --preload')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    report = []
+    for workers in args.workers:
+        for preload in ([True] if args.no_compare else [False, True]):
+            report.append(run(workers, preload, args))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'workers':>7} {'preload':>7} {'ready s':>8} {'rps':>8} {'p95 ms':>8} "
+          f"{'RSS MB':>8} {'USS MB':>8} {'PSS MB':>8}")
+    for row in report:
+        print(f"{row['workers']:>7} {str(row['preload']):>7} {row['ready_s']:>8.1f} {row['rps']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['rss_mb']:>8.1f} {row['uss_mb']:>8.1f} {row['pss_mb']:>8.1f}")
+
+if __name__ == '__main__':
+    main()
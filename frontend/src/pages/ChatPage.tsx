@@ -7,7 +7,7 @@ import {
   ClockIcon,
   LinkIcon
 } from '@heroicons/react/24/outline';
-import { ApiService, GenerateContentResponse } from '../services/api';
+import { ApiService, Source } from '../services/api';
 import MarkdownRenderer from '../components/MarkdownRenderer';
 import toast from 'react-hot-toast';
 
@@ -16,13 +16,9 @@ interface Message {
   type: 'user' | 'assistant';
   content: string;
   timestamp: Date;
-  sources?: Array<{
-    title: string;
-    url: string;
-    snippet: string;
-    score: number;
-  }>;
+  sources?: Source[];
   responseTime?: number;
+  timeToFirstToken?: number;
 }
 
 const ChatPage: React.FC = () => {
@@ -58,37 +54,47 @@ const ChatPage: React.FC = () => {
       timestamp: new Date(),
     };
 
-    setMessages(prev => [...prev, userMessage]);
+    const assistantId = (Date.now() + 1).toString();
+    setMessages(prev => [...prev, userMessage, {
+      id: assistantId,
+      type: 'assistant',
+      content: '',
+      timestamp: new Date(),
+    }]);
     setInput('');
     setIsLoading(true);
 
-    try {
-      const response: GenerateContentResponse = await ApiService.generateContent({
-        query: input.trim(),
-        max_length: 500,
-        temperature: 0.7
-      });
-
-      const assistantMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        type: 'assistant',
-        content: response.content,
-        timestamp: new Date(),
-        sources: response.sources,
-        responseTime: response.response_time_ms
-      };
+    // The assistant message fills in as sources and tokens arrive
+    const updateAssistant = (update: (message: Message) => Partial<Message>) => {
+      setMessages(prev => prev.map(message =>
+        message.id === assistantId ? { ...message, ...update(message) } : message
+      ));
+    };
 
-      setMessages(prev => [...prev, assistantMessage]);
-      toast.success('Response generated successfully!');
+    try {
+      await ApiService.generateContentStream(
+        {
+          query: userMessage.content,
+          max_length: 500,
+          temperature: 0.7
+        },
+        {
+          onSources: (event) => updateAssistant(() => ({ sources: event.sources })),
+          onToken: (delta) => updateAssistant(message => ({ content: message.content + delta })),
+          onDone: (event) => updateAssistant(() => ({
+            responseTime: Math.round(event.response_time_ms),
+            timeToFirstToken: event.time_to_first_token_ms !== null
+              ? Math.round(event.time_to_first_token_ms)
+              : undefined
+          })),
+        }
+      );
     } catch (error) {
       console.error('Error generating response:', error);
-      const errorMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        type: 'assistant',
+      updateAssistant(() => ({
         content: 'I apologize, but I encountered an error while processing your request. Please try again or check if the backend service is running.',
-        timestamp: new Date(),
-      };
-      setMessages(prev => [...prev, errorMessage]);
+        sources: undefined,
+      }));
       toast.error('Failed to generate response');
     } finally {
       setIsLoading(false);
@@ -121,7 +127,7 @@ const ChatPage: React.FC = () => {
         {/* Messages */}
         <div className="flex-1 overflow-y-auto p-6 space-y-6">
           <AnimatePresence>
-            {messages.map((message) => (
+            {messages.filter(message => message.content || message.sources?.length).map((message) => (
               <motion.div
                 key={message.id}
                 initial={{ opacity: 0, y: 20 }}
@@ -192,6 +198,9 @@ const ChatPage: React.FC = () => {
                   }`}>
                     <ClockIcon className="h-3 w-3 mr-1" />
                     <span>{formatTimestamp(message.timestamp)}</span>
+                    {message.timeToFirstToken !== undefined && (
+                      <span className="ml-2">• first token {message.timeToFirstToken}ms</span>
+                    )}
                     {message.responseTime && (
                       <span className="ml-2">• {message.responseTime}ms</span>
                     )}
@@ -201,8 +210,8 @@ const ChatPage: React.FC = () => {
             ))}
           </AnimatePresence>
 
-          {/* Loading indicator */}
-          {isLoading && (
+          {/* Loading indicator, until the first token arrives */}
+          {isLoading && !messages[messages.length - 1]?.content && (
             <motion.div
               initial={{ opacity: 0, y: 20 }}
               animate={{ opacity: 1, y: 0 }}
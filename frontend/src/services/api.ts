@@ -49,18 +49,43 @@ export interface GenerateContentRequest {
   temperature?: number;
 }
 
+export interface Source {
+  title: string;
+  url: string;
+  snippet: string;
+  score: number;
+  source_type?: 'web' | 'knowledge_base';
+}
+
 export interface GenerateContentResponse {
   content: string;
-  sources: Array<{
-    title: string;
-    url: string;
-    snippet: string;
-    score: number;
-  }>;
+  sources: Source[];
   response_time_ms: number;
   timestamp: string;
 }
 
+export interface StreamSourcesEvent {
+  sources: Source[];
+  web_sources_count: number;
+  kb_sources_count: number;
+  search_time: number;
+}
+
+export interface StreamDoneEvent {
+  tokens_used: number;
+  finish_reason: string;
+  cached: boolean;
+  response_time_ms: number;
+  time_to_first_token_ms: number | null;
+  timestamp: number;
+}
+
+export interface GenerateStreamHandlers {
+  onSources?: (event: StreamSourcesEvent) => void;
+  onToken: (delta: string) => void;
+  onDone?: (event: StreamDoneEvent) => void;
+}
+
 export interface SearchRequest {
   query: string;
   limit?: number;
@@ -127,6 +152,53 @@ export class ApiService {
     return response.data;
   }
 
+  // Generate content using RAG, streamed as Server-Sent Events.
+  // EventSource cannot POST, so the event stream is read from fetch.
+  static async generateContentStream(
+    request: GenerateContentRequest,
+    handlers: GenerateStreamHandlers,
+    signal?: AbortSignal
+  ): Promise<void> {
+    const response = await fetch(`${getBaseUrl()}/generate/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+      body: JSON.stringify(request),
+      signal,
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Streaming request failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line; the last part may be incomplete
+      const events = buffer.split('\n\n');
+      buffer = events.pop() ?? '';
+      for (const raw of events) {
+        let event = 'message';
+        let data = '';
+        for (const line of raw.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (!data) continue; // comments such as ": stream open"
+
+        const payload = JSON.parse(data);
+        if (event === 'sources') handlers.onSources?.(payload);
+        else if (event === 'token') handlers.onToken(payload.delta);
+        else if (event === 'done') handlers.onDone?.(payload);
+        else if (event === 'error') throw new Error(payload.error);
+      }
+    }
+  }
+
   // Perform semantic search
   static async search(request: SearchRequest): Promise<SearchResponse> {
     const response = await api.post<SearchResponse>('/search', request);
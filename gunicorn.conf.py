@@ -0,0 +1,37 @@
+"""
+Gunicorn configuration
+Preloads the app in the master so workers share the embedding model and the
+memory-mapped FAISS index copy-on-write instead of each loading their own copy.
+
+    gunicorn app:app -c gunicorn.conf.py
+"""
+import os
+import sys
+import threading
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+if preload_app:
+    # Read by src.config when the app is imported, which happens after this file
+    os.environ.setdefault('EMBEDDINGS_LOAD_MODE', 'preload')
+    os.environ.setdefault('FAISS_MMAP', 'True')
+
+def post_fork(server, worker):
+    """Give each worker its own inference threads, warm it up and start its job workers"""
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        # Workers share the CPU; one intra-op thread each avoids oversubscription
+        torch.set_num_threads(int(os.getenv('TORCH_THREADS_PER_WORKER', 1)))
+
+    if preload_app:
+        app = worker.app.wsgi()
+        vector_service = app.extensions['vector_service']
+        threading.Thread(target=vector_service.warm_up, name='embedding-warmup', daemon=True).start()
+        if app.config['JOB_WORKERS_ENABLED']:
+            app.extensions['job_queue'].start()
+        if app.extensions['reranker'] is not None:
+            app.extensions['reranker'].warm_up()
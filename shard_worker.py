@@ -0,0 +1,47 @@
+"""
+Standalone vector shard
+Serves one partition of the vector index to the web app's ShardedVectorService.
+Give every shard its own FAISS_INDEX_PATH and list their addresses in the web app's VECTOR_SHARDS.
+Shards and the web app share a secret in VECTOR_SHARD_AUTHKEY, which must be set.
+
+    VECTOR_SHARD_AUTHKEY=... FAISS_INDEX_PATH=./data/shard_0/faiss_index python shard_worker.py --port 7101
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+
+# Load the model before serving rather than on the first search
+os.environ.setdefault('EMBEDDINGS_LOAD_MODE', 'eager')
+
+from src.config import Config
+from src.services.cache_service import CacheService
+from src.services.sharding import ShardServer, shard_authkey
+from src.services.vector_service import VectorService
+from src.utils.logger import setup_logger
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default=os.getenv('VECTOR_SHARD_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('VECTOR_SHARD_PORT', 7101)))
+    args = parser.parse_args()
+
+    shard_config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    setup_logger(shard_config['LOG_LEVEL'], shard_config['LOG_FILE'])
+    # Fail before loading the index when no shared secret is configured
+    authkey = shard_authkey(shard_config)
+
+    service = VectorService(shard_config, CacheService(shard_config))
+    server = ShardServer(service, (args.host, args.port), authkey)
+
+    signal.signal(signal.SIGTERM, lambda *_: server.stop())
+    signal.signal(signal.SIGINT, lambda *_: server.stop())
+    thread = threading.Thread(target=server.serve_forever, name='shard-server', daemon=True)
+    thread.start()
+    while thread.is_alive():
+        thread.join(1.0)
+    logging.getLogger(__name__).info("Shard stopped")
+
+if __name__ == '__main__':
+    main()
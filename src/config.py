@@ -21,6 +21,13 @@ class Config:
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4-0125-preview')
     OPENAI_MAX_TOKENS = int(os.getenv('OPENAI_MAX_TOKENS', 1000))
     OPENAI_TEMPERATURE = float(os.getenv('OPENAI_TEMPERATURE', 0.7))
+    # An OpenAI-compatible endpoint instead of api.openai.com (e.g. a proxy or a local mock)
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')
+    # Per-process quotas for all OpenAI calls (0 = unlimited); divide the account's limits by the worker count
+    OPENAI_REQUESTS_PER_MINUTE = float(os.getenv('OPENAI_REQUESTS_PER_MINUTE', 0))
+    OPENAI_TOKENS_PER_MINUTE = float(os.getenv('OPENAI_TOKENS_PER_MINUTE', 0))
+    OPENAI_RATE_LIMIT_BURST_SECONDS = float(os.getenv('OPENAI_RATE_LIMIT_BURST_SECONDS', 10))
+    OPENAI_BATCH_CONCURRENCY = int(os.getenv('OPENAI_BATCH_CONCURRENCY', 8))
     
     # Redis Configuration
     REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
@@ -33,9 +40,141 @@ class Config:
     FAISS_INDEX_PATH = os.getenv('FAISS_INDEX_PATH', './data/faiss_index')
     EMBEDDINGS_MODEL = os.getenv('EMBEDDINGS_MODEL', 'all-MiniLM-L6-v2')
     VECTOR_DIMENSION = int(os.getenv('VECTOR_DIMENSION', 384))
+    # sentence-transformers (PyTorch), onnx or onnx-int8 (ONNX Runtime, exported on first use)
+    EMBEDDINGS_BACKEND = os.getenv('EMBEDDINGS_BACKEND', 'sentence-transformers')
+    ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', './data/onnx')
+    ONNX_THREADS = int(os.getenv('ONNX_THREADS', 0))
+    EMBEDDINGS_PARITY_MIN_COSINE = float(os.getenv('EMBEDDINGS_PARITY_MIN_COSINE', 0.98))
+    # background: load the model in a warm-up thread at startup; lazy: on first use; eager: before serving;
+    # preload: load weights without inference, for gunicorn --preload (workers warm up after fork)
+    EMBEDDINGS_LOAD_MODE = os.getenv('EMBEDDINGS_LOAD_MODE', 'background')
     MAX_SEARCH_RESULTS = int(os.getenv('MAX_SEARCH_RESULTS', 10))
     USE_LIGHTWEIGHT_MODE = os.getenv('USE_LIGHTWEIGHT_MODE', 'False').lower() == 'true'
     
+    # FAISS Index Configuration (flat, ivf_flat, ivf_pq, hnsw)
+    FAISS_INDEX_TYPE = os.getenv('FAISS_INDEX_TYPE', 'flat')
+    FAISS_NLIST = int(os.getenv('FAISS_NLIST', 1024))
+    FAISS_NPROBE = int(os.getenv('FAISS_NPROBE', 16))
+    FAISS_PQ_M = int(os.getenv('FAISS_PQ_M', 48))
+    FAISS_PQ_NBITS = int(os.getenv('FAISS_PQ_NBITS', 8))
+    FAISS_HNSW_M = int(os.getenv('FAISS_HNSW_M', 32))
+    FAISS_EF_CONSTRUCTION = int(os.getenv('FAISS_EF_CONSTRUCTION', 200))
+    FAISS_EF_SEARCH = int(os.getenv('FAISS_EF_SEARCH', 64))
+    FAISS_TRAIN_SAMPLE = int(os.getenv('FAISS_TRAIN_SAMPLE', 100000))
+    # Vector storage inside the index (float32, fp16, sq8, pq). Compressed storage keeps the float32
+    # vectors in a memory-mapped side file and re-scores FAISS_RESCORE_FACTOR x limit candidates (0: off)
+    FAISS_STORAGE = os.getenv('FAISS_STORAGE', 'float32')
+    FAISS_RESCORE_FACTOR = int(os.getenv('FAISS_RESCORE_FACTOR', 4))
+    # Memory-map the index snapshot read-only so worker processes share its pages
+    FAISS_MMAP = os.getenv('FAISS_MMAP', 'False').lower() == 'true'
+    # Seconds between checks for index versions committed by other processes (0 disables)
+    INDEX_WATCH_INTERVAL = float(os.getenv('INDEX_WATCH_INTERVAL', 2.0))
+    
+    # Sharded index: host:port list of shard_worker.py processes, each holding part of the documents.
+    # Empty keeps a single local index. After a rebalance the list in VECTOR_SHARD_MAP_PATH takes over.
+    VECTOR_SHARDS = os.getenv('VECTOR_SHARDS', '')
+    # Shared secret of the shards and the web app; required with VECTOR_SHARDS, since shards unpickle requests
+    VECTOR_SHARD_AUTHKEY = os.getenv('VECTOR_SHARD_AUTHKEY', '')
+    VECTOR_SHARD_TIMEOUT = float(os.getenv('VECTOR_SHARD_TIMEOUT', 10.0))
+    # Answer from the shards that responded when some are down, instead of returning no results
+    VECTOR_SHARD_PARTIAL_RESULTS = os.getenv('VECTOR_SHARD_PARTIAL_RESULTS', 'True').lower() == 'true'
+    VECTOR_SHARD_FANOUT_THREADS = int(os.getenv('VECTOR_SHARD_FANOUT_THREADS', 32))
+    VECTOR_SHARD_MAP_PATH = os.getenv('VECTOR_SHARD_MAP_PATH', './data/shards.json')
+    VECTOR_SHARD_REBALANCE_BATCH = int(os.getenv('VECTOR_SHARD_REBALANCE_BATCH', 500))
+    
+    # Ingest batches are appended as segments and folded into a snapshot every N segments
+    SEGMENT_COMPACT_THRESHOLD = int(os.getenv('SEGMENT_COMPACT_THRESHOLD', 32))
+    
+    # Deleted rows are compacted away in the background once they make up this share of the store
+    COMPACTION_TOMBSTONE_RATIO = float(os.getenv('COMPACTION_TOMBSTONE_RATIO', 0.2))
+    COMPACTION_MIN_TOMBSTONES = int(os.getenv('COMPACTION_MIN_TOMBSTONES', 100))
+    
+    # Content-addressed embedding cache (local memory-mapped store, plus Redis when available)
+    EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True').lower() == 'true'
+    EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', './data/embedding_cache')
+    EMBEDDING_CACHE_TTL = int(os.getenv('EMBEDDING_CACHE_TTL', 604800))
+    
+    # In-process LRU of query embeddings; the Redis tier shares them across workers
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 10000))
+    QUERY_EMBEDDING_CACHE_REDIS = os.getenv('QUERY_EMBEDDING_CACHE_REDIS', 'False').lower() == 'true'
+    
+    # Micro-batching of concurrent searches: dispatch after N queries or a few milliseconds
+    SEARCH_BATCH_ENABLED = os.getenv('SEARCH_BATCH_ENABLED', 'False').lower() == 'true'
+    SEARCH_BATCH_MAX_SIZE = int(os.getenv('SEARCH_BATCH_MAX_SIZE', 32))
+    SEARCH_BATCH_WAIT_MS = float(os.getenv('SEARCH_BATCH_WAIT_MS', 3.0))
+    # Largest number of queries accepted by POST /api/search/batch
+    BATCH_SEARCH_MAX_QUERIES = int(os.getenv('BATCH_SEARCH_MAX_QUERIES', 256))
+    
+    # Retrieval: dense (FAISS), lexical (BM25) or hybrid, fused by rrf or weighted scores
+    SEARCH_MODE = os.getenv('SEARCH_MODE', 'hybrid')
+    HYBRID_FUSION = os.getenv('HYBRID_FUSION', 'rrf')
+    HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', 60))
+    HYBRID_DENSE_WEIGHT = float(os.getenv('HYBRID_DENSE_WEIGHT', 0.5))
+    HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', 50))
+    BM25_K1 = float(os.getenv('BM25_K1', 1.2))
+    BM25_B = float(os.getenv('BM25_B', 0.75))
+    # Generation skips web search when a top KB result has this cosine similarity or query term coverage
+    KB_CONFIDENT_DENSE_SCORE = float(os.getenv('KB_CONFIDENT_DENSE_SCORE', 0.75))
+    KB_CONFIDENT_TERM_COVERAGE = float(os.getenv('KB_CONFIDENT_TERM_COVERAGE', 1.0))
+    # Generation searches the knowledge base and the web concurrently; each source is dropped past its deadline.
+    # By default the web search waits for the KB, so a confident KB skips the (billed) call. Speculative search
+    # starts both at once for lower latency; a search already running cannot be cancelled and is always paid for
+    KB_SEARCH_TIMEOUT_MS = float(os.getenv('KB_SEARCH_TIMEOUT_MS', 2000))
+    WEB_SEARCH_TIMEOUT_MS = float(os.getenv('WEB_SEARCH_TIMEOUT_MS', 6000))
+    WEB_SEARCH_SPECULATIVE = os.getenv('WEB_SEARCH_SPECULATIVE', 'False').lower() == 'true'
+    RETRIEVAL_THREADS = int(os.getenv('RETRIEVAL_THREADS', 16))
+    
+    # Cross-encoder reranking of the top RERANK_CANDIDATES results, within RERANK_BUDGET_MS
+    RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'False').lower() == 'true'
+    RERANK_MODEL = os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+    RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', 30))
+    RERANK_TOP_K = int(os.getenv('RERANK_TOP_K', 5))
+    RERANK_MIN_SCORE = float(os.getenv('RERANK_MIN_SCORE', 0.2))
+    RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', 16))
+    RERANK_BUDGET_MS = float(os.getenv('RERANK_BUDGET_MS', 150))
+    RERANK_MAX_LENGTH = int(os.getenv('RERANK_MAX_LENGTH', 256))
+    RERANK_CACHE_SIZE = int(os.getenv('RERANK_CACHE_SIZE', 10000))
+    RERANK_CACHE_REDIS = os.getenv('RERANK_CACHE_REDIS', 'False').lower() == 'true'
+    RERANK_CACHE_TTL = int(os.getenv('RERANK_CACHE_TTL', 86400))
+    
+    # Semantic response cache: reuse the answer of a past query within SEMANTIC_CACHE_THRESHOLD cosine similarity.
+    # SEMANTIC_CACHE_AUDIT_RATE of the hits are generated again to count answers that differ (false hits)
+    SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'False').lower() == 'true'
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.92))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', 10000))
+    SEMANTIC_CACHE_AUDIT_RATE = float(os.getenv('SEMANTIC_CACHE_AUDIT_RATE', 0.02))
+    SEMANTIC_CACHE_AUDIT_MIN_SIMILARITY = float(os.getenv('SEMANTIC_CACHE_AUDIT_MIN_SIMILARITY', 0.85))
+    
+    # Single-flight: concurrent identical generations share one upstream call (in-process, and across workers via a
+    # Redis lock). Waiters give up after SINGLE_FLIGHT_TIMEOUT seconds, which is also the lock's expiry
+    SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'True').lower() == 'true'
+    SINGLE_FLIGHT_TIMEOUT = float(os.getenv('SINGLE_FLIGHT_TIMEOUT', 30))
+    SINGLE_FLIGHT_POLL_MS = float(os.getenv('SINGLE_FLIGHT_POLL_MS', 50))
+    
+    # Bulk NDJSON ingest: batches embedded on a process pool (0 workers = in-process) and written in order
+    BULK_INGEST_BATCH_SIZE = int(os.getenv('BULK_INGEST_BATCH_SIZE', 256))
+    BULK_INGEST_WORKERS = int(os.getenv('BULK_INGEST_WORKERS', 2))
+    BULK_INGEST_WORKER_THREADS = int(os.getenv('BULK_INGEST_WORKER_THREADS', 1))
+    BULK_INGEST_MAX_INFLIGHT = int(os.getenv('BULK_INGEST_MAX_INFLIGHT', 4))
+    BULK_INGEST_MAX_JOBS = int(os.getenv('BULK_INGEST_MAX_JOBS', 2))
+    BULK_INGEST_SPOOL_DIR = os.getenv('BULK_INGEST_SPOOL_DIR', './data/ingest')
+    BULK_INGEST_JOB_TTL = int(os.getenv('BULK_INGEST_JOB_TTL', 86400))
+    
+    # Background jobs (ingest, rebuild_index, compact, crawl, rebalance_shards): broker is redis, sqlite or memory
+    JOB_BROKER = os.getenv('JOB_BROKER', 'sqlite')
+    JOB_SQLITE_PATH = os.getenv('JOB_SQLITE_PATH', './data/jobs.db')
+    # Run queued jobs on threads of the web workers; set False when running worker.py separately
+    JOB_WORKERS_ENABLED = os.getenv('JOB_WORKERS_ENABLED', 'True').lower() == 'true'
+    # Jobs of each type running at once, across all processes sharing the broker
+    JOB_CONCURRENCY = os.getenv('JOB_CONCURRENCY', 'ingest=1,rebuild_index=1,compact=1,crawl=1,rebalance_shards=1')
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+    JOB_RETRY_BACKOFF = float(os.getenv('JOB_RETRY_BACKOFF', 5.0))
+    # An idle dispatcher polls the broker less and less often, from JOB_POLL_INTERVAL up to this
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 0.5))
+    JOB_MAX_POLL_INTERVAL = float(os.getenv('JOB_MAX_POLL_INTERVAL', 10.0))
+    JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 300))
+    JOB_TTL = int(os.getenv('JOB_TTL', 604800))
+    
     # Data Processing Configuration
     DATA_DIRECTORY = os.getenv('DATA_DIRECTORY', './data/raw')
     PROCESSED_DATA_DIRECTORY = os.getenv('PROCESSED_DATA_DIRECTORY', './data/processed')
@@ -69,6 +208,7 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     REDIS_DB = 1  # Use different Redis DB for testing
+    JOB_BROKER = 'memory'
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,276 @@
+"""
+Bulk ingestion of NDJSON uploads
+Splits an upload into fixed-size batches, embeds them on a process pool and writes them to the index as a tracked job
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, asdict
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .embedding_backend import create_embedding_backend
+
+# Embedding backend of a pool process, loaded once by _init_worker
+_worker_backend = None
+
+def _init_worker(config: Dict, threads: int):
+    global _worker_backend
+    if threads:
+        os.environ['OMP_NUM_THREADS'] = str(threads)
+        config = {**config, 'ONNX_THREADS': threads}
+    _worker_backend = create_embedding_backend(config)
+    torch = sys.modules.get('torch')
+    if torch is not None and threads:
+        torch.set_num_threads(threads)
+
+def _encode_in_worker(texts: List[str], batch_size: int) -> np.ndarray:
+    """Tokenize and encode in a pool process; normalized float32 like VectorService._encode"""
+    embeddings = np.asarray(_worker_backend.encode(texts, batch_size=batch_size), dtype='float32')
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+@dataclass
+class BulkIngestJob:
+    """Progress of one bulk upload"""
+    job_id: str
+    upsert: bool = False
+    status: str = 'queued'
+    bytes_total: int = 0
+    bytes_read: int = 0
+    documents_read: int = 0
+    documents_processed: int = 0
+    records_indexed: int = 0
+    documents_skipped: int = 0
+    invalid_lines: int = 0
+    batches_written: int = 0
+    inflight_batches: int = 0
+    backpressure_waits: int = 0
+    backpressure_seconds: float = 0.0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    errors: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        data['elapsed_seconds'] = elapsed
+        data['docs_per_second'] = self.documents_processed / elapsed if elapsed > 0 else 0.0
+        data['progress'] = self.bytes_read / self.bytes_total if self.bytes_total else 0.0
+        return data
+
+class BulkIngestService:
+    """Runs bulk ingest jobs in background threads of the web process.
+
+    Each job reads its spooled NDJSON file in batches of ``batch_size``
+    documents. Up to ``max_inflight`` batches are embedded at once on a
+    shared process pool of ``workers`` processes (each loads the embedding
+    backend once; ``workers=0`` embeds in this process) while the job thread
+    writes finished batches to the index in upload order. When all in-flight
+    slots are taken the reader waits for the oldest batch, so memory stays
+    bounded; these waits are reported as back-pressure. At most ``max_jobs``
+    jobs run at once and ``submit`` refuses more. Job progress is kept in
+    memory and mirrored to Redis so any worker process can report it.
+    """
+
+    def __init__(self, vector_service, config: Dict, cache_service=None):
+        self.vector_service = vector_service
+        self.cache_service = cache_service
+        self.batch_size = max(1, int(config.get('BULK_INGEST_BATCH_SIZE', 256)))
+        self.workers = max(0, int(config.get('BULK_INGEST_WORKERS', 2)))
+        self.worker_threads = int(config.get('BULK_INGEST_WORKER_THREADS', 1))
+        self.max_inflight = max(1, int(config.get('BULK_INGEST_MAX_INFLIGHT', 4)))
+        self.max_jobs = max(1, int(config.get('BULK_INGEST_MAX_JOBS', 2)))
+        self.spool_dir = config.get('BULK_INGEST_SPOOL_DIR', './data/ingest')
+        self.job_ttl = int(config.get('BULK_INGEST_JOB_TTL', 86400))
+        self.backend_config = {
+            k: v for k, v in dict(config).items() if k.startswith(('EMBEDDINGS_', 'ONNX_'))
+        }
+
+        self.logger = logging.getLogger(__name__)
+        self.jobs: Dict[str, BulkIngestJob] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _running(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status in ('queued', 'running'))
+
+    def submit(self, stream: BinaryIO, upsert: bool = False, chunk_size: int = 1 << 20) -> Optional[BulkIngestJob]:
+        """Spool an NDJSON upload to disk and start a job for it; None if max_jobs are already running"""
+        with self._lock:
+            if self._running() >= self.max_jobs:
+                return None
+            job = BulkIngestJob(job_id=uuid.uuid4().hex, upsert=upsert)
+            self.jobs[job.job_id] = job
+
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            path = os.path.join(self.spool_dir, f"{job.job_id}.ndjson")
+            with open(path, 'wb') as f:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+            job.bytes_total = os.path.getsize(path)
+        except Exception as e:
+            self._finish(job, 'failed', f"Could not read upload: {str(e)}")
+            raise
+
+        self._publish(job)
+        threading.Thread(target=self._run, args=(job, path), name=f"bulk-ingest-{job.job_id[:8]}",
+                         daemon=True).start()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Progress of a job started by this or, through Redis, another worker process"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.cache_service is not None:
+            return self.cache_service.get(job_id, prefix_type='jobs')
+        return None
+
+    def _publish(self, job: BulkIngestJob):
+        if self.cache_service is not None:
+            self.cache_service.set(job.job_id, job.to_dict(), self.job_ttl, prefix_type='jobs')
+
+    def _finish(self, job: BulkIngestJob, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.inflight_batches = 0
+        job.finished_at = time.time()
+        self._publish(job)
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        """Process pool shared by all jobs, started on first use"""
+        if self.workers == 0:
+            return None
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a threaded web worker that holds a model is not safe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.backend_config, self.worker_threads)
+                )
+            return self._pool
+
+    def _encoder(self, pool: Optional[ProcessPoolExecutor]):
+        if pool is None:
+            return None  # VectorService encodes in-process
+
+        def encode(texts: List[str]) -> np.ndarray:
+            return pool.submit(_encode_in_worker, texts, 32).result()
+        return encode
+
+    def _read_batches(self, path: str, job: BulkIngestJob) -> Iterator[List[Dict]]:
+        batch = []
+        with open(path, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                job.bytes_read += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    doc = json.loads(line)
+                    if not isinstance(doc, dict):
+                        raise ValueError('expected a JSON object')
+                except ValueError as e:
+                    job.invalid_lines += 1
+                    if len(job.errors) < 10:
+                        job.errors.append(f"line {line_number}: {str(e)}")
+                    continue
+                batch.append(doc)
+                job.documents_read += 1
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _write_oldest(self, job: BulkIngestJob, inflight: deque):
+        documents, records, replaced_rows, future = inflight.popleft()
+        embeddings = future.result() if future is not None else None
+        job.records_indexed += self.vector_service.write_documents(records, embeddings, replaced_rows)
+        job.documents_processed += documents
+        job.batches_written += 1
+        job.inflight_batches = len(inflight)
+        self._publish(job)
+
+    def _run(self, job: BulkIngestJob, path: str):
+        job.status = 'running'
+        job.started_at = time.time()
+        self._publish(job)
+        self.logger.info(f"Bulk ingest {job.job_id} started ({job.bytes_total} bytes)")
+
+        inflight = deque()
+        seen_ids = set()
+        try:
+            encode = self._encoder(self._get_pool())
+            with ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix='bulk-embed') as embedder:
+                for batch in self._read_batches(path, job):
+                    texts, records, replaced_rows = self.vector_service.prepare_documents(batch, job.upsert)
+
+                    # Records repeated within the upload are only indexed once
+                    keep = [i for i, record in enumerate(records) if record['id'] not in seen_ids]
+                    seen_ids.update(records[i]['id'] for i in keep)
+                    texts = [texts[i] for i in keep]
+                    records = [records[i] for i in keep]
+
+                    # Invalid, already indexed (unless changed and upserting) or repeated documents
+                    parents = {record['metadata'].get('parent_doc_id', record['id']) for record in records}
+                    job.documents_skipped += len(batch) - len(parents)
+
+                    if len(inflight) >= self.max_inflight:
+                        job.backpressure_waits += 1
+                        wait_start = time.time()
+                        self._write_oldest(job, inflight)
+                        job.backpressure_seconds += time.time() - wait_start
+
+                    future = embedder.submit(self.vector_service.embed, texts, encode) if texts else None
+                    inflight.append((len(batch), records, replaced_rows, future))
+                    job.inflight_batches = len(inflight)
+
+                while inflight:
+                    self._write_oldest(job, inflight)
+
+            self._finish(job, 'completed')
+            self.logger.info(
+                f"Bulk ingest {job.job_id} indexed {job.records_indexed} records from "
+                f"{job.documents_processed} documents at {job.to_dict()['docs_per_second']:.1f} docs/s"
+            )
+
+        except BrokenProcessPool as e:
+            with self._lock:
+                self._pool = None
+            self._finish(job, 'failed', f"Embedding worker died: {str(e)}")
+            self.logger.error(f"Bulk ingest {job.job_id} failed: embedding worker died")
+        except Exception as e:
+            self._finish(job, 'failed', str(e))
+            self.logger.error(f"Bulk ingest {job.job_id} failed: {str(e)}")
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def get_stats(self) -> Dict:
+        return {
+            'running_jobs': self._running(),
+            'max_jobs': self.max_jobs,
+            'workers': self.workers,
+            'pool_started': self._pool is not None,
+            'batch_size': self.batch_size,
+            'max_inflight': self.max_inflight
+        }
@@ -71,7 +71,9 @@ class CacheService:
             'embeddings': 'embeddings:',
             'metadata': 'metadata:',
             'user_session': 'session:',
-            'api_response': 'api:'
+            'api_response': 'api:',
+            'jobs': 'jobs:',
+            'rerank': 'rerank:'
         }
     
     def _create_connection(self) -> redis.Redis:
@@ -312,11 +314,13 @@ class CacheService:
             return None
     
     def get_with_lock(self, key: str, lock_timeout: int = 10, prefix_type: str = 'content') -> Tuple[Optional[Any], Any]:
-        """Get value with distributed lock"""
-        lock_key = f"lock:{key}"
-        lock = self.redis_client.lock(lock_key, timeout=lock_timeout)
+        """Get value with distributed lock; the lock is None if someone else holds it"""
+        if not self.redis_available or self.redis_client is None:
+            return None, None
         
+        lock_key = f"lock:{key}"
         try:
+            lock = self.redis_client.lock(lock_key, timeout=lock_timeout)
             if lock.acquire(blocking=False):
                 value = self.get(key, prefix_type)
                 return value, lock
@@ -326,6 +330,16 @@ class CacheService:
             self.logger.error(f"Cache get with lock error for key {key}: {str(e)}")
             return None, None
     
+    def is_locked(self, key: str) -> bool:
+        """Whether the distributed lock of get_with_lock is held for key"""
+        if not self.redis_available or self.redis_client is None:
+            return False
+        try:
+            return bool(self.redis_client.exists(f"lock:{key}"))
+        except Exception as e:
+            self.logger.error(f"Cache lock check error for key {key}: {str(e)}")
+            return False
+    
     def cache_search_results(self, query: str, results: List[Dict], ttl: Optional[int] = None) -> bool:
         """Cache search results with query-specific key"""
         query_hash = hashlib.md5(query.encode()).hexdigest()
@@ -338,14 +352,26 @@ class CacheService:
         key = f"search_results:{query_hash}"
         return self.get(key, 'search')
     
-    def cache_embeddings(self, text_hash: str, embeddings: List[float], ttl: Optional[int] = None) -> bool:
-        """Cache embeddings for text"""
+    def cache_embeddings(self, text_hash: str, embeddings: Union[List[float], bytes], ttl: Optional[int] = None) -> bool:
+        """Cache embeddings for text (a list of floats or raw float32 bytes)"""
         return self.set(text_hash, embeddings, ttl, 'embeddings')
     
-    def get_cached_embeddings(self, text_hash: str) -> Optional[List[float]]:
+    def get_cached_embeddings(self, text_hash: str) -> Optional[Union[List[float], bytes]]:
         """Get cached embeddings"""
         return self.get(text_hash, 'embeddings')
     
+    def cache_embeddings_many(self, embeddings: Dict[str, Union[List[float], bytes]], ttl: Optional[int] = None) -> int:
+        """Cache embeddings for several texts in one round trip"""
+        if not self.redis_available or self.redis_client is None:
+            return 0
+        return self.set_multiple(embeddings, ttl, 'embeddings')
+    
+    def get_cached_embeddings_many(self, text_hashes: List[str]) -> Dict[str, Union[List[float], bytes]]:
+        """Get cached embeddings for several texts; missing hashes are left out"""
+        if not self.redis_available or self.redis_client is None:
+            return {}
+        return self.get_multiple(text_hashes, 'embeddings')
+    
     def clear_prefix(self, prefix_type: str) -> int:
         """Clear all keys with a specific prefix"""
         try:
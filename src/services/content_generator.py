@@ -5,8 +5,11 @@ NOW INCLUDES REAL-TIME WEB SEARCH
 """
 
 import logging
+import random
+import threading
 import time
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, Generator, List, Optional, Tuple
 from dataclasses import dataclass
 import json
 import hashlib
@@ -16,6 +19,9 @@ from .vector_service import VectorService, SearchResult
 from .cache_service import CacheService
 from .realtime_search import RealTimeWebSearcher
 from .query_classifier import QueryClassifier, QueryType
+from .reranker import CrossEncoderReranker
+from .semantic_cache import SemanticCache
+from .single_flight import SingleFlight
 
 @dataclass
 class RAGResult:
@@ -32,7 +38,15 @@ class RAGResult:
 class ContentGenerator:
     """High-level content generation service with RAG capabilities and real-time web search"""
     
-    def __init__(self, openai_service: OpenAIService, vector_service: VectorService, cache_service: CacheService):
+    def __init__(
+        self,
+        openai_service: OpenAIService,
+        vector_service: VectorService,
+        cache_service: CacheService,
+        config: Optional[Dict] = None,
+        reranker: Optional[CrossEncoderReranker] = None
+    ):
+        config = config or {}
         self.openai_service = openai_service
         self.vector_service = vector_service
         self.cache_service = cache_service
@@ -46,16 +60,64 @@ class ContentGenerator:
         
         # Configuration
         self.max_context_length = 4000  # tokens
+        # Cosine similarity cutoffs, checked against each result's dense_score: hybrid scores are fused ranks
         self.relevance_threshold = 0.7
+        self.kb_source_min_score = 0.3
         self.min_search_results = 3
+        # A knowledge base result this close to the query answers it without a web search
+        self.kb_confident_dense_score = config.get('KB_CONFIDENT_DENSE_SCORE', 0.75)
+        self.kb_confident_term_coverage = config.get('KB_CONFIDENT_TERM_COVERAGE', 1.0)
+        
+        # Optional cross-encoder stage: rerank the top candidates and keep the best few for the context
+        self.reranker = reranker
+        self.rerank_candidates = config.get('RERANK_CANDIDATES', 30)
+        self.rerank_top_k = config.get('RERANK_TOP_K', 5)
+        self.rerank_min_score = config.get('RERANK_MIN_SCORE', 0.2)
+        
+        # Knowledge base and web search run concurrently, each waited on until its own deadline.
+        # The pool starts threads on first use, so a preloaded app forks before any exist.
+        self.kb_search_timeout = config.get('KB_SEARCH_TIMEOUT_MS', 2000) / 1000
+        self.web_search_timeout = config.get('WEB_SEARCH_TIMEOUT_MS', 6000) / 1000
+        self.speculative_web_search = config.get('WEB_SEARCH_SPECULATIVE', False)
+        self.retrieval_pool = ThreadPoolExecutor(
+            max_workers=config.get('RETRIEVAL_THREADS', 16), thread_name_prefix='retrieval'
+        )
+        
+        # Optional semantic cache: a query close enough in meaning to a past one gets its cached answer.
+        # A sample of those hits is generated again in the background to measure false hits.
+        self.semantic_cache = None
+        if config.get('SEMANTIC_CACHE_ENABLED', False):
+            self.semantic_cache = SemanticCache(
+                config.get('SEMANTIC_CACHE_THRESHOLD', 0.92), config.get('SEMANTIC_CACHE_MAX_ENTRIES', 10000)
+            )
+        self.semantic_audit_rate = config.get('SEMANTIC_CACHE_AUDIT_RATE', 0.02)
+        self.semantic_audit_min_similarity = config.get('SEMANTIC_CACHE_AUDIT_MIN_SIMILARITY', 0.85)
+        self.audit_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='semantic-audit')
+        self._audit_slot = threading.Semaphore(1)
+        
+        # Single-flight: concurrent identical requests share one generation. Within the process they wait
+        # for the first one; across workers the first one holds a Redis lock and the others poll the cache.
+        self.single_flight_enabled = config.get('SINGLE_FLIGHT_ENABLED', True)
+        self.single_flight_timeout = config.get('SINGLE_FLIGHT_TIMEOUT', 30)
+        self.single_flight_poll = config.get('SINGLE_FLIGHT_POLL_MS', 50) / 1000
+        self.single_flight = SingleFlight()
         
         # Statistics
         self.stats = {
             'total_requests': 0,
             'cache_hits': 0,
+            'semantic_cache_hits': 0,
             'average_response_time': 0.0,
             'average_search_time': 0.0,
-            'average_generation_time': 0.0
+            'average_generation_time': 0.0,
+            'average_rerank_time': 0.0,
+            'web_searches_skipped': 0,
+            'kb_search_timeouts': 0,
+            'web_search_timeouts': 0,
+            'streamed_requests': 0,
+            'average_time_to_first_token': 0.0,
+            'coalesced_requests': 0,
+            'coalesced_across_workers': 0
         }
     
     def generate_with_rag(
@@ -78,34 +140,15 @@ class ContentGenerator:
         
         # Step 2: Handle conversational queries without RAG
         if not should_use_rag:
-            conversational_response = self.query_classifier.get_conversational_response(query)
-            
-            return {
-                'content': conversational_response,
-                'sources': [],
-                'query': query,
-                'tokens_used': 0,
-                'response_time': time.time() - start_time,
-                'search_time': 0,
-                'web_search_time': 0,
-                'kb_search_time': 0,
-                'generation_time': 0,
-                'cached': False,
-                'model_used': 'conversational',
-                'finish_reason': 'conversational_response',
-                'web_sources_count': 0,
-                'kb_sources_count': 0,
-                'classification': classification_reason,
-                'used_rag': False
-            }
+            return self._conversational_result(query, classification_reason, start_time)
         
         # Step 3: Proceed with RAG for factual/research queries
         # Create cache key
         cache_key = self._create_cache_key(query, max_length, temperature, template_type)
         
-        # Check cache
+        # Check cache (the exact request, then a query with the same meaning)
         if use_cache:
-            cached_result = self.cache_service.get(cache_key)
+            cached_result = self._get_cached(query, cache_key, max_length, temperature, template_type)
             if cached_result:
                 self.logger.info(f"Cache hit for query: {query[:50]}...")
                 self.stats['cache_hits'] += 1
@@ -113,40 +156,278 @@ class ContentGenerator:
                 cached_result['response_time'] = time.time() - start_time
                 return cached_result
         
-        # Step 4: Real-time web search for current information
-        web_sources = []
-        web_search_time = 0
+        def generate() -> Dict:
+            return self._generate_rag(
+                query, cache_key, max_length, temperature, use_cache, search_limit, template_type, use_web_search,
+                start_time, classification_reason
+            )
         
-        if use_web_search:
-            self.logger.info(f"Performing web search for: {query}")
-            web_search_start = time.time()
-            
+        if not (use_cache and self.single_flight_enabled):
+            return generate()
+        
+        # An identical request already generating in this process answers this one too
+        result, shared = self.single_flight.do(
+            cache_key, lambda: self._generate_once_across_workers(cache_key, generate), self.single_flight_timeout
+        )
+        if shared:
+            self.stats['coalesced_requests'] += 1
+            result = dict(result)
+            result['coalesced'] = True
+            result['response_time'] = time.time() - start_time
+        return result
+    
+    def _generate_once_across_workers(self, cache_key: str, generate) -> Dict:
+        """Run generate under the Redis lock for cache_key, or wait for the worker that holds it"""
+        if not self.cache_service.redis_available:
+            return generate()
+        
+        cached_result, lock = self.cache_service.get_with_lock(cache_key, lock_timeout=self.single_flight_timeout)
+        if lock is None:
+            # Another worker is generating this request; its result lands in the cache
+            cached_result = self._wait_for_worker(cache_key)
+            if cached_result:
+                self.stats['coalesced_across_workers'] += 1
+                cached_result['cached'] = True
+                cached_result['coalesced'] = True
+                return cached_result
+            return generate()
+        
+        try:
+            if cached_result:
+                # Another worker finished between the cache check and the lock
+                self.stats['cache_hits'] += 1
+                cached_result['cached'] = True
+                return cached_result
+            return generate()
+        finally:
             try:
-                web_results = self.web_searcher.search_web(query, num_results=5)
-                web_search_time = time.time() - web_search_start
-                
-                # Convert web results to sources format
-                for result in web_results:
-                    web_sources.append({
-                        'title': result['title'],
-                        'url': result['url'],
-                        'snippet': result['snippet'],
-                        'content': result.get('content', result['snippet']),
-                        'score': result['score'],
-                        'source_type': 'web'
-                    })
-                
-                self.logger.info(f"Found {len(web_sources)} web sources in {web_search_time:.2f}s")
+                lock.release()
             except Exception as e:
-                self.logger.warning(f"Web search failed: {e}")
-                web_search_time = time.time() - web_search_start
+                self.logger.warning(f"Single-flight lock release failed (expired?): {e}")
+    
+    def _wait_for_worker(self, cache_key: str) -> Optional[Dict]:
+        """Poll the cache for the result of the worker holding the lock, until it appears or the lock goes"""
+        deadline = time.time() + self.single_flight_timeout
+        while time.time() < deadline:
+            time.sleep(self.single_flight_poll)
+            cached_result = self.cache_service.get(cache_key)
+            if cached_result:
+                return cached_result
+            if not self.cache_service.is_locked(cache_key):
+                # Finished without caching (no context) or gave up; the result may have landed just before
+                return self.cache_service.get(cache_key)
+        return None
+    
+    def _generate_rag(self, query: str, cache_key: str, max_length: int, temperature: float, use_cache: bool,
+                      search_limit: int, template_type: str, use_web_search: bool, start_time: float,
+                      classification_reason: str) -> Dict:
+        """Steps 4-8 of generate_with_rag: retrieve, generate and cache"""
+        # Steps 4-6: Search the knowledge base and the web, and combine their sources
+        retrieval = self._retrieve(query, search_limit, use_web_search)
+        
+        if not retrieval['context']:
+            self.logger.warning(f"No relevant context found for query: {query}")
+            return self._generate_without_context(query, max_length, temperature)
         
-        # Step 5: Semantic search for relevant context from knowledge base
-        search_start = time.time()
-        search_results = self.vector_service.search(query, search_limit)
-        kb_search_time = time.time() - search_start
+        # Step 7: Generate content with enriched context
+        generation_start = time.time()
+        generation_result = self.openai_service.generate_with_context(
+            query=query,
+            context=retrieval['context'],
+            template_type=template_type,
+            max_tokens=max_length,
+            temperature=temperature
+        )
+        generation_time = time.time() - generation_start
         
-        # Step 6: Combine web sources and knowledge base sources
+        # Step 8: Prepare final result with sources
+        result = self._rag_result(query, retrieval, generation_result, generation_time, start_time, classification_reason)
+        
+        # Cache the result
+        if use_cache:
+            self._store_result(query, cache_key, result, (max_length, temperature, template_type))
+        
+        # Update statistics
+        self._update_stats(time.time() - start_time, retrieval['search_time'], generation_time, retrieval['rerank_time'])
+        
+        return result
+    
+    def _conversational_result(self, query: str, classification_reason: str, start_time: float) -> Dict:
+        """Result for a query answered without RAG"""
+        conversational_response = self.query_classifier.get_conversational_response(query)
+        
+        return {
+            'content': conversational_response,
+            'sources': [],
+            'query': query,
+            'tokens_used': 0,
+            'response_time': time.time() - start_time,
+            'search_time': 0,
+            'web_search_time': 0,
+            'kb_search_time': 0,
+            'generation_time': 0,
+            'cached': False,
+            'model_used': 'conversational',
+            'finish_reason': 'conversational_response',
+            'web_sources_count': 0,
+            'kb_sources_count': 0,
+            'classification': classification_reason,
+            'used_rag': False
+        }
+    
+    def generate_with_rag_streaming(
+        self,
+        query: str,
+        max_length: int = 500,
+        temperature: float = 0.7,
+        use_cache: bool = True,
+        search_limit: int = 10,
+        template_type: str = 'rag',
+        use_web_search: bool = True
+    ) -> Generator[Tuple[str, Dict], None, None]:
+        """generate_with_rag as a stream of (event, data) pairs.
+        
+        Yields one 'sources' event once retrieval finishes, a 'token' event
+        per content delta and a final 'done' event with the same fields as
+        generate_with_rag's result (without content and sources) plus
+        time_to_first_token. Cached and conversational answers arrive as a
+        single token. The complete result is cached like generate_with_rag's.
+        """
+        start_time = time.time()
+        should_use_rag, classification_reason = self.query_classifier.should_use_rag(query)
+        self.logger.info(f"Query classification: {classification_reason}")
+        
+        if not should_use_rag:
+            yield from self._replay_stream(self._conversational_result(query, classification_reason, start_time), start_time)
+            return
+        
+        cache_key = self._create_cache_key(query, max_length, temperature, template_type)
+        if use_cache:
+            cached_result = self._get_cached(query, cache_key, max_length, temperature, template_type)
+            if cached_result:
+                self.logger.info(f"Cache hit for query: {query[:50]}...")
+                self.stats['cache_hits'] += 1
+                cached_result['cached'] = True
+                yield from self._replay_stream(cached_result, start_time)
+                return
+        
+        retrieval = self._retrieve(query, search_limit, use_web_search)
+        has_context = bool(retrieval['context'])
+        if has_context:
+            prompt = self.openai_service.format_prompt(query, retrieval['context'], template_type)
+        else:
+            self.logger.warning(f"No relevant context found for query: {query}")
+            prompt = f"Please provide a helpful response to: {query}"
+        sources = retrieval['sources'][:5] if has_context else []
+        yield 'sources', {
+            'sources': sources,
+            'web_sources_count': retrieval['web_sources_count'] if has_context else 0,
+            'kb_sources_count': retrieval['kb_sources_count'] if has_context else 0,
+            'search_time': retrieval['search_time'],
+            'stages': retrieval['stages']
+        }
+        
+        generation_start = time.time()
+        time_to_first_token = None
+        stream = self.openai_service.generate_streaming(prompt, max_tokens=max_length, temperature=temperature)
+        try:
+            while True:
+                try:
+                    delta = next(stream)
+                except StopIteration as finished:
+                    generation_result = finished.value
+                    break
+                if time_to_first_token is None:
+                    time_to_first_token = time.time() - start_time
+                yield 'token', {'delta': delta}
+        finally:
+            # A client that disconnects closes this generator, which closes the upstream stream
+            stream.close()
+        generation_time = time.time() - generation_start
+        
+        if has_context:
+            result = self._rag_result(query, retrieval, generation_result, generation_time, start_time, classification_reason)
+            if use_cache:
+                self._store_result(query, cache_key, result, (max_length, temperature, template_type))
+        else:
+            result = self._no_context_result(query, generation_result, generation_time)
+            result['response_time'] = time.time() - start_time
+        self._update_stats(time.time() - start_time, retrieval['search_time'], generation_time,
+                           retrieval['rerank_time'], time_to_first_token)
+        
+        yield 'done', self._stream_summary(result, time_to_first_token)
+    
+    def _replay_stream(self, result: Dict, start_time: float) -> Generator[Tuple[str, Dict], None, None]:
+        """Events for an already complete result, its content as one token"""
+        yield 'sources', {
+            'sources': result['sources'],
+            'web_sources_count': result['web_sources_count'],
+            'kb_sources_count': result['kb_sources_count'],
+            'search_time': result['search_time'],
+            'stages': result.get('stages', {})
+        }
+        time_to_first_token = time.time() - start_time
+        yield 'token', {'delta': result['content']}
+        yield 'done', self._stream_summary({**result, 'response_time': time.time() - start_time}, time_to_first_token)
+    
+    def _stream_summary(self, result: Dict, time_to_first_token: Optional[float]) -> Dict:
+        summary = {key: value for key, value in result.items() if key not in ('content', 'sources', 'stages')}
+        summary['time_to_first_token'] = time_to_first_token
+        return summary
+    
+    def _retrieve(self, query: str, search_limit: int, use_web_search: bool) -> Dict:
+        """Knowledge base and web search, and the combined sources and context for generation"""
+        # Search the knowledge base (hybrid, reranked when enabled); with speculative web search, the web at once
+        retrieval_start = time.time()
+        kb_future = self.retrieval_pool.submit(self._search_knowledge_base, query, search_limit)
+        web_future = None
+        if use_web_search and self.speculative_web_search:
+            web_future = self.retrieval_pool.submit(self._search_web, query)
+        
+        kb_result = self._wait_for(kb_future, retrieval_start + self.kb_search_timeout, 'kb')
+        if kb_result is None:
+            # Missed its deadline or failed: generate from the web sources alone
+            search_results, kb_search_time = [], time.time() - retrieval_start
+            stages = {'retrieval': {**self._stage_report([], kb_search_time), 'timed_out': not kb_future.done()}}
+        else:
+            search_results, stages, kb_search_time = kb_result
+        rerank_time = stages['rerank']['time_ms'] / 1000 if 'rerank' in stages else 0
+        kb_confident = self._kb_confident(search_results)
+        
+        # Real-time web search results, unless the knowledge base already answers the query
+        web_sources = []
+        web_search_time = 0
+        web_timed_out = False
+        
+        if use_web_search and kb_confident:
+            self.logger.info(f"Knowledge base is confident, skipping web search for: {query}")
+            self.stats['web_searches_skipped'] += 1
+            if web_future is not None:
+                # Not waited for; a search already running finishes in the background
+                web_future.cancel()
+        elif use_web_search:
+            web_start = retrieval_start
+            if web_future is None:
+                web_start = time.time()
+                web_future = self.retrieval_pool.submit(self._search_web, query)
+            
+            web_result = self._wait_for(web_future, web_start + self.web_search_timeout, 'web')
+            if web_result is None:
+                web_search_time = time.time() - web_start
+                web_timed_out = not web_future.done()
+            else:
+                web_sources, web_search_time = web_result
+                self.logger.info(f"Found {len(web_sources)} web sources in {web_search_time:.2f}s")
+        stages['web_search'] = {
+            'time_ms': web_search_time * 1000,
+            'results': len(web_sources),
+            'skipped': use_web_search and kb_confident,
+            'timed_out': web_timed_out
+        }
+        # Both sources were searched at once, so this is about the slower of the two, not their sum
+        search_time = time.time() - retrieval_start
+        
+        # Combine web sources and knowledge base sources
         all_sources = web_sources.copy()
         
         # Only use knowledge base if web search didn't find enough relevant sources
@@ -155,49 +436,53 @@ class ContentGenerator:
             # Filter knowledge base sources by relevance to avoid irrelevant results
             relevant_kb_sources = [
                 source for source in kb_sources 
-                if source.get('score', 0) >= 0.3  # Higher threshold for KB sources
+                if self._relevant(source['dense_score'], source['term_coverage'], self.kb_source_min_score)
             ]
             all_sources.extend(relevant_kb_sources)
         
         # Prioritize web sources for freshness
         all_sources.sort(key=lambda x: (x.get('source_type') == 'web', x.get('score', 0)), reverse=True)
         
-        # Prepare combined context
-        combined_context = self._prepare_combined_context(all_sources, query)
-        
-        if not combined_context:
-            self.logger.warning(f"No relevant context found for query: {query}")
-            return self._generate_without_context(query, max_length, temperature)
-        
-        # Step 7: Generate content with enriched context
-        generation_start = time.time()
-        generation_result = self.openai_service.generate_with_context(
-            query=query,
-            context=combined_context,
-            template_type=template_type,
-            max_tokens=max_length,
-            temperature=temperature
-        )
-        generation_time = time.time() - generation_start
-        
-        # Step 8: Prepare final result with sources
+        return {
+            'sources': all_sources,
+            'context': self._prepare_combined_context(all_sources, query),
+            'stages': stages,
+            'search_time': search_time,
+            'kb_search_time': kb_search_time,
+            'web_search_time': web_search_time,
+            'rerank_time': rerank_time,
+            'kb_confident': kb_confident,
+            'web_sources_count': len(web_sources),
+            'kb_sources_count': len(all_sources) - len(web_sources)
+        }
+    
+    def _rag_result(self, query: str, retrieval: Dict, generation_result: GenerationResult, generation_time: float,
+                    start_time: float, classification_reason: str) -> Dict:
+        """generate_with_rag's result for a completed generation"""
+        stages = {**retrieval['stages'], 'generation': {
+            'time_ms': generation_time * 1000, 'tokens': generation_result.tokens_used
+        }}
+        all_sources = retrieval['sources']
         result = {
             'content': generation_result.content,
             'sources': all_sources[:5],  # Limit to top 5 sources for display
             'query': query,
             'tokens_used': generation_result.tokens_used,
             'response_time': time.time() - start_time,
-            'search_time': kb_search_time + web_search_time,
-            'web_search_time': web_search_time,
-            'kb_search_time': kb_search_time,
+            'search_time': retrieval['search_time'],
+            'web_search_time': retrieval['web_search_time'],
+            'kb_search_time': retrieval['kb_search_time'],
+            'rerank_time': retrieval['rerank_time'],
             'generation_time': generation_time,
+            'stages': stages,
             'cached': False,
             'model_used': generation_result.model,
             'finish_reason': generation_result.finish_reason,
-            'web_sources_count': len(web_sources),
-            'kb_sources_count': len(all_sources) - len(web_sources),
+            'web_sources_count': retrieval['web_sources_count'],
+            'kb_sources_count': retrieval['kb_sources_count'],
             'classification': classification_reason,
-            'used_rag': True
+            'used_rag': True,
+            'kb_confident': retrieval['kb_confident']
         }
         
         # Debug log for sources
@@ -205,24 +490,88 @@ class ContentGenerator:
         for i, source in enumerate(all_sources[:5]):
             self.logger.info(f"Source {i+1}: {source.get('source_type', 'unknown')} - {source.get('title', 'no title')[:50]}")
         
-        # Cache the result
-        if use_cache:
-            self.cache_service.set(cache_key, result, ttl=3600)  # Cache for 1 hour
-        
-        # Update statistics
-        self._update_stats(time.time() - start_time, kb_search_time + web_search_time, generation_time)
-        
         return result
     
+    def _search_knowledge_base(self, query: str, search_limit: int) -> Tuple[List[SearchResult], Dict, float]:
+        """Knowledge base results (reranked when enabled), stage reports and search time; runs on the retrieval pool"""
+        search_start = time.time()
+        candidates = max(search_limit, self.rerank_candidates) if self.reranker else search_limit
+        search_results = self.vector_service.search(query, candidates)
+        kb_search_time = time.time() - search_start
+        stages = {'retrieval': self._stage_report(search_results, kb_search_time)}
+        
+        if self.reranker is not None:
+            search_results, stages['rerank'] = self.reranker.rerank(query, search_results, self.rerank_top_k)
+        return search_results, stages, kb_search_time
+    
+    def _search_web(self, query: str) -> Tuple[List[Dict], float]:
+        """Web results as sources and the time taken; runs on the retrieval pool"""
+        self.logger.info(f"Performing web search for: {query}")
+        web_search_start = time.time()
+        web_results = self.web_searcher.search_web(query, num_results=5)
+        
+        # Convert web results to sources format
+        web_sources = [{
+            'title': result['title'],
+            'url': result['url'],
+            'snippet': result['snippet'],
+            'content': result.get('content', result['snippet']),
+            'score': result['score'],
+            'source_type': 'web'
+        } for result in web_results]
+        return web_sources, time.time() - web_search_start
+    
+    def _wait_for(self, future: Future, deadline: float, source: str) -> Optional[Any]:
+        """Result of a retrieval task, or None if it failed or is still running at the deadline"""
+        try:
+            return future.result(timeout=max(0.0, deadline - time.time()))
+        except FutureTimeout:
+            future.cancel()
+            self.stats[f'{source}_search_timeouts'] += 1
+            self.logger.warning(f"{source} search missed its deadline, continuing without it")
+        except Exception as e:
+            self.logger.warning(f"{source} search failed: {e}")
+        return None
+    
+    def _stage_report(self, results: List[SearchResult], elapsed: float) -> Dict:
+        """Timing and result scores of the retrieval stage"""
+        scores = [result.score for result in results]
+        return {
+            'time_ms': elapsed * 1000,
+            'results': len(results),
+            'top_score': max(scores) if scores else None,
+            'mean_score': sum(scores) / len(scores) if scores else None
+        }
+    
+    def _kb_confident(self, search_results: List[SearchResult]) -> bool:
+        """Whether a top result matches the query closely enough, by meaning or by its exact terms"""
+        for result in search_results[:self.min_search_results]:
+            if result.dense_score is not None and result.dense_score >= self.kb_confident_dense_score:
+                return True
+            if result.term_coverage is not None and result.term_coverage >= self.kb_confident_term_coverage:
+                return True
+        return False
+    
+    def _relevant(self, dense_score: Optional[float], term_coverage: Optional[float], min_dense_score: float) -> bool:
+        """Whether a knowledge base result clears a cosine similarity cutoff.
+        
+        A lexical-only hit has no cosine similarity, so it counts only if it
+        contains the query's terms (KB_CONFIDENT_TERM_COVERAGE of them).
+        """
+        if dense_score is not None:
+            return dense_score >= min_dense_score
+        return term_coverage is not None and term_coverage >= self.kb_confident_term_coverage
+    
     def _prepare_context(self, search_results: List[SearchResult], query: str) -> Tuple[str, List[Dict]]:
         """Prepare context from search results"""
         if not search_results:
             return "", []
         
-        # Filter results by relevance threshold
+        # Filter results by relevance threshold (the cross-encoder's when reranked)
         relevant_results = [
             result for result in search_results 
-            if result.score >= self.relevance_threshold
+            if (result.rerank_score >= self.rerank_min_score if result.rerank_score is not None
+                else self._relevant(result.dense_score, result.term_coverage, self.relevance_threshold))
         ]
         
         if not relevant_results:
@@ -252,6 +601,9 @@ class ContentGenerator:
                 'title': result.title,
                 'url': result.url,
                 'score': result.score,
+                'dense_score': result.dense_score,
+                'term_coverage': result.term_coverage,
+                'rerank_score': result.rerank_score,
                 'snippet': result.content[:200] + "..." if len(result.content) > 200 else result.content,
                 'source_type': 'knowledge_base'
             })
@@ -298,6 +650,9 @@ class ContentGenerator:
         
         generation_time = time.time() - generation_start
         
+        return self._no_context_result(query, generation_result, generation_time)
+    
+    def _no_context_result(self, query: str, generation_result: GenerationResult, generation_time: float) -> Dict:
         return {
             'content': generation_result.content,
             'sources': [],
@@ -377,15 +732,94 @@ class ContentGenerator:
             'model_used': generation_result.model
         }
     
+    def _get_cached(self, query: str, cache_key: str, max_length: int, temperature: float,
+                    template_type: str) -> Optional[Dict]:
+        """Cached result of the exact request, else of a past query with the same meaning and parameters"""
+        cached_result = self.cache_service.get(cache_key)
+        if cached_result or self.semantic_cache is None:
+            return cached_result
+        
+        try:
+            match = self.semantic_cache.lookup(
+                self.vector_service.embed_query(query), (max_length, temperature, template_type)
+            )
+        except Exception as e:
+            self.logger.warning(f"Semantic cache lookup failed: {e}")
+            return None
+        if match is None:
+            return None
+        
+        cached_result = self.cache_service.get(match['cache_key'])
+        if not cached_result:
+            # The result expired from the response cache
+            self.semantic_cache.discard(match['cache_key'], stale=True)
+            return None
+        
+        self.logger.info(f"Semantic cache hit ({match['similarity']:.3f}) for query: {query[:50]}...")
+        self.stats['semantic_cache_hits'] += 1
+        cached_result['semantic_match'] = {'query': match['query'], 'similarity': match['similarity']}
+        
+        if random.random() < self.semantic_audit_rate and self._audit_slot.acquire(blocking=False):
+            # One audit at a time; hits sampled while one runs are not audited
+            self.audit_pool.submit(
+                self._audit_semantic_hit, query, cache_key, cached_result, match, max_length, temperature, template_type
+            )
+        return cached_result
+    
+    def _store_result(self, query: str, cache_key: str, result: Dict, partition: Tuple):
+        """Cache a generated result and index its query for semantic lookups"""
+        stored = self.cache_service.set(cache_key, result, ttl=3600)  # Cache for 1 hour
+        if self.semantic_cache is None or not stored:
+            return
+        try:
+            self.semantic_cache.add(self.vector_service.embed_query(query), partition, query, cache_key)
+        except Exception as e:
+            self.logger.warning(f"Semantic cache update failed: {e}")
+    
+    def _audit_semantic_hit(self, query: str, cache_key: str, cached_result: Dict, match: Dict,
+                            max_length: int, temperature: float, template_type: str):
+        """Generate a semantic hit's query afresh and compare the answers; runs on the audit pool"""
+        try:
+            fresh = self.generate_with_rag(
+                query, max_length, temperature, use_cache=False, template_type=template_type
+            )
+            answer_similarity = float(
+                self.vector_service.embed_query(fresh['content']) @ self.vector_service.embed_query(cached_result['content'])
+            )
+            false_hit = answer_similarity < self.semantic_audit_min_similarity
+            self.semantic_cache.record_audit(query, match['query'], match['similarity'], answer_similarity, false_hit)
+            
+            if false_hit:
+                self.logger.warning(
+                    f"Semantic cache false hit: '{query[:50]}' matched '{match['query'][:50]}' "
+                    f"({match['similarity']:.3f}), answers {answer_similarity:.3f} similar"
+                )
+                # The fresh answer serves this query from now on; the matched entry stops serving others
+                self.semantic_cache.discard(match['cache_key'])
+                self._store_result(query, cache_key, fresh, (max_length, temperature, template_type))
+        except Exception as e:
+            self.logger.warning(f"Semantic cache audit failed: {e}")
+        finally:
+            self._audit_slot.release()
+    
     def _create_cache_key(self, query: str, max_length: int, temperature: float, template_type: str) -> str:
         """Create a cache key for the request"""
         key_data = f"{query}:{max_length}:{temperature}:{template_type}"
         return hashlib.md5(key_data.encode()).hexdigest()
     
-    def _update_stats(self, response_time: float, search_time: float, generation_time: float):
+    def _update_stats(self, response_time: float, search_time: float, generation_time: float,
+                      rerank_time: float = 0.0, time_to_first_token: Optional[float] = None):
         """Update service statistics"""
         self.stats['total_requests'] += 1
         
+        if time_to_first_token is not None:
+            # Averaged over streamed requests only
+            self.stats['streamed_requests'] += 1
+            streamed = self.stats['streamed_requests']
+            self.stats['average_time_to_first_token'] = (
+                (self.stats['average_time_to_first_token'] * (streamed - 1) + time_to_first_token) / streamed
+            )
+        
         # Update running averages
         total = self.stats['total_requests']
         self.stats['average_response_time'] = (
@@ -397,10 +831,23 @@ class ContentGenerator:
         self.stats['average_generation_time'] = (
             (self.stats['average_generation_time'] * (total - 1) + generation_time) / total
         )
+        self.stats['average_rerank_time'] = (
+            (self.stats['average_rerank_time'] * (total - 1) + rerank_time) / total
+        )
     
     def get_stats(self) -> Dict:
         """Get service statistics"""
-        return self.stats.copy()
+        stats = self.stats.copy()
+        if self.reranker is not None:
+            stats['reranker'] = self.reranker.get_stats()
+        if self.semantic_cache is not None:
+            stats['semantic_cache'] = self.semantic_cache.get_stats()
+        # Each coalesced request is a retrieval and an OpenAI call that did not happen
+        stats['single_flight'] = {
+            **self.single_flight.get_stats(),
+            'upstream_calls_saved': stats['coalesced_requests'] + stats['coalesced_across_workers']
+        }
+        return stats
     
     def clear_cache(self):
         """Clear the cache"""
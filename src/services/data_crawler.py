@@ -310,10 +310,7 @@ class DataProcessor:
                 with open(filepath, 'r', encoding='utf-8') as f:
                     documents = json.load(f)
                 
-                for doc in documents:
-                    processed_doc = self._process_document(doc)
-                    if processed_doc:
-                        processed_documents.append(processed_doc)
+                processed_documents.extend(self.process_documents(documents))
                 
             except Exception as e:
                 self.logger.error(f"Error processing file {filename}: {str(e)}")
@@ -327,6 +324,11 @@ class DataProcessor:
         self.logger.info(f"Processed {len(processed_documents)} unique documents")
         return processed_documents
     
+    def process_documents(self, documents: List[Dict]) -> List[Dict]:
+        """Documents ready for the vector store from crawled ones, without short or duplicate documents"""
+        processed_documents = [processed for processed in map(self._process_document, documents) if processed]
+        return self._deduplicate_documents(processed_documents)
+    
     def _process_document(self, doc: Dict) -> Dict:
         """Process a single document"""
         try:
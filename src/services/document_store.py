@@ -0,0 +1,161 @@
+"""
+Memory-mapped document store for the vector database
+Keeps chunk records on disk so worker processes share them through the page cache
+"""
+import os
+import json
+import mmap
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+OFFSET_DTYPE = np.dtype('<u8')
+
+class DocumentStore:
+    """Append-only store of JSON document records addressed by row number.
+
+    ``<base>_docstore.blob`` holds the UTF-8 records back to back and
+    ``<base>_docstore.offsets`` is a fixed-width uint64 array where row ``i``
+    spans ``offsets[i]:offsets[i + 1]``. Both files are memory-mapped read-only,
+    so lookups decode only the requested rows and resident memory does not grow
+    with the corpus.
+    """
+
+    def __init__(self, base_path: str):
+        self.blob_file = f"{base_path}_docstore.blob"
+        self.offsets_file = f"{base_path}_docstore.offsets"
+        self.logger = logging.getLogger(__name__)
+
+        self._offsets = np.zeros(1, dtype=OFFSET_DTYPE)
+        self._blob: Optional[mmap.mmap] = None
+        self._open()
+
+    @staticmethod
+    def exists(base_path: str) -> bool:
+        return os.path.exists(f"{base_path}_docstore.offsets")
+
+    def _open(self):
+        """Create missing files and drop a torn trailing offset"""
+        if not os.path.exists(self.offsets_file):
+            with open(self.offsets_file, 'wb') as f:
+                f.write(np.zeros(1, dtype=OFFSET_DTYPE).tobytes())
+        if not os.path.exists(self.blob_file):
+            open(self.blob_file, 'wb').close()
+
+        size = os.path.getsize(self.offsets_file)
+        if size % OFFSET_DTYPE.itemsize:
+            with open(self.offsets_file, 'r+b') as f:
+                f.truncate(size - size % OFFSET_DTYPE.itemsize)
+
+        self._remap()
+
+    def _remap(self):
+        """Map the current files; previous maps stay valid for readers holding them"""
+        count = os.path.getsize(self.offsets_file) // OFFSET_DTYPE.itemsize
+        self._offsets = np.memmap(self.offsets_file, dtype=OFFSET_DTYPE, mode='r', shape=(count,))
+
+        blob_size = int(self._offsets[-1])
+        if blob_size:
+            with open(self.blob_file, 'rb') as f:
+                self._blob = mmap.mmap(f.fileno(), blob_size, access=mmap.ACCESS_READ)
+        else:
+            self._blob = None
+
+    @staticmethod
+    def _encode(doc: Dict) -> bytes:
+        return json.dumps(doc, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row: int) -> Dict:
+        count = len(self)
+        if row < 0:
+            row += count
+        if not 0 <= row < count:
+            raise IndexError(f"Document row {row} out of range")
+
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return json.loads(self._blob[start:end])
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def get_many(self, rows: Iterable[int]) -> List[Dict]:
+        return [self[row] for row in rows]
+
+    def extend(self, documents: List[Dict]):
+        """Append documents durably; rows become visible after the offsets are written"""
+        if not documents:
+            return
+
+        records = [self._encode(doc) for doc in documents]
+        end = int(self._offsets[-1])
+        offsets = end + np.cumsum([len(r) for r in records], dtype=OFFSET_DTYPE)
+
+        # Write past the last committed offset, discarding any torn tail
+        with open(self.blob_file, 'r+b') as f:
+            f.seek(end)
+            f.write(b''.join(records))
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(self.offsets_file, 'ab') as f:
+            f.write(offsets.astype(OFFSET_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._remap()
+
+    def truncate(self, count: int):
+        """Drop rows at and after count (uncommitted appends after a crash)"""
+        if count >= len(self):
+            return
+
+        self.logger.warning(f"Truncating document store from {len(self)} to {count} rows")
+        blob_size = int(self._offsets[count])
+        self._offsets = np.zeros(1, dtype=OFFSET_DTYPE)
+        self._blob = None
+
+        with open(self.offsets_file, 'r+b') as f:
+            f.truncate((count + 1) * OFFSET_DTYPE.itemsize)
+        with open(self.blob_file, 'r+b') as f:
+            f.truncate(blob_size)
+        self._remap()
+
+    def stage_rewrite(self, documents: Iterable[Dict]) -> List[str]:
+        """Write a replacement store next to the current one as ``.tmp`` files.
+
+        Returns the paths to move into place; call reload() after moving them.
+        """
+        offsets = [0]
+        with open(f"{self.blob_file}.tmp", 'wb') as f:
+            for doc in documents:
+                record = self._encode(doc)
+                f.write(record)
+                offsets.append(offsets[-1] + len(record))
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(f"{self.offsets_file}.tmp", 'wb') as f:
+            f.write(np.array(offsets, dtype=OFFSET_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        return [self.blob_file, self.offsets_file]
+
+    def reload(self):
+        """Pick up files replaced on disk"""
+        self._remap()
+
+    def rewrite(self, documents: Iterable[Dict]):
+        """Replace the whole store"""
+        for path in self.stage_rewrite(documents):
+            os.replace(f"{path}.tmp", path)
+        self._remap()
+
+    def clear(self):
+        self.rewrite([])
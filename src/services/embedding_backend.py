@@ -0,0 +1,213 @@
+"""
+Embedding backends for the vector database
+PyTorch Sentence-Transformers, or an ONNX Runtime export (optionally int8-quantized) for CPU inference
+"""
+import os
+import re
+import json
+import time
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+BACKENDS = ('sentence-transformers', 'onnx', 'onnx-int8')
+
+# Texts used to measure cosine drift of an exported model against PyTorch
+PARITY_TEXTS = [
+    "test",
+    "What is machine learning?",
+    "Neural networks are computational models inspired by biological neural networks.",
+    "How do I deploy a Flask application with gunicorn behind nginx?",
+    "FAISS provides efficient similarity search over dense vectors.",
+    "The quarterly revenue report shows a 12% increase year over year.",
+    "Recipe: whisk two eggs with flour, sugar and a pinch of salt.",
+    "Der schnelle braune Fuchs springt über den faulen Hund.",
+    "Transformers use self-attention to model long-range dependencies in text, " * 8
+]
+
+logger = logging.getLogger(__name__)
+
+class SentenceTransformerBackend:
+    """PyTorch Sentence-Transformers model"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.name = model_name
+        self.backend = 'sentence-transformers'
+        self.model = SentenceTransformer(model_name)
+        # Read from the model config; no test encode needed
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], convert_to_tensor: bool = False, show_progress_bar: bool = False,
+               batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(
+            texts, convert_to_tensor=convert_to_tensor, show_progress_bar=show_progress_bar, batch_size=batch_size
+        )
+
+class OnnxBackend:
+    """Sentence-Transformers model exported to ONNX and run with ONNX Runtime.
+
+    The transformer is exported once to ``<ONNX_MODEL_DIR>/<model>/model.onnx``
+    (int8 weights in ``model.int8.onnx`` when quantized) together with its
+    tokenizer, and pooling is done in numpy. The export is only kept if its
+    embeddings stay within ``min_cosine`` of the PyTorch model on PARITY_TEXTS;
+    later starts load the exported files without importing PyTorch.
+    """
+
+    def __init__(self, model_name: str, model_dir: str, quantize: bool = True,
+                 min_cosine: float = 0.98, threads: int = 0):
+        try:
+            import onnxruntime
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise RuntimeError(f"ONNX backend needs onnxruntime and transformers: {str(e)}")
+
+        self.model_name = model_name
+        self.quantize = quantize
+        self.backend = 'onnx-int8' if quantize else 'onnx'
+        self.name = f"{model_name}@{self.backend}"
+        self.directory = os.path.join(model_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        self.model_file = os.path.join(self.directory, 'model.int8.onnx' if quantize else 'model.onnx')
+        self.meta_file = os.path.join(self.directory, 'export.json')
+
+        if not os.path.exists(self.model_file) or not os.path.exists(self.meta_file):
+            self._export(min_cosine)
+
+        with open(self.meta_file, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        parity = self.meta.get('parity', {}).get(self.backend)
+        if parity is None or parity['min_cosine'] < min_cosine:
+            raise RuntimeError(f"{self.backend} export of {model_name} failed the parity check: {parity}")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(self.model_file, options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(self.directory)
+        self.dimension = int(self.session.get_outputs()[0].shape[-1])
+
+    def _export(self, min_cosine: float):
+        """Export the PyTorch model, quantize it and record the parity check"""
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        os.makedirs(self.directory, exist_ok=True)
+        start = time.time()
+        reference = SentenceTransformer(self.model_name, device='cpu')
+        transformer = reference[0]
+        pooling = reference[1] if len(reference) > 1 else None
+
+        fp32_file = os.path.join(self.directory, 'model.onnx')
+        sample = transformer.tokenizer(["export sample"], return_tensors='pt')
+        input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+        dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+        transformer.auto_model.eval()
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer.auto_model,
+                tuple(sample[name] for name in input_names),
+                fp32_file,
+                input_names=input_names,
+                output_names=['last_hidden_state'],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+        transformer.tokenizer.save_pretrained(self.directory)
+
+        if self.quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(fp32_file, self.model_file, weight_type=QuantType.QInt8)
+
+        self.meta = {
+            'model': self.model_name,
+            'pooling': 'cls' if pooling is not None and getattr(pooling, 'pooling_mode_cls_token', False) else 'mean',
+            'max_seq_length': int(transformer.max_seq_length or 256)
+        }
+
+        # Parity against PyTorch, for the variant being loaded and the other one if present
+        import onnxruntime
+        expected = reference.encode(PARITY_TEXTS, convert_to_tensor=False)
+        parity = {}
+        for backend, path in (('onnx', fp32_file), ('onnx-int8', os.path.join(self.directory, 'model.int8.onnx'))):
+            if not os.path.exists(path):
+                continue
+            self.session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+            self.input_names = {i.name for i in self.session.get_inputs()}
+            self.tokenizer = transformer.tokenizer
+            parity[backend] = parity_check(expected, self.encode(PARITY_TEXTS))
+        self.meta['parity'] = parity
+
+        with open(self.meta_file, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=2)
+
+        logger.info(
+            f"Exported {self.model_name} to ONNX in {time.time() - start:.1f}s; "
+            f"parity {parity.get(self.backend)} (required min cosine {min_cosine})"
+        )
+
+    def encode(self, texts: List[str], convert_to_tensor: bool = False, show_progress_bar: bool = False,
+               batch_size: int = 32) -> np.ndarray:
+        """Pooled sentence embeddings (not normalized), like SentenceTransformer.encode"""
+        if isinstance(texts, str):
+            texts = [texts]
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.meta['max_seq_length'],
+                return_tensors='np'
+            )
+            inputs = {name: tokens[name].astype('int64') for name in self.input_names if name in tokens}
+            if 'token_type_ids' in self.input_names and 'token_type_ids' not in inputs:
+                inputs['token_type_ids'] = np.zeros_like(inputs['input_ids'])
+            hidden = self.session.run(['last_hidden_state'], inputs)[0]
+
+            if self.meta['pooling'] == 'cls':
+                pooled = hidden[:, 0]
+            else:
+                mask = tokens['attention_mask'][..., None].astype('float32')
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled.astype('float32'))
+
+        if not batches:
+            return np.empty((0, 0), dtype='float32')
+        return np.vstack(batches)
+
+def parity_check(reference: np.ndarray, candidate: np.ndarray) -> Dict:
+    """Cosine similarity between row-aligned embeddings from two backends"""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = np.sum(reference * candidate, axis=1)
+    return {'mean_cosine': float(cosine.mean()), 'min_cosine': float(cosine.min()), 'texts': len(cosine)}
+
+def create_embedding_backend(config: Dict, backend: Optional[str] = None):
+    """Backend selected by EMBEDDINGS_BACKEND, falling back to Sentence-Transformers if ONNX cannot be used"""
+    model_name = config.get('EMBEDDINGS_MODEL', 'all-MiniLM-L6-v2')
+    backend = str(backend or config.get('EMBEDDINGS_BACKEND', 'sentence-transformers')).lower()
+    if backend not in BACKENDS:
+        logger.warning(f"Unknown EMBEDDINGS_BACKEND '{backend}', using sentence-transformers")
+        backend = 'sentence-transformers'
+
+    if backend != 'sentence-transformers':
+        try:
+            return OnnxBackend(
+                model_name,
+                config.get('ONNX_MODEL_DIR', './data/onnx'),
+                quantize=backend == 'onnx-int8',
+                min_cosine=float(config.get('EMBEDDINGS_PARITY_MIN_COSINE', 0.98)),
+                threads=int(config.get('ONNX_THREADS', 0))
+            )
+        except Exception as e:
+            logger.error(f"Could not load {backend} backend, using sentence-transformers: {str(e)}")
+
+    return SentenceTransformerBackend(model_name)
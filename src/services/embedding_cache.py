@@ -0,0 +1,296 @@
+"""
+Content-addressed embedding caches
+Stores normalized float32 embeddings by text hash so unchanged text is never re-encoded
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+KEY_BYTES = 16
+
+def text_hash(text: str) -> bytes:
+    """Content address of a text"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=KEY_BYTES).digest()
+
+class EmbeddingCache:
+    """Append-only local embedding store with an optional Redis tier.
+
+    Each model gets its own directory under ``path`` holding ``keys.bin``
+    (16-byte text hashes) and ``vectors.f32`` (row-aligned float32 vectors,
+    memory-mapped read-only). Lookups check the local store first, then
+    Redis through ``CacheService.get_cached_embeddings``; Redis hits are
+    copied into the local store so the next lookup stays on disk. Processes
+    sharing the directory serialize appends with a lock on ``keys.bin`` and
+    pick up each other's keys when they append.
+    """
+
+    def __init__(self, path: str, model_name: str, dim: int, cache_service=None, ttl: Optional[int] = None):
+        self.model_name = model_name
+        self.dim = dim
+        self.cache_service = cache_service
+        self.ttl = ttl
+        self.directory = os.path.join(path, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        self.keys_file = os.path.join(self.directory, 'keys.bin')
+        self.vectors_file = os.path.join(self.directory, 'vectors.f32')
+        self.logger = logging.getLogger(__name__)
+
+        self.rows: Dict[bytes, int] = {}
+        self._count = 0
+        self._vectors = np.empty((0, dim), dtype='float32')
+        self._lock = threading.Lock()
+        self.stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._open()
+
+    @contextmanager
+    def _file_lock(self):
+        """Thread lock plus an exclusive lock on the key file, shared with other processes"""
+        with self._lock:
+            with open(self.keys_file, 'ab') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                yield
+
+    def _open(self):
+        """Load the key table, dropping rows whose vector or key was not fully written"""
+        meta_file = os.path.join(self.directory, 'meta.json')
+        with self._file_lock():
+            try:
+                with open(meta_file, 'r', encoding='utf-8') as f:
+                    dim = json.load(f).get('dim')
+            except (OSError, ValueError):
+                dim = self.dim
+            if dim != self.dim:
+                self.logger.warning(f"Embedding cache dimension changed, clearing {self.directory}")
+                for name in (self.keys_file, self.vectors_file):
+                    open(name, 'wb').close()
+            with open(f"{meta_file}.tmp", 'w', encoding='utf-8') as f:
+                json.dump({'model': self.model_name, 'dim': self.dim}, f)
+            os.replace(f"{meta_file}.tmp", meta_file)
+
+            if not os.path.exists(self.vectors_file):
+                open(self.vectors_file, 'wb').close()
+            self._trim()
+            self._read_new_keys()
+        self._remap()
+
+    def _trim(self):
+        """Drop a torn tail: vectors without a key, or a partial key or vector"""
+        row_bytes = self.dim * 4
+        count = min(os.path.getsize(self.keys_file) // KEY_BYTES, os.path.getsize(self.vectors_file) // row_bytes)
+        with open(self.keys_file, 'r+b') as f:
+            f.truncate(count * KEY_BYTES)
+        with open(self.vectors_file, 'r+b') as f:
+            f.truncate(count * row_bytes)
+
+    def _read_new_keys(self):
+        """Add keys appended since the last read, by this or another process"""
+        with open(self.keys_file, 'rb') as f:
+            f.seek(self._count * KEY_BYTES)
+            keys = f.read()
+        for i in range(len(keys) // KEY_BYTES):
+            self.rows.setdefault(keys[i * KEY_BYTES:(i + 1) * KEY_BYTES], self._count + i)
+        self._count += len(keys) // KEY_BYTES
+
+    def _remap(self):
+        count = os.path.getsize(self.vectors_file) // (self.dim * 4)
+        if count:
+            self._vectors = np.memmap(self.vectors_file, dtype='float32', mode='r', shape=(count, self.dim))
+        else:
+            self._vectors = np.empty((0, self.dim), dtype='float32')
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _redis_key(self, key: bytes) -> str:
+        return f"{self.model_name}:{key.hex()}"
+
+    def _redis_enabled(self) -> bool:
+        return self.cache_service is not None and self.cache_service.redis_available
+
+    def _append(self, keys: List[bytes], vectors: np.ndarray):
+        """Persist new vectors; the key is written last so a torn write is dropped on open"""
+        with self._file_lock():
+            self._read_new_keys()
+            fresh, seen = [], set()
+            for i, key in enumerate(keys):
+                if key not in self.rows and key not in seen:
+                    fresh.append(i)
+                    seen.add(key)
+            if not fresh:
+                return
+            # A torn write of a process that died is overwritten
+            self._trim()
+            start = self._count
+            with open(self.vectors_file, 'ab') as f:
+                f.write(np.ascontiguousarray(vectors[fresh], dtype='float32').tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.keys_file, 'ab') as f:
+                f.write(b''.join(keys[i] for i in fresh))
+                f.flush()
+                os.fsync(f.fileno())
+            for offset, i in enumerate(fresh):
+                self.rows[keys[i]] = start + offset
+            self._count += len(fresh)
+            self._remap()
+
+    def get_or_encode(self, texts: List[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Embeddings for texts, calling encode only for texts not cached anywhere"""
+        keys = [text_hash(text) for text in texts]
+        result = np.empty((len(texts), self.dim), dtype='float32')
+
+        vectors = self._vectors
+        rows = [self.rows.get(key, -1) for key in keys]
+        hits = [i for i, row in enumerate(rows) if 0 <= row < len(vectors)]
+        if hits:
+            result[hits] = vectors[[rows[i] for i in hits]]
+        hit_set = set(hits)
+        missing = [i for i in range(len(texts)) if i not in hit_set]
+        self.stats['local_hits'] += len(hits)
+
+        # Redis tier, shared between hosts
+        if missing and self._redis_enabled():
+            cached = self.cache_service.get_cached_embeddings_many([self._redis_key(keys[i]) for i in missing])
+            found = []
+            for i in missing:
+                value = cached.get(self._redis_key(keys[i]))
+                if value is not None:
+                    result[i] = np.frombuffer(value, dtype='float32')
+                    found.append(i)
+            if found:
+                self._append([keys[i] for i in found], result[found])
+                self.stats['redis_hits'] += len(found)
+                found = set(found)
+                missing = [i for i in missing if i not in found]
+
+        if missing:
+            # Encode each distinct text once
+            positions: Dict[bytes, List[int]] = {}
+            for i in missing:
+                positions.setdefault(keys[i], []).append(i)
+            first = [group[0] for group in positions.values()]
+
+            self.stats['misses'] += len(first)
+            encoded = np.asarray(encode([texts[i] for i in first]), dtype='float32')
+            for vector, group in zip(encoded, positions.values()):
+                result[group] = vector
+            self._append([keys[i] for i in first], encoded)
+            if self._redis_enabled():
+                self.cache_service.cache_embeddings_many(
+                    {self._redis_key(keys[i]): result[i].tobytes() for i in first}, self.ttl
+                )
+
+        return result
+
+    def get_stats(self) -> Dict:
+        return {'entries': len(self), **self.stats}
+
+class QueryEmbeddingCache:
+    """Size-bounded LRU of query embeddings with an optional shared Redis tier.
+
+    Redis entries use the same ``<model>:<hash>`` keys as EmbeddingCache, so
+    a query matching an ingested chunk's text is also a hit.
+    """
+
+    def __init__(self, model_name: str, dim: int, max_size: int = 10000, cache_service=None, ttl: Optional[int] = None):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_size = max_size
+        self.cache_service = cache_service
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+
+        self._entries: 'OrderedDict[bytes, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'redis_hits': 0, 'misses': 0}
+
+    def _redis_enabled(self) -> bool:
+        return self.cache_service is not None and self.cache_service.redis_available
+
+    def _put(self, key: bytes, vector: np.ndarray):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_encode(self, query: str, encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Embedding of one query as a (1, dim) array"""
+        return self.get_or_encode_many([query], encode)
+
+    def get_or_encode_many(self, queries: List[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Embeddings of several queries, encoding all misses in one call"""
+        keys = [text_hash(query) for query in queries]
+        result = np.empty((len(queries), self.dim), dtype='float32')
+        missing = []
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    result[i] = vector
+                else:
+                    missing.append(i)
+            self.stats['hits'] += len(queries) - len(missing)
+
+        if missing and self._redis_enabled():
+            redis_keys = [f"{self.model_name}:{keys[i].hex()}" for i in missing]
+            cached = self.cache_service.get_cached_embeddings_many(redis_keys)
+            still_missing = []
+            for i, redis_key in zip(missing, redis_keys):
+                value = cached.get(redis_key)
+                if value is None:
+                    still_missing.append(i)
+                    continue
+                result[i] = np.frombuffer(value, dtype='float32')
+                self._put(keys[i], result[i].copy())
+                self.stats['redis_hits'] += 1
+            missing = still_missing
+
+        if missing:
+            # Encode each distinct query once
+            positions: Dict[bytes, List[int]] = {}
+            for i in missing:
+                positions.setdefault(keys[i], []).append(i)
+            first = [group[0] for group in positions.values()]
+
+            self.stats['misses'] += len(first)
+            encoded = np.asarray(encode([queries[i] for i in first]), dtype='float32')
+            for vector, group in zip(encoded, positions.values()):
+                result[group] = vector
+                self._put(keys[group[0]], vector.copy())
+            if self._redis_enabled():
+                self.cache_service.cache_embeddings_many(
+                    {f"{self.model_name}:{keys[i].hex()}": result[i].tobytes() for i in first}, self.ttl
+                )
+
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats['hits'] + self.stats['redis_hits'] + self.stats['misses']
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            **self.stats,
+            'hit_rate': (self.stats['hits'] + self.stats['redis_hits']) / lookups if lookups else 0.0
+        }
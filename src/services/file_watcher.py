@@ -0,0 +1,70 @@
+"""
+Polling file watcher
+Calls back on a background thread when any of a set of files changes on disk
+"""
+import os
+import logging
+import threading
+from typing import Callable, List, Optional, Tuple
+
+class FileWatcher:
+    """Polls the (mtime, size) of each path every ``interval`` seconds.
+
+    A file appearing, disappearing or being replaced counts as a change.
+    Polling needs no extra dependency and works on network and container
+    file systems where inotify events are not delivered. The thread is
+    restarted by ``ensure_started`` after a fork, which does not copy it.
+    """
+
+    def __init__(self, paths: List[str], callback: Callable[[], None], interval: float = 2.0,
+                 name: str = 'file-watcher'):
+        self.paths = list(paths)
+        self.callback = callback
+        self.interval = max(0.05, float(interval))
+        self.name = name
+        self.logger = logging.getLogger(__name__)
+
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._signature = self._stat()
+        self.stats = {'changes': 0, 'errors': 0}
+
+    def _stat(self) -> Tuple:
+        signature = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def ensure_started(self):
+        if self._stopped.is_set() or (self._worker is not None and self._worker.is_alive()):
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def check(self) -> bool:
+        """Run the callback if anything changed since the last check"""
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        self.stats['changes'] += 1
+        try:
+            self.callback()
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.logger.error(f"{self.name} callback failed: {str(e)}")
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
@@ -0,0 +1,188 @@
+"""
+Binary document id table for the vector database
+Maps document ids to rows through a sorted, fixed-width hash table that can be memory-mapped
+"""
+import os
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b'IDTABLE1'
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('count', '<u8')])
+HASH_DTYPE = np.dtype('<u8')
+ROW_DTYPE = np.dtype('<i8')
+# hi and lo hash halves plus the row
+RECORD_BYTES = 2 * HASH_DTYPE.itemsize + ROW_DTYPE.itemsize
+
+# Marks an id deleted since the table was loaded
+_DELETED = -1
+_LOW_64 = (1 << 64) - 1
+
+def id_hash(doc_id: str) -> Tuple[int, int]:
+    """128-bit hash of a document id as (hi, lo); collisions are not a practical concern"""
+    value = int.from_bytes(hashlib.blake2b(doc_id.encode('utf-8'), digest_size=16).digest(), 'little')
+    return value & _LOW_64, value >> 64
+
+def id_hashes(doc_ids: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    digests = b''.join(hashlib.blake2b(doc_id.encode('utf-8'), digest_size=16).digest() for doc_id in doc_ids)
+    halves = np.frombuffer(digests, dtype=HASH_DTYPE).reshape(-1, 2)
+    return halves[:, 0], halves[:, 1]
+
+class IdTable:
+    """Document id → row mapping with the lookups of a dict.
+
+    ``<base>_ids.bin`` holds a header and three fixed-width uint64/int64
+    columns: the high and low halves of each id's 128-bit hash, sorted, and
+    the row. Lookups binary-search the high halves (O(log n)), so the file is
+    used memory-mapped as is: opening it reads no records, and worker
+    processes share its pages instead of each unpickling a dict of strings.
+
+    Ids added or deleted since the table was written live in a small dict
+    on top of it; ``save`` merges them into a new file.
+    """
+
+    def __init__(self, hi: Optional[np.ndarray] = None, lo: Optional[np.ndarray] = None,
+                 rows: Optional[np.ndarray] = None, mapped: bool = False):
+        self._hi = hi if hi is not None else np.zeros(0, dtype=HASH_DTYPE)
+        self._lo = lo if lo is not None else np.zeros(0, dtype=HASH_DTYPE)
+        self._rows = rows if rows is not None else np.zeros(0, dtype=ROW_DTYPE)
+        # bisect over memoryviews of the columns costs a fraction of np.searchsorted per single lookup
+        self._hi_view = self._view(self._hi, 'Q')
+        self._lo_view = self._view(self._lo, 'Q')
+        self._rows_view = self._view(self._rows, 'q')
+        self.mapped = mapped
+        self._changes: Dict[str, int] = {}
+        self._size = len(self._rows)
+
+    @staticmethod
+    def _view(column: np.ndarray, fmt: str) -> memoryview:
+        return memoryview(np.ascontiguousarray(column).view(np.ndarray)).cast('B').cast(fmt)
+
+    @classmethod
+    def from_rows(cls, doc_ids: List[str], rows: Iterable[int]) -> 'IdTable':
+        """Table of doc_ids[i] → rows[i]; for repeated ids the last row wins"""
+        rows = np.asarray(list(rows), dtype=ROW_DTYPE)
+        if not len(rows):
+            return cls()
+
+        hi, lo = id_hashes(doc_ids)
+        # lexsort is stable, so the last of equal keys is the latest row
+        order = np.lexsort((lo, hi))
+        hi, lo, rows = hi[order], lo[order], rows[order]
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = (hi[1:] != hi[:-1]) | (lo[1:] != lo[:-1])
+        return cls(hi[last].copy(), lo[last].copy(), rows[last].copy())
+
+    @classmethod
+    def from_mapping(cls, mapping: Dict[str, int]) -> 'IdTable':
+        return cls.from_rows(list(mapping), mapping.values())
+
+    @classmethod
+    def load(cls, path: str) -> 'IdTable':
+        """Memory-map a table written by save()"""
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) != 1 or header['magic'][0] != MAGIC:
+            raise ValueError(f"{path} is not an id table")
+
+        count = int(header['count'][0])
+        if os.path.getsize(path) != HEADER_DTYPE.itemsize + count * RECORD_BYTES:
+            raise ValueError(f"Id table {path} is truncated")
+        if not count:
+            return cls()
+
+        offset = HEADER_DTYPE.itemsize
+        hi = np.memmap(path, dtype=HASH_DTYPE, mode='r', offset=offset, shape=(count,))
+        lo = np.memmap(path, dtype=HASH_DTYPE, mode='r', offset=offset + count * HASH_DTYPE.itemsize, shape=(count,))
+        rows = np.memmap(path, dtype=ROW_DTYPE, mode='r', offset=offset + 2 * count * HASH_DTYPE.itemsize, shape=(count,))
+        return cls(hi, lo, rows, mapped=True)
+
+    def _position(self, doc_id: str) -> int:
+        """Index of doc_id in the sorted columns, or -1"""
+        count = len(self._hi_view)
+        if not count:
+            return -1
+        hi, lo = id_hash(doc_id)
+        i = bisect.bisect_left(self._hi_view, hi)
+        while i < count and self._hi_view[i] == hi:
+            if self._lo_view[i] == lo:
+                return i
+            i += 1
+        return -1
+
+    def get(self, doc_id: str, default=None):
+        row = self._changes.get(doc_id)
+        if row is None:
+            position = self._position(doc_id)
+            return self._rows_view[position] if position >= 0 else default
+        return row if row != _DELETED else default
+
+    def __contains__(self, doc_id: str) -> bool:
+        return self.get(doc_id) is not None
+
+    def __getitem__(self, doc_id: str) -> int:
+        row = self.get(doc_id)
+        if row is None:
+            raise KeyError(doc_id)
+        return row
+
+    def __setitem__(self, doc_id: str, row: int):
+        if doc_id not in self:
+            self._size += 1
+        self._changes[doc_id] = int(row)
+
+    def __delitem__(self, doc_id: str):
+        if doc_id not in self:
+            raise KeyError(doc_id)
+        self._size -= 1
+        # An id only added since loading needs no marker
+        if self._position(doc_id) >= 0:
+            self._changes[doc_id] = _DELETED
+        else:
+            del self._changes[doc_id]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _merged(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sorted columns with the pending changes applied"""
+        if not self._changes:
+            return self._hi, self._lo, self._rows
+
+        keep = np.ones(len(self._rows), dtype=bool)
+        for doc_id in self._changes:
+            position = self._position(doc_id)
+            if position >= 0:
+                keep[position] = False
+
+        added = [(doc_id, row) for doc_id, row in self._changes.items() if row != _DELETED]
+        hi, lo = id_hashes(doc_id for doc_id, _ in added)
+        hi = np.concatenate([self._hi[keep], hi])
+        lo = np.concatenate([self._lo[keep], lo])
+        rows = np.concatenate([self._rows[keep], np.array([row for _, row in added], dtype=ROW_DTYPE)])
+
+        order = np.lexsort((lo, hi))
+        return hi[order], lo[order], rows[order]
+
+    def save(self, path: str):
+        """Write the table, pending changes included, durably to path"""
+        hi, lo, rows = self._merged()
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'], header['count'] = MAGIC, len(rows)
+
+        with open(path, 'wb') as f:
+            f.write(header.tobytes())
+            for column, dtype in ((hi, HASH_DTYPE), (lo, HASH_DTYPE), (rows, ROW_DTYPE)):
+                f.write(np.ascontiguousarray(column, dtype=dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def get_stats(self) -> Dict:
+        return {
+            'ids': len(self),
+            'table_ids': len(self._rows),
+            'pending_changes': len(self._changes),
+            'table_bytes': HEADER_DTYPE.itemsize + len(self._rows) * RECORD_BYTES,
+            'memory_mapped': self.mapped
+        }
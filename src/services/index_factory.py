@@ -0,0 +1,339 @@
+"""
+FAISS index construction for the vector database
+Builds flat, IVF and HNSW indexes with full-precision or compressed vector storage and measures their recall
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+# How the index stores each vector: 4, 2 or 1 bytes per dimension, or pq_m bytes of product-quantizer codes
+STORAGE_TYPES = ('float32', 'fp16', 'sq8', 'pq')
+
+# FAISS needs roughly 39 training points per IVF centroid and 2^nbits points per PQ codebook
+MIN_POINTS_PER_CENTROID = 39
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class IndexSettings:
+    """Index type and tuning parameters"""
+    index_type: str = 'flat'
+    storage: str = 'float32'
+    nlist: int = 1024
+    nprobe: int = 16
+    pq_m: int = 48
+    pq_nbits: int = 8
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+    train_sample: int = 100000
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'IndexSettings':
+        """Read index settings from the application config"""
+        index_type = str(config.get('FAISS_INDEX_TYPE', 'flat')).lower()
+        if index_type not in INDEX_TYPES:
+            logger.warning(f"Unknown FAISS_INDEX_TYPE '{index_type}', falling back to flat")
+            index_type = 'flat'
+
+        storage = str(config.get('FAISS_STORAGE', 'float32')).lower()
+        if storage not in STORAGE_TYPES:
+            logger.warning(f"Unknown FAISS_STORAGE '{storage}', falling back to float32")
+            storage = 'float32'
+        # IVF-PQ is IVF with PQ storage
+        if index_type == 'ivf_pq':
+            storage = 'pq'
+        elif index_type == 'ivf_flat' and storage == 'pq':
+            index_type = 'ivf_pq'
+
+        return cls(
+            index_type=index_type,
+            storage=storage,
+            nlist=int(config.get('FAISS_NLIST', 1024)),
+            nprobe=int(config.get('FAISS_NPROBE', 16)),
+            pq_m=int(config.get('FAISS_PQ_M', 48)),
+            pq_nbits=int(config.get('FAISS_PQ_NBITS', 8)),
+            hnsw_m=int(config.get('FAISS_HNSW_M', 32)),
+            ef_construction=int(config.get('FAISS_EF_CONSTRUCTION', 200)),
+            ef_search=int(config.get('FAISS_EF_SEARCH', 64)),
+            train_sample=int(config.get('FAISS_TRAIN_SAMPLE', 100000))
+        )
+
+    @property
+    def is_ivf(self) -> bool:
+        return self.index_type in ('ivf_flat', 'ivf_pq')
+
+    @property
+    def requires_training(self) -> bool:
+        """IVF centroids, SQ8 value ranges and PQ codebooks are learned from a sample"""
+        return self.is_ivf or self.storage in ('sq8', 'pq')
+
+def _pq_subquantizers(dim: int, requested: int) -> int:
+    """Largest divisor of dim not above the requested subquantizer count"""
+    for m in range(min(requested, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+def _codec(dim: int, settings: IndexSettings) -> str:
+    """FAISS description of the per-vector storage"""
+    if settings.storage == 'fp16':
+        return "SQfp16"
+    if settings.storage == 'sq8':
+        return "SQ8"
+    if settings.storage == 'pq':
+        return f"PQ{_pq_subquantizers(dim, settings.pq_m)}x{settings.pq_nbits}"
+    return "Flat"
+
+def _factory_string(dim: int, settings: IndexSettings, n_train: Optional[int]) -> str:
+    """Translate settings into a FAISS index_factory description"""
+    if settings.index_type == 'hnsw':
+        if settings.storage == 'pq':
+            # HNSW-PQ codes are always 8 bits per subquantizer
+            return f"HNSW{settings.hnsw_m}_PQ{_pq_subquantizers(dim, settings.pq_m)}"
+        return f"HNSW{settings.hnsw_m},{_codec(dim, settings)}"
+
+    if settings.is_ivf:
+        nlist = settings.nlist
+        if n_train is not None:
+            nlist = max(1, min(nlist, n_train // MIN_POINTS_PER_CENTROID))
+        return f"IVF{nlist},{_codec(dim, settings)}"
+
+    return _codec(dim, settings)
+
+def create_index(dim: int, settings: IndexSettings, n_train: Optional[int] = None) -> faiss.Index:
+    """Create an empty inner-product index; nlist is capped by the training sample size.
+
+    Vectors are addressed by stable document-store rows rather than by
+    insertion position: IVF indexes store ids in their inverted lists, flat
+    and HNSW indexes are wrapped in IndexIDMap2. PQ storage falls back to SQ8
+    when there are fewer training vectors than PQ centroids.
+    """
+    pq_nbits = 8 if settings.index_type == 'hnsw' else settings.pq_nbits
+    if settings.storage == 'pq' and n_train is not None and n_train < 2 ** pq_nbits:
+        index_type = 'ivf_flat' if settings.index_type == 'ivf_pq' else settings.index_type
+        logger.warning(
+            f"Only {n_train} training vectors for PQ (need {2 ** pq_nbits}), "
+            "using SQ8 storage until the index is rebuilt"
+        )
+        settings = IndexSettings(**{**settings.__dict__, 'index_type': index_type, 'storage': 'sq8'})
+
+    description = _factory_string(dim, settings, n_train)
+    if not settings.is_ivf:
+        description = f"IDMap2,{description}"
+    index = faiss.index_factory(dim, description, faiss.METRIC_INNER_PRODUCT)
+
+    if settings.index_type == 'hnsw':
+        _hnsw(index).hnsw.efConstruction = settings.ef_construction
+
+    apply_search_defaults(index, settings)
+    return index
+
+def sample_training_vectors(vectors: np.ndarray, settings: IndexSettings, seed: int = 1234) -> np.ndarray:
+    """Pick a random training sample of at most train_sample vectors"""
+    if len(vectors) <= settings.train_sample:
+        return vectors
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), settings.train_sample, replace=False)
+    return vectors[np.sort(rows)]
+
+def build_index(
+    vectors: np.ndarray,
+    dim: int,
+    settings: IndexSettings,
+    ids: Optional[np.ndarray] = None
+) -> faiss.Index:
+    """Create, train and fill an index from normalized float32 vectors (ids default to 0..n-1)"""
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    if ids is None:
+        ids = np.arange(len(vectors), dtype='int64')
+    sample = sample_training_vectors(vectors, settings) if settings.requires_training else None
+
+    index = create_index(dim, settings, len(sample) if sample is not None else None)
+    if not index.is_trained:
+        start = time.time()
+        index.train(sample)
+        logger.info(f"Trained {settings.index_type} index on {len(sample)} vectors in {time.time() - start:.2f}s")
+
+    if len(vectors):
+        index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype='int64'))
+    return index
+
+def _ivf(index: faiss.Index) -> Optional[faiss.IndexIVF]:
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+def _hnsw(index: faiss.Index) -> Optional[faiss.IndexHNSW]:
+    index = faiss.downcast_index(index)
+    while hasattr(index, 'index') and not isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.index)
+    return index if isinstance(index, faiss.IndexHNSW) else None
+
+def is_id_mapped(index: faiss.Index) -> bool:
+    """Whether the index stores explicit ids (IDMap2 wrapper or IVF inverted lists)"""
+    return isinstance(faiss.downcast_index(index), faiss.IndexIDMap2) or _ivf(index) is not None
+
+def supports_remove(index: faiss.Index) -> bool:
+    """HNSW graphs cannot drop vectors; deleted rows are filtered at search time instead"""
+    return _hnsw(index) is None
+
+def renumber_ids(index: faiss.Index, live_ids: np.ndarray) -> faiss.Index:
+    """Copy of an id-mapped index where each id becomes its position in the sorted live_ids.
+
+    Used by compaction; every id in the index must be in live_ids.
+    """
+    index = faiss.clone_index(index)
+    ivf = _ivf(index)
+    if ivf is not None:
+        invlists = ivf.invlists
+        for list_no in range(ivf.nlist):
+            size = invlists.list_size(list_no)
+            if size:
+                ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+                ids[:] = np.searchsorted(live_ids, ids)
+        return index
+
+    id_mapped = faiss.downcast_index(index)
+    old_ids = faiss.vector_to_array(id_mapped.id_map)
+    faiss.copy_array_to_vector(np.searchsorted(live_ids, old_ids).astype('int64'), id_mapped.id_map)
+    id_mapped.construct_rev_map()
+    return index
+
+def supports_selector(index: faiss.Index) -> bool:
+    """Flat PQ storage (IndexPQ) rejects id selectors; its filtered searches keep the selected rows afterwards"""
+    return not isinstance(_codes(index), faiss.IndexPQ)
+
+def apply_search_defaults(index: faiss.Index, settings: IndexSettings):
+    """Set the default nprobe / efSearch used when a request does not override them"""
+    ivf = _ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(settings.nprobe, ivf.nlist)
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        hnsw.hnsw.efSearch = settings.ef_search
+
+def search_parameters(
+    index: faiss.Index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    selector: Optional[faiss.IDSelector] = None
+) -> Optional[faiss.SearchParameters]:
+    """Per-request search parameters, or None to use the index defaults.
+
+    The selector restricts the search to a subset of ids and must be kept
+    alive by the caller until the search returns. Indexes without
+    supports_selector raise ValueError for one.
+    """
+    if not nprobe and not ef_search and selector is None:
+        return None
+    if selector is not None and not supports_selector(index):
+        raise ValueError(f"{describe_index(index)} index with {describe_storage(index)} storage cannot take an id selector")
+
+    # IVF and HNSW only accept their own parameter classes
+    kwargs = {'sel': selector} if selector is not None else {}
+    ivf = _ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(nprobe=int(nprobe or ivf.nprobe), **kwargs)
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search or hnsw.hnsw.efSearch), **kwargs)
+    if selector is not None:
+        return faiss.SearchParameters(**kwargs)
+    return None
+
+def describe_index(index: Optional[faiss.Index]) -> str:
+    """Short name of the index type actually in use"""
+    if index is None:
+        return 'none'
+    ivf = _ivf(index)
+    if ivf is not None:
+        return 'ivf_pq' if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else 'ivf_flat'
+    if _hnsw(index) is not None:
+        return 'hnsw'
+    return 'flat'
+
+def _codes(index: faiss.Index) -> faiss.Index:
+    """The part of an index that holds the vector codes"""
+    ivf = _ivf(index)
+    if ivf is not None:
+        return faiss.downcast_index(ivf)
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        return faiss.downcast_index(hnsw.storage)
+    index = faiss.downcast_index(index)
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+
+def describe_storage(index: Optional[faiss.Index]) -> str:
+    """How the index in use stores its vectors (one of STORAGE_TYPES)"""
+    if index is None:
+        return 'none'
+    codes = _codes(index)
+    if isinstance(codes, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return 'pq'
+    if isinstance(codes, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return 'fp16' if codes.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else 'sq8'
+    return 'float32'
+
+def evaluate_recall(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    candidates: List[Dict],
+    k: int = 10
+) -> List[Dict]:
+    """Compare candidate index settings with exact search.
+
+    Each candidate is a dict with 'settings' (IndexSettings) and an optional
+    'sweep' list of {'nprobe': ...} / {'ef_search': ...} search overrides.
+    Returns one row per (settings, override) with recall@k and query latency.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    k = min(k, len(vectors))
+
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    start = time.time()
+    _, truth = exact.search(queries, k)
+    flat_latency = (time.time() - start) * 1000 / len(queries)
+
+    report = [{
+        'index_type': 'flat',
+        'params': {},
+        'recall_at_k': 1.0,
+        'latency_ms': flat_latency,
+        'build_time_s': 0.0
+    }]
+
+    for candidate in candidates:
+        settings = candidate['settings']
+        start = time.time()
+        index = build_index(vectors, vectors.shape[1], settings)
+        build_time = time.time() - start
+
+        for overrides in candidate.get('sweep') or [{}]:
+            params = search_parameters(index, **overrides)
+            start = time.time()
+            if params is not None:
+                _, found = index.search(queries, k, params=params)
+            else:
+                _, found = index.search(queries, k)
+            latency = (time.time() - start) * 1000 / len(queries)
+
+            hits = sum(len(np.intersect1d(found[i], truth[i])) for i in range(len(queries)))
+            report.append({
+                'index_type': describe_index(index),
+                'params': overrides,
+                'recall_at_k': hits / float(k * len(queries)),
+                'latency_ms': latency,
+                'build_time_s': build_time
+            })
+
+    return report
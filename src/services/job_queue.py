@@ -0,0 +1,486 @@
+"""
+Background job queue
+Runs ingestion, index rebuilds and crawls on worker threads instead of request threads, through a pluggable broker
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass, field, fields, asdict, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+@dataclass
+class Job:
+    """A unit of background work and its outcome"""
+    job_type: str
+    payload: Dict
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = 'queued'  # queued, running, succeeded or failed
+    attempts: int = 0
+    max_attempts: int = 3
+    idempotency_key: Optional[str] = None
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    run_after: float = 0.0
+    lease_until: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+def _start(job: Job, lease_seconds: float, now: float):
+    """Mark a claimed job as running under a lease"""
+    job.status = 'running'
+    job.attempts += 1
+    job.started_at = now
+    job.lease_until = now + lease_seconds
+
+def _lease_lost(job: Job) -> bool:
+    """A running job whose lease expired (its worker died); fail it once out of attempts"""
+    if job.attempts < job.max_attempts:
+        return False
+    job.status = 'failed'
+    job.error = f"Worker lost after {job.attempts} attempts (lease expired)"
+    job.finished_at = time.time()
+    job.lease_until = 0.0
+    return True
+
+class MemoryBroker:
+    """In-process broker, for tests and single-process deployments"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._keys: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, job: Job) -> Tuple[Job, bool]:
+        """Store a new job; with a known idempotency key, return the existing job instead"""
+        with self._lock:
+            if job.idempotency_key:
+                existing = self._keys.get(job.idempotency_key)
+                if existing is not None:
+                    return replace(self._jobs[existing]), False
+                self._keys[job.idempotency_key] = job.job_id
+            self._jobs[job.job_id] = replace(job)
+            return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return replace(job) if job is not None else None
+
+    def save(self, job: Job):
+        with self._lock:
+            self._jobs[job.job_id] = replace(job)
+
+    def claim(self, limits: Dict[str, int], lease_seconds: float) -> Optional[Job]:
+        """Start the oldest runnable job of a type that is below its concurrency limit"""
+        now = time.time()
+        with self._lock:
+            running = Counter(
+                job.job_type for job in self._jobs.values() if job.status == 'running' and job.lease_until > now
+            )
+            candidates = sorted(
+                (job for job in self._jobs.values()
+                 if job.job_type in limits and (
+                     (job.status == 'queued' and job.run_after <= now)
+                     or (job.status == 'running' and job.lease_until <= now))),
+                key=lambda job: job.created_at
+            )
+            for job in candidates:
+                if running[job.job_type] >= limits[job.job_type] or (job.status == 'running' and _lease_lost(job)):
+                    continue
+                _start(job, lease_seconds, now)
+                return replace(job)
+        return None
+
+class SQLiteBroker:
+    """Broker in a SQLite file, shared by all processes on one host (gunicorn workers, worker.py)"""
+
+    COLUMNS = [f.name for f in fields(Job)]
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'job_id TEXT PRIMARY KEY, job_type TEXT NOT NULL, payload TEXT, status TEXT NOT NULL, '
+            'attempts INTEGER, max_attempts INTEGER, idempotency_key TEXT UNIQUE, result TEXT, error TEXT, '
+            'created_at REAL, started_at REAL, finished_at REAL, run_after REAL, lease_until REAL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (status, job_type, created_at)')
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread and process; connections must not cross a fork"""
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def _to_row(self, job: Job) -> List:
+        data = job.to_dict()
+        data['payload'] = json.dumps(job.payload)
+        data['result'] = json.dumps(job.result)
+        return [data[column] for column in self.COLUMNS]
+
+    def _from_row(self, row) -> Job:
+        data = dict(zip(self.COLUMNS, row))
+        data['payload'] = json.loads(data['payload'])
+        data['result'] = json.loads(data['result'])
+        return Job(**data)
+
+    def _select(self, where: str, params: tuple) -> Optional[Job]:
+        row = self._conn().execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE {where}", params).fetchone()
+        return self._from_row(row) if row else None
+
+    def add(self, job: Job) -> Tuple[Job, bool]:
+        try:
+            self._conn().execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                self._to_row(job)
+            )
+            return job, True
+        except sqlite3.IntegrityError:
+            existing = self._select('idempotency_key = ?', (job.idempotency_key,))
+            if existing is None:
+                raise
+            return existing, False
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._select('job_id = ?', (job_id,))
+
+    def save(self, job: Job, conn: Optional[sqlite3.Connection] = None):
+        (conn or self._conn()).execute(
+            f"UPDATE jobs SET {', '.join(f'{column} = ?' for column in self.COLUMNS[1:])} WHERE job_id = ?",
+            self._to_row(job)[1:] + [job.job_id]
+        )
+
+    def claim(self, limits: Dict[str, int], lease_seconds: float) -> Optional[Job]:
+        if not limits:
+            return None
+        conn = self._conn()
+        # Only take the write lock when a read finds something to claim; idle pollers then never contend for it
+        now = time.time()
+        runnable = conn.execute(
+            f"SELECT 1 FROM jobs WHERE job_type IN ({', '.join('?' * len(limits))}) "
+            "AND ((status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until <= ?)) LIMIT 1",
+            (*limits, now, now)
+        ).fetchone()
+        if runnable is None:
+            return None
+        
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            running = dict(conn.execute(
+                "SELECT job_type, COUNT(*) FROM jobs WHERE status = 'running' AND lease_until > ? GROUP BY job_type",
+                (now,)
+            ).fetchall())
+            job_types = [job_type for job_type, limit in limits.items() if running.get(job_type, 0) < limit]
+            while job_types:
+                row = conn.execute(
+                    f"SELECT {', '.join(self.COLUMNS)} FROM jobs "
+                    f"WHERE job_type IN ({', '.join('?' * len(job_types))}) "
+                    "AND ((status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until <= ?)) "
+                    "ORDER BY created_at LIMIT 1",
+                    (*job_types, now, now)
+                ).fetchone()
+                if row is None:
+                    break
+                job = self._from_row(row)
+                if job.status != 'running' or not _lease_lost(job):
+                    _start(job, lease_seconds, now)
+                    self.save(job, conn)
+                    conn.execute('COMMIT')
+                    return job
+                self.save(job, conn)
+            conn.execute('COMMIT')
+            return None
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+class RedisBroker:
+    """Broker in Redis, shared by every process and host using the same Redis.
+
+    Jobs are JSON strings; each job type has a sorted set of runnable job ids
+    (scored by the time they may run) and one of running job ids (scored by
+    lease expiry). Claiming is a Lua script, so limits hold across processes.
+    """
+
+    CLAIM_SCRIPT = """
+    local now, lease = tonumber(ARGV[1]), tonumber(ARGV[2])
+    for i = 1, #KEYS, 2 do
+        local ready, running = KEYS[i], KEYS[i + 1]
+        local expired = redis.call('ZRANGEBYSCORE', running, '-inf', now, 'LIMIT', 0, 1)
+        if #expired > 0 then
+            redis.call('ZADD', running, now + lease, expired[1])
+            return expired[1]
+        end
+        if redis.call('ZCOUNT', running, '(' .. now, '+inf') < tonumber(ARGV[2 + (i + 1) / 2]) then
+            local ids = redis.call('ZRANGEBYSCORE', ready, '-inf', now, 'LIMIT', 0, 1)
+            if #ids > 0 then
+                redis.call('ZREM', ready, ids[1])
+                redis.call('ZADD', running, now + lease, ids[1])
+                return ids[1]
+            end
+        end
+    end
+    return false
+    """
+
+    def __init__(self, redis_client, ttl: int = 604800, prefix: str = 'jobs:'):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._claim = self.redis.register_script(self.CLAIM_SCRIPT)
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ':'.join(parts)
+
+    def add(self, job: Job) -> Tuple[Job, bool]:
+        if job.idempotency_key:
+            key = self._key('key', job.idempotency_key)
+            if not self.redis.set(key, job.job_id, nx=True, ex=self.ttl):
+                existing = self.get(self.redis.get(key).decode())
+                if existing is not None:
+                    return existing, False
+                self.redis.set(key, job.job_id, ex=self.ttl)
+        self.save(job)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        data = self.redis.get(self._key('job', job_id))
+        return Job(**json.loads(data)) if data else None
+
+    def save(self, job: Job):
+        ready, running = self._key('ready', job.job_type), self._key('running', job.job_type)
+        pipe = self.redis.pipeline()
+        pipe.set(self._key('job', job.job_id), json.dumps(job.to_dict()), ex=self.ttl)
+        if job.status == 'queued':
+            pipe.zrem(running, job.job_id)
+            pipe.zadd(ready, {job.job_id: max(job.created_at, job.run_after)})
+        elif job.status == 'running':
+            pipe.zadd(running, {job.job_id: job.lease_until})
+        else:
+            pipe.zrem(running, job.job_id)
+            pipe.zrem(ready, job.job_id)
+        pipe.execute()
+
+    def claim(self, limits: Dict[str, int], lease_seconds: float) -> Optional[Job]:
+        keys = []
+        for job_type in limits:
+            keys += [self._key('ready', job_type), self._key('running', job_type)]
+        while True:
+            now = time.time()
+            job_id = self._claim(keys=keys, args=[now, lease_seconds, *limits.values()])
+            if not job_id:
+                return None
+            job = self.get(job_id.decode())
+            if job is None:
+                continue  # Expired record; the script already moved its id
+            if job.status != 'running' or not _lease_lost(job):
+                _start(job, lease_seconds, now)
+            self.save(job)
+            if job.status == 'running':
+                return job
+
+def create_job_broker(config: Dict, cache_service=None):
+    """Broker selected by JOB_BROKER: redis, sqlite (default) or memory"""
+    logger = logging.getLogger(__name__)
+    broker = str(config.get('JOB_BROKER', 'sqlite')).lower()
+    if broker == 'redis':
+        if cache_service is not None and cache_service.redis_available:
+            return RedisBroker(cache_service.redis_client, int(config.get('JOB_TTL', 604800)))
+        logger.warning("Redis not available, using the SQLite job broker")
+        broker = 'sqlite'
+    if broker == 'memory':
+        return MemoryBroker()
+    return SQLiteBroker(config.get('JOB_SQLITE_PATH', './data/jobs.db'))
+
+def parse_concurrency(value: str) -> Dict[str, int]:
+    """Per-type limits from 'ingest=2,rebuild_index=1'"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in str(value or '').split(','))):
+        job_type, _, limit = item.partition('=')
+        limits[job_type.strip()] = max(0, int(limit))
+    return limits
+
+class JobQueue:
+    """Runs registered job types from a broker on local worker threads.
+    
+    One dispatcher thread per process claims jobs and runs each on its own
+    thread, up to the total concurrency. While the broker has nothing to
+    claim the dispatcher polls less and less often, up to
+    JOB_MAX_POLL_INTERVAL; a job submitted in the same process wakes it at
+    once.
+
+    Each job type has a concurrency limit that the broker enforces across
+    every process sharing it, so e.g. only one index rebuild runs at a time
+    however many gunicorn workers there are. A failing job is retried with
+    exponential backoff until it has run ``max_attempts`` times. Submitting
+    with an idempotency key that was used before (for the same job type)
+    returns the original job instead of queueing a duplicate. Running jobs
+    hold a lease that a heartbeat renews; if a worker dies, the job is picked
+    up again once the lease expires.
+    """
+
+    def __init__(self, broker, config: Dict):
+        self.broker = broker
+        self.max_attempts = max(1, int(config.get('JOB_MAX_ATTEMPTS', 3)))
+        self.retry_backoff = float(config.get('JOB_RETRY_BACKOFF', 5.0))
+        self.poll_interval = float(config.get('JOB_POLL_INTERVAL', 0.5))
+        self.max_poll_interval = max(self.poll_interval, float(config.get('JOB_MAX_POLL_INTERVAL', 10.0)))
+        self.lease_seconds = float(config.get('JOB_LEASE_SECONDS', 300))
+        self.configured_limits = parse_concurrency(config.get('JOB_CONCURRENCY', ''))
+        self.logger = logging.getLogger(__name__)
+
+        self.handlers: Dict[str, Callable[[Dict], Any]] = {}
+        self.limits: Dict[str, int] = {}
+        self.type_max_attempts: Dict[str, int] = {}
+
+        self._dispatcher: Optional[threading.Thread] = None
+        self._running: List[threading.Thread] = []
+        self._slots: Optional[threading.Semaphore] = None
+        self._pid = None
+        self._stopped = threading.Event()
+        self._wakeup = threading.Event()
+        self.stats = {'succeeded': 0, 'failed': 0, 'retried': 0}
+
+    def register(self, job_type: str, handler: Callable[[Dict], Any], concurrency: int = 1,
+                 max_attempts: Optional[int] = None):
+        """Handle jobs of a type; the handler gets the payload and returns a JSON-serializable result"""
+        self.handlers[job_type] = handler
+        self.limits[job_type] = self.configured_limits.get(job_type, concurrency)
+        self.type_max_attempts[job_type] = max_attempts or self.max_attempts
+
+    def submit(self, job_type: str, payload: Optional[Dict] = None,
+               idempotency_key: Optional[str] = None) -> Tuple[Job, bool]:
+        """Queue a job; returns it and whether it was created (False for a repeated idempotency key)"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type '{job_type}'; expected one of {sorted(self.handlers)}")
+        job = Job(
+            job_type,
+            payload or {},
+            max_attempts=self.type_max_attempts[job_type],
+            idempotency_key=f"{job_type}:{idempotency_key}" if idempotency_key else None
+        )
+        job, created = self.broker.add(job)
+        if created:
+            self._wakeup.set()
+        return job, created
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.broker.get(job_id)
+
+    def start(self):
+        """Start the dispatcher thread (again in a forked child)"""
+        if self._pid == os.getpid() and self._dispatcher is not None and self._dispatcher.is_alive():
+            return
+        self._pid = os.getpid()
+        self._stopped.clear()
+        self._running = []
+        self._slots = threading.Semaphore(max(1, sum(self.limits.values())))
+        self._dispatcher = threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True)
+        self._dispatcher.start()
+        self.logger.info(f"Started the job dispatcher for {self.limits}")
+    
+    def stop(self, timeout: Optional[float] = None):
+        self._stopped.set()
+        self._wakeup.set()
+        for thread in [self._dispatcher, *self._running]:
+            if thread is not None:
+                thread.join(timeout)
+    
+    def _dispatch(self):
+        idle_wait = self.poll_interval
+        while not self._stopped.is_set():
+            # Wait for a free thread before claiming, so claimed jobs never wait for one
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+            self._wakeup.clear()
+            try:
+                job = self.broker.claim(self.limits, self.lease_seconds)
+            except Exception as e:
+                self.logger.error(f"Job claim failed: {str(e)}")
+                job = None
+            
+            if job is None:
+                self._slots.release()
+                # Back off while there is nothing to claim; a local submit or a finished job wakes us
+                if self._wakeup.wait(idle_wait):
+                    idle_wait = self.poll_interval
+                else:
+                    idle_wait = min(idle_wait * 2, self.max_poll_interval)
+                continue
+            
+            idle_wait = self.poll_interval
+            self._running = [thread for thread in self._running if thread.is_alive()]
+            thread = threading.Thread(target=self._run_in_slot, args=(job,), name=f"job-{job.job_type}", daemon=True)
+            self._running.append(thread)
+            thread.start()
+    
+    def _run_in_slot(self, job: Job):
+        try:
+            self._run(job)
+        except Exception as e:
+            self.logger.error(f"{job.job_type} job {job.job_id} could not be saved: {str(e)}")
+        finally:
+            self._slots.release()
+            # A job of a type at its limit may be runnable now
+            self._wakeup.set()
+    
+    def _heartbeat(self, job: Job, done: threading.Event):
+        while not done.wait(self.lease_seconds / 3):
+            job.lease_until = time.time() + self.lease_seconds
+            try:
+                self.broker.save(job)
+            except Exception as e:
+                self.logger.error(f"Job {job.job_id} heartbeat failed: {str(e)}")
+
+    def _run(self, job: Job):
+        self.logger.info(f"Running {job.job_type} job {job.job_id} (attempt {job.attempts}/{job.max_attempts})")
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), daemon=True)
+        heartbeat.start()
+        try:
+            job.result = self.handlers[job.job_type](job.payload)
+            job.status = 'succeeded'
+            job.error = None
+        except Exception as e:
+            job.error = str(e)
+            if job.attempts < job.max_attempts:
+                job.status = 'queued'
+                job.run_after = time.time() + self.retry_backoff * 2 ** (job.attempts - 1)
+                self.stats['retried'] += 1
+                self.logger.warning(f"{job.job_type} job {job.job_id} failed, retrying: {str(e)}")
+            else:
+                job.status = 'failed'
+                self.logger.error(f"{job.job_type} job {job.job_id} failed: {str(e)}")
+        finally:
+            done.set()
+            heartbeat.join()
+
+        if job.status != 'queued':
+            job.finished_at = time.time()
+            self.stats[job.status] += 1
+        job.lease_until = 0.0
+        self.broker.save(job)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'broker': type(self.broker).__name__,
+            'limits': dict(self.limits),
+            'dispatcher_alive': self._dispatcher is not None and self._dispatcher.is_alive(),
+            'running_jobs': sum(1 for thread in self._running if thread.is_alive())
+        }
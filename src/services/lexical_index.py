@@ -0,0 +1,184 @@
+"""
+Sparse lexical (BM25) index for hybrid search
+Maps terms of the indexed chunk texts to posting arrays of document rows and term frequencies
+"""
+import os
+import re
+import math
+import pickle
+import logging
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Dropped from documents and queries; they carry no signal and inflate the postings
+STOPWORDS = frozenset("""
+a an and are as at be but by can did do does for from had has have how i if in into is it its me my no not
+of on or our so than that the their them then there these they this to was we were what when where which
+who why will with would you your
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens without stopwords"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+class LexicalIndex:
+    """BM25 inverted index of term -> sorted rows and term frequencies.
+
+    Like MetadataIndex, rows are added in increasing order so posting arrays
+    stay sorted. Deleted rows stay indexed until compaction rebuilds the
+    index; searches exclude them.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.rows = 0
+        self.documents = 0
+        self.total_length = 0
+        self.posting_count = 0
+        self.lengths = array('I')
+        self.postings: Dict[str, array] = {}
+        self.frequencies: Dict[str, array] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def add(self, row: int, text: str):
+        """Index the text of one document row"""
+        tokens = tokenize(text or '')
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+
+        for term, count in counts.items():
+            if term not in self.postings:
+                self.postings[term] = array('q')
+                self.frequencies[term] = array('I')
+            self.postings[term].append(row)
+            self.frequencies[term].append(count)
+        self.posting_count += len(counts)
+
+        # Rows skipped by the caller (e.g. deleted ones during a rebuild) have length 0
+        if row >= len(self.lengths):
+            self.lengths.extend([0] * (row + 1 - len(self.lengths)))
+        self.lengths[row] = len(tokens)
+        if tokens:
+            self.documents += 1
+            self.total_length += len(tokens)
+        self.rows = max(self.rows, row + 1)
+
+    def add_document(self, row: int, doc: Dict):
+        """Index the title and content of a document record"""
+        self.add(row, f"{doc.get('title') or ''} {doc.get('content') or ''}")
+
+    def term_stats(self, query: str) -> Dict:
+        """Collection statistics BM25 uses for a query; summed over shards they score like one index"""
+        return {
+            'documents': self.documents,
+            'total_length': self.total_length,
+            'document_frequencies': {
+                term: len(self.postings[term]) for term in dict.fromkeys(tokenize(query)) if term in self.postings
+            }
+        }
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        allowed: Optional[np.ndarray] = None,
+        excluded: Optional[np.ndarray] = None,
+        stats: Optional[Dict] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Top-k rows by BM25 score for a query.
+
+        Returns rows, scores and the fraction of distinct query terms each row
+        contains, best first. allowed restricts the search to those rows and
+        excluded removes rows (both sorted). stats (as from term_stats)
+        replaces this index's document count, length and document frequencies
+        in the score, e.g. with the totals of all shards.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        terms_found = [term for term in terms if term in self.postings]
+        if not terms_found or k <= 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+
+        # Views on the posting arrays; callers hold the read lock, so they are not appended meanwhile
+        lengths = np.frombuffer(self.lengths, dtype=np.uint32)
+        documents = stats['documents'] if stats else self.documents
+        average_length = (stats['total_length'] if stats else self.total_length) / max(documents, 1)
+        frequencies = stats['document_frequencies'] if stats else {}
+        all_rows, all_scores = [], []
+        for term in terms_found:
+            rows = np.frombuffer(self.postings[term], dtype=np.int64)
+            tf = np.frombuffer(self.frequencies[term], dtype=np.uint32).astype(np.float32)
+            df = frequencies.get(term, len(rows))
+            idf = math.log(1 + (documents - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[rows] / average_length)
+            all_rows.append(rows)
+            all_scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+
+        rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+        # Each term lists a row at most once, so the count is the number of matched terms
+        coverage = (np.bincount(inverse) / len(terms)).astype(np.float32)
+
+        keep = np.ones(len(rows), dtype=bool)
+        if allowed is not None:
+            keep &= np.isin(rows, allowed, assume_unique=True)
+        if excluded is not None and len(excluded):
+            keep &= ~np.isin(rows, excluded, assume_unique=True)
+        rows, scores, coverage = rows[keep], scores[keep], coverage[keep]
+
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores, coverage = rows[top], scores[top], coverage[top]
+        order = np.argsort(-scores, kind='stable')
+        return rows[order], scores[order], coverage[order]
+
+    def get_stats(self) -> Dict:
+        return {
+            'terms': len(self.postings),
+            'documents': self.documents,
+            'postings': self.posting_count,
+            'average_length': self.total_length / max(self.documents, 1)
+        }
+
+    def save(self, path: str):
+        state = {
+            'rows': self.rows,
+            'documents': self.documents,
+            'total_length': self.total_length,
+            'posting_count': self.posting_count,
+            'lengths': self.lengths,
+            'postings': self.postings,
+            'frequencies': self.frequencies
+        }
+        with open(f"{path}.tmp", 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str, k1: float = 1.2, b: float = 0.75) -> 'LexicalIndex':
+        index = cls(k1, b)
+        if not os.path.exists(path):
+            return index
+
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            index.logger.error(f"Could not load lexical index, rebuilding it: {str(e)}")
+            return index
+
+        # Scores depend on k1 and b only at query time, so changed settings need no rebuild
+        index.rows = state['rows']
+        index.documents = state['documents']
+        index.total_length = state['total_length']
+        index.posting_count = state['posting_count']
+        index.lengths = state['lengths']
+        index.postings = state['postings']
+        index.frequencies = state['frequencies']
+        return index
@@ -0,0 +1,181 @@
+"""
+Metadata inverted index for filtered vector search
+Maps metadata field values to document rows so filters can be applied inside FAISS
+"""
+import os
+import pickle
+import logging
+from array import array
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+RANGE_OPERATORS = ('gt', 'gte', 'lt', 'lte')
+
+# Long free-text values are not useful as filter keys
+MAX_INDEXED_VALUE_LENGTH = 256
+
+# Saved indexes of another version are rebuilt from the documents
+FORMAT_VERSION = 2
+
+def _posting_key(value: Any) -> tuple:
+    """Posting list key of a value, by kind as well as value: True == 1 and 1 == 1.0 in Python"""
+    if isinstance(value, bool):
+        return ('bool', value)
+    if isinstance(value, (int, float)):
+        return ('number', value)
+    return (type(value).__name__, value)
+
+def _range_key(value: Any) -> Optional[float]:
+    """Sortable key for range filters: numbers, or ISO-8601 dates as timestamps"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    return None
+
+class MetadataIndex:
+    """Inverted index of metadata field -> value -> sorted row ids.
+
+    Rows are added in increasing order and each value is indexed once per
+    row, so every posting list stays sorted and unique without re-sorting.
+    Values are keyed by kind, so ``True`` and ``1`` are different values
+    (``1`` and ``1.0`` are the same number). Numeric and date fields additionally keep (key, row)
+    pairs for range filters such as ``{'published_date': {'gte': '2023-01-01'}}``.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.postings: Dict[str, Dict[tuple, array]] = defaultdict(dict)
+        self.range_values: Dict[str, array] = defaultdict(lambda: array('d'))
+        self.range_rows: Dict[str, array] = defaultdict(lambda: array('q'))
+        self._sorted_ranges: Dict[str, tuple] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def add(self, row: int, metadata: Dict):
+        """Index the metadata of one document row"""
+        for field, value in (metadata or {}).items():
+            values = value if isinstance(value, list) else [value]
+            seen = set()
+            for item in values:
+                if isinstance(item, (dict, list)) or item is None:
+                    continue
+                if isinstance(item, str) and len(item) > MAX_INDEXED_VALUE_LENGTH:
+                    continue
+                posting_key = _posting_key(item)
+                # A repeated value (tags: ["a", "a"]) would put the row in its posting list twice
+                if posting_key in seen:
+                    continue
+                seen.add(posting_key)
+
+                field_postings = self.postings[field]
+                if posting_key not in field_postings:
+                    field_postings[posting_key] = array('q')
+                field_postings[posting_key].append(row)
+
+                key = _range_key(item)
+                if key is not None:
+                    self.range_values[field].append(key)
+                    self.range_rows[field].append(row)
+                    self._sorted_ranges.pop(field, None)
+
+        self.rows = max(self.rows, row + 1)
+
+    def _equals(self, field: str, value: Any) -> np.ndarray:
+        values = value if isinstance(value, list) else [value]
+        field_postings = self.postings.get(field, {})
+        # Copies, so later appends can still resize the posting arrays
+        keys = [_posting_key(v) for v in values if not isinstance(v, (dict, list)) and v is not None]
+        matches = [np.frombuffer(field_postings[k], dtype=np.int64).copy() for k in keys if k in field_postings]
+        if not matches:
+            return np.empty(0, dtype=np.int64)
+        if len(matches) == 1:
+            return matches[0]
+        return np.unique(np.concatenate(matches))
+
+    def _range(self, field: str, bounds: Dict) -> np.ndarray:
+        if field not in self.range_values:
+            return np.empty(0, dtype=np.int64)
+
+        if field not in self._sorted_ranges:
+            keys = np.frombuffer(self.range_values[field], dtype=np.float64)
+            rows = np.frombuffer(self.range_rows[field], dtype=np.int64)
+            order = np.argsort(keys, kind='stable')
+            self._sorted_ranges[field] = (keys[order], rows[order])
+        keys, rows = self._sorted_ranges[field]
+
+        lo, hi = 0, len(keys)
+        for op, raw in bounds.items():
+            bound = _range_key(raw)
+            if op not in RANGE_OPERATORS or bound is None:
+                raise ValueError(f"Invalid range filter {field}.{op}={raw!r}")
+            if op == 'gt':
+                lo = max(lo, np.searchsorted(keys, bound, side='right'))
+            elif op == 'gte':
+                lo = max(lo, np.searchsorted(keys, bound, side='left'))
+            elif op == 'lt':
+                hi = min(hi, np.searchsorted(keys, bound, side='left'))
+            else:
+                hi = min(hi, np.searchsorted(keys, bound, side='right'))
+
+        if lo >= hi:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(rows[lo:hi])
+
+    def select(self, filters: Dict) -> np.ndarray:
+        """Sorted rows matching every filter.
+
+        A plain value means equality, a list means any of the values and a
+        dict of gt/gte/lt/lte bounds means a range.
+        """
+        result = None
+        for field, condition in filters.items():
+            if isinstance(condition, dict):
+                matches = self._range(field, condition)
+            else:
+                matches = self._equals(field, condition)
+
+            result = matches if result is None else np.intersect1d(result, matches, assume_unique=True)
+            if len(result) == 0:
+                break
+
+        if result is None:
+            return np.arange(self.rows, dtype=np.int64)
+        return result
+
+    def save(self, path: str):
+        state = {
+            'version': FORMAT_VERSION,
+            'rows': self.rows,
+            'postings': {field: dict(values) for field, values in self.postings.items()},
+            'range_values': dict(self.range_values),
+            'range_rows': dict(self.range_rows)
+        }
+        with open(f"{path}.tmp", 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> 'MetadataIndex':
+        index = cls()
+        if not os.path.exists(path):
+            return index
+
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('version') != FORMAT_VERSION:
+            index.logger.info("Metadata index is in an older format, rebuilding it")
+            return index
+
+        index.rows = state['rows']
+        index.postings.update(state['postings'])
+        index.range_values.update(state['range_values'])
+        index.range_rows.update(state['range_rows'])
+        return index
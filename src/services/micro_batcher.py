@@ -0,0 +1,96 @@
+"""
+Micro-batching scheduler
+Coalesces concurrent single-item calls into batches processed on one worker thread
+"""
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+class MicroBatcher:
+    """Collects items submitted from many threads and processes them in batches.
+
+    A batch is dispatched when it reaches max_batch_size items or
+    max_wait_ms after its first item arrived, whichever comes first.
+    ``process`` receives the list of items and must return one result per
+    item, in order; an exception fails every call in the batch.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 3.0,
+        name: str = 'micro-batcher'
+    ):
+        self.process = process
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.name = name
+        self.logger = logging.getLogger(__name__)
+
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.stats = {'batches': 0, 'items': 0, 'max_batch': 0}
+
+    def _ensure_started(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Process one item as part of the next batch and return its result"""
+        return self.submit_async(item).result(timeout)
+
+    def submit_async(self, item: Any) -> Future:
+        future = Future()
+        self._ensure_started()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self) -> List:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.process(items)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                self.logger.error(f"{self.name} batch of {len(batch)} failed: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+            self.stats['batches'] += 1
+            self.stats['items'] += len(batch)
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+
+    def get_stats(self) -> Dict:
+        batches = self.stats['batches']
+        return {
+            **self.stats,
+            'average_batch': self.stats['items'] / batches if batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000
+        }
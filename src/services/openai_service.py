@@ -5,12 +5,16 @@ Handles content generation and prompt engineering
 import openai
 from openai import OpenAI
 import logging
+import threading
 import time
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Generator, List, Optional, Tuple
 import json
 import re
 from dataclasses import dataclass
 
+from .rate_limiter import RateLimiter
+
 @dataclass
 class GenerationResult:
     """Content generation result"""
@@ -96,12 +100,26 @@ class OpenAIService:
         if not self.api_key:
             raise ValueError("OpenAI API key is required")
         
+        # Every call from this process waits for its share of the requests/min and tokens/min quotas
+        self.rate_limiter = RateLimiter(
+            config.get('OPENAI_REQUESTS_PER_MINUTE', 0),
+            config.get('OPENAI_TOKENS_PER_MINUTE', 0),
+            config.get('OPENAI_RATE_LIMIT_BURST_SECONDS', 10)
+        )
+        
         # Initialize OpenAI client with timeout settings
         self.client = OpenAI(
             api_key=self.api_key,
+            base_url=config.get('OPENAI_BASE_URL'),  # None uses api.openai.com
             timeout=120.0,  # Increase timeout to 2 minutes
             max_retries=3   # Add retry logic
         )
+        # With rate limits, generate_content retries through the limiter itself, so its calls skip the SDK's retries
+        self.limited_client = self.client.with_options(max_retries=0) if self.rate_limiter.enabled else self.client
+        # batch_generate runs at most this many calls at once, across all batches.
+        # The pool starts threads on first use, so a preloaded app forks before any exist.
+        self.batch_concurrency = max(1, config.get('OPENAI_BATCH_CONCURRENCY', 8))
+        self.batch_pool = ThreadPoolExecutor(max_workers=self.batch_concurrency, thread_name_prefix='openai-batch')
         
         # Initialize prompt templates
         self.templates = PromptTemplates()
@@ -112,8 +130,10 @@ class OpenAIService:
             'total_tokens': 0,
             'successful_requests': 0,
             'failed_requests': 0,
+            'cancelled_requests': 0,
             'average_response_time': 0.0
         }
+        self._stats_lock = threading.Lock()
     
     def generate_content(
         self,
@@ -133,12 +153,17 @@ class OpenAIService:
         # Retry logic with exponential backoff
         max_retries = 3
         base_delay = 1
+        # With rate limits, a 429 is retried once the limiter admits the call again, without using up an attempt
+        max_rate_limit_retries = 10
         
-        for attempt in range(max_retries):
+        attempt = 0
+        rate_limited = 0
+        while True:
+            reserved = self._reserve_quota(prompt, max_tokens)
             try:
-                self.logger.debug(f"Generating content with model: {model} (attempt {attempt + 1})")
+                self.logger.debug(f"Generating content with model: {model} (attempt {attempt + rate_limited + 1})")
                 
-                response = self.client.chat.completions.create(
+                response = self.limited_client.chat.completions.create(
                     model=model,
                     messages=[
                         {"role": "user", "content": prompt}
@@ -153,6 +178,7 @@ class OpenAIService:
                 content = response.choices[0].message.content
                 tokens_used = response.usage.total_tokens
                 finish_reason = response.choices[0].finish_reason
+                self.rate_limiter.settle(reserved, tokens_used)
                 
                 # Update statistics
                 self._update_stats(response_time, tokens_used, True)
@@ -169,7 +195,17 @@ class OpenAIService:
                 return result
                 
             except Exception as e:
-                self.logger.warning(f"Generation attempt {attempt + 1} failed: {str(e)}")
+                self.rate_limiter.settle(reserved, 0)
+                self.logger.warning(f"Generation attempt {attempt + rate_limited + 1} failed: {str(e)}")
+                
+                if (isinstance(e, openai.RateLimitError) and self.rate_limiter.enabled
+                        and rate_limited < max_rate_limit_retries):
+                    # Hold back every call through the limiter, not just this one, for as long as the API asks
+                    rate_limited += 1
+                    delay = self._retry_after(e, base_delay)
+                    self.logger.info(f"Rate limited; pausing requests for {delay:.2f} seconds...")
+                    self.rate_limiter.pause(delay)
+                    continue
                 
                 if attempt == max_retries - 1:  # Last attempt
                     response_time = time.time() - start_time
@@ -181,6 +217,7 @@ class OpenAIService:
                 delay = base_delay * (2 ** attempt)
                 self.logger.info(f"Retrying in {delay} seconds...")
                 time.sleep(delay)
+                attempt += 1
     
     def generate_with_context(
         self,
@@ -191,7 +228,14 @@ class OpenAIService:
         temperature: Optional[float] = None
     ) -> GenerationResult:
         """Generate content with context using predefined templates"""
-        
+        return self.generate_content(
+            prompt=self.format_prompt(query, context, template_type),
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+    
+    def format_prompt(self, query: str, context: str, template_type: str = 'rag') -> str:
+        """Prompt for a query and its context in one of the predefined templates"""
         # Select appropriate template
         if template_type == 'rag':
             template = self.templates.RAG_CONTENT_GENERATION
@@ -208,15 +252,8 @@ class OpenAIService:
         
         # Format prompt with context and query
         if template_type == 'summary':
-            formatted_prompt = template.format(content=context)
-        else:
-            formatted_prompt = template.format(context=context, query=query)
-        
-        return self.generate_content(
-            prompt=formatted_prompt,
-            max_tokens=max_tokens,
-            temperature=temperature
-        )
+            return template.format(content=context)
+        return template.format(context=context, query=query)
     
     def generate_streaming(
         self,
@@ -224,12 +261,23 @@ class OpenAIService:
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
         model: Optional[str] = None
-    ):
-        """Generate content with streaming response"""
+    ) -> Generator[str, None, GenerationResult]:
+        """Generate content with streaming response.
+        
+        Yields the content deltas as they arrive; the generator's return value
+        (``result = yield from ...``) is the GenerationResult of the whole
+        completion. Closing the generator early closes the upstream stream.
+        """
+        start_time = time.time()
         max_tokens = max_tokens or self.max_tokens
         temperature = temperature or self.temperature
         model = model or self.model
         
+        parts = []
+        tokens_used = None
+        finish_reason = None
+        outcome = 'cancelled'
+        reserved = self._reserve_quota(prompt, max_tokens)
         try:
             self.logger.debug(f"Starting streaming generation with model: {model}")
             
@@ -241,16 +289,48 @@ class OpenAIService:
                 max_tokens=max_tokens,
                 temperature=temperature,
                 stream=True,
+                # The last chunk then carries the token usage, with no choices
+                stream_options={"include_usage": True},
                 timeout=self.timeout
             )
             
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+            try:
+                for chunk in stream:
+                    if chunk.usage is not None:
+                        tokens_used = chunk.usage.total_tokens
+                    if not chunk.choices:
+                        continue
+                    if chunk.choices[0].finish_reason is not None:
+                        finish_reason = chunk.choices[0].finish_reason
+                    if chunk.choices[0].delta.content is not None:
+                        parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+            outcome = 'completed'
                     
         except Exception as e:
+            outcome = 'failed'
             self.logger.error(f"Streaming generation failed: {str(e)}")
             raise
+        
+        finally:
+            # Also runs when the consumer closes the generator early (GeneratorExit), e.g. a client disconnect
+            content = ''.join(parts)
+            if tokens_used is None and (parts or outcome == 'completed'):
+                tokens_used = self.estimate_tokens(prompt) + self.estimate_tokens(content)
+            tokens_used = tokens_used or 0
+            self.rate_limiter.settle(reserved, tokens_used)
+            response_time = time.time() - start_time
+            self._update_stats(response_time, tokens_used, outcome == 'completed', cancelled=outcome == 'cancelled')
+        
+        return GenerationResult(
+            content=content,
+            tokens_used=tokens_used,
+            response_time=response_time,
+            model=model,
+            finish_reason=finish_reason
+        )
     
     def batch_generate(
         self,
@@ -259,35 +339,57 @@ class OpenAIService:
         temperature: Optional[float] = None,
         model: Optional[str] = None
     ) -> List[GenerationResult]:
-        """Generate content for multiple prompts"""
-        results = []
+        """Generate content for multiple prompts.
         
-        for i, prompt in enumerate(prompts):
+        Up to OPENAI_BATCH_CONCURRENCY prompts are in flight at once, each
+        waiting for its share of the rate limits. Results are in prompt order;
+        a prompt that fails gets a placeholder with finish_reason "error".
+        """
+        def generate(item: Tuple[int, str]) -> GenerationResult:
+            i, prompt = item
             try:
                 self.logger.debug(f"Processing batch item {i+1}/{len(prompts)}")
-                result = self.generate_content(
+                return self.generate_content(
                     prompt=prompt,
                     max_tokens=max_tokens,
                     temperature=temperature,
                     model=model
                 )
-                results.append(result)
-                
-                # Add small delay to avoid rate limiting
-                time.sleep(0.1)
-                
             except Exception as e:
                 self.logger.error(f"Batch generation failed for item {i+1}: {str(e)}")
                 # Add placeholder result for failed generation
-                results.append(GenerationResult(
+                return GenerationResult(
                     content=f"Generation failed: {str(e)}",
                     tokens_used=0,
                     response_time=0.0,
                     model=model or self.model,
                     finish_reason="error"
-                ))
+                )
         
-        return results
+        return list(self.batch_pool.map(generate, enumerate(prompts)))
+    
+    @staticmethod
+    def _retry_after(error: openai.APIStatusError, default: float) -> float:
+        """Seconds the API asked to wait before retrying, from the retry-after-ms or retry-after header"""
+        headers = error.response.headers
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000
+            if headers.get('retry-after'):
+                return float(headers['retry-after'])
+        except ValueError:
+            pass
+        return default
+    
+    def _reserve_quota(self, prompt: str, max_tokens: int) -> int:
+        """Wait for the rate limits to admit a request; returns the tokens reserved for it"""
+        if not self.rate_limiter.enabled:
+            return 0
+        reserved = self.estimate_tokens(prompt) + max_tokens
+        waited = self.rate_limiter.acquire(reserved)
+        if waited > 0.001:
+            self.logger.debug(f"Waited {waited:.2f}s for the OpenAI rate limits")
+        return reserved
     
     def improve_content(self, content: str, instructions: str) -> GenerationResult:
         """Improve existing content based on instructions"""
@@ -365,26 +467,33 @@ Analysis:
                 'suggestions': result.content
             }
     
-    def _update_stats(self, response_time: float, tokens: int, success: bool):
-        """Update usage statistics"""
-        self.usage_stats['total_requests'] += 1
-        self.usage_stats['total_tokens'] += tokens
-        
-        if success:
-            self.usage_stats['successful_requests'] += 1
-        else:
-            self.usage_stats['failed_requests'] += 1
-        
-        # Update average response time
-        total_requests = self.usage_stats['total_requests']
-        current_avg = self.usage_stats['average_response_time']
-        self.usage_stats['average_response_time'] = (
-            (current_avg * (total_requests - 1) + response_time) / total_requests
-        )
+    def _update_stats(self, response_time: float, tokens: int, success: bool, cancelled: bool = False):
+        """Update usage statistics; cancelled requests were stopped by the caller, e.g. a closed stream"""
+        # Batch calls finish on several threads at once
+        with self._stats_lock:
+            self.usage_stats['total_requests'] += 1
+            self.usage_stats['total_tokens'] += tokens
+            
+            if success:
+                self.usage_stats['successful_requests'] += 1
+            elif cancelled:
+                self.usage_stats['cancelled_requests'] += 1
+            else:
+                self.usage_stats['failed_requests'] += 1
+            
+            # Update average response time
+            total_requests = self.usage_stats['total_requests']
+            current_avg = self.usage_stats['average_response_time']
+            self.usage_stats['average_response_time'] = (
+                (current_avg * (total_requests - 1) + response_time) / total_requests
+            )
     
     def get_usage_stats(self) -> Dict:
         """Get usage statistics"""
-        return self.usage_stats.copy()
+        stats = self.usage_stats.copy()
+        if self.rate_limiter.enabled:
+            stats['rate_limits'] = self.rate_limiter.get_stats()
+        return stats
     
     def reset_stats(self):
         """Reset usage statistics"""
@@ -393,6 +502,7 @@ Analysis:
             'total_tokens': 0,
             'successful_requests': 0,
             'failed_requests': 0,
+            'cancelled_requests': 0,
             'average_response_time': 0.0
         }
     
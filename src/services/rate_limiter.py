@@ -0,0 +1,117 @@
+"""
+Token-bucket rate limiting
+Keeps OpenAI calls from all threads of a process within requests-per-minute and tokens-per-minute quotas
+"""
+import time
+import threading
+from typing import Dict, Optional
+
+class TokenBucket:
+    """Holds up to ``capacity`` units and refills at ``rate_per_minute``.
+
+    ``acquire`` blocks until the units are available and takes them. A
+    request larger than the capacity waits for a full bucket and leaves it in
+    debt, which later callers wait out, so it is delayed rather than
+    rejected. ``adjust`` settles an estimate afterwards: a positive
+    correction refunds units, a negative one takes more.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition(threading.Lock())
+        self.stats = {'acquired': 0.0, 'waits': 0, 'wait_time': 0.0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Take amount units, waiting as long as needed; returns the time waited"""
+        needed = min(float(amount), self.capacity)
+        start = time.monotonic()
+        with self._cond:
+            self._refill()
+            while self._level < needed:
+                self._cond.wait((needed - self._level) / self.rate)
+                self._refill()
+            self._level -= amount
+
+            waited = time.monotonic() - start
+            self.stats['acquired'] += amount
+            if waited > 0.001:
+                self.stats['waits'] += 1
+                self.stats['wait_time'] += waited
+        return waited
+
+    def adjust(self, amount: float):
+        """Return amount units (or take them, if negative) without waiting"""
+        with self._cond:
+            self._refill()
+            self._level = min(self.capacity, self._level + amount)
+            self.stats['acquired'] -= amount
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Empty the bucket so that the next unit is available in seconds at the earliest"""
+        with self._cond:
+            self._refill()
+            self._level = min(self._level, 1.0 - seconds * self.rate)
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            self._refill()
+            return {**self.stats, 'level': self._level, 'capacity': self.capacity}
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute quotas as two buckets.
+
+    A limit of 0 disables that bucket. Each bucket holds burst_seconds of
+    its quota, since providers enforce per-minute limits over shorter
+    windows too. Callers reserve the tokens a request may use (prompt
+    estimate plus max_tokens) before sending it and settle the difference
+    once the response reports its usage.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0, burst_seconds: float = 10):
+        self.requests = self._bucket(requests_per_minute, burst_seconds)
+        self.tokens = self._bucket(tokens_per_minute, burst_seconds)
+
+    @staticmethod
+    def _bucket(rate_per_minute: float, burst_seconds: float) -> Optional[TokenBucket]:
+        if rate_per_minute <= 0:
+            return None
+        return TokenBucket(rate_per_minute, max(1.0, rate_per_minute * burst_seconds / 60))
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def acquire(self, tokens: int) -> float:
+        """Wait for one request and tokens; returns the time waited"""
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None:
+            waited += self.tokens.acquire(tokens)
+        return waited
+
+    def settle(self, reserved: int, used: int):
+        """Correct a reservation of reserved tokens to what the request used"""
+        if self.tokens is not None and used != reserved:
+            self.tokens.adjust(reserved - used)
+
+    def pause(self, seconds: float):
+        """Hold every caller back for seconds, e.g. after the provider answered 429 with retry-after"""
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.pause(seconds)
+
+    def get_stats(self) -> Dict:
+        return {
+            'requests': self.requests.get_stats() if self.requests is not None else None,
+            'tokens': self.tokens.get_stats() if self.tokens is not None else None
+        }
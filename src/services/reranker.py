@@ -0,0 +1,175 @@
+"""
+Cross-encoder reranking of search results
+Scores (query, chunk) pairs with a small CPU cross-encoder in batches, within a latency budget, with cached scores
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+
+from .embedding_cache import text_hash
+from .vector_service import SearchResult
+
+class CrossEncoderReranker:
+    """Reorders search candidates by cross-encoder relevance.
+
+    Candidates are scored in batches of ``batch_size`` until all are scored
+    or the next batch would exceed ``budget_ms``; unscored candidates keep
+    their retrieval order after the scored ones. Scores are cached per
+    (query, chunk text) in a size-bounded LRU and, optionally, in Redis.
+    The model is loaded on a background thread on first use, and requests
+    arriving before it is ready are not reranked rather than wait for it.
+    """
+
+    def __init__(self, config: Dict, cache_service=None):
+        self.model_name = config.get('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+        self.max_length = config.get('RERANK_MAX_LENGTH', 256)
+        self.batch_size = max(1, int(config.get('RERANK_BATCH_SIZE', 16)))
+        self.budget_ms = float(config.get('RERANK_BUDGET_MS', 150))
+        self.cache_size = config.get('RERANK_CACHE_SIZE', 10000)
+        self.cache_ttl = config.get('RERANK_CACHE_TTL', 86400)
+        self.cache_service = cache_service if config.get('RERANK_CACHE_REDIS', False) else None
+        self.logger = logging.getLogger(__name__)
+
+        self._model = None
+        self._load_thread = None
+        self._load_lock = threading.Lock()
+        self.model_error = None
+        self._scores: 'OrderedDict[bytes, float]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.stats = {'requests': 0, 'pairs_scored': 0, 'cache_hits': 0, 'truncated': 0, 'skipped_loading': 0}
+
+    def _load(self):
+        try:
+            from sentence_transformers import CrossEncoder
+
+            start = time.time()
+            self._model = CrossEncoder(self.model_name, max_length=self.max_length, device='cpu')
+            self.logger.info(f"Loaded reranker {self.model_name} in {time.time() - start:.1f}s")
+        except Exception as e:
+            self.model_error = str(e)
+            self.logger.error(f"Could not load reranker {self.model_name}: {str(e)}")
+
+    def warm_up(self):
+        """Start loading the model in the background (again in a forked child)"""
+        with self._load_lock:
+            if self._model is None and self.model_error is None and (
+                    self._load_thread is None or not self._load_thread.is_alive()):
+                self._load_thread = threading.Thread(target=self._load, name='reranker-load', daemon=True)
+                self._load_thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    def _key(self, query: str, text: str) -> bytes:
+        return text_hash(f"{self.model_name}\x00{query}\x00{text}")
+
+    def _cached(self, keys: List[bytes]) -> Dict[bytes, float]:
+        found = {}
+        with self._cache_lock:
+            for key in keys:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    found[key] = self._scores[key]
+
+        missing = [key for key in keys if key not in found]
+        if missing and self.cache_service is not None and self.cache_service.redis_available:
+            cached = self.cache_service.get_multiple([key.hex() for key in missing], prefix_type='rerank')
+            for key in missing:
+                if key.hex() in cached:
+                    found[key] = cached[key.hex()]
+                    self._remember({key: found[key]}, publish=False)
+        return found
+
+    def _remember(self, scores: Dict[bytes, float], publish: bool = True):
+        with self._cache_lock:
+            for key, score in scores.items():
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+        if publish and scores and self.cache_service is not None and self.cache_service.redis_available:
+            self.cache_service.set_multiple(
+                {key.hex(): score for key, score in scores.items()}, self.cache_ttl, prefix_type='rerank'
+            )
+
+    def rerank(self, query: str, results: List[SearchResult],
+               top_k: Optional[int] = None) -> Tuple[List[SearchResult], Dict]:
+        """Results ordered by cross-encoder score (as ``rerank_score``), and stats of this stage"""
+        start = time.perf_counter()
+        top_k = top_k or len(results)
+        report = {
+            'candidates': len(results),
+            'scored': 0,
+            'cache_hits': 0,
+            'batches': 0,
+            'truncated': False,
+            'model_ready': self.ready
+        }
+        self.stats['requests'] += 1
+
+        if not results:
+            report['time_ms'] = 0.0
+            return [], report
+        if not self.ready:
+            # Never block a request on the model load
+            self.warm_up()
+            self.stats['skipped_loading'] += 1
+            report['truncated'] = True
+            report['time_ms'] = (time.perf_counter() - start) * 1000
+            return results[:top_k], report
+
+        keys = [self._key(query, result.content) for result in results]
+        scores = self._cached(keys)
+        report['cache_hits'] = sum(1 for key in keys if key in scores)
+        self.stats['cache_hits'] += report['cache_hits']
+
+        pending = [i for i, key in enumerate(keys) if key not in scores]
+        batch_ms = 0.0
+        for offset in range(0, len(pending), self.batch_size):
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if report['batches'] and elapsed_ms + batch_ms > self.budget_ms:
+                report['truncated'] = True
+                self.stats['truncated'] += 1
+                break
+
+            batch = pending[offset:offset + self.batch_size]
+            batch_start = time.perf_counter()
+            predicted = self._model.predict(
+                [(query, results[i].content) for i in batch], batch_size=len(batch), show_progress_bar=False
+            )
+            batch_ms = (time.perf_counter() - batch_start) * 1000
+            new_scores = {keys[i]: float(score) for i, score in zip(batch, predicted)}
+            scores.update(new_scores)
+            self._remember(new_scores)
+            report['batches'] += 1
+            report['scored'] += len(batch)
+        self.stats['pairs_scored'] += report['scored']
+
+        # Scored candidates by score, then the rest in retrieval order
+        scored = sorted(
+            (i for i, key in enumerate(keys) if key in scores), key=lambda i: scores[keys[i]], reverse=True
+        )
+        unscored = [i for i, key in enumerate(keys) if key not in scores]
+        order = (scored + unscored)[:top_k]
+        reranked = [replace(results[i], rerank_score=scores.get(keys[i])) for i in order]
+
+        # How much reranking changed the top_k compared with retrieval
+        report['reordered'] = sum(1 for position, i in enumerate(order) if position != i)
+        report['top_score'] = scores.get(keys[order[0]])
+        report['time_ms'] = (time.perf_counter() - start) * 1000
+        return reranked, report
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'model': self.model_name,
+            'model_ready': self.ready,
+            'model_error': self.model_error,
+            'cache_size': len(self._scores),
+            'budget_ms': self.budget_ms,
+            'batch_size': self.batch_size
+        }
@@ -0,0 +1,61 @@
+"""
+Readers-writer lock
+Lets many searches run concurrently while index swaps and in-place updates get exclusive access
+"""
+import threading
+from contextlib import contextmanager
+
+class RWLock:
+    """Many readers or one writer; a waiting writer blocks new readers.
+
+    The writing thread may re-enter ``write()`` and ``read()``. Readers must
+    not take ``read()`` again while holding it, since a writer queued in
+    between would wait on them forever.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        if self._writer == threading.get_ident():
+            yield
+            return
+
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+            else:
+                self._waiting_writers += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._waiting_writers -= 1
+                self._writer = me
+                self._writer_depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer_depth -= 1
+                if not self._writer_depth:
+                    self._writer = None
+                    self._cond.notify_all()
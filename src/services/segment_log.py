@@ -0,0 +1,118 @@
+"""
+Append-only segment log for the vector database
+Each ingest batch's vectors are written to their own segment and committed through a write-ahead log
+"""
+import os
+import json
+import logging
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+class SegmentLog:
+    """Vector segments and deletes appended after the last full index snapshot.
+
+    A segment is one ``seg_<seq>.npy`` file with the float32 vectors of an
+    ingest batch; the matching documents live in the DocumentStore at rows
+    ``start_row:start_row + rows``. Deletes are WAL records listing tombstoned
+    rows. Nothing becomes visible until its record is appended to ``wal.log``,
+    so a crash half-way through a write leaves the previous state intact.
+    """
+
+    def __init__(self, base_path: str):
+        self.directory = f"{base_path}_segments"
+        self.wal_file = os.path.join(self.directory, 'wal.log')
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _segment_file(self, seq: int) -> str:
+        return os.path.join(self.directory, f"seg_{seq:08d}.npy")
+
+    def _read_wal(self) -> List[Dict]:
+        """Committed WAL records; a torn last line is ignored"""
+        if not os.path.exists(self.wal_file):
+            return []
+
+        records = []
+        with open(self.wal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    self.logger.warning(f"Ignoring torn WAL record in {self.wal_file}")
+                    break
+        return records
+
+    def segment_count(self) -> int:
+        return len(self._read_wal())
+
+    def append(self, start_row: int, vectors: np.ndarray) -> int:
+        """Write one segment and commit it; returns the segment sequence number"""
+        records = self._read_wal()
+        seq = records[-1]['seq'] + 1 if records else 1
+
+        with open(self._segment_file(seq), 'wb') as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype='float32'))
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Commit point
+        self._commit({'seq': seq, 'op': 'add', 'start_row': start_row, 'rows': len(vectors)})
+        return seq
+
+    def append_delete(self, rows: List[int]) -> int:
+        """Commit a tombstone record for the given rows"""
+        records = self._read_wal()
+        seq = records[-1]['seq'] + 1 if records else 1
+        self._commit({'seq': seq, 'op': 'delete', 'deleted': [int(row) for row in rows]})
+        return seq
+
+    def _commit(self, record: Dict):
+        with open(self.wal_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self, start_row: int) -> Iterator[Dict]:
+        """Yield committed records that continue a snapshot holding start_row rows.
+
+        Add records carry 'start_row' and 'vectors', delete records carry
+        'deleted'. Segments already folded into the snapshot (a crash between
+        writing the snapshot and resetting the log) are skipped; replaying a
+        delete twice is harmless.
+        """
+        expected = start_row
+        for record in self._read_wal():
+            if record.get('op') == 'delete':
+                yield record
+                continue
+
+            if record['start_row'] + record['rows'] <= start_row:
+                continue
+            if record['start_row'] != expected:
+                self.logger.error(
+                    f"Segment {record['seq']} starts at row {record['start_row']}, expected {expected}; "
+                    "ignoring the rest of the log"
+                )
+                return
+
+            try:
+                vectors = np.load(self._segment_file(record['seq']))
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Unreadable segment {record['seq']}: {str(e)}")
+                return
+
+            if len(vectors) != record['rows']:
+                self.logger.error(f"Segment {record['seq']} is incomplete; ignoring the rest of the log")
+                return
+
+            expected += record['rows']
+            yield {**record, 'op': 'add', 'vectors': vectors}
+
+    def reset(self):
+        """Drop all segments after they have been folded into a snapshot"""
+        for name in os.listdir(self.directory):
+            if name.startswith('seg_'):
+                os.remove(os.path.join(self.directory, name))
+        if os.path.exists(self.wal_file):
+            os.remove(self.wal_file)
@@ -0,0 +1,141 @@
+"""
+Semantic response cache
+Finds a past generation whose query means the same as a new one, by cosine similarity of their embeddings
+"""
+import time
+import threading
+from collections import deque
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+class SemanticCache:
+    """Small flat inner-product index of the query embeddings of past generations.
+
+    Each entry holds a normalized query embedding, the query, the cache key
+    its result was stored under and a partition (the generation parameters
+    that must match, such as template and temperature). ``lookup`` returns
+    the entry of the most similar query in the same partition if its cosine
+    similarity is at least ``threshold``; the result itself stays in the
+    response cache, so it expires with it. When full, the least recently
+    matched entry is replaced.
+
+    Entries live in the process. ``record_audit`` counts how often a sampled
+    hit turned out to answer differently from a fresh generation.
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 10000):
+        self.threshold = threshold
+        self.max_entries = max(1, int(max_entries))
+
+        # Allocated on the first add, when the embedding size is known
+        self._vectors: Optional[np.ndarray] = None
+        self._partitions = np.full(self.max_entries, -1, dtype='int64')
+        self._last_used = np.zeros(self.max_entries, dtype='float64')
+        self._entries: Dict[int, Tuple[str, str]] = {}
+        self._slots_by_key: Dict[str, int] = {}
+        self._partition_ids: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+        self.stats = {'lookups': 0, 'hits': 0, 'stale_hits': 0, 'audits': 0, 'false_hits': 0}
+        self.recent_false_hits = deque(maxlen=20)
+
+    def _partition(self, partition: Hashable) -> int:
+        return self._partition_ids.setdefault(partition, len(self._partition_ids))
+
+    def lookup(self, vector: np.ndarray, partition: Hashable) -> Optional[Dict]:
+        """Closest cached query at or above the threshold, as {'query', 'cache_key', 'similarity'}"""
+        vector = np.asarray(vector, dtype='float32').reshape(-1)
+        with self._lock:
+            self.stats['lookups'] += 1
+            partition_id = self._partition_ids.get(partition)
+            if partition_id is None or not self._entries:
+                return None
+
+            candidates = np.flatnonzero(self._partitions == partition_id)
+            if not len(candidates):
+                return None
+            scores = self._vectors[candidates] @ vector
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < self.threshold:
+                return None
+
+            slot = int(candidates[best])
+            self._last_used[slot] = time.monotonic()
+            self.stats['hits'] += 1
+            query, cache_key = self._entries[slot]
+            return {'query': query, 'cache_key': cache_key, 'similarity': similarity}
+
+    def add(self, vector: np.ndarray, partition: Hashable, query: str, cache_key: str):
+        """Remember that the result for query is cached under cache_key"""
+        vector = np.asarray(vector, dtype='float32').reshape(-1)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype='float32')
+            slot = self._slots_by_key.get(cache_key)
+            if slot is None:
+                if len(self._entries) < self.max_entries:
+                    slot = len(self._entries)
+                else:
+                    slot = int(np.argmin(self._last_used))
+                    del self._slots_by_key[self._entries[slot][1]]
+
+            self._vectors[slot] = vector
+            self._partitions[slot] = self._partition(partition)
+            self._last_used[slot] = time.monotonic()
+            self._entries[slot] = (query, cache_key)
+            self._slots_by_key[cache_key] = slot
+
+    def discard(self, cache_key: str, stale: bool = False):
+        """Forget the entry for cache_key; stale when its result was no longer in the response cache"""
+        with self._lock:
+            slot = self._slots_by_key.pop(cache_key, None)
+            if slot is None:
+                return
+            if stale:
+                self.stats['stale_hits'] += 1
+
+            # Keep entries packed in slots [0, n) by moving the last one into the hole
+            last = len(self._entries) - 1
+            if slot != last:
+                self._vectors[slot] = self._vectors[last]
+                self._partitions[slot] = self._partitions[last]
+                self._last_used[slot] = self._last_used[last]
+                self._entries[slot] = self._entries[last]
+                self._slots_by_key[self._entries[slot][1]] = slot
+            del self._entries[last]
+            self._partitions[last] = -1
+            self._last_used[last] = 0.0
+
+    def record_audit(self, query: str, cached_query: str, similarity: float, answer_similarity: float,
+                     false_hit: bool):
+        """Outcome of comparing a hit's cached answer with a fresh one"""
+        with self._lock:
+            self.stats['audits'] += 1
+            if false_hit:
+                self.stats['false_hits'] += 1
+                self.recent_false_hits.append({
+                    'query': query,
+                    'cached_query': cached_query,
+                    'query_similarity': similarity,
+                    'answer_similarity': answer_similarity,
+                    'timestamp': time.time()
+                })
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                # A stale hit found an entry whose result had expired, so it was served as a miss
+                'hit_rate': (stats['hits'] - stats['stale_hits']) / stats['lookups'] if stats['lookups'] else 0.0,
+                'false_hit_rate': stats['false_hits'] / stats['audits'] if stats['audits'] else 0.0,
+                'recent_false_hits': list(self.recent_false_hits)
+            })
+            return stats
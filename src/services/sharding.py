@@ -0,0 +1,670 @@
+"""
+Sharded vector index with scatter-gather search
+Hash-partitions documents over shard processes, each serving its own VectorService, and merges their top-k results
+"""
+import os
+import json
+import time
+import heapq
+import hashlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from itertools import chain
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .file_watcher import FileWatcher
+from .vector_service import SEARCH_MODES, SearchResult, document_id, fuse_scores
+
+# VectorService methods a coordinator may call on a shard
+SERVICE_OPS = frozenset({
+    'search_many', 'add_documents', 'delete_document', 'delete_documents', 'get_document_by_id',
+    'get_stats', 'readiness', 'rebuild_index', 'compact', 'prepare_documents', 'write_documents',
+    'import_records', 'warm_up', 'refresh', 'embed_query', 'search_candidates', 'lexical_stats'
+})
+
+# Default per-call timeout; None waits as long as the shard takes (ingests, rebuilds, rebalancing)
+_SEARCH_TIMEOUT = object()
+
+class ShardError(RuntimeError):
+    """A shard could not be reached or failed to answer"""
+
+def shard_for(key: str, shards: List[str]) -> str:
+    """Owner of a key by rendezvous (highest random weight) hashing.
+
+    Every shard gets a hash of (shard, key) and the largest wins, so adding a
+    shard only moves the keys it now wins and removing one only moves its own.
+    """
+    return max(shards, key=lambda shard: hashlib.blake2b(f"{shard}\x00{key}".encode(), digest_size=8).digest())
+
+def routing_key(doc: Dict) -> str:
+    """Key that places a document: chunks go with their parent, so a document lives on one shard"""
+    return (doc.get('metadata') or {}).get('parent_doc_id') or document_id(doc)
+
+def parse_shards(value) -> List[str]:
+    """Shard addresses from 'host:port,host:port' (or a list)"""
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value or '').split(',') if item.strip()]
+
+def shard_authkey(config: Dict) -> bytes:
+    """VECTOR_SHARD_AUTHKEY as bytes; there is no default, since shards unpickle what authenticated peers send"""
+    authkey = str(config.get('VECTOR_SHARD_AUTHKEY') or '').strip()
+    if not authkey:
+        raise ValueError("VECTOR_SHARD_AUTHKEY must be set to a shared secret to use shards (VECTOR_SHARDS)")
+    return authkey.encode()
+
+def _address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+def _sum_term_stats(stats: List[Dict]) -> Dict:
+    """BM25 collection statistics of all shards from each shard's LexicalIndex.term_stats"""
+    frequencies: Dict[str, int] = {}
+    for shard in stats:
+        for term, count in shard['document_frequencies'].items():
+            frequencies[term] = frequencies.get(term, 0) + count
+    return {
+        'documents': sum(shard['documents'] for shard in stats),
+        'total_length': sum(shard['total_length'] for shard in stats),
+        'document_frequencies': frequencies
+    }
+
+def _merge_ranking(rankings: List[List[Tuple[str, float]]], depth: int) -> List[Tuple[str, float]]:
+    """Top depth (id, score) pairs of per-shard rankings, each id once"""
+    best: Dict[str, float] = {}
+    for key, score in chain.from_iterable(rankings):
+        if key not in best or score > best[key]:
+            best[key] = score
+    return heapq.nlargest(depth, best.items(), key=lambda item: item[1])
+
+class ShardServer:
+    """Serves one VectorService to coordinators over ``multiprocessing.connection``.
+
+    Each coordinator connection gets its own thread, which answers
+    ``(op, args, kwargs)`` requests in order. Connections are authenticated
+    with a shared key (HMAC challenge); payloads are pickled, so shards
+    should only listen on a private network.
+    """
+
+    def __init__(self, service, address: Tuple[str, int], authkey: bytes):
+        if not authkey:
+            raise ValueError("A shard needs an authkey (VECTOR_SHARD_AUTHKEY)")
+        self.service = service
+        self.authkey = authkey
+        # The default backlog of 1 drops connections when a coordinator's fan-out threads connect at once.
+        # Clients are authenticated on their connection's thread, so a slow one cannot stall accept()
+        self.listener = Listener(address, backlog=128)
+        self.address = '%s:%d' % self.listener.address
+        self.logger = logging.getLogger(__name__)
+        self._stopped = threading.Event()
+
+    def serve_forever(self):
+        self.logger.info(f"Shard serving {self.service.index_path} on {self.address}")
+        while not self._stopped.is_set():
+            try:
+                conn = self.listener.accept()
+            except OSError as e:
+                if self._stopped.is_set():
+                    break
+                self.logger.warning(f"Shard accept failed: {str(e)}")
+                continue
+            threading.Thread(target=self._handle, args=(conn,), name='shard-conn', daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        self.listener.close()
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                deliver_challenge(conn, self.authkey)
+                answer_challenge(conn, self.authkey)
+            except multiprocessing.AuthenticationError:
+                self.logger.warning("Rejected a shard connection with the wrong authkey")
+                return
+            except (EOFError, OSError):
+                return
+
+            while True:
+                try:
+                    op, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                try:
+                    reply = ('ok', self._dispatch(op, args, kwargs))
+                except ValueError as e:
+                    reply = ('value_error', str(e))
+                except Exception as e:
+                    self.logger.error(f"Shard op {op} failed: {str(e)}")
+                    reply = ('error', f"{type(e).__name__}: {str(e)}")
+
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+    def _dispatch(self, op: str, args: tuple, kwargs: Dict) -> Any:
+        if op == 'ping':
+            return self.address
+        if op == 'embed':
+            return self.service.embed(*args, **kwargs)
+        if op == 'export_moved':
+            return self.export_moved(*args, **kwargs)
+        if op in SERVICE_OPS:
+            return getattr(self.service, op)(*args, **kwargs)
+        raise ValueError(f"Unknown shard operation '{op}'")
+
+    def export_moved(self, shards: List[str], name: str, start_row: int, count: int) -> Tuple[List[Dict], Optional[int]]:
+        """Records from start_row whose documents belong to another shard of shards"""
+        return self.service.export_records(
+            start_row, count, lambda record: shard_for(routing_key(record), shards) != name
+        )
+
+class ShardClient:
+    """Pooled connections from a coordinator to one shard.
+
+    A connection is used by one request at a time and returned to the pool
+    afterwards. After a timeout the connection is dropped, since its reply
+    may still arrive. Pooled connections are not reused in a forked child.
+    """
+
+    def __init__(self, address: str, authkey: bytes, timeout: float):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _checkout(self) -> Tuple[Any, bool]:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Sockets inherited through a fork are shared with the parent
+                self._idle, self._pid = [], os.getpid()
+            if self._idle:
+                return self._idle.pop(), True
+        try:
+            return Client(_address(self.address), authkey=self.authkey), False
+        except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+            raise ShardError(f"Cannot connect to shard {self.address}: {str(e)}")
+
+    def call(self, op: str, args: tuple = (), kwargs: Optional[Dict] = None, timeout=_SEARCH_TIMEOUT) -> Any:
+        """Run one operation on the shard; ValueError from the shard is raised as ValueError"""
+        if timeout is _SEARCH_TIMEOUT:
+            timeout = self.timeout
+
+        while True:
+            conn, pooled = self._checkout()
+            try:
+                conn.send((op, args, kwargs or {}))
+                if not conn.poll(timeout):
+                    conn.close()
+                    raise ShardError(f"Shard {self.address} did not answer {op} within {timeout}s")
+                status, payload = conn.recv()
+            except (EOFError, OSError) as e:
+                conn.close()
+                if pooled:
+                    # The shard restarted since this connection was pooled
+                    continue
+                raise ShardError(f"Shard {self.address} dropped the connection: {str(e)}")
+
+            with self._lock:
+                if self._pid == os.getpid():
+                    self._idle.append(conn)
+            if status == 'ok':
+                return payload
+            if status == 'value_error':
+                raise ValueError(payload)
+            raise ShardError(f"Shard {self.address} failed {op}: {payload}")
+
+    def close(self):
+        with self._lock:
+            for conn in self._idle:
+                conn.close()
+            self._idle = []
+
+class ShardedVectorService:
+    """Coordinator for a vector index hash-partitioned over shard processes.
+
+    Documents are placed by rendezvous hashing of their id (chunks by their
+    parent's id) over the shard addresses. Searches are sent to every shard
+    concurrently and the per-shard top-k lists are merged into a global
+    top-k; writes go to the owning shard. Deletes and lookups by id ask every
+    shard, so they also find documents written while a rebalance was moving
+    them. It offers the VectorService methods the application uses, so it can
+    stand in for it.
+
+    The shard list starts as VECTOR_SHARDS; rebalance() records changes in
+    VECTOR_SHARD_MAP_PATH, which every coordinator process watches.
+    """
+
+    def __init__(self, config: Dict, shards: Optional[List[str]] = None):
+        self.max_results = config.get('MAX_SEARCH_RESULTS', 10)
+        self.search_mode = str(config.get('SEARCH_MODE', 'hybrid')).lower()
+        # Lexical and hybrid results are fused here, over the candidates of all shards
+        self.fusion = str(config.get('HYBRID_FUSION', 'rrf')).lower()
+        self.rrf_k = config.get('HYBRID_RRF_K', 60)
+        self.dense_weight = config.get('HYBRID_DENSE_WEIGHT', 0.5)
+        self.hybrid_candidates = config.get('HYBRID_CANDIDATES', 50)
+        self.authkey = shard_authkey(config)
+        self.timeout = float(config.get('VECTOR_SHARD_TIMEOUT', 10.0))
+        self.partial_results = config.get('VECTOR_SHARD_PARTIAL_RESULTS', True)
+        self.rebalance_batch = int(config.get('VECTOR_SHARD_REBALANCE_BATCH', 500))
+        self.map_path = config.get('VECTOR_SHARD_MAP_PATH', './data/shards.json')
+        self.watch_interval = float(config.get('INDEX_WATCH_INTERVAL', 2.0))
+        self.logger = logging.getLogger(__name__)
+
+        self.clients: Dict[str, ShardClient] = {}
+        self.shard_names: List[str] = []
+        self._map_lock = threading.Lock()
+        self._rebalance_lock = threading.Lock()
+        self._embed_turn = 0
+        self.stats = {'searches': 0, 'shard_failures': 0, 'partial_results': 0, 'rebalances': 0}
+
+        self._set_shards(shards or self._read_map() or parse_shards(config.get('VECTOR_SHARDS', '')))
+        if not self.shard_names:
+            raise ValueError("ShardedVectorService needs at least one shard address (VECTOR_SHARDS)")
+
+        # Threads start on first use, so a preloaded app forks before any exist
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(config.get('VECTOR_SHARD_FANOUT_THREADS', 32)), thread_name_prefix='shard-fanout'
+        )
+        self.map_watcher = None
+        if self.watch_interval > 0:
+            self.map_watcher = FileWatcher([self.map_path], self._reload_map, self.watch_interval, name='shard-map-watcher')
+
+    # Shard membership
+
+    def _read_map(self) -> List[str]:
+        try:
+            with open(self.map_path, 'r', encoding='utf-8') as f:
+                return parse_shards(json.load(f).get('shards'))
+        except (OSError, ValueError):
+            return []
+
+    def _write_map(self, shards: List[str]):
+        os.makedirs(os.path.dirname(self.map_path) or '.', exist_ok=True)
+        with open(f"{self.map_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'shards': shards, 'updated_at': time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{self.map_path}.tmp", self.map_path)
+
+    def _client(self, name: str) -> ShardClient:
+        with self._map_lock:
+            if name not in self.clients:
+                self.clients[name] = ShardClient(name, self.authkey, self.timeout)
+            return self.clients[name]
+
+    def _set_shards(self, shards: List[str]):
+        shards = list(dict.fromkeys(shards))
+        for name in shards:
+            self._client(name)
+        with self._map_lock:
+            self.shard_names = shards
+
+    def _reload_map(self):
+        shards = self._read_map()
+        if shards and shards != self.shard_names:
+            self.logger.info(f"Shard map changed on disk: {', '.join(shards)}")
+            self._set_shards(shards)
+
+    def _ensure_watcher(self):
+        if self.map_watcher is not None:
+            self.map_watcher.ensure_started()
+
+    def owner(self, doc: Dict, shards: Optional[List[str]] = None) -> str:
+        return shard_for(routing_key(doc), shards or self.shard_names)
+
+    def _route(self, documents: List[Dict], shards: Optional[List[str]] = None) -> Dict[str, List[int]]:
+        """Positions of the documents owned by each shard"""
+        groups: Dict[str, List[int]] = {}
+        for i, doc in enumerate(documents):
+            groups.setdefault(self.owner(doc, shards), []).append(i)
+        return groups
+
+    # Scatter-gather
+
+    def _scatter(self, calls: Dict[str, Tuple], timeout=_SEARCH_TIMEOUT) -> Dict[str, Any]:
+        """Run {shard: (op, args)} concurrently; each value is the shard's result or its exception"""
+        futures = {
+            name: self._executor.submit(self._client(name).call, op, args, None, timeout)
+            for name, (op, args) in calls.items()
+        }
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = e
+        return results
+
+    def _scatter_all(self, op: str, args: tuple = (), timeout=_SEARCH_TIMEOUT) -> Dict[str, Any]:
+        return self._scatter({name: (op, args) for name in self.shard_names}, timeout)
+
+    def _succeeded(self, op: str, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Results of the shards that answered; shard ValueErrors (bad filters or mode) are raised"""
+        answered = {}
+        for name, result in results.items():
+            if isinstance(result, ValueError):
+                raise result
+            if isinstance(result, Exception):
+                self.stats['shard_failures'] += 1
+                self.logger.error(f"Shard {name} failed {op}: {str(result)}")
+                continue
+            answered[name] = result
+        return answered
+
+    @staticmethod
+    def _merge(lists: List[List[SearchResult]], limit: int) -> List[SearchResult]:
+        """Global top-k of per-shard top-k dense lists (cosine similarities compare across shards).
+
+        A document found on two shards (while a rebalance is moving it) is
+        kept once.
+        """
+        best: Dict[str, SearchResult] = {}
+        for result in chain.from_iterable(lists):
+            if result.id not in best or result.score > best[result.id].score:
+                best[result.id] = result
+        return heapq.nlargest(limit, best.values(), key=lambda result: result.score)
+
+    def _fuse(self, candidates: List[Dict], limit: int, mode: str) -> List[SearchResult]:
+        """Lexical or hybrid results from the shards' unfused candidates (see VectorService.search_candidates).
+
+        The shards' dense and BM25 lists are merged into the rankings one
+        index over all documents would have produced, and fused once, so RRF
+        ranks and normalized BM25 scores are global.
+        """
+        depth = max(limit, self.hybrid_candidates)
+        dense = _merge_ranking([shard['dense'] for shard in candidates], depth)
+        lexical = _merge_ranking([shard['lexical'] for shard in candidates], limit if mode == 'lexical' else depth)
+        results: Dict[str, SearchResult] = {}
+        for shard in candidates:
+            for key, result in shard['results'].items():
+                results.setdefault(key, result)
+        ranked = fuse_scores(dense, lexical, mode, self.fusion, self.rrf_k, self.dense_weight)[:limit]
+        return [replace(results[key], score=score) for key, score in ranked]
+
+    def _gather(self, op: str, args: tuple) -> Optional[Dict[str, Any]]:
+        """Run op on every shard; the answers, or None if too few shards answered to return results"""
+        results = self._scatter_all(op, args)
+        answered = self._succeeded(op, results)
+        if len(answered) < len(results):
+            if not answered or not self.partial_results:
+                return None
+            # Results of the shards that answered beat an error page
+            self.stats['partial_results'] += 1
+        return answered
+
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        mode: Optional[str] = None
+    ) -> List[SearchResult]:
+        """Search every shard and merge the results (see VectorService.search)"""
+        if not query.strip():
+            return []
+        return self.search_many([query], limit, nprobe, ef_search, filters, mode)[0]
+
+    def search_many(
+        self,
+        queries: List[str],
+        limit: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        mode: Optional[str] = None
+    ) -> List[List[SearchResult]]:
+        """Batch search on every shard.
+
+        Dense searches merge each shard's top limit per query. Lexical and
+        hybrid searches take two round trips: the shards' BM25 statistics are
+        summed first so every shard scores terms alike, then their unfused
+        candidates are fused here.
+        """
+        if limit is None:
+            limit = self.max_results
+        mode = str(mode or self.search_mode).lower()
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'; expected one of {', '.join(SEARCH_MODES)}")
+        self._ensure_watcher()
+        self.stats['searches'] += 1
+
+        if mode == 'dense':
+            answered = self._gather('search_many', (queries, limit, nprobe, ef_search, filters, mode))
+            if answered is None:
+                return [[] for _ in queries]
+            return [self._merge([lists[i] for lists in answered.values()], limit) for i in range(len(queries))]
+
+        stats = self._gather('lexical_stats', (queries,))
+        if stats is None:
+            return [[] for _ in queries]
+        term_stats = [_sum_term_stats([shard[i] for shard in stats.values()]) for i in range(len(queries))]
+        answered = self._gather('search_candidates', (queries, limit, nprobe, ef_search, filters, mode, term_stats))
+        if answered is None:
+            return [[] for _ in queries]
+        return [self._fuse([shard[i] for shard in answered.values()], limit, mode) for i in range(len(queries))]
+
+    # Writes
+
+    def add_documents(self, documents: List[Dict], upsert: bool = False) -> int:
+        """Add documents on their owning shards; returns the number of records added"""
+        if not documents:
+            return 0
+        groups = self._route(documents)
+        results = self._scatter(
+            {name: ('add_documents', ([documents[i] for i in rows], upsert)) for name, rows in groups.items()},
+            timeout=None
+        )
+        return sum(self._succeeded('add_documents', results).values())
+
+    def prepare_documents(self, documents: List[Dict], upsert: bool = False) -> Tuple[List[str], List[Dict], List]:
+        """VectorService.prepare_documents on the owning shards; replaced rows are (shard, row) pairs"""
+        groups = self._route(documents)
+        results = self._scatter(
+            {name: ('prepare_documents', ([documents[i] for i in rows], upsert)) for name, rows in groups.items()},
+            timeout=None
+        )
+        texts, records, replaced_rows = [], [], []
+        for name, (shard_texts, shard_records, shard_replaced) in self._succeeded('prepare_documents', results).items():
+            texts.extend(shard_texts)
+            records.extend(shard_records)
+            replaced_rows.extend((name, row) for row in shard_replaced)
+        return texts, records, replaced_rows
+
+    def embed(self, texts: List[str], encode=None) -> np.ndarray:
+        """Embeddings from encode, or from the shards in turn (using their embedding caches)"""
+        if encode is not None:
+            return encode(texts)
+        with self._map_lock:
+            self._embed_turn += 1
+            name = self.shard_names[self._embed_turn % len(self.shard_names)]
+        return self._client(name).call('embed', (texts,), timeout=None)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Query embedding from the shards in turn (using their query caches)"""
+        with self._map_lock:
+            self._embed_turn += 1
+            name = self.shard_names[self._embed_turn % len(self.shard_names)]
+        return self._client(name).call('embed_query', (query,))
+
+    def write_documents(self, docs_to_add: List[Dict], embeddings_array: np.ndarray, replaced_rows: List) -> int:
+        """Write prepared records and their embeddings to the owning shards"""
+        if not docs_to_add:
+            return 0
+        calls = {}
+        for name, positions in self._route(docs_to_add).items():
+            replaced = [row for shard, row in replaced_rows if shard == name]
+            calls[name] = (
+                'write_documents',
+                ([docs_to_add[i] for i in positions], embeddings_array[positions], replaced)
+            )
+        return sum(self._succeeded('write_documents', self._scatter(calls, timeout=None)).values())
+
+    def delete_document(self, doc_id: str) -> bool:
+        results = self._succeeded('delete_document', self._scatter_all('delete_document', (doc_id,), timeout=None))
+        return any(results.values())
+
+    def get_document_by_id(self, doc_id: str) -> Optional[Dict]:
+        results = self._succeeded('get_document_by_id', self._scatter_all('get_document_by_id', (doc_id,)))
+        return next((doc for doc in results.values() if doc is not None), None)
+
+    # Maintenance
+
+    def rebuild_index(self) -> bool:
+        results = self._scatter_all('rebuild_index', timeout=None)
+        rebuilt = self._succeeded('rebuild_index', results)
+        return len(rebuilt) == len(results) and all(rebuilt.values())
+
+    def compact(self) -> bool:
+        results = self._succeeded('compact', self._scatter_all('compact', timeout=None))
+        return any(results.values())
+
+    def warm_up(self):
+        self._succeeded('warm_up', self._scatter_all('warm_up', timeout=None))
+
+    @property
+    def snapshot_generation(self) -> Optional[str]:
+        """Combined index version of the shards; changes when any shard commits a snapshot"""
+        stats = self._succeeded('get_stats', self._scatter_all('get_stats'))
+        if not stats:
+            return None
+        versions = '\x00'.join(f"{name}={stats[name].get('index_version')}" for name in sorted(stats))
+        return hashlib.sha1(versions.encode()).hexdigest()[:32]
+
+    def rebalance(self, shards: List[str]) -> Dict:
+        """Move documents to their owners under a new shard list and switch to it.
+
+        Documents are copied to their new shard and then deleted from the old
+        one, one batch of rows at a time. The first pass runs while writes
+        still use the old list; after the new list is published and every
+        coordinator has picked it up, a second pass moves documents written in
+        between. Searches may see a moved document on both shards meanwhile;
+        the merge keeps one copy.
+        """
+        shards = list(dict.fromkeys(parse_shards(shards)))
+        if not shards:
+            raise ValueError("At least one shard is required")
+
+        with self._rebalance_lock:
+            start_time = time.time()
+            previous = list(self.shard_names)
+            # Removed shards are still read from; new ones must be reachable before anything moves
+            sources = list(dict.fromkeys(previous + shards))
+            for name in shards:
+                self._client(name).call('ping')
+
+            moved = self._move_documents(sources, shards)
+            self._write_map(shards)
+            self._set_shards(shards)
+            time.sleep(2 * self.watch_interval)
+            moved += self._move_documents(sources, shards)
+
+            self.stats['rebalances'] += 1
+            report = {
+                'shards': shards,
+                'added': [name for name in shards if name not in previous],
+                'removed': [name for name in previous if name not in shards],
+                'moved_records': moved,
+                'time_s': time.time() - start_time
+            }
+            self.logger.info(f"Rebalanced to {len(shards)} shards, moved {moved} records")
+            return report
+
+    def add_shard(self, address: str) -> Dict:
+        return self.rebalance(self.shard_names + [address])
+
+    def remove_shard(self, address: str) -> Dict:
+        return self.rebalance([name for name in self.shard_names if name != address])
+
+    def _move_documents(self, sources: List[str], shards: List[str]) -> int:
+        moved = 0
+        for source in sources:
+            client = self._client(source)
+            start_row, exported = 0, []
+            while start_row is not None:
+                records, start_row = client.call(
+                    'export_moved', (shards, source, start_row, self.rebalance_batch), timeout=None
+                )
+                for target, positions in self._route(records, shards).items():
+                    self._client(target).call('import_records', ([records[i] for i in positions],), timeout=None)
+                exported.extend(record['id'] for record in records)
+
+            # Deleted only once every record of their documents has a copy
+            if exported:
+                client.call('delete_documents', (exported,), timeout=None)
+                moved += len(exported)
+        return moved
+
+    # Status
+
+    def readiness(self) -> Dict:
+        results = self._scatter_all('readiness')
+        shards = {
+            name: result if not isinstance(result, Exception) else {'ready': False, 'error': str(result)}
+            for name, result in results.items()
+        }
+        return {
+            'ready': all(shard.get('ready') for shard in shards.values()),
+            'state': 'ready' if all(shard.get('state') == 'ready' for shard in shards.values()) else 'pending',
+            'load_mode': 'sharded',
+            'documents': sum(shard.get('documents', 0) for shard in shards.values()),
+            'shards': shards
+        }
+
+    def get_stats(self) -> Dict:
+        results = self._scatter_all('get_stats')
+        shards = {
+            name: result if not isinstance(result, Exception) else {'error': str(result)}
+            for name, result in results.items()
+        }
+        return {
+            'total_documents': sum(shard.get('total_documents', 0) for shard in shards.values()),
+            'deleted_documents': sum(shard.get('deleted_documents', 0) for shard in shards.values()),
+            'index_size': sum(shard.get('index_size', 0) for shard in shards.values()),
+            'search_mode': self.search_mode,
+            'sharding': {**self.stats, 'shard_count': len(self.shard_names), 'shards': list(self.shard_names)},
+            'shards': shards,
+            'last_updated': time.time()
+        }
+
+def _run_local_shard(number: int, config: Dict, authkey: bytes, addresses):
+    from .vector_service import VectorService
+
+    server = ShardServer(VectorService(config), ('127.0.0.1', 0), authkey)
+    addresses.put((number, server.address))
+    server.serve_forever()
+
+def spawn_local_shards(config: Dict, count: int, base_path: str) -> List[Tuple[str, multiprocessing.Process]]:
+    """Start count shard processes on this machine, each with its own index under base_path.
+
+    For tests and benchmarks; production shards run shard_worker.py. Returns
+    (address, process) pairs; terminate the processes when done.
+    """
+    context = multiprocessing.get_context('spawn')
+    addresses = context.Queue()
+    authkey = shard_authkey(config)
+
+    processes = []
+    for i in range(count):
+        shard_config = {**config, 'FAISS_INDEX_PATH': os.path.join(base_path, f"shard_{i}", 'faiss_index')}
+        process = context.Process(
+            target=_run_local_shard, args=(i, shard_config, authkey, addresses), name=f"shard-{i}", daemon=True
+        )
+        process.start()
+        processes.append(process)
+
+    # Shards report their port once their index is open, in whatever order they finish
+    started = dict(addresses.get(timeout=300) for _ in processes)
+    return [(started[i], process) for i, process in enumerate(processes)]
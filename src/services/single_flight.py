@@ -0,0 +1,61 @@
+"""
+Single-flight request coalescing
+Concurrent calls for the same key in a process share the result of the first one instead of repeating its work
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Runs one call per key at a time.
+
+    The first caller for a key runs ``fn``; callers arriving while it runs
+    wait for it and get the same result, or the same exception. A waiter
+    that is not answered within ``timeout`` runs ``fn`` itself, so a slow
+    call delays the others by at most that long.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'shared': 0, 'timeouts': 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """Result of fn for key, and whether it came from another caller's call"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats['calls'] += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                return fn(), False
+            with self._lock:
+                self.stats['shared'] += 1
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self.stats, 'in_flight': len(self._calls)}
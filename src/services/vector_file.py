@@ -0,0 +1,137 @@
+"""
+Memory-mapped float32 vector file for exact re-scoring
+Keeps the full-precision embedding of every row on disk next to an index with compressed vector storage
+"""
+import os
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Rows copied per step when staging a rewrite, so compaction does not load every vector at once
+REWRITE_BLOCK_ROWS = 65536
+
+def rescore(vectors, queries: np.ndarray, indices: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact inner products of each query with its candidate rows; the top k per query, best first.
+
+    vectors is any array indexed by row (a memory map or an in-memory array);
+    padding candidates (-1) stay last with -inf scores.
+    """
+    valid = indices >= 0
+    candidates = np.asarray(vectors[np.where(valid, indices, 0).ravel()], dtype=np.float32)
+    candidates = candidates.reshape(indices.shape[0], indices.shape[1], -1)
+    scores = np.einsum('qcd,qd->qc', candidates, queries)
+    scores[~valid] = -np.inf
+
+    order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(scores, order, 1).astype(np.float32), np.take_along_axis(indices, order, 1)
+
+class VectorFile:
+    """Row-addressed float32 vectors in ``<base>_vectors.f32``.
+
+    Row ``i`` is stored at byte offset ``i * dim * 4``, so FAISS ids (document
+    store rows) address it directly. The file is memory-mapped read-only:
+    re-scoring reads only the pages of the candidates it scores, and those
+    sit in the page cache shared by worker processes instead of each
+    process's heap. Rows of deleted documents keep their vectors until
+    compaction rewrites the file.
+    """
+
+    def __init__(self, base_path: str, dim: int):
+        self.path = f"{base_path}_vectors.f32"
+        self.dim = dim
+        self.row_bytes = dim * np.dtype(np.float32).itemsize
+        self.logger = logging.getLogger(__name__)
+
+        if not os.path.exists(self.path):
+            open(self.path, 'wb').close()
+        self._remap()
+
+    @staticmethod
+    def exists(base_path: str) -> bool:
+        return os.path.exists(f"{base_path}_vectors.f32")
+
+    def _remap(self):
+        """Map the current file; previous maps stay valid for readers holding them"""
+        count = os.path.getsize(self.path) // self.row_bytes
+        if count:
+            self._vectors = np.memmap(self.path, dtype=np.float32, mode='r', shape=(count, self.dim))
+        else:
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def __getitem__(self, rows) -> np.ndarray:
+        return np.asarray(self._vectors[rows])
+
+    def write(self, start_row: int, vectors: np.ndarray):
+        """Store the vectors of consecutive rows from start_row, overwriting any stored there"""
+        if not len(vectors):
+            return
+        with open(self.path, 'r+b') as f:
+            f.seek(start_row * self.row_bytes)
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self._remap()
+
+    def truncate(self, count: int):
+        """Drop rows at and after count"""
+        if count >= len(self):
+            return
+        with open(self.path, 'r+b') as f:
+            f.truncate(count * self.row_bytes)
+        self._remap()
+
+    def sync(self):
+        """Flush written rows to disk before the segments holding them are dropped"""
+        with open(self.path, 'r+b') as f:
+            os.fsync(f.fileno())
+
+    def covers(self, indices: np.ndarray) -> bool:
+        """Whether every candidate row has a stored vector"""
+        return len(indices) == 0 or int(indices.max()) < len(self)
+
+    def rescore(self, queries: np.ndarray, indices: np.ndarray, k: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Exact top-k of the candidates (see rescore), or None if some are not stored yet"""
+        if not self.covers(indices):
+            return None
+        return rescore(self._vectors, queries, indices, k)
+
+    def _stage(self, count: int, blocks: Iterable[Tuple[np.ndarray, np.ndarray]]) -> List[str]:
+        with open(f"{self.path}.tmp", 'wb') as f:
+            f.truncate(count * self.row_bytes)
+        if count:
+            out = np.memmap(f"{self.path}.tmp", dtype=np.float32, mode='r+', shape=(count, self.dim))
+            for rows, vectors in blocks:
+                out[rows] = vectors
+            out.flush()
+            del out
+        with open(f"{self.path}.tmp", 'r+b') as f:
+            os.fsync(f.fileno())
+        return [self.path]
+
+    def stage_rewrite(self, count: int, rows: np.ndarray, vectors: np.ndarray) -> List[str]:
+        """Write a replacement file of count rows as ``.tmp``, holding vectors at rows (others zero).
+
+        Returns the paths to move into place; call reload() after moving them.
+        """
+        return self._stage(count, [(rows, vectors)])
+
+    def stage_subset(self, rows: np.ndarray) -> List[str]:
+        """Write a replacement file holding only the given rows, renumbered 0..len(rows)-1 (for compaction)"""
+        def blocks():
+            for start in range(0, len(rows), REWRITE_BLOCK_ROWS):
+                chunk = rows[start:start + REWRITE_BLOCK_ROWS]
+                yield slice(start, start + len(chunk)), self[chunk]
+
+        return self._stage(len(rows), blocks())
+
+    def reload(self):
+        """Pick up a file replaced on disk"""
+        self._remap()
+
+    def get_stats(self) -> Dict:
+        return {
+            'rows': len(self),
+            'bytes': len(self) * self.row_bytes
+        }
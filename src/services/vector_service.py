@@ -6,14 +6,38 @@ import os
 import json
 import pickle
 import logging
+import threading
+import uuid
+from contextlib import contextmanager
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional
 import faiss
-from sentence_transformers import SentenceTransformer
 import hashlib
 import time
 from dataclasses import dataclass
 
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+from .index_factory import (
+    IndexSettings, create_index, build_index, sample_training_vectors,
+    apply_search_defaults, search_parameters, describe_index, describe_storage,
+    is_id_mapped, supports_remove, supports_selector, renumber_ids
+)
+from .segment_log import SegmentLog
+from .document_store import DocumentStore
+from .id_table import IdTable
+from .metadata_index import MetadataIndex
+from .lexical_index import LexicalIndex
+from .vector_file import VectorFile
+from .embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from .micro_batcher import MicroBatcher
+from .rw_lock import RWLock
+from .file_watcher import FileWatcher
+from .embedding_backend import create_embedding_backend
+
 @dataclass
 class SearchResult:
     """Search result data structure"""
@@ -23,107 +47,692 @@ class SearchResult:
     score: float
     metadata: Dict
     url: str
+    # Signals behind a hybrid score: cosine similarity, BM25 score and share of query terms present
+    dense_score: Optional[float] = None
+    lexical_score: Optional[float] = None
+    term_coverage: Optional[float] = None
+    # Cross-encoder relevance, when reranked (see CrossEncoderReranker)
+    rerank_score: Optional[float] = None
+
+@dataclass
+class IndexSnapshot:
+    """One committed version of the index and the structures keyed by its rows"""
+    index: faiss.Index
+    id_to_doc: IdTable
+    metadata_index: MetadataIndex
+    lexical_index: LexicalIndex
+    tombstones: set
+    rows: int
+    generation: Optional[str]
+    mmapped: bool = False
+
+SEARCH_MODES = ('dense', 'lexical', 'hybrid')
+
+def document_id(doc: Dict) -> str:
+    """Id of an input document: its own, or one derived from its content"""
+    return doc.get('id') or f"doc_{hashlib.md5(doc.get('content', '').encode()).hexdigest()}"
+
+def fuse_scores(
+    dense: List[Tuple],
+    lexical: List[Tuple],
+    mode: str,
+    fusion: str = 'rrf',
+    rrf_k: int = 60,
+    dense_weight: float = 0.5
+) -> List[Tuple]:
+    """(key, score) pairs of a lexical or hybrid search, best first.
+    
+    dense holds (key, cosine similarity) and lexical (key, BM25 score)
+    pairs, each best first. With rrf fusion a key scores
+    sum(1 / (rrf_k + rank)) over the two rankings, scaled so that ranking
+    first in every list scores 1. With weighted fusion the score is
+    dense_weight times the cosine similarity plus the rest times the BM25
+    score divided by the best BM25 score. Keys found by only one retriever
+    count as absent (rank or score 0) from the other.
+    """
+    best_lexical = float(lexical[0][1]) if lexical else 1.0
+    fused: Dict = {}
+    if mode == 'lexical':
+        fused = {key: score / best_lexical for key, score in lexical}
+    elif fusion == 'weighted':
+        dense_scores = dict(dense)
+        lexical_scores = dict(lexical)
+        for key in set(dense_scores) | set(lexical_scores):
+            fused[key] = (
+                dense_weight * max(dense_scores.get(key, 0.0), 0.0)
+                + (1 - dense_weight) * lexical_scores.get(key, 0.0) / best_lexical
+            )
+    else:
+        for ranking in (dense, lexical):
+            for rank, (key, _) in enumerate(ranking):
+                fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+        lists = bool(dense) + bool(lexical)
+        fused = {key: score * (rrf_k + 1) / max(lists, 1) for key, score in fused.items()}
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
 
 class VectorService:
-    """FAISS-based vector database service"""
+    """FAISS-based vector database service
+    
+    FAISS ids are document-store rows. Deleting or replacing a document
+    tombstones its rows; compaction later drops them from the store and
+    renumbers the index. With compressed vector storage (FAISS_STORAGE) the
+    float32 vectors are also kept in a memory-mapped VectorFile, and the
+    index's top candidates are re-scored exactly from it.
     
-    def __init__(self, config: Dict):
+    Searches hold a read lock for their whole duration, so each sees one
+    version of the index. Rebuilds and compactions build the new version
+    aside and swap it in under the write lock; ingests and deletes update
+    in place under the same lock. Snapshots committed by other processes
+    are picked up by a file watcher.
+    """
+    
+    def __init__(self, config: Dict, cache_service=None):
         self.config = config
         self.model_name = config.get('EMBEDDINGS_MODEL', 'all-MiniLM-L6-v2')
         self.vector_dim = config.get('VECTOR_DIMENSION', 384)
         self.index_path = config.get('FAISS_INDEX_PATH', './data/faiss_index')
         self.max_results = config.get('MAX_SEARCH_RESULTS', 10)
+        self.index_settings = IndexSettings.from_config(config)
+        self.compact_threshold = config.get('SEGMENT_COMPACT_THRESHOLD', 32)
+        self.compaction_ratio = config.get('COMPACTION_TOMBSTONE_RATIO', 0.2)
+        self.compaction_min_tombstones = config.get('COMPACTION_MIN_TOMBSTONES', 100)
+        self.mmap_index = config.get('FAISS_MMAP', False)
+        self.rescore_factor = config.get('FAISS_RESCORE_FACTOR', 4)
+        
+        # Hybrid search fuses FAISS results with a BM25 index over the same records
+        self.search_mode = str(config.get('SEARCH_MODE', 'hybrid')).lower()
+        self.fusion = str(config.get('HYBRID_FUSION', 'rrf')).lower()
+        self.rrf_k = config.get('HYBRID_RRF_K', 60)
+        self.dense_weight = config.get('HYBRID_DENSE_WEIGHT', 0.5)
+        self.hybrid_candidates = config.get('HYBRID_CANDIDATES', 50)
+        self.bm25_k1 = config.get('BM25_K1', 1.2)
+        self.bm25_b = config.get('BM25_B', 0.75)
         
         self.logger = logging.getLogger(__name__)
         
-        # Initialize sentence transformer
-        self.logger.info(f"Loading embedding model: {self.model_name}")
-        self.model = SentenceTransformer(self.model_name)
+        # The embedding model (PyTorch or ONNX Runtime, see EMBEDDINGS_BACKEND) is
+        # loaded on first use or by a background warm-up, not here
+        self.cache_service = cache_service
+        self.load_mode = str(config.get('EMBEDDINGS_LOAD_MODE', 'background')).lower()
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.model_state = 'pending'
+        self.model_error = None
+        self.model_load_time = None
+        self.embedding_cache = None
+        self.query_cache = None
         
-        # Verify vector dimension matches model
-        test_embedding = self.model.encode(["test"])
-        actual_dim = test_embedding.shape[1]
-        if actual_dim != self.vector_dim:
-            self.logger.warning(f"Vector dimension mismatch. Expected: {self.vector_dim}, Actual: {actual_dim}")
-            self.vector_dim = actual_dim
+        # Concurrent searches are coalesced into one encode and one index search
+        self.search_batcher = None
+        if config.get('SEARCH_BATCH_ENABLED', False):
+            self.search_batcher = MicroBatcher(
+                self._search_batch,
+                config.get('SEARCH_BATCH_MAX_SIZE', 32),
+                config.get('SEARCH_BATCH_WAIT_MS', 3.0),
+                name='search-batcher'
+            )
         
         # Initialize FAISS index
         self.index = None
-        self.documents = []
-        self.id_to_doc = {}
+        self.id_to_doc = IdTable()
+        self.metadata_index = MetadataIndex()
+        self.lexical_index = self._new_lexical_index()
+        self.tombstones = set()
+        self._tombstone_array = None
+        self.snapshot_rows = 0
+        self.snapshot_generation = None
+        self.committed_rows = 0
+        self._index_mmapped = False
+        
+        # Writers (ingest, delete, compaction) are serialized across threads and,
+        # through a lock file, across worker processes sharing the index
+        self._write_lock = threading.RLock()
+        self._lock_file = None
+        self._process_lock_depth = 0
+        self._compaction_thread = None
+        self._rebuild_thread = None
+        
+        # Searches read under the state lock; swaps and in-place updates write under it
+        self._state_lock = RWLock()
         
         # Create directories
         os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        self.segment_log = SegmentLog(self.index_path)
         
-        # Load existing index if available
-        self._load_index()
-    
-    def _load_index(self):
-        """Load existing FAISS index and documents"""
-        index_file = f"{self.index_path}.index"
-        docs_file = f"{self.index_path}_docs.json"
-        mapping_file = f"{self.index_path}_mapping.pkl"
+        # Full-precision vectors for re-scoring, only needed when the index stores them compressed
+        self.vector_file = None
+        if self.index_settings.storage != 'float32':
+            self.vector_file = VectorFile(self.index_path, self.vector_dim)
+        elif VectorFile.exists(self.index_path):
+            # Left from a compressed index; its rows would be stale if compression is turned back on
+            os.remove(f"{self.index_path}_vectors.f32")
         
-        if os.path.exists(index_file) and os.path.exists(docs_file):
+        start_time = time.time()
+        with self._process_lock():
+            self._finish_commit()
+            self.documents = self._open_document_store()
+            
+            # Load existing index if available, then replay segments written since
+            self._load_index()
+            if self.snapshot_rows == 0 and len(self.documents) and not self.segment_log.segment_count():
+                # Index missing or unreadable; cached embeddings make this cheap
+                self.logger.warning("No usable index snapshot, rebuilding from the document store")
+                self.committed_rows = len(self.documents)
+                self.rebuild_index()
+            else:
+                self._replay_segments()
+        self.logger.info(f"Vector store opened in {time.time() - start_time:.2f}s")
+        
+        # Reload when another process commits a snapshot or a segment
+        self.index_watcher = None
+        watch_interval = float(config.get('INDEX_WATCH_INTERVAL', 2.0))
+        if watch_interval > 0:
+            self.index_watcher = FileWatcher(
+                [f"{self.index_path}_snapshot.json", self.segment_log.wal_file],
+                self.refresh,
+                watch_interval,
+                name='index-watcher'
+            )
+            # Threads do not survive a fork; preloaded workers start it on their first search
+            if self.load_mode != 'preload':
+                self.index_watcher.ensure_started()
+        
+        if self.load_mode == 'eager':
+            self.warm_up()
+        elif self.load_mode == 'preload':
+            # Weights only, shared copy-on-write with forked workers, which warm up after the fork.
+            # ONNX Runtime starts its thread pool with the session, and threads do not survive a fork.
+            if str(config.get('EMBEDDINGS_BACKEND', 'sentence-transformers')).lower() == 'sentence-transformers':
+                self._load_model()
+        elif self.load_mode == 'background':
+            threading.Thread(target=self.warm_up, name='embedding-warmup', daemon=True).start()
+    
+    @property
+    def model(self):
+        """Embedding backend, loaded on first use"""
+        self._ensure_model()
+        return self._model
+    
+    def _ensure_model(self):
+        """Load the model (and the embedding caches keyed by it) if not loaded yet"""
+        if self._model is None:
+            self._load_model()
+    
+    def _load_model(self):
+        """Load the embedding backend and the caches keyed by it"""
+        with self._model_lock:
+            if self._model is not None:
+                return
+            
+            self.model_state = 'loading'
+            start_time = time.time()
             try:
-                # Load FAISS index
-                self.index = faiss.read_index(index_file)
+                self.logger.info(f"Loading embedding model: {self.model_name}")
+                model = create_embedding_backend(self.config)
+                
+                # Verify vector dimension matches model
+                if model.dimension != self.vector_dim:
+                    self.logger.warning(
+                        f"Vector dimension mismatch. Expected: {self.vector_dim}, Actual: {model.dimension}"
+                    )
+                    self.vector_dim = model.dimension
+                    if self.index is None or self.index.ntotal == 0:
+                        self.index = create_index(self.vector_dim, self.index_settings)
+                        if self.vector_file is not None:
+                            self.vector_file.truncate(0)
+                            self.vector_file = VectorFile(self.index_path, self.vector_dim)
+                    else:
+                        self.logger.error("Existing index has a different dimension; call rebuild_index()")
                 
-                # Load documents
-                with open(docs_file, 'r', encoding='utf-8') as f:
-                    self.documents = json.load(f)
+                # Embeddings of previously seen texts are reused instead of re-encoded
+                if self.config.get('EMBEDDING_CACHE_ENABLED', True):
+                    self.embedding_cache = EmbeddingCache(
+                        self.config.get('EMBEDDING_CACHE_PATH', './data/embedding_cache'),
+                        model.name,
+                        self.vector_dim,
+                        self.cache_service,
+                        self.config.get('EMBEDDING_CACHE_TTL', 604800)
+                    )
                 
-                # Load ID mapping
-                if os.path.exists(mapping_file):
-                    with open(mapping_file, 'rb') as f:
-                        self.id_to_doc = pickle.load(f)
+                # Repeated queries skip the transformer forward pass
+                self.query_cache = QueryEmbeddingCache(
+                    model.name,
+                    self.vector_dim,
+                    self.config.get('QUERY_EMBEDDING_CACHE_SIZE', 10000),
+                    self.cache_service if self.config.get('QUERY_EMBEDDING_CACHE_REDIS', False) else None,
+                    self.config.get('EMBEDDING_CACHE_TTL', 604800)
+                )
                 
-                self.logger.info(f"Loaded existing index with {len(self.documents)} documents")
+                self._model = model
+                self.model_load_time = time.time() - start_time
+                self.model_state = 'ready'
+                self.logger.info(f"Embedding model {model.name} loaded in {self.model_load_time:.2f}s")
                 
             except Exception as e:
-                self.logger.error(f"Error loading index: {str(e)}")
-                self._initialize_new_index()
-        else:
-            self._initialize_new_index()
+                self.model_state = 'failed'
+                self.model_error = str(e)
+                self.logger.error(f"Error loading embedding model: {str(e)}")
+                raise
     
-    def _initialize_new_index(self):
-        """Initialize a new FAISS index"""
-        self.index = faiss.IndexFlatIP(self.vector_dim)  # Inner product for cosine similarity
-        self.documents = []
-        self.id_to_doc = {}
-        self.logger.info("Initialized new FAISS index")
+    def warm_up(self):
+        """Load the model and run one inference so the first request is not slowed down"""
+        try:
+            self._encode(["warm up"])
+        except Exception as e:
+            self.logger.error(f"Embedding warm-up failed: {str(e)}")
     
-    def _save_index(self):
-        """Save FAISS index and documents to disk"""
+    def readiness(self) -> Dict:
+        """Whether searches can be served without waiting for the model to load"""
+        return {
+            'ready': self.model_state == 'ready' or (self.load_mode == 'lazy' and self.model_state == 'pending'),
+            'state': self.model_state,
+            'load_mode': self.load_mode,
+            'model_load_time_s': self.model_load_time,
+            'error': self.model_error,
+            'documents': len(self.documents) - len(self.tombstones)
+        }
+    
+    def _open_document_store(self) -> DocumentStore:
+        """Open the memory-mapped document store, migrating a legacy JSON docs file"""
+        docs_file = f"{self.index_path}_docs.json"
+        migrate = not DocumentStore.exists(self.index_path) and os.path.exists(docs_file)
+        
+        store = DocumentStore(self.index_path)
+        if migrate:
+            with open(docs_file, 'r', encoding='utf-8') as f:
+                store.extend(json.load(f))
+            self.logger.info(f"Migrated {len(store)} documents from {docs_file} to the document store")
+        return store
+    
+    def _load_index(self):
+        """Load existing FAISS index, ID mapping, metadata index and tombstones"""
+        snapshot = self._read_snapshot(self.documents)
+        if snapshot is None:
+            self._initialize_new_index()
+        else:
+            self._install(snapshot)
+    
+    def _read_snapshot(self, documents: DocumentStore) -> Optional[IndexSnapshot]:
+        """Read the committed snapshot files; None if there are none or they cannot be read"""
+        index_file = f"{self.index_path}.index"
+        ids_file = f"{self.index_path}_ids.bin"
+        legacy_mapping_file = f"{self.index_path}_mapping.pkl"
+        metadata_file = f"{self.index_path}_metadata.pkl"
+        lexical_file = f"{self.index_path}_lexical.pkl"
+        tombstones_file = f"{self.index_path}_tombstones.npy"
+        snapshot_file = f"{self.index_path}_snapshot.json"
+        
+        if not os.path.exists(index_file):
+            return None
+        
         try:
-            index_file = f"{self.index_path}.index"
-            docs_file = f"{self.index_path}_docs.json"
-            mapping_file = f"{self.index_path}_mapping.pkl"
+            # Load FAISS index, memory-mapped read-only so processes share its pages
+            if self.mmap_index:
+                index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP)
+            else:
+                index = faiss.read_index(index_file)
+            mmapped = self.mmap_index
+            apply_search_defaults(index, self.index_settings)
+            
+            # Rows covered by the snapshot; older snapshots were positional
+            rows = index.ntotal
+            generation = None
+            if os.path.exists(snapshot_file):
+                with open(snapshot_file, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                rows = snapshot['rows']
+                generation = snapshot.get('generation')
             
-            # Save FAISS index
-            faiss.write_index(self.index, index_file)
+            if not is_id_mapped(index):
+                index = self._convert_to_id_map(index)
+                mmapped = False
             
-            # Save documents
-            with open(docs_file, 'w', encoding='utf-8') as f:
-                json.dump(self.documents, f, indent=2, ensure_ascii=False)
+            loaded_type = describe_index(index)
+            if loaded_type != self.index_settings.index_type:
+                self.logger.warning(
+                    f"Loaded {loaded_type} index but FAISS_INDEX_TYPE is {self.index_settings.index_type}; "
+                    "call rebuild_index() to convert"
+                )
+            loaded_storage = describe_storage(index)
+            if loaded_storage != self.index_settings.storage:
+                self.logger.warning(
+                    f"Loaded index stores {loaded_storage} vectors but FAISS_STORAGE is "
+                    f"{self.index_settings.storage}; call rebuild_index() to convert"
+                )
             
-            # Save ID mapping
-            with open(mapping_file, 'wb') as f:
-                pickle.dump(self.id_to_doc, f)
+            # Load tombstones
+            tombstones = set()
+            if os.path.exists(tombstones_file):
+                tombstones = set(np.load(tombstones_file).tolist())
             
-            self.logger.info(f"Saved index with {len(self.documents)} documents")
+            # Memory-map the ID table; snapshots written before it had a pickled dict
+            if os.path.exists(ids_file):
+                id_to_doc = IdTable.load(ids_file)
+            elif os.path.exists(legacy_mapping_file):
+                with open(legacy_mapping_file, 'rb') as f:
+                    id_to_doc = IdTable.from_mapping(pickle.load(f))
+            else:
+                live_rows = [row for row in range(rows) if row not in tombstones]
+                id_to_doc = IdTable.from_rows([documents[row]['id'] for row in live_rows], live_rows)
+            
+            # Load metadata index, indexing any rows the saved copy is missing
+            metadata_index = MetadataIndex.load(metadata_file)
+            if metadata_index.rows > rows:
+                metadata_index = MetadataIndex()
+            for row in range(metadata_index.rows, rows):
+                metadata_index.add(row, documents[row].get('metadata'))
+            
+            # Same for the lexical index (built from the document store on first start after an upgrade)
+            lexical_index = LexicalIndex.load(lexical_file, self.bm25_k1, self.bm25_b)
+            if lexical_index.rows > rows:
+                lexical_index = self._new_lexical_index()
+            for row in range(lexical_index.rows, rows):
+                lexical_index.add_document(row, documents[row])
+            
+            self.logger.info(f"Loaded existing index with {index.ntotal} documents")
+            return IndexSnapshot(index, id_to_doc, metadata_index, lexical_index, tombstones, rows, generation, mmapped)
             
         except Exception as e:
-            self.logger.error(f"Error saving index: {str(e)}")
+            self.logger.error(f"Error loading index: {str(e)}")
+            return None
     
-    def add_documents(self, documents: List[Dict]) -> int:
-        """Add documents to the vector database"""
-        if not documents:
-            return 0
+    def _install(self, snapshot: IndexSnapshot, documents: Optional[DocumentStore] = None):
+        """Make a snapshot the current version; callers hold the state write lock once serving"""
+        if documents is not None:
+            self.documents = documents
+        self.index = snapshot.index
+        self.id_to_doc = snapshot.id_to_doc
+        self.metadata_index = snapshot.metadata_index
+        self.lexical_index = snapshot.lexical_index
+        self.tombstones = snapshot.tombstones
+        self._tombstone_array = None
+        self.snapshot_rows = snapshot.rows
+        self.snapshot_generation = snapshot.generation
+        self.committed_rows = snapshot.rows
+        self._index_mmapped = snapshot.mmapped
+        if self.vector_file is not None:
+            self.vector_file.reload()
+    
+    def _new_lexical_index(self) -> LexicalIndex:
+        return LexicalIndex(self.bm25_k1, self.bm25_b)
+    
+    def _convert_to_id_map(self, index: faiss.Index) -> faiss.Index:
+        """Re-add the vectors of a positional index saved before ids were row-mapped"""
+        self.logger.info("Converting positional FAISS index to an ID-mapped index")
+        vectors = index.reconstruct_n(0, index.ntotal)
+        return build_index(vectors, self.vector_dim, self.index_settings)
+    
+    def _make_index_writable(self):
+        """Swap a memory-mapped (read-only) index for an in-memory copy before modifying it"""
+        if not self._index_mmapped:
+            return
+        # Nothing was modified since the snapshot was mapped, so re-reading it is exact
+        self.index = faiss.read_index(f"{self.index_path}.index")
+        apply_search_defaults(self.index, self.index_settings)
+        self._index_mmapped = False
+    
+    def _initialize_new_index(self):
+        """Initialize a new FAISS index"""
+        # Inner product on normalized vectors gives cosine similarity. IVF indexes
+        # are re-created and trained on the first batch added to them.
+        self.index = create_index(self.vector_dim, self.index_settings)
+        self.id_to_doc = IdTable()
+        self.metadata_index = MetadataIndex()
+        self.lexical_index = self._new_lexical_index()
+        self.tombstones = set()
+        self._tombstone_array = None
+        self.snapshot_rows = 0
+        self.snapshot_generation = None
+        self.committed_rows = 0
+        self._index_mmapped = False
+        self.logger.info(f"Initialized new FAISS index ({self.index_settings.index_type})")
+    
+    def _replay_segments(self, start_row: Optional[int] = None, truncate: bool = True):
+        """Apply records committed after start_row (default: the snapshot) and drop uncommitted documents
+        
+        Dropping uncommitted rows is only safe while holding the process lock
+        exclusively, since another process may be appending them right now.
+        """
+        replayed = 0
+        committed_rows = self.snapshot_rows if start_row is None else start_row
+        for record in self.segment_log.replay(committed_rows):
+            if record['op'] == 'delete':
+                self._apply_deletes(record['deleted'])
+                continue
+            
+            start_row, vectors = record['start_row'], record['vectors']
+            if start_row + len(vectors) > len(self.documents):
+                self.logger.error(f"Document store is missing rows of the segment at {start_row}")
+                break
+            
+            self._add_vectors(vectors, start_row)
+            for row in range(start_row, start_row + len(vectors)):
+                doc = self.documents[row]
+                self.id_to_doc[doc['id']] = row
+                self.metadata_index.add(row, doc.get('metadata'))
+                self.lexical_index.add_document(row, doc)
+            committed_rows = start_row + len(vectors)
+            replayed += len(vectors)
         
-        processed_count = 0
+        # Rows appended to the store whose vectors were never committed
+        self.committed_rows = committed_rows
+        if truncate:
+            self.documents.truncate(committed_rows)
+            if self.vector_file is not None:
+                self.vector_file.truncate(committed_rows)
+        
+        if replayed:
+            self.logger.info(f"Replayed {replayed} documents from segment log")
+    
+    def _add_vectors(self, vectors: np.ndarray, start_row: int):
+        """Add vectors for consecutive rows, training the index first if this is the first batch"""
+        self._make_index_writable()
+        if not self.index.is_trained:
+            sample = sample_training_vectors(vectors, self.index_settings)
+            self.index = create_index(self.vector_dim, self.index_settings, len(sample))
+            self.index.train(sample)
+        ids = np.arange(start_row, start_row + len(vectors), dtype='int64')
+        self.index.add_with_ids(vectors, ids)
+        if self.vector_file is not None:
+            # Replays write the same bytes again, which also restores rows lost in a crash
+            self.vector_file.write(start_row, vectors)
+    
+    def _apply_deletes(self, rows: List[int]):
+        """Tombstone rows and drop them from the index where the index supports it"""
+        rows = [int(row) for row in rows if row not in self.tombstones]
+        if not rows:
+            return
+        
+        self.tombstones.update(rows)
+        self._tombstone_array = None
+        if supports_remove(self.index):
+            self._make_index_writable()
+            self.index.remove_ids(np.array(rows, dtype='int64'))
+        
+        for row in rows:
+            if row < len(self.documents):
+                doc_id = self.documents[row]['id']
+                if self.id_to_doc.get(doc_id) == row:
+                    del self.id_to_doc[doc_id]
+    
+    @contextmanager
+    def _process_lock(self, exclusive: bool = True):
+        """Thread lock plus a lock file shared by every process using this index (re-entrant)"""
+        with self._write_lock:
+            if self._process_lock_depth == 0 and fcntl is not None:
+                self._lock_file = open(f"{self.index_path}.lock", 'a+')
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._process_lock_depth += 1
+            try:
+                yield
+            finally:
+                self._process_lock_depth -= 1
+                if self._process_lock_depth == 0 and self._lock_file is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+    
+    @contextmanager
+    def _writing(self):
+        """Exclusive write access, after catching up with writes from other processes"""
+        with self._process_lock():
+            if self._process_lock_depth == 1:
+                self._catch_up(truncate=True)
+            yield
+    
+    def _snapshot_generation_on_disk(self) -> Optional[str]:
+        try:
+            with open(f"{self.index_path}_snapshot.json", 'r', encoding='utf-8') as f:
+                return json.load(f).get('generation')
+        except (OSError, ValueError):
+            return None
+    
+    def _catch_up(self, truncate: bool = False) -> bool:
+        """Apply snapshots and segments committed by other processes; returns True if anything changed"""
+        if self._snapshot_generation_on_disk() != self.snapshot_generation:
+            # Read the new version aside; searches continue on the current one meanwhile
+            self.logger.info("Index snapshot changed on disk, reloading")
+            documents = DocumentStore(self.index_path)
+            snapshot = self._read_snapshot(documents)
+            with self._state_lock.write():
+                if snapshot is None:
+                    self.documents = documents
+                    self._initialize_new_index()
+                else:
+                    self._install(snapshot, documents)
+                self._replay_segments(truncate=truncate)
+            return True
+        
+        with self._state_lock.write():
+            self.documents.reload()
+            before = (self.committed_rows, len(self.tombstones))
+            self._replay_segments(self.committed_rows, truncate)
+            return (self.committed_rows, len(self.tombstones)) != before
+    
+    def refresh(self) -> bool:
+        """Pick up index versions and segments committed by other processes"""
+        with self._process_lock(exclusive=False):
+            return self._catch_up()
+    
+    def _commit_files(self, paths: List[str]):
+        """Atomically move staged ``.tmp`` files into place.
+        
+        The list of files is written to a marker first, so a crash part-way
+        through is rolled forward on the next start instead of leaving a mix
+        of old and new snapshot files.
+        """
+        marker = f"{self.index_path}_commit.json"
+        with open(f"{marker}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(paths, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{marker}.tmp", marker)
+        self._finish_commit()
+    
+    def _finish_commit(self):
+        """Complete an interrupted snapshot commit; the snapshot supersedes the segment log"""
+        marker = f"{self.index_path}_commit.json"
+        if not os.path.exists(marker):
+            return
+        
+        with open(marker, 'r', encoding='utf-8') as f:
+            paths = json.load(f)
+        for path in paths:
+            if os.path.exists(f"{path}.tmp"):
+                os.replace(f"{path}.tmp", path)
+        
+        self.segment_log.reset()
+        os.remove(marker)
+    
+    def _stage_snapshot(
+        self,
+        index: faiss.Index,
+        id_to_doc: IdTable,
+        metadata_index: MetadataIndex,
+        lexical_index: LexicalIndex,
+        tombstones: set,
+        rows: int,
+        generation: str
+    ) -> List[str]:
+        """Write the index, ID table, metadata and lexical indexes and tombstones as ``.tmp`` files"""
+        index_file = f"{self.index_path}.index"
+        ids_file = f"{self.index_path}_ids.bin"
+        metadata_file = f"{self.index_path}_metadata.pkl"
+        lexical_file = f"{self.index_path}_lexical.pkl"
+        tombstones_file = f"{self.index_path}_tombstones.npy"
+        snapshot_file = f"{self.index_path}_snapshot.json"
+        
+        # Documents are already durable in the document store
+        faiss.write_index(index, f"{index_file}.tmp")
+        
+        id_to_doc.save(f"{ids_file}.tmp")
+        
+        metadata_index.save(f"{metadata_file}.tmp")
+        lexical_index.save(f"{lexical_file}.tmp")
+        
+        with open(f"{tombstones_file}.tmp", 'wb') as f:
+            np.save(f, np.array(sorted(tombstones), dtype='int64'))
+        
+        with open(f"{snapshot_file}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'rows': rows, 'generation': generation}, f)
+        
+        return [ids_file, metadata_file, lexical_file, tombstones_file, snapshot_file, index_file]
+    
+    def _save_index(self):
+        """Write a full snapshot of the index, folding in all segments"""
+        with self._writing():
+            try:
+                # The snapshot replaces the segments, so the vectors they hold must be on disk
+                if self.vector_file is not None:
+                    self.vector_file.sync()
+                generation = uuid.uuid4().hex
+                self._commit_files(self._stage_snapshot(
+                    self.index, self.id_to_doc, self.metadata_index, self.lexical_index, self.tombstones,
+                    len(self.documents), generation
+                ))
+                self.snapshot_rows = len(self.documents)
+                self.snapshot_generation = generation
+                self.committed_rows = len(self.documents)
+                # Same ids, now memory-mapped from the snapshot instead of held in the pending dict
+                self.id_to_doc = IdTable.load(f"{self.index_path}_ids.bin")
+                self.logger.info(f"Saved index with {self.index.ntotal} documents")
+                
+            except Exception as e:
+                self.logger.error(f"Error saving index: {str(e)}")
+    
+    def _append_segment(self, vectors: np.ndarray, start_row: int):
+        """Persist one ingest batch; cost depends on the batch, not the corpus"""
+        try:
+            self.segment_log.append(start_row, vectors)
+        except Exception as e:
+            self.logger.error(f"Error writing segment, falling back to full save: {str(e)}")
+            self._save_index()
+            return
+        
+        # Fold segments into a new snapshot once enough have accumulated
+        if self.segment_log.segment_count() >= self.compact_threshold:
+            self.logger.info("Compacting segment log")
+            self._save_index()
+    
+    def _rows_for(self, doc_id: str) -> List[int]:
+        """Live rows holding a document, or its chunks when it was ingested in chunks"""
+        rows = []
+        if doc_id in self.id_to_doc:
+            rows.append(self.id_to_doc[doc_id])
+        for row in self.metadata_index.select({'parent_doc_id': doc_id}).tolist():
+            if row not in self.tombstones and row not in rows:
+                rows.append(row)
+        return sorted(rows)
+    
+    def prepare_documents(self, documents: List[Dict], upsert: bool = False) -> Tuple[List[str], List[Dict], List[int]]:
+        """Turn input documents into index records.
+        
+        Returns the texts to embed, the records to append and, for upserts,
+        the rows of changed documents that the new records replace.
+        """
         texts_to_embed = []
         docs_to_add = []
+        replaced_rows = []
         
         for doc in documents:
             try:
@@ -132,20 +741,14 @@ class VectorService:
                     continue
                 
                 # Generate document ID if not provided
-                doc_id = doc.get('id')
-                if not doc_id:
-                    content_hash = hashlib.md5(doc['content'].encode()).hexdigest()
-                    doc_id = f"doc_{content_hash}"
-                
-                # Skip if document already exists
-                if doc_id in self.id_to_doc:
-                    continue
+                doc_id = document_id(doc)
                 
                 # Process chunks if available, otherwise use full content
+                records = []
                 if 'chunks' in doc and doc['chunks']:
                     for i, chunk in enumerate(doc['chunks']):
                         chunk_id = f"{doc_id}_chunk_{i}"
-                        chunk_doc = {
+                        records.append({
                             'id': chunk_id,
                             'content': chunk['text'],
                             'title': doc['title'],
@@ -156,14 +759,10 @@ class VectorService:
                                 'chunk_index': i,
                                 'is_chunk': True
                             }
-                        }
-                        
-                        texts_to_embed.append(chunk['text'])
-                        docs_to_add.append(chunk_doc)
-                        self.id_to_doc[chunk_id] = len(self.documents) + len(docs_to_add) - 1
+                        })
                 else:
                     # Use full document content
-                    doc_with_id = {
+                    records.append({
                         'id': doc_id,
                         'content': doc['content'],
                         'title': doc['title'],
@@ -172,38 +771,81 @@ class VectorService:
                             **doc.get('metadata', {}),
                             'is_chunk': False
                         }
-                    }
-                    
-                    texts_to_embed.append(doc['content'])
-                    docs_to_add.append(doc_with_id)
-                    self.id_to_doc[doc_id] = len(self.documents) + len(docs_to_add) - 1
+                    })
+                
+                # Existing documents are skipped, or replaced when upserting a change
+                existing_rows = self._rows_for(doc_id)
+                if existing_rows:
+                    if not upsert or self.documents.get_many(existing_rows) == records:
+                        continue
+                    replaced_rows.extend(existing_rows)
+                
+                texts_to_embed.extend(record['content'] for record in records)
+                docs_to_add.extend(records)
                 
             except Exception as e:
                 self.logger.error(f"Error processing document: {str(e)}")
                 continue
         
+        return texts_to_embed, docs_to_add, replaced_rows
+    
+    def add_documents(self, documents: List[Dict], upsert: bool = False) -> int:
+        """Add documents to the vector database
+        
+        With upsert, documents whose id already exists but whose content
+        changed replace the stored version; otherwise they are skipped.
+        """
+        if not documents:
+            return 0
+        
+        texts_to_embed, docs_to_add, replaced_rows = self.prepare_documents(documents, upsert)
         if not texts_to_embed:
             return 0
         
         try:
             # Generate embeddings
-            self.logger.info(f"Generating embeddings for {len(texts_to_embed)} texts")
-            embeddings = self.model.encode(texts_to_embed, convert_to_tensor=False, show_progress_bar=True)
-            
-            # Normalize embeddings for cosine similarity
-            embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-            
-            # Add to FAISS index
-            embeddings_array = np.array(embeddings).astype('float32')
-            self.index.add(embeddings_array)
+            embeddings_array = self.embed(texts_to_embed)
+        except Exception as e:
+            self.logger.error(f"Error adding documents to index: {str(e)}")
+            return 0
+        
+        return self.write_documents(docs_to_add, embeddings_array, replaced_rows)
+    
+    def write_documents(self, docs_to_add: List[Dict], embeddings_array: np.ndarray, replaced_rows: List[int]) -> int:
+        """Append records from prepare_documents with their embeddings; returns the number added"""
+        if not docs_to_add:
+            return 0
+        
+        try:
+            with self._writing():
+                if replaced_rows:
+                    # Compaction (here or in another process) may have renumbered rows since they were looked up
+                    parents = {doc['metadata'].get('parent_doc_id', doc['id']) for doc in docs_to_add}
+                    replaced_rows = [row for parent in parents for row in self._rows_for(parent)]
+                
+                with self._state_lock.write():
+                    # Add documents to the store first; they are committed with the segment
+                    start_row = len(self.documents)
+                    self.documents.extend(docs_to_add)
+                    for offset, doc in enumerate(docs_to_add):
+                        self.metadata_index.add(start_row + offset, doc['metadata'])
+                        self.lexical_index.add_document(start_row + offset, doc)
+                    
+                    # Add to FAISS index
+                    self._add_vectors(embeddings_array, start_row)
+                    
+                    for offset, doc in enumerate(docs_to_add):
+                        self.id_to_doc[doc['id']] = start_row + offset
+                
+                # Persist the batch vectors as a new segment
+                self._append_segment(embeddings_array, start_row)
+                self.committed_rows = max(self.committed_rows, start_row + len(docs_to_add))
+                
+                # Tombstone the versions that were replaced
+                if replaced_rows:
+                    self._delete_rows(replaced_rows)
             
-            # Add documents to collection
-            self.documents.extend(docs_to_add)
             processed_count = len(docs_to_add)
-            
-            # Save index
-            self._save_index()
-            
             self.logger.info(f"Added {processed_count} documents to vector database")
             
         except Exception as e:
@@ -212,165 +854,661 @@ class VectorService:
         
         return processed_count
     
-    def search(self, query: str, limit: Optional[int] = None) -> List[SearchResult]:
-        """Perform semantic search"""
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts with the model, normalized for cosine similarity"""
+        embeddings = self.model.encode(texts, convert_to_tensor=False, show_progress_bar=len(texts) > 1)
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return np.array(embeddings).astype('float32')
+    
+    def embed(self, texts: List[str], encode: Optional[Callable[[List[str]], np.ndarray]] = None) -> np.ndarray:
+        """Normalized float32 embeddings, reusing cached vectors for texts seen before
+        
+        encode replaces the in-process model for texts that are not cached,
+        e.g. with a process pool (see BulkIngestService); it must return
+        normalized float32 vectors like _encode.
+        """
+        self.logger.info(f"Generating embeddings for {len(texts)} texts")
+        self._ensure_model()
+        encode = encode or self._encode
+        if self.embedding_cache is None:
+            return encode(texts)
+        return self.embedding_cache.get_or_encode(texts, encode)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Normalized embedding of a search query, through the query cache that search() also uses"""
+        self._ensure_model()
+        return self.query_cache.get_or_encode(query, self._encode)[0]
+    
+    def _excluded_rows(self) -> np.ndarray:
+        """Sorted tombstoned rows, cached between deletes"""
+        if self._tombstone_array is None:
+            self._tombstone_array = np.array(sorted(self.tombstones), dtype='int64')
+        return self._tombstone_array
+    
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        mode: Optional[str] = None
+    ) -> List[SearchResult]:
+        """Perform semantic search.
+
+        nprobe / ef_search override the index defaults. filters restrict the
+        search to documents whose metadata matches (see MetadataIndex.select);
+        the matching rows are passed to FAISS as an ID selector, so only they
+        are scored. mode is dense, lexical (BM25) or hybrid (both, fused by
+        HYBRID_FUSION); the default is SEARCH_MODE.
+        """
         if not query.strip():
             return []
         
         if limit is None:
             limit = self.max_results
         
+        if self.index_watcher is not None:
+            self.index_watcher.ensure_started()
+        
+        # Pin one version of the index, document store and tombstones for the whole search
+        with self._state_lock.read():
+            return self._search_pinned(query, limit, nprobe, ef_search, filters, mode)
+    
+    def search_many(
+        self,
+        queries: List[str],
+        limit: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        mode: Optional[str] = None
+    ) -> List[List[SearchResult]]:
+        """Semantic search for several queries at once.
+
+        All queries are embedded in one model call and searched with one index
+        search; options apply to every query. Returns one result list per
+        query, in order (empty for blank queries).
+        """
+        if limit is None:
+            limit = self.max_results
+        
+        if self.index_watcher is not None:
+            self.index_watcher.ensure_started()
+        
+        with self._state_lock.read():
+            return self._search_many_pinned(queries, limit, nprobe, ef_search, filters, mode)
+    
+    def _search_pinned(
+        self,
+        query: str,
+        limit: int,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        filters: Optional[Dict],
+        mode: Optional[str]
+    ) -> List[SearchResult]:
+        return self._search_many_pinned([query], limit, nprobe, ef_search, filters, mode)[0]
+    
+    def search_candidates(
+        self,
+        queries: List[str],
+        limit: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        mode: Optional[str] = None,
+        term_stats: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """Unfused dense and BM25 candidates of a lexical or hybrid search_many, for a coordinator to fuse.
+        
+        Each query gets {'dense': [(id, cosine)], 'lexical': [(id, bm25)],
+        'results': {id: SearchResult}}, both lists best first and as deep as
+        this index would fuse. term_stats (one lexical_stats dict per query,
+        summed over shards) makes BM25 scores comparable across shards.
+        """
+        if limit is None:
+            limit = self.max_results
+        
+        if self.index_watcher is not None:
+            self.index_watcher.ensure_started()
+        
+        with self._state_lock.read():
+            return self._search_many_pinned(queries, limit, nprobe, ef_search, filters, mode, term_stats, fuse=False)
+    
+    def lexical_stats(self, queries: List[str]) -> List[Dict]:
+        """BM25 collection statistics of each query (see LexicalIndex.term_stats)"""
+        with self._state_lock.read():
+            return [self.lexical_index.term_stats(query) for query in queries]
+    
+    def _search_many_pinned(
+        self,
+        queries: List[str],
+        limit: int,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        filters: Optional[Dict],
+        mode: Optional[str],
+        term_stats: Optional[List[Dict]] = None,
+        fuse: bool = True
+    ) -> List:
+        mode = str(mode or self.search_mode).lower()
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'; expected one of {', '.join(SEARCH_MODES)}")
+        
+        empty = (lambda: []) if fuse else (lambda: {'dense': [], 'lexical': [], 'results': {}})
+        results = [empty() for _ in queries]
         if not self.index or self.index.ntotal == 0:
             self.logger.warning("No documents in index")
-            return []
+            return results
+        
+        search_limit = min(limit, self.index.ntotal)
+        
+        # Resolve metadata filters to an ID selector (invalid filters raise ValueError)
+        selector = None
+        excluded = None
+        allowed = None
+        post_filter = False
+        if filters:
+            rows = self.metadata_index.select(filters)
+            if self.tombstones:
+                rows = np.setdiff1d(rows, self._excluded_rows(), assume_unique=True)
+            if len(rows) == 0:
+                return results
+            allowed = rows
+            search_limit = min(search_limit, len(rows))
+            if supports_selector(self.index):
+                selector = faiss.IDSelectorBatch(rows)
+            else:
+                # Flat PQ scans every code anyway; rank more candidates and keep the selected rows
+                post_filter = True
+
+            # HNSW only returns selected rows it visits, so widen the search for selective filters
+            if not ef_search and not supports_remove(self.index):
+                ef_search = min(
+                    self.index.ntotal,
+                    max(self.index_settings.ef_search, search_limit * self.index.ntotal // len(rows))
+                )
+        elif self.tombstones and not supports_remove(self.index):
+            # HNSW keeps deleted vectors until compaction
+            excluded = faiss.IDSelectorBatch(self._excluded_rows())
+            selector = faiss.IDSelectorNot(excluded)
         
         try:
-            # Generate query embedding
-            query_embedding = self.model.encode([query], convert_to_tensor=False)
-            query_embedding = query_embedding / np.linalg.norm(query_embedding, axis=1, keepdims=True)
-            query_vector = query_embedding.astype('float32')
+            # Embed the queries and search the index; a single query is batched with
+            # concurrent requests when enabled, several go through as one batch
+            params = search_parameters(self.index, nprobe, ef_search, selector)
+            pending = [i for i, query in enumerate(queries) if query.strip()]
+            # Hybrid search fuses deeper candidate lists than the final limit
+            dense_k = search_limit
+            if mode == 'hybrid':
+                dense_k = min(self.index.ntotal, max(search_limit, self.hybrid_candidates))
+            fetch_k = dense_k
+            if post_filter:
+                fetch_k = min(self.index.ntotal, max(dense_k, 4 * dense_k * self.index.ntotal // len(allowed)))
+            requests = [(queries[i], fetch_k, params) for i in pending] if mode != 'lexical' else []
+            if len(requests) == 1 and self.search_batcher is not None:
+                found = [self.search_batcher.submit(requests[0])]
+            elif requests:
+                found = self._search_batch(requests)
+            else:
+                found = [None] * len(pending)
+            if post_filter and requests:
+                found = self._keep_rows(requests, found, allowed, dense_k)
             
-            # Search in FAISS index
-            search_limit = min(limit, self.index.ntotal)
-            scores, indices = self.index.search(query_vector, search_limit)
-            
-            # Convert results
-            results = []
-            for score, idx in zip(scores[0], indices[0]):
-                if idx >= 0 and idx < len(self.documents):  # Valid index
-                    doc = self.documents[idx]
-                    result = SearchResult(
-                        id=doc['id'],
-                        content=doc['content'][:500] + "..." if len(doc['content']) > 500 else doc['content'],
-                        title=doc['title'],
-                        score=float(score),
-                        metadata=doc['metadata'],
-                        url=doc['url']
-                    )
-                    results.append(result)
-            
-            # Sort by score (descending)
-            results.sort(key=lambda x: x.score, reverse=True)
+            for i, dense in zip(pending, found):
+                if mode == 'dense' and fuse:
+                    results[i] = self._to_results(dense[0][0], dense[1][0])
+                    continue
+                candidates = self._candidates(
+                    queries[i], dense, search_limit, allowed, mode, term_stats[i] if term_stats else None
+                )
+                results[i] = self._fuse(candidates, search_limit, mode) if fuse else self._candidate_results(candidates)
             
-            self.logger.info(f"Search for '{query}' returned {len(results)} results")
+            if not fuse:
+                return results
+            if len(queries) == 1:
+                self.logger.info(f"Search for '{queries[0]}' returned {len(results[0])} results")
+            else:
+                self.logger.info(
+                    f"Batch search of {len(queries)} queries returned {sum(len(r) for r in results)} results"
+                )
             return results
             
         except Exception as e:
             self.logger.error(f"Search error: {str(e)}")
-            return []
+            return [empty() for _ in queries]
     
-    def search_by_filters(self, query: str, filters: Dict, limit: Optional[int] = None) -> List[SearchResult]:
-        """Search with metadata filters"""
-        # Get all results first
-        all_results = self.search(query, self.index.ntotal if self.index else 0)
-        
-        # Apply filters
-        filtered_results = []
-        for result in all_results:
-            metadata = result.metadata
-            match = True
-            
-            for key, value in filters.items():
-                if key not in metadata or metadata[key] != value:
-                    match = False
-                    break
-            
-            if match:
-                filtered_results.append(result)
-                if limit and len(filtered_results) >= limit:
-                    break
+    def _keep_rows(
+        self,
+        requests: List[Tuple],
+        found: List[Tuple[np.ndarray, np.ndarray]],
+        rows: np.ndarray,
+        k: int
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top k of each search result among the given rows.
+        
+        Queries that come up short of k selected rows (a selective filter
+        whose matches rank low) are searched again over the whole index.
+        """
+        wanted = min(k, len(rows))
+        kept = []
+        retry = []
+        for i, (scores, indices) in enumerate(found):
+            mask = np.isin(indices[0], rows)
+            kept.append((scores[:, mask][:, :k], indices[:, mask][:, :k]))
+            if kept[-1][1].shape[1] < wanted and requests[i][1] < self.index.ntotal:
+                retry.append(i)
+        
+        if retry:
+            full = self._search_batch([(requests[i][0], self.index.ntotal, requests[i][2]) for i in retry])
+            for i, (scores, indices) in zip(retry, full):
+                mask = np.isin(indices[0], rows)
+                kept[i] = (scores[:, mask][:, :k], indices[:, mask][:, :k])
+        return kept
+    
+    def _result(self, row: int, score: float, **signals) -> SearchResult:
+        doc = self.documents[row]
+        return SearchResult(
+            id=doc['id'],
+            content=doc['content'][:500] + "..." if len(doc['content']) > 500 else doc['content'],
+            title=doc['title'],
+            score=float(score),
+            metadata=doc['metadata'],
+            url=doc['url'],
+            **signals
+        )
+    
+    def _valid_rows(self, scores: np.ndarray, indices: np.ndarray) -> List[Tuple[int, float]]:
+        """(row, score) pairs of a FAISS result row, without padding and deleted rows"""
+        return [
+            (int(idx), float(score)) for score, idx in zip(scores, indices)
+            if idx >= 0 and idx < len(self.documents) and idx not in self.tombstones
+        ]
+    
+    def _to_results(self, scores: np.ndarray, indices: np.ndarray) -> List[SearchResult]:
+        """Search results for one query's row of scores and document rows"""
+        results = [self._result(row, score, dense_score=score) for row, score in self._valid_rows(scores, indices)]
+        
+        # Sort by score (descending)
+        results.sort(key=lambda x: x.score, reverse=True)
+        return results
+    
+    def _candidates(
+        self,
+        query: str,
+        dense: Optional[Tuple[np.ndarray, np.ndarray]],
+        limit: int,
+        allowed: Optional[np.ndarray],
+        mode: str,
+        term_stats: Optional[Dict] = None
+    ) -> Tuple[List[Tuple[int, float]], Dict[int, Tuple[float, float]]]:
+        """Dense (row, cosine) pairs and BM25 {row: (score, term coverage)} of one query, best first"""
+        dense_ranked = self._valid_rows(dense[0][0], dense[1][0]) if dense is not None else []
+        if mode == 'dense':
+            return dense_ranked, {}
+        
+        excluded = self._excluded_rows() if self.tombstones and allowed is None else None
+        lexical_k = limit if mode == 'lexical' else max(limit, self.hybrid_candidates)
+        lexical_rows, lexical_scores, coverage = self.lexical_index.search(
+            query, lexical_k, allowed, excluded, term_stats
+        )
+        lexical = {
+            int(row): (float(score), float(share)) for row, score, share in zip(lexical_rows, lexical_scores, coverage)
+        }
+        return dense_ranked, lexical
+    
+    def _fuse(
+        self,
+        candidates: Tuple[List[Tuple[int, float]], Dict[int, Tuple[float, float]]],
+        limit: int,
+        mode: str
+    ) -> List[SearchResult]:
+        """Lexical or hybrid results for one query, fused as HYBRID_FUSION (see fuse_scores)"""
+        dense_ranked, lexical = candidates
+        dense_scores = dict(dense_ranked)
+        ranked = fuse_scores(
+            dense_ranked, [(row, score) for row, (score, _) in lexical.items()], mode,
+            self.fusion, self.rrf_k, self.dense_weight
+        )[:limit]
+        return [
+            self._result(
+                row,
+                score,
+                dense_score=dense_scores.get(row),
+                lexical_score=lexical[row][0] if row in lexical else None,
+                term_coverage=lexical[row][1] if row in lexical else None
+            )
+            for row, score in ranked
+        ]
+    
+    def _candidate_results(
+        self,
+        candidates: Tuple[List[Tuple[int, float]], Dict[int, Tuple[float, float]]]
+    ) -> Dict:
+        """Candidates keyed by document id, with the signals the coordinator fuses"""
+        dense_ranked, lexical = candidates
+        dense_scores = dict(dense_ranked)
+        ids = {}
+        results = {}
+        for row in dict.fromkeys([row for row, _ in dense_ranked] + list(lexical)):
+            result = self._result(
+                row,
+                0.0,
+                dense_score=dense_scores.get(row),
+                lexical_score=lexical[row][0] if row in lexical else None,
+                term_coverage=lexical[row][1] if row in lexical else None
+            )
+            ids[row] = result.id
+            results[result.id] = result
+        return {
+            'dense': [(ids[row], score) for row, score in dense_ranked],
+            'lexical': [(ids[row], score) for row, (score, _) in lexical.items()],
+            'results': results
+        }
+    
+    def _search_batch(self, requests: List[Tuple]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Run (query, k, params) searches with one batched encode.
+        
+        Requests with the same search parameters (none, or one shared object as
+        from search_many) share one index search at their largest k; each gets
+        its own top-k slice back. With compressed storage the index returns
+        FAISS_RESCORE_FACTOR times as many candidates, which are ranked again
+        by their exact float32 similarity.
+        """
+        self._ensure_model()
+        vectors = self.query_cache.get_or_encode_many([query for query, _, _ in requests], self._encode)
+        index = self.index
+        results = [None] * len(requests)
+        
+        groups: Dict[int, List[int]] = {}
+        for i, (_, _, params) in enumerate(requests):
+            groups.setdefault(id(params), []).append(i)
         
-        return filtered_results
+        for members in groups.values():
+            params = requests[members[0]][2]
+            k = max(requests[i][1] for i in members)
+            fetch = k
+            if self.vector_file is not None and self.rescore_factor > 0:
+                fetch = min(index.ntotal, max(k, k * self.rescore_factor))
+            if params is None:
+                scores, indices = index.search(vectors[members], fetch)
+            else:
+                scores, indices = index.search(vectors[members], fetch, params=params)
+            if self.vector_file is not None and self.rescore_factor > 0:
+                # Rows not in the vector file yet (an index built before compression) keep approximate scores
+                rescored = self.vector_file.rescore(vectors[members], indices, k)
+                if rescored is not None:
+                    scores, indices = rescored
+            for row, i in enumerate(members):
+                limit = requests[i][1]
+                results[i] = (scores[row:row + 1, :limit], indices[row:row + 1, :limit])
+        
+        return results
+    
+    def search_by_filters(self, query: str, filters: Dict, limit: Optional[int] = None) -> List[SearchResult]:
+        """Search with metadata filters; without a limit every matching document is ranked"""
+        if limit is None:
+            limit = self.index.ntotal if self.index else 0
+        return self.search(query, limit, filters=filters)
     
     def get_document_by_id(self, doc_id: str) -> Optional[Dict]:
         """Retrieve a document by ID"""
-        if doc_id in self.id_to_doc:
-            doc_index = self.id_to_doc[doc_id]
-            if 0 <= doc_index < len(self.documents):
-                return self.documents[doc_index]
+        with self._state_lock.read():
+            if doc_id in self.id_to_doc:
+                doc_index = self.id_to_doc[doc_id]
+                if 0 <= doc_index < len(self.documents):
+                    return self.documents[doc_index]
         return None
     
     def get_stats(self) -> Dict:
         """Get database statistics"""
         return {
-            'total_documents': len(self.documents),
+            'total_documents': len(self.documents) - len(self.tombstones),
+            'deleted_documents': len(self.tombstones),
             'vector_dimension': self.vector_dim,
             'model_name': self.model_name,
+            'embedding_backend': self._model.backend if self._model else None,
+            'model_state': self.model_state,
+            'index_type': describe_index(self.index),
+            'index_storage': describe_storage(self.index),
+            'rescore_vectors': self.vector_file.get_stats() if self.vector_file else None,
+            'index_version': self.snapshot_generation,
             'index_size': self.index.ntotal if self.index else 0,
+            'id_table': self.id_to_doc.get_stats(),
+            'search_mode': self.search_mode,
+            'lexical_index': self.lexical_index.get_stats(),
+            'embedding_cache': self.embedding_cache.get_stats() if self.embedding_cache else None,
+            'query_cache': self.query_cache.get_stats() if self.query_cache else None,
+            'search_batching': self.search_batcher.get_stats() if self.search_batcher else None,
             'last_updated': time.time()
         }
     
     def rebuild_index(self) -> bool:
-        """Rebuild the entire index from documents"""
-        try:
-            if not self.documents:
-                self.logger.warning("No documents to rebuild index")
+        """Rebuild the entire index from documents
+        
+        The new index is built while searches keep using the current one, and
+        replaces it in a single swap once its snapshot is committed.
+        """
+        with self._writing():
+            try:
+                live_rows = [row for row in range(len(self.documents)) if row not in self.tombstones]
+                if not live_rows:
+                    self.logger.warning("No documents to rebuild index")
+                    return False
+                
+                # Extract all content
+                live_docs = self.documents.get_many(live_rows)
+                texts = [doc['content'] for doc in live_docs]
+                
+                # Generate embeddings
+                self.logger.info(f"Rebuilding index with {len(texts)} documents")
+                embeddings_array = self.embed(texts)
+                
+                # Create new index (trained on a sample for IVF types), keeping row ids
+                new_index = build_index(
+                    embeddings_array, self.vector_dim, self.index_settings,
+                    ids=np.array(live_rows, dtype='int64')
+                )
+                
+                # Rebuild ID table, metadata and lexical indexes
+                id_to_doc = IdTable.from_rows([doc['id'] for doc in live_docs], live_rows)
+                metadata_index = MetadataIndex()
+                lexical_index = self._new_lexical_index()
+                for row, doc in zip(live_rows, live_docs):
+                    metadata_index.add(row, doc['metadata'])
+                    lexical_index.add_document(row, doc)
+                
+                # Commit the new version, then switch readers over to it
+                snapshot = IndexSnapshot(
+                    new_index, id_to_doc, metadata_index, lexical_index, set(self.tombstones),
+                    len(self.documents), uuid.uuid4().hex
+                )
+                staged = []
+                if self.vector_file is not None:
+                    staged += self.vector_file.stage_rewrite(
+                        len(self.documents), np.array(live_rows, dtype='int64'), embeddings_array
+                    )
+                self._commit_files(staged + self._stage_snapshot(
+                    snapshot.index, snapshot.id_to_doc, snapshot.metadata_index, snapshot.lexical_index,
+                    snapshot.tombstones, snapshot.rows, snapshot.generation
+                ))
+                with self._state_lock.write():
+                    self._install(snapshot)
+                
+                self.logger.info("Index rebuilt successfully")
+                return True
+                
+            except Exception as e:
+                self.logger.error(f"Error rebuilding index: {str(e)}")
                 return False
-            
-            # Extract all content
-            texts = [doc['content'] for doc in self.documents]
-            
-            # Generate embeddings
-            self.logger.info(f"Rebuilding index with {len(texts)} documents")
-            embeddings = self.model.encode(texts, convert_to_tensor=False, show_progress_bar=True)
-            
-            # Normalize embeddings
-            embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-            
-            # Create new index
-            new_index = faiss.IndexFlatIP(self.vector_dim)
-            embeddings_array = np.array(embeddings).astype('float32')
-            new_index.add(embeddings_array)
-            
-            # Replace old index
-            self.index = new_index
-            
-            # Rebuild ID mapping
-            self.id_to_doc = {}
-            for i, doc in enumerate(self.documents):
-                self.id_to_doc[doc['id']] = i
-            
-            # Save new index
-            self._save_index()
-            
-            self.logger.info("Index rebuilt successfully")
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"Error rebuilding index: {str(e)}")
+    
+    def rebuild_in_background(self) -> bool:
+        """Start rebuild_index on a background thread; False if one is already running"""
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
             return False
+        self._rebuild_thread = threading.Thread(target=self.rebuild_index, name='vector-rebuild', daemon=True)
+        self._rebuild_thread.start()
+        return True
     
     def delete_document(self, doc_id: str) -> bool:
-        """Delete a document from the index (requires rebuild)"""
-        if doc_id not in self.id_to_doc:
-            return False
+        """Delete a document, or every chunk of a chunked document
         
-        try:
-            # Remove from documents list
-            doc_index = self.id_to_doc[doc_id]
-            del self.documents[doc_index]
-            
-            # Remove from ID mapping
-            del self.id_to_doc[doc_id]
+        The rows are tombstoned and dropped from the index immediately; the
+        space they take is reclaimed later by compaction.
+        """
+        with self._writing():
+            rows = self._rows_for(doc_id)
+            if not rows:
+                return False
             
-            # Update remaining mappings
-            for doc_id_key, index in self.id_to_doc.items():
-                if index > doc_index:
-                    self.id_to_doc[doc_id_key] = index - 1
+            try:
+                self._delete_rows(rows)
+                return True
+                
+            except Exception as e:
+                self.logger.error(f"Error deleting document {doc_id}: {str(e)}")
+                return False
+    
+    def delete_documents(self, doc_ids: List[str]) -> int:
+        """Delete several documents with one tombstone record; returns how many were found"""
+        with self._writing():
+            found = 0
+            rows = set()
+            for doc_id in doc_ids:
+                doc_rows = self._rows_for(doc_id)
+                found += bool(doc_rows)
+                rows.update(doc_rows)
+            if not rows:
+                return 0
             
-            # Rebuild index
-            return self.rebuild_index()
+            try:
+                self._delete_rows(sorted(rows))
+                return found
+                
+            except Exception as e:
+                self.logger.error(f"Error deleting {len(doc_ids)} documents: {str(e)}")
+                return 0
+    
+    def export_records(
+        self,
+        start_row: int,
+        count: int,
+        keep: Optional[Callable[[Dict], bool]] = None
+    ) -> Tuple[List[Dict], Optional[int]]:
+        """Live index records among count rows from start_row, optionally only those keep accepts.
+        
+        Also returns the row to continue from, or None after the last row.
+        Used to move documents between shards (see ShardedVectorService).
+        """
+        with self._state_lock.read():
+            total = len(self.documents)
+            end = min(total, start_row + count)
+            records = [self.documents[row] for row in range(start_row, end) if row not in self.tombstones]
+        if keep is not None:
+            records = [record for record in records if keep(record)]
+        return records, end if end < total else None
+    
+    def import_records(self, records: List[Dict]) -> int:
+        """Add index records from export_records, re-embedding their text (cached embeddings are reused)
+        
+        Records whose id is already indexed are skipped, so importing the same
+        batch twice is harmless.
+        """
+        with self._state_lock.read():
+            records = [record for record in records if record['id'] not in self.id_to_doc]
+        if not records:
+            return 0
+        return self.write_documents(records, self.embed([record['content'] for record in records]), [])
+    
+    def _delete_rows(self, rows: List[int]):
+        """Commit and apply tombstones, scheduling compaction when enough have built up"""
+        self.segment_log.append_delete(rows)
+        with self._state_lock.write():
+            self._apply_deletes(rows)
+        
+        if (len(self.tombstones) >= self.compaction_min_tombstones
+                and len(self.tombstones) >= self.compaction_ratio * len(self.documents)):
+            self.compact_in_background()
+    
+    def compact_in_background(self):
+        """Start compaction on a background thread unless one is already running"""
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self.compact, name='vector-compaction', daemon=True)
+        self._compaction_thread.start()
+    
+    def compact(self) -> bool:
+        """Drop tombstoned rows from the document store and renumber the index"""
+        with self._writing():
+            if not self.tombstones:
+                return False
             
-        except Exception as e:
-            self.logger.error(f"Error deleting document {doc_id}: {str(e)}")
-            return False
+            try:
+                start_time = time.time()
+                live = np.setdiff1d(
+                    np.arange(len(self.documents), dtype='int64'), self._excluded_rows(), assume_unique=True
+                )
+                
+                # Renumber FAISS ids to the compacted rows; no re-embedding needed
+                if supports_remove(self.index):
+                    with self._state_lock.write():
+                        self._make_index_writable()
+                    new_index = renumber_ids(self.index, live)
+                elif self.vector_file is not None and self.vector_file.covers(live):
+                    # Compressed HNSW codes only reconstruct approximately
+                    new_index = build_index(self.vector_file[live], self.vector_dim, self.index_settings)
+                else:
+                    vectors = np.array([self.index.reconstruct(int(row)) for row in live], dtype='float32')
+                    new_index = build_index(vectors.reshape(-1, self.vector_dim), self.vector_dim, self.index_settings)
+                
+                # Compacted documents, ID table, metadata and lexical indexes
+                doc_ids = []
+                metadata_index = MetadataIndex()
+                lexical_index = self._new_lexical_index()
+                
+                def compacted_documents():
+                    for new_row, old_row in enumerate(live.tolist()):
+                        doc = self.documents[old_row]
+                        doc_ids.append(doc['id'])
+                        metadata_index.add(new_row, doc.get('metadata'))
+                        lexical_index.add_document(new_row, doc)
+                        yield doc
+                
+                staged = self.documents.stage_rewrite(compacted_documents())
+                id_to_doc = IdTable.from_rows(doc_ids, range(len(doc_ids)))
+                if self.vector_file is not None:
+                    staged += self.vector_file.stage_subset(live)
+                generation = uuid.uuid4().hex
+                staged += self._stage_snapshot(
+                    new_index, id_to_doc, metadata_index, lexical_index, set(), len(live), generation
+                )
+                self._commit_files(staged)
+                
+                # Switch over
+                reclaimed = len(self.tombstones)
+                with self._state_lock.write():
+                    self.documents.reload()
+                    self._install(IndexSnapshot(
+                        new_index, id_to_doc, metadata_index, lexical_index, set(), len(live), generation
+                    ))
+                
+                self.logger.info(f"Compaction reclaimed {reclaimed} rows in {time.time() - start_time:.2f}s")
+                return True
+                
+            except Exception as e:
+                self.logger.error(f"Error compacting index: {str(e)}")
+                return False
     
     def clear_index(self):
         """Clear all documents and rebuild empty index"""
-        self.documents = []
-        self.id_to_doc = {}
-        self._initialize_new_index()
-        self._save_index()
+        with self._writing():
+            with self._state_lock.write():
+                self.documents.clear()
+                if self.vector_file is not None:
+                    self.vector_file.truncate(0)
+                self._initialize_new_index()
+            self._save_index()
         self.logger.info("Index cleared")
 
 # Example usage and testing
@@ -22,6 +22,7 @@ class RequestMetrics:
     user_id: Optional[str] = None
     tokens_used: int = 0
     cache_hit: bool = False
+    time_to_first_token: Optional[float] = None
 
 @dataclass
 class SystemMetrics:
@@ -111,9 +112,10 @@ class MetricsCollector:
         method: str = 'POST',
         user_id: Optional[str] = None,
         tokens_used: int = 0,
-        cache_hit: bool = False
+        cache_hit: bool = False,
+        time_to_first_token_ms: Optional[float] = None
     ):
-        """Record a request metric"""
+        """Record a request metric; streamed responses also pass their time to first token"""
         with self.lock:
             # Create request metric
             metric = RequestMetrics(
@@ -124,7 +126,8 @@ class MetricsCollector:
                 timestamp=time.time(),
                 user_id=user_id,
                 tokens_used=tokens_used,
-                cache_hit=cache_hit
+                cache_hit=cache_hit,
+                time_to_first_token=time_to_first_token_ms
             )
             
             # Store in history
@@ -250,6 +253,7 @@ class MetricsCollector:
                 'average_response_time_ms': avg_response_time,
                 'recent_average_response_time_ms': recent_avg_response_time,
                 'cache_hit_rate': cache_hit_rate,
+                'time_to_first_token': self._time_to_first_token_summary(self.request_history),
                 'total_tokens_used': sum(req.tokens_used for req in self.request_history),
                 'active_users_count': len(self.active_users),
                 'requests_per_minute': len(recent_requests) * (60 / 300),  # Scale to per minute
@@ -261,6 +265,19 @@ class MetricsCollector:
                 'health_score': self._calculate_health_score()
             }
     
+    def _time_to_first_token_summary(self, requests) -> Dict:
+        """Time to first token of the streamed requests among requests"""
+        times = sorted(req.time_to_first_token for req in requests if req.time_to_first_token is not None)
+        if not times:
+            return {'count': 0, 'average_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0}
+        
+        return {
+            'count': len(times),
+            'average_ms': sum(times) / len(times),
+            'p50_ms': times[len(times) // 2],
+            'p95_ms': times[int(len(times) * 0.95)]
+        }
+    
     def _get_service_metrics(self) -> Dict[str, Dict]:
         """Get per-service metrics breakdown"""
         service_metrics = {}
@@ -391,7 +408,8 @@ class MetricsCollector:
                 'median_response_time_ms': sorted(response_times)[len(response_times) // 2],
                 'p95_response_time_ms': sorted(response_times)[int(len(response_times) * 0.95)],
                 'total_tokens_used': sum(req.tokens_used for req in recent_requests),
-                'cache_hit_rate': sum(1 for req in recent_requests if req.cache_hit) / len(recent_requests)
+                'cache_hit_rate': sum(1 for req in recent_requests if req.cache_hit) / len(recent_requests),
+                'time_to_first_token': self._time_to_first_token_summary(recent_requests)
             }
     
     def export_metrics(self, format_type: str = 'json') -> str:
@@ -415,6 +433,12 @@ class MetricsCollector:
             lines.append(f"# TYPE average_response_time_ms gauge")
             lines.append(f"average_response_time_ms {metrics['average_response_time_ms']}")
             
+            lines.append(f"# HELP time_to_first_token_ms Time to the first streamed token in milliseconds")
+            lines.append(f"# TYPE time_to_first_token_ms gauge")
+            for quantile in ('p50', 'p95'):
+                value = metrics['time_to_first_token'][f'{quantile}_ms']
+                lines.append(f'time_to_first_token_ms{{quantile="0.{quantile[1:]}"}} {value}')
+            
             return '\n'.join(lines)
         else:
             return str(metrics)
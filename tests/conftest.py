@@ -0,0 +1,84 @@
+"""
+Shared fixtures: vector services backed by a deterministic word-hashing embedder instead of a downloaded model
+"""
+import os
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.config import Config
+from src.services import vector_service as vector_service_module
+from src.services.vector_service import VectorService
+
+DIMENSION = 64
+
+class HashingBackend:
+    """Embeds a text as the sum of one fixed random vector per word, so shared words mean similar vectors"""
+
+    name = 'hashing-test'
+    backend = 'hashing'
+    dimension = DIMENSION
+
+    def encode(self, texts, convert_to_tensor=False, show_progress_bar=False, batch_size=32):
+        vectors = np.full((len(texts), DIMENSION), 1e-3, dtype='float32')
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i] += np.random.default_rng(zlib.crc32(word.encode())).normal(size=DIMENSION)
+        return vectors
+
+@pytest.fixture
+def make_vector_service(tmp_path, monkeypatch):
+    """Factory for VectorServices with their own index directory and the hashing embedder"""
+    monkeypatch.setattr(vector_service_module, 'create_embedding_backend', lambda config, backend=None: HashingBackend())
+
+    def make(name: str = 'index', **overrides) -> VectorService:
+        config = {
+            'FAISS_INDEX_PATH': str(tmp_path / name / 'faiss_index'),
+            'EMBEDDING_CACHE_PATH': str(tmp_path / name / 'embedding_cache'),
+            'VECTOR_DIMENSION': DIMENSION,
+            'EMBEDDINGS_LOAD_MODE': 'lazy',
+            'INDEX_WATCH_INTERVAL': 0,
+            **overrides
+        }
+        return VectorService(config)
+
+    return make
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch, make_vector_service):
+    """Factory for the Flask app with its data under tmp_path, the hashing embedder and no Redis"""
+    apps = []
+
+    def make(**overrides):
+        settings = {
+            'OPENAI_API_KEY': 'test',
+            'FAISS_INDEX_PATH': str(tmp_path / 'app' / 'faiss_index'),
+            'EMBEDDING_CACHE_PATH': str(tmp_path / 'app' / 'embedding_cache'),
+            'VECTOR_DIMENSION': DIMENSION,
+            'EMBEDDINGS_LOAD_MODE': 'lazy',
+            'INDEX_WATCH_INTERVAL': 0,
+            'LOG_FILE': str(tmp_path / 'app.log'),
+            'REDIS_PORT': 1,
+            'JOB_SQLITE_PATH': str(tmp_path / 'jobs.db'),
+            'JOB_POLL_INTERVAL': 0.05,
+            'BULK_INGEST_SPOOL_DIR': str(tmp_path / 'ingest'),
+            **overrides
+        }
+        for key, value in settings.items():
+            monkeypatch.setattr(Config, key, value, raising=False)
+        # app.py also builds an app when first imported, from the same settings
+        from app import create_app
+        app = create_app('production')
+        apps.append(app)
+        return app
+
+    yield make
+    if apps:
+        import app as app_module
+        apps.append(app_module.app)
+    for app in apps:
+        app.extensions['job_queue'].stop(5)
@@ -0,0 +1,149 @@
+"""
+OpenAIService batch and streaming generation against the mock OpenAI server from the batch_generate benchmark
+"""
+import threading
+import time
+
+import pytest
+
+from benchmarks.batch_generate import MockOpenAIServer
+from src.config import Config
+from src.services.openai_service import OpenAIService
+
+PROMPTS = [f"Prompt number {i}: write one sentence about topic {i % 17}." for i in range(30)]
+
+@pytest.fixture
+def start_server():
+    """Factory for mock servers serving from a daemon thread"""
+    servers = []
+
+    def start(latency: float = 0.02, requests_per_minute: float = 0, burst_seconds: float = 1) -> MockOpenAIServer:
+        server = MockOpenAIServer(latency, requests_per_minute, burst_seconds)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def make_service(server: MockOpenAIServer, **overrides) -> OpenAIService:
+    config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    config.update({
+        'OPENAI_API_KEY': 'mock',
+        'OPENAI_MODEL': 'mock-model',
+        'OPENAI_BASE_URL': server.base_url,
+        'OPENAI_REQUESTS_PER_MINUTE': 0,
+        'OPENAI_TOKENS_PER_MINUTE': 0,
+        'OPENAI_RATE_LIMIT_BURST_SECONDS': 1,
+        **overrides
+    })
+    return OpenAIService(config)
+
+def assert_answered_in_order(results, prompts=PROMPTS):
+    assert [result.finish_reason for result in results] == ['stop'] * len(prompts)
+    assert [result.content for result in results] == [f"Answer to: {prompt}" for prompt in prompts]
+
+def test_results_come_back_in_prompt_order(start_server):
+    server = start_server()
+    service = make_service(server, OPENAI_BATCH_CONCURRENCY=8)
+    assert_answered_in_order(service.batch_generate(PROMPTS, max_tokens=50))
+
+@pytest.mark.parametrize('concurrency', [1, 4])
+def test_concurrency_stays_within_the_limit(start_server, concurrency):
+    server = start_server(latency=0.05)
+    service = make_service(server, OPENAI_BATCH_CONCURRENCY=concurrency)
+    # Two batches at once share the one pool
+    batches = [threading.Thread(target=service.batch_generate, args=(PROMPTS[:12],)) for _ in range(2)]
+    for batch in batches:
+        batch.start()
+    for batch in batches:
+        batch.join()
+    assert server.stats['requests'] == 24
+    assert server.stats['max_in_flight'] == concurrency
+
+def test_requests_per_minute_limit_avoids_429s(start_server):
+    server = start_server(requests_per_minute=600)
+    # A little under the server's quota, since its window starts when the first burst arrives
+    service = make_service(server, OPENAI_BATCH_CONCURRENCY=8, OPENAI_REQUESTS_PER_MINUTE=540)
+
+    assert_answered_in_order(service.batch_generate(PROMPTS, max_tokens=50))
+    assert server.stats['rejected'] == 0
+    assert server.stats['requests'] == len(PROMPTS)
+    assert service.rate_limiter.requests.get_stats()['waits'] > 0
+
+def test_tokens_per_minute_limit_is_respected(start_server):
+    server = start_server()
+    service = make_service(server, OPENAI_BATCH_CONCURRENCY=8, OPENAI_TOKENS_PER_MINUTE=12000)
+
+    start = time.monotonic()
+    results = service.batch_generate(PROMPTS, max_tokens=20)
+    elapsed = time.monotonic() - start
+    assert_answered_in_order(results)
+
+    # Reservations are settled to the usage the server reported, which the batch cannot take faster than the quota
+    bucket = service.rate_limiter.tokens.get_stats()
+    used = sum(result.tokens_used for result in results)
+    assert bucket['acquired'] == used
+    assert used <= bucket['capacity'] + elapsed * 12000 / 60
+    assert bucket['waits'] > 0
+
+def test_429s_are_retried_through_the_rate_limiter(start_server):
+    # The server allows fewer requests than the limiter was told, e.g. because another process shares the quota
+    server = start_server(requests_per_minute=300)
+    service = make_service(server, OPENAI_BATCH_CONCURRENCY=8, OPENAI_REQUESTS_PER_MINUTE=540)
+    assert service.limited_client.max_retries == 0
+
+    # Each 429 pauses the limiter for the retry-after the server sent, and the call is tried again
+    assert_answered_in_order(service.batch_generate(PROMPTS[:20], max_tokens=50), PROMPTS[:20])
+    assert server.stats['rejected'] > 0
+    assert server.stats['requests'] == 20 + server.stats['rejected']
+    assert service.get_usage_stats()['failed_requests'] == 0
+
+def test_streaming_returns_the_whole_completion(start_server):
+    server = start_server()
+    service = make_service(server, OPENAI_TOKENS_PER_MINUTE=60000)
+
+    stream = service.generate_streaming(PROMPTS[0], max_tokens=50)
+    parts = []
+    while True:
+        try:
+            parts.append(next(stream))
+        except StopIteration as stop:
+            result = stop.value
+            break
+    assert ''.join(parts) == result.content == f"Answer to: {PROMPTS[0]}"
+    assert result.finish_reason == 'stop'
+    assert service.get_usage_stats()['successful_requests'] == 1
+
+def test_streaming_keeps_the_sdk_retries(start_server):
+    # One request a tenth of a second, already used up when the stream starts
+    server = start_server(requests_per_minute=600, burst_seconds=0.1)
+    server.quota.acquire(1)
+    service = make_service(server, OPENAI_REQUESTS_PER_MINUTE=540)
+    assert service.client.max_retries == 3
+
+    # The 429 is retried by the OpenAI client after the retry-after the server sent
+    assert ''.join(service.generate_streaming(PROMPTS[0], max_tokens=50)) == f"Answer to: {PROMPTS[0]}"
+    assert server.stats['rejected'] == 1
+    assert server.stats['requests'] == 2
+
+def test_closing_a_stream_early_settles_its_reservation(start_server):
+    server = start_server(latency=0.2)
+    service = make_service(server, OPENAI_TOKENS_PER_MINUTE=60000)
+    tokens = service.rate_limiter.tokens
+    reserved = service.estimate_tokens(PROMPTS[0]) + 500
+
+    stream = service.generate_streaming(PROMPTS[0], max_tokens=500)
+    first = next(stream)
+    assert tokens.get_stats()['acquired'] == reserved
+    # The client disconnects after the first word
+    stream.close()
+
+    used = service.estimate_tokens(PROMPTS[0]) + service.estimate_tokens(first)
+    assert tokens.get_stats()['acquired'] == used
+    stats = service.get_usage_stats()
+    assert stats['total_requests'] == 1
+    assert stats['cancelled_requests'] == 1
+    assert stats['total_tokens'] == used
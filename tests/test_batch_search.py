@@ -0,0 +1,59 @@
+"""
+Batch search: search_many answers like one search per query, with a single encode and index search
+"""
+import pytest
+
+def documents(count: int = 60):
+    return [
+        {'id': f'doc_{i}', 'title': f'Doc {i}', 'url': f'https://example.com/{i}',
+         'content': f'note {i} about subject s{i} in area a{i % 5}', 'metadata': {'area': i % 5}}
+        for i in range(count)
+    ]
+
+QUERIES = ['subject s3', 'area a2 note 17', '   ', 'note 40 about subject s40']
+
+@pytest.fixture
+def service(make_vector_service):
+    service = make_vector_service()
+    service.add_documents(documents())
+    return service
+
+def ranking(results):
+    return [(result.id, round(result.score, 5)) for result in results]
+
+@pytest.mark.parametrize('mode', ['dense', 'hybrid', 'lexical'])
+def test_search_many_matches_one_search_per_query(service, mode):
+    batch = service.search_many(QUERIES, 5, mode=mode)
+    assert len(batch) == len(QUERIES)
+    assert batch[2] == []
+    for query, results in zip(QUERIES, batch):
+        assert ranking(results) == ranking(service.search(query, 5, mode=mode))
+
+    filtered = service.search_many(QUERIES, 5, mode=mode, filters={'area': 2})
+    assert all(result.metadata['area'] == 2 for results in filtered for result in results)
+
+def test_queries_are_encoded_in_one_call(service, monkeypatch):
+    calls = []
+    encode = service.model.encode
+    monkeypatch.setattr(service.model, 'encode', lambda texts, **kwargs: calls.append(list(texts)) or encode(texts))
+    service.search_many(['first query', 'second query', 'first query'], 3, mode='dense')
+    assert calls == [['first query', 'second query']]
+
+def test_unknown_mode_is_rejected(service):
+    with pytest.raises(ValueError):
+        service.search_many(['subject s3'], 5, mode='fuzzy')
+
+def test_batch_endpoint(make_app):
+    app = make_app(BATCH_SEARCH_MAX_QUERIES=3)
+    client = app.test_client()
+    app.extensions['vector_service'].add_documents(documents(10))
+
+    response = client.post('/api/search/batch', json={'queries': ['subject s3', 'subject s7'], 'limit': 2})
+    assert response.status_code == 200
+    assert response.json['query_count'] == 2
+    assert [entry['query'] for entry in response.json['results']] == ['subject s3', 'subject s7']
+    assert [entry['count'] for entry in response.json['results']] == [2, 2]
+
+    for body in ({}, {'queries': []}, {'queries': 'subject'}, {'queries': ['a', 1]}, {'queries': ['a'] * 4},
+                 {'queries': ['a'], 'mode': 'fuzzy'}):
+        assert client.post('/api/search/batch', json=body).status_code == 400
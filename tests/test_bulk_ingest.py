@@ -0,0 +1,99 @@
+"""
+Bulk NDJSON ingestion: batching, bounded in-flight embedding, skipped lines and job progress
+"""
+import io
+import json
+import threading
+import time
+
+from src.services.bulk_ingest import BulkIngestService
+
+def document(i: int, content: str = None) -> dict:
+    return {'id': f'doc_{i}', 'title': f'Doc {i}', 'url': f'https://example.com/{i}',
+            'content': content or f'bulk note {i} about subject s{i}', 'metadata': {}}
+
+def ndjson(lines) -> bytes:
+    return b''.join((line if isinstance(line, bytes) else json.dumps(line).encode()) + b'\n' for line in lines)
+
+def wait_for_job(service: BulkIngestService, job_id: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while service.get_job(job_id)['status'] in ('queued', 'running'):
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+    return service.get_job(job_id)
+
+def make_bulk(vector_service, tmp_path, **config) -> BulkIngestService:
+    return BulkIngestService(vector_service, {
+        'BULK_INGEST_WORKERS': 0, 'BULK_INGEST_BATCH_SIZE': 4, 'BULK_INGEST_MAX_INFLIGHT': 1,
+        'BULK_INGEST_SPOOL_DIR': str(tmp_path / 'spool'), **config
+    })
+
+def test_upload_is_indexed_in_order_with_bad_lines_skipped(make_vector_service, tmp_path):
+    service = make_vector_service(SEARCH_MODE='dense')
+    bulk = make_bulk(service, tmp_path)
+    upload = ndjson([document(i) for i in range(10)] + [b'{not json', b'', b'[1, 2]', document(3)])
+
+    job = wait_for_job(bulk, bulk.submit(io.BytesIO(upload), chunk_size=7).job_id)
+    assert job['status'] == 'completed', job['error']
+    assert job['bytes_total'] == job['bytes_read'] == len(upload) and job['progress'] == 1.0
+    assert job['documents_read'] == 11 and job['invalid_lines'] == 2
+    assert job['records_indexed'] == 10 and job['documents_skipped'] == 1
+    assert job['batches_written'] == 3
+    # One batch in flight at a time: every later batch waited for the one before it
+    assert job['backpressure_waits'] == 2
+    assert len(job['errors']) == 2 and job['errors'][0].startswith('line 11')
+
+    assert [service.documents[row]['id'] for row in range(10)] == [f'doc_{i}' for i in range(10)]
+    assert service.search('bulk note 8 about subject s8', 1)[0].id == 'doc_8'
+    assert not list((tmp_path / 'spool').iterdir())
+
+def test_upsert_replaces_changed_documents(make_vector_service, tmp_path):
+    service = make_vector_service(SEARCH_MODE='dense')
+    bulk = make_bulk(service, tmp_path)
+    wait_for_job(bulk, bulk.submit(io.BytesIO(ndjson([document(i) for i in range(3)]))).job_id)
+
+    again = ndjson([document(0), document(1, 'rewritten note on volcano eruptions')])
+    assert wait_for_job(bulk, bulk.submit(io.BytesIO(again)).job_id)['records_indexed'] == 0
+    job = wait_for_job(bulk, bulk.submit(io.BytesIO(again), upsert=True).job_id)
+    assert job['records_indexed'] == 1 and job['documents_skipped'] == 1
+    assert service.get_stats()['total_documents'] == 3
+    assert service.search('volcano eruptions', 1)[0].id == 'doc_1'
+
+def test_jobs_beyond_the_limit_are_refused(make_vector_service, tmp_path, monkeypatch):
+    service = make_vector_service()
+    bulk = make_bulk(service, tmp_path, BULK_INGEST_MAX_JOBS=1)
+    release = threading.Event()
+    embed = service.embed
+    monkeypatch.setattr(service, 'embed', lambda texts, encode=None: release.wait(5) and embed(texts, encode))
+
+    first = bulk.submit(io.BytesIO(ndjson([document(1)])))
+    assert bulk.submit(io.BytesIO(ndjson([document(2)]))) is None
+    assert bulk.get_stats()['running_jobs'] == 1
+    release.set()
+    assert wait_for_job(bulk, first.job_id)['status'] == 'completed'
+    assert bulk.submit(io.BytesIO(ndjson([document(2)]))) is not None
+
+def test_a_failing_write_fails_the_job(make_vector_service, tmp_path, monkeypatch):
+    service = make_vector_service()
+    bulk = make_bulk(service, tmp_path)
+
+    def fail(*args):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(service, 'write_documents', fail)
+    job = wait_for_job(bulk, bulk.submit(io.BytesIO(ndjson([document(1)]))).job_id)
+    assert job['status'] == 'failed' and job['error'] == 'disk full'
+
+def test_bulk_endpoint(make_app):
+    app = make_app(BULK_INGEST_WORKERS=0)
+    client = app.test_client()
+    response = client.post('/api/ingest/bulk', data=ndjson([document(i) for i in range(6)]),
+                           content_type='application/x-ndjson')
+    assert response.status_code == 202
+    status_url = response.json['status_url']
+
+    deadline = time.monotonic() + 10
+    while client.get(status_url).json['status'] in ('queued', 'running'):
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+    assert client.get(status_url).json['records_indexed'] == 6
+    assert client.get('/api/ingest/jobs/unknown').status_code == 404
@@ -0,0 +1,90 @@
+"""
+Deletes and upserts: tombstoned rows leave search results at once, and compaction reclaims them without re-embedding
+"""
+import pytest
+
+def documents(count: int = 60):
+    return [
+        {'id': f'doc_{i}', 'title': f'Doc {i}', 'url': f'https://example.com/{i}',
+         'content': f'note {i} about subject s{i} and area a{i % 7}', 'metadata': {'area': i % 7}}
+        for i in range(count)
+    ]
+
+def query(i: int) -> str:
+    return f'note {i} about subject s{i} and area a{i % 7}'
+
+def ids(results):
+    return [result.id for result in results]
+
+@pytest.mark.parametrize('index_type', ['flat', 'ivf_flat', 'hnsw'])
+def test_delete_then_compact_then_search(make_vector_service, index_type):
+    config = {'FAISS_INDEX_TYPE': index_type, 'SEARCH_MODE': 'dense', 'COMPACTION_MIN_TOMBSTONES': 1000}
+    service = make_vector_service(**config)
+    service.add_documents(documents())
+
+    assert service.delete_document('doc_5')
+    assert not service.delete_document('doc_5')
+    assert service.delete_documents(['doc_6', 'doc_7', 'missing']) == 2
+    assert service.get_document_by_id('doc_5') is None
+    assert service.get_stats()['total_documents'] == 57
+    for i in (5, 6, 7):
+        assert f'doc_{i}' not in ids(service.search(query(i), 10))
+    # Deletes are committed to the log, so they survive a restart before compaction
+    assert 'doc_5' not in ids(make_vector_service(**config).search(query(5), 10))
+
+    assert service.compact()
+    assert len(service.documents) == 57 and service.get_stats()['deleted_documents'] == 0
+    assert service.get_document_by_id('doc_8')['content'] == query(8)
+    for i in (4, 8, 59):
+        assert service.search(query(i), 1)[0].id == f'doc_{i}'
+    assert 'doc_6' not in ids(service.search(query(6), 10))
+    assert all(result.metadata['area'] == 3 for result in service.search(query(3), 5, filters={'area': 3}))
+
+    reopened = make_vector_service(**config)
+    assert reopened.get_stats()['total_documents'] == 57
+    assert reopened.search(query(59), 1)[0].id == 'doc_59'
+
+def test_upsert_replaces_only_changed_documents(make_vector_service):
+    service = make_vector_service(SEARCH_MODE='dense')
+    service.add_documents(documents(10))
+    # Without upsert, and for an unchanged document, nothing is written
+    assert service.add_documents(documents(10)[:1]) == 0
+    assert service.add_documents(documents(10)[:1], upsert=True) == 0
+
+    changed = {**documents(10)[3], 'content': 'rewritten text on volcano eruptions'}
+    assert service.add_documents([changed], upsert=True) == 1
+    assert service.get_stats()['total_documents'] == 10
+    assert service.get_document_by_id('doc_3')['content'] == changed['content']
+    assert service.search('volcano eruptions', 1)[0].id == 'doc_3'
+    assert ids(service.search(query(3), 10)).count('doc_3') == 1
+
+def test_deleting_a_chunked_document_deletes_every_chunk(make_vector_service):
+    service = make_vector_service(SEARCH_MODE='dense')
+    service.add_documents(documents(5) + [{
+        'id': 'long', 'title': 'Long', 'url': 'https://example.com/long', 'content': 'unused',
+        'chunks': [{'text': 'first chunk on glaciers'}, {'text': 'second chunk on glaciers'}]
+    }])
+    assert service.get_stats()['total_documents'] == 7
+
+    assert service.delete_document('long')
+    assert service.get_stats()['total_documents'] == 5
+    assert not [result for result in service.search('chunk on glaciers', 7) if result.id.startswith('long')]
+
+def test_compaction_starts_once_enough_rows_are_deleted(make_vector_service):
+    service = make_vector_service(COMPACTION_MIN_TOMBSTONES=5, COMPACTION_TOMBSTONE_RATIO=0.1)
+    service.add_documents(documents())
+    service.delete_documents([f'doc_{i}' for i in range(4)])
+    assert service._compaction_thread is None
+
+    service.delete_documents([f'doc_{i}' for i in range(4, 7)])
+    service._compaction_thread.join(10)
+    assert len(service.documents) == 53 and not service.tombstones
+
+def test_delete_endpoint(make_app):
+    app = make_app()
+    client = app.test_client()
+    app.extensions['vector_service'].add_documents(documents(3))
+
+    assert client.delete('/api/documents/doc_1').status_code == 200
+    assert client.delete('/api/documents/doc_1').status_code == 404
+    assert app.extensions['vector_service'].get_document_by_id('doc_1') is None
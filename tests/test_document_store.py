@@ -0,0 +1,80 @@
+"""
+Memory-mapped document store: row lookups, appends, torn writes, rewrites and migration from the JSON docs file
+"""
+import json
+import os
+
+import pytest
+
+from src.services.document_store import DocumentStore
+
+DOCS = [{'id': f'doc_{i}', 'content': f'note {i} — ünïcode', 'metadata': {'n': i}} for i in range(5)]
+
+def test_rows_are_read_back_by_number(tmp_path):
+    store = DocumentStore(str(tmp_path / 'index'))
+    assert len(store) == 0
+    store.extend(DOCS[:3])
+    store.extend([])
+    store.extend(DOCS[3:])
+
+    assert len(store) == 5
+    assert store[0] == DOCS[0] and store[-1] == DOCS[4]
+    assert store.get_many([4, 1]) == [DOCS[4], DOCS[1]]
+    assert list(store) == DOCS
+    with pytest.raises(IndexError):
+        store[5]
+
+    assert list(DocumentStore(str(tmp_path / 'index'))) == DOCS
+
+def test_torn_appends_are_dropped_on_open(tmp_path):
+    store = DocumentStore(str(tmp_path / 'index'))
+    store.extend(DOCS[:2])
+    # A crash part-way through the next append: some record bytes and half an offset
+    with open(store.blob_file, 'ab') as f:
+        f.write(b'{"id":"torn"')
+    with open(store.offsets_file, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+
+    reopened = DocumentStore(str(tmp_path / 'index'))
+    assert list(reopened) == DOCS[:2]
+    reopened.extend(DOCS[2:3])
+    assert list(DocumentStore(str(tmp_path / 'index'))) == DOCS[:3]
+
+def test_truncate_drops_uncommitted_rows(tmp_path):
+    store = DocumentStore(str(tmp_path / 'index'))
+    store.extend(DOCS)
+    store.truncate(2)
+    assert list(store) == DOCS[:2]
+    assert os.path.getsize(store.blob_file) == sum(len(DocumentStore._encode(doc)) for doc in DOCS[:2])
+    store.extend(DOCS[4:])
+    assert list(DocumentStore(str(tmp_path / 'index'))) == DOCS[:2] + DOCS[4:]
+
+def test_rewrite_is_picked_up_by_other_readers_on_reload(tmp_path):
+    store = DocumentStore(str(tmp_path / 'index'))
+    store.extend(DOCS)
+    reader = DocumentStore(str(tmp_path / 'index'))
+
+    store.rewrite(DOCS[::2])
+    assert list(store) == DOCS[::2]
+    # The reader keeps its mapping of the old files until it reloads
+    assert len(reader) == 5
+    reader.reload()
+    assert list(reader) == DOCS[::2]
+
+    store.clear()
+    assert len(store) == 0
+
+def test_legacy_json_documents_are_migrated(make_vector_service, tmp_path):
+    os.makedirs(tmp_path / 'index')
+    documents = [
+        {'id': f'doc_{i}', 'title': f'Doc {i}', 'url': f'https://example.com/{i}',
+         'content': f'legacy note {i} about subject s{i}', 'metadata': {}}
+        for i in range(4)
+    ]
+    with open(tmp_path / 'index' / 'faiss_index_docs.json', 'w', encoding='utf-8') as f:
+        json.dump(documents, f)
+
+    service = make_vector_service()
+    assert DocumentStore.exists(service.index_path)
+    assert service.get_stats()['total_documents'] == 4
+    assert service.search('legacy note 2 about subject s2', 1)[0].id == 'doc_2'
@@ -0,0 +1,95 @@
+"""
+Embedding backends: selection and fallback, the ONNX parity check, and pooling of ONNX Runtime outputs
+"""
+import numpy as np
+import pytest
+
+from src.services import embedding_backend
+from src.services.embedding_backend import OnnxBackend, create_embedding_backend, parity_check
+
+class FakeSentenceTransformer:
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.backend = 'sentence-transformers'
+
+@pytest.fixture
+def backends(monkeypatch):
+    """Records which ONNX backends were tried; fails them when asked to"""
+    tried = []
+    state = {'fail': False}
+
+    def onnx(model_name, model_dir, quantize=True, min_cosine=0.98, threads=0):
+        tried.append({'model': model_name, 'quantize': quantize, 'min_cosine': min_cosine})
+        if state['fail']:
+            raise RuntimeError('parity check failed')
+        return 'onnx-int8' if quantize else 'onnx'
+
+    monkeypatch.setattr(embedding_backend, 'OnnxBackend', onnx)
+    monkeypatch.setattr(embedding_backend, 'SentenceTransformerBackend', FakeSentenceTransformer)
+    return tried, state
+
+def test_backend_is_chosen_by_config(backends):
+    tried, _ = backends
+    assert create_embedding_backend({'EMBEDDINGS_BACKEND': 'ONNX-INT8', 'EMBEDDINGS_PARITY_MIN_COSINE': '0.99'}) \
+        == 'onnx-int8'
+    assert create_embedding_backend({}, backend='onnx') == 'onnx'
+    assert tried[0] == {'model': 'all-MiniLM-L6-v2', 'quantize': True, 'min_cosine': 0.99}
+    assert not tried[1]['quantize']
+
+    default = create_embedding_backend({'EMBEDDINGS_MODEL': 'other-model'})
+    assert isinstance(default, FakeSentenceTransformer) and default.model_name == 'other-model'
+    assert isinstance(create_embedding_backend({'EMBEDDINGS_BACKEND': 'tensorrt'}), FakeSentenceTransformer)
+    assert len(tried) == 2
+
+def test_unusable_onnx_falls_back_to_sentence_transformers(backends, caplog):
+    tried, state = backends
+    state['fail'] = True
+    assert isinstance(create_embedding_backend({'EMBEDDINGS_BACKEND': 'onnx-int8'}), FakeSentenceTransformer)
+    assert len(tried) == 1
+    assert 'parity check failed' in caplog.text
+
+def test_parity_check_compares_directions_not_lengths():
+    reference = np.array([[1.0, 0.0], [0.0, 2.0]], dtype='float32')
+    assert parity_check(reference, reference * 3) == pytest.approx({'mean_cosine': 1.0, 'min_cosine': 1.0, 'texts': 2})
+    drifted = parity_check(reference, np.array([[1.0, 1.0], [0.0, 1.0]], dtype='float32'))
+    assert drifted['min_cosine'] == pytest.approx(np.sqrt(0.5))
+    assert drifted['mean_cosine'] == pytest.approx((1 + np.sqrt(0.5)) / 2)
+
+class FakeTokenizer:
+    """One token per word, padded to the longest text in the batch"""
+
+    def __call__(self, texts, padding, truncation, max_length, return_tensors):
+        lengths = [min(len(text.split()), max_length) for text in texts]
+        width = max(lengths)
+        ids = np.array([[i + 1 for i in range(n)] + [0] * (width - n) for n in lengths])
+        return {'input_ids': ids, 'attention_mask': (ids > 0).astype('int64')}
+
+class FakeSession:
+    """Each token's hidden state is its position in the sequence, in every dimension"""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, outputs, inputs):
+        self.batches.append(len(inputs['input_ids']))
+        assert inputs['token_type_ids'].shape == inputs['input_ids'].shape
+        return [np.repeat(inputs['input_ids'][..., None].astype('float32'), 3, axis=2)]
+
+def onnx_backend(pooling: str) -> OnnxBackend:
+    backend = OnnxBackend.__new__(OnnxBackend)
+    backend.session = FakeSession()
+    backend.tokenizer = FakeTokenizer()
+    backend.input_names = {'input_ids', 'attention_mask', 'token_type_ids'}
+    backend.meta = {'pooling': pooling, 'max_seq_length': 4}
+    return backend
+
+def test_onnx_outputs_are_pooled_over_real_tokens_only():
+    backend = onnx_backend('mean')
+    vectors = backend.encode(['one', 'one two three', 'a b c d e f'], batch_size=2)
+    # Padding is left out of the mean, and texts are truncated to max_seq_length tokens
+    assert vectors[:, 0].tolist() == [1.0, 2.0, 2.5]
+    assert vectors.shape == (3, 3) and vectors.dtype == np.float32
+    assert backend.session.batches == [2, 1]
+
+    assert onnx_backend('cls').encode(['one two', 'three'])[:, 0].tolist() == [1.0, 1.0]
+    assert onnx_backend('mean').encode([]).shape == (0, 0)
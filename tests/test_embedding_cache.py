@@ -0,0 +1,97 @@
+"""
+Content-addressed embedding cache: unchanged text is encoded once, across restarts, processes and hosts
+"""
+import numpy as np
+
+from src.services.embedding_cache import EmbeddingCache
+
+DIM = 8
+
+class Encoder:
+    """Deterministic encoder that records every text it is asked to encode"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(text) + i for i in range(DIM)] for text in texts], dtype='float32')
+
+class FakeRedis:
+    """The parts of CacheService the embedding cache uses"""
+
+    redis_available = True
+
+    def __init__(self):
+        self.store = {}
+
+    def get_cached_embeddings_many(self, keys):
+        return {key: self.store[key] for key in keys if key in self.store}
+
+    def cache_embeddings_many(self, values, ttl=None):
+        self.store.update(values)
+
+def test_only_misses_are_encoded_and_each_text_once(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'test/model', DIM)
+    encode = Encoder()
+
+    first = cache.get_or_encode(['alpha', 'beta', 'alpha'], encode)
+    assert encode.calls == [['alpha', 'beta']]
+    np.testing.assert_array_equal(first[0], first[2])
+
+    second = cache.get_or_encode(['beta', 'gamma', 'alpha'], encode)
+    assert encode.calls[1] == ['gamma']
+    np.testing.assert_array_equal(second[0], first[1])
+    np.testing.assert_array_equal(second[2], first[0])
+    assert cache.get_stats() == {'entries': 3, 'local_hits': 2, 'redis_hits': 0, 'misses': 3}
+
+def test_entries_survive_a_restart_and_torn_tails_are_dropped(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'test/model', DIM)
+    cache.get_or_encode(['alpha', 'beta'], Encoder())
+    # A crash after writing a vector but before its key
+    with open(cache.vectors_file, 'ab') as f:
+        f.write(np.ones(DIM, dtype='float32').tobytes())
+
+    reopened = EmbeddingCache(str(tmp_path), 'test/model', DIM)
+    assert len(reopened) == 2
+    encode = Encoder()
+    reopened.get_or_encode(['alpha', 'beta', 'delta'], encode)
+    assert encode.calls == [['delta']]
+    np.testing.assert_array_equal(
+        EmbeddingCache(str(tmp_path), 'test/model', DIM).get_or_encode(['delta'], Encoder())[0],
+        Encoder()(['delta'])[0]
+    )
+
+def test_each_model_and_dimension_has_its_own_entries(tmp_path):
+    EmbeddingCache(str(tmp_path), 'model-a', DIM).get_or_encode(['alpha'], Encoder())
+    assert len(EmbeddingCache(str(tmp_path), 'model-b', DIM)) == 0
+    # Vectors of another size cannot be reused
+    assert len(EmbeddingCache(str(tmp_path), 'model-a', DIM * 2)) == 0
+
+def test_redis_tier_is_shared_between_hosts(tmp_path):
+    redis = FakeRedis()
+    EmbeddingCache(str(tmp_path / 'host_a'), 'model', DIM, redis).get_or_encode(['alpha', 'beta'], Encoder())
+
+    other_host = EmbeddingCache(str(tmp_path / 'host_b'), 'model', DIM, redis)
+    encode = Encoder()
+    other_host.get_or_encode(['alpha', 'beta', 'gamma'], encode)
+    assert encode.calls == [['gamma']]
+    assert other_host.get_stats()['redis_hits'] == 2
+    # Redis hits are copied to the local store
+    other_host.get_or_encode(['alpha'], encode)
+    assert other_host.get_stats()['local_hits'] == 1
+
+def test_rebuild_reuses_cached_embeddings(make_vector_service, monkeypatch):
+    service = make_vector_service()
+    service.add_documents([
+        {'id': f'doc_{i}', 'title': f'Doc {i}', 'url': f'https://example.com/{i}',
+         'content': f'cached note {i}', 'metadata': {}}
+        for i in range(10)
+    ])
+    encoded = []
+    encode = service.model.encode
+    monkeypatch.setattr(service.model, 'encode', lambda texts, **kwargs: encoded.extend(texts) or encode(texts))
+
+    assert service.rebuild_index()
+    assert encoded == []
+    assert service.search('cached note 4', 1)[0].id == 'doc_4'
@@ -0,0 +1,60 @@
+"""
+Metadata-filtered search on every index storage, including flat PQ, which cannot take an id selector
+"""
+import faiss
+import numpy as np
+import pytest
+
+from src.services.index_factory import IndexSettings, build_index, search_parameters, supports_selector
+
+TOPICS = ['neural networks', 'databases', 'cooking', 'astronomy', 'finance', 'music', 'travel', 'biology']
+
+def documents(count: int = 300):
+    return [
+        {
+            'id': f'doc_{i}',
+            'title': f'Document {i}',
+            'url': f'https://example.com/{i}',
+            'content': f'Document {i} discusses {TOPICS[i % len(TOPICS)]} and subject code{i % 97}.',
+            'metadata': {'category': TOPICS[i % len(TOPICS)]}
+        }
+        for i in range(count)
+    ]
+
+def test_flat_pq_rejects_selectors():
+    vectors = np.random.default_rng(3).normal(size=(300, 16)).astype('float32')
+    index = build_index(vectors, 16, IndexSettings(storage='pq', pq_m=4, pq_nbits=4))
+    assert not supports_selector(index)
+    with pytest.raises(ValueError):
+        search_parameters(index, selector=faiss.IDSelectorBatch(np.arange(10, dtype='int64')))
+
+    sq8 = build_index(vectors, 16, IndexSettings(storage='sq8'))
+    assert supports_selector(sq8)
+    assert search_parameters(sq8, selector=faiss.IDSelectorBatch(np.arange(10, dtype='int64'))) is not None
+
+@pytest.mark.parametrize('storage', ['float32', 'sq8', 'pq'])
+def test_filtered_search_returns_only_matching_documents(make_vector_service, storage):
+    service = make_vector_service(FAISS_STORAGE=storage, FAISS_PQ_M=8, FAISS_PQ_NBITS=4, SEARCH_MODE='dense')
+    service.add_documents(documents())
+    service.rebuild_index()
+    assert service.get_stats()['index_storage'] == storage
+
+    results = service.search('cooking subject code42', 10, filters={'category': 'cooking'})
+    assert len(results) == 10
+    assert all(result.metadata['category'] == 'cooking' for result in results)
+
+    # A selective filter whose matches rank low still fills the limit
+    results = service.search('astronomy', 5, filters={'category': 'music'})
+    assert len(results) == 5
+    assert all(result.metadata['category'] == 'music' for result in results)
+
+def test_search_errors_are_logged_and_return_no_results(make_vector_service, monkeypatch, caplog):
+    service = make_vector_service(SEARCH_MODE='dense')
+    service.add_documents(documents(20))
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('index search failed')
+    monkeypatch.setattr(service, '_search_batch', fail)
+    assert service.search('cooking', 5) == []
+    assert service.search_many(['cooking', 'music'], 5) == [[], []]
+    assert 'index search failed' in caplog.text
@@ -0,0 +1,108 @@
+"""
+Hot index swaps: searches keep running through a rebuild, and other processes' versions are picked up by the watcher
+"""
+import os
+import threading
+import time
+
+from src.services.file_watcher import FileWatcher
+
+def documents(prefix: str = 'doc', count: int = 200):
+    return [
+        {'id': f'{prefix}_{i}', 'title': f'{prefix} {i}', 'url': f'https://example.com/{prefix}/{i}',
+         'content': f'{prefix} note {i} about subject s{i}', 'metadata': {}}
+        for i in range(count)
+    ]
+
+def wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+def test_searches_keep_answering_during_a_rebuild(make_vector_service):
+    service = make_vector_service(SEARCH_MODE='dense')
+    service.add_documents(documents())
+    before = service.snapshot_generation
+
+    answers, stop = [], threading.Event()
+
+    def search():
+        while not stop.is_set():
+            answers.append([result.id for result in service.search('doc note 7 about subject s7', 1)])
+
+    readers = [threading.Thread(target=search) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    try:
+        for _ in range(3):
+            assert service.rebuild_index()
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join(5)
+
+    assert answers and all(answer == ['doc_7'] for answer in answers)
+    assert service.snapshot_generation not in (None, before)
+
+def test_a_version_committed_elsewhere_is_picked_up(make_vector_service):
+    reader = make_vector_service(INDEX_WATCH_INTERVAL=0.05, SEARCH_MODE='dense')
+    writer = make_vector_service(SEARCH_MODE='dense')
+
+    # A new segment from another process
+    writer.add_documents(documents('first', 5))
+    wait_for(lambda: reader.get_stats()['total_documents'] == 5)
+    assert reader.search('first note 3 about subject s3', 1)[0].id == 'first_3'
+
+    # A whole new snapshot version
+    writer.add_documents(documents('second', 5))
+    assert writer.rebuild_index()
+    wait_for(lambda: reader.snapshot_generation == writer.snapshot_generation)
+    assert reader.get_stats()['total_documents'] == 10
+    assert reader.search('second note 1 about subject s1', 1)[0].id == 'second_1'
+    assert reader.index_watcher.stats['errors'] == 0
+
+def test_file_watcher_reports_created_changed_and_removed_files(tmp_path):
+    path = tmp_path / 'snapshot.json'
+    calls = []
+    watcher = FileWatcher([str(path)], lambda: calls.append(path.exists()), interval=60)
+    assert not watcher.check()
+
+    path.write_text('1')
+    assert watcher.check()
+    # Replaced with a file of the same size
+    path.with_suffix('.tmp').write_text('2')
+    os.replace(path.with_suffix('.tmp'), path)
+    assert watcher.check()
+    path.unlink()
+    assert watcher.check()
+    assert not watcher.check()
+    assert calls == [True, True, False]
+
+def test_file_watcher_survives_a_failing_callback(tmp_path):
+    path = tmp_path / 'wal.log'
+
+    def fail():
+        raise RuntimeError('reload failed')
+
+    watcher = FileWatcher([str(path)], fail, interval=0.05)
+    watcher.ensure_started()
+    try:
+        path.write_text('1')
+        wait_for(lambda: watcher.stats['errors'] == 1)
+        path.write_text('12')
+        wait_for(lambda: watcher.stats['changes'] == 2)
+    finally:
+        watcher.stop()
+
+def test_rebuild_endpoint_queues_a_rebuild(make_app):
+    app = make_app()
+    client = app.test_client()
+    service = app.extensions['vector_service']
+    service.add_documents(documents(count=5))
+
+    response = client.post('/api/index/rebuild')
+    assert response.status_code == 202
+    job_id = response.json['job_id']
+    wait_for(lambda: client.get(f"/api/jobs/{job_id}").json['status'] == 'succeeded')
+    assert service.snapshot_generation is not None
@@ -0,0 +1,74 @@
+"""
+Hybrid BM25 + dense retrieval, and the relevance gates that decide which knowledge base results reach the prompt
+"""
+import pytest
+
+from src.services.content_generator import ContentGenerator
+
+DOCUMENTS = [
+    {'id': 'quantum_1', 'title': 'Entanglement', 'url': 'https://example.com/q1',
+     'content': 'quantum entanglement', 'metadata': {}},
+    {'id': 'quantum_2', 'title': 'Entanglement basics', 'url': 'https://example.com/q2',
+     'content': 'quantum entanglement basics', 'metadata': {}},
+    {'id': 'quantum_3', 'title': 'Entanglement explained', 'url': 'https://example.com/q3',
+     'content': 'quantum entanglement explained', 'metadata': {}},
+    {'id': 'zebra', 'title': 'Savanna animals', 'url': 'https://example.com/zebra',
+     'content': 'zebra herds graze the savanna grassland at dawn', 'metadata': {}},
+] + [
+    {'id': f'filler_{i}', 'title': f'Filler {i}', 'url': f'https://example.com/f{i}',
+     'content': f'unrelated filler text number n{i} about gardening', 'metadata': {}}
+    for i in range(12)
+]
+
+@pytest.fixture
+def service(make_vector_service):
+    # Few dense candidates, so a document found only by BM25 has no cosine similarity
+    service = make_vector_service(SEARCH_MODE='hybrid', HYBRID_CANDIDATES=3)
+    service.add_documents(DOCUMENTS)
+    return service
+
+@pytest.fixture
+def generator(service):
+    return ContentGenerator(None, service, None, {'WEB_SEARCH_SPECULATIVE': False})
+
+def test_lexical_search_finds_exact_terms(service):
+    results = service.search('zebra', 3, mode='lexical')
+    assert results[0].id == 'zebra'
+    assert results[0].term_coverage == 1.0
+    assert results[0].dense_score is None
+
+def test_hybrid_results_carry_both_signals(service):
+    results = service.search('quantum entanglement zebra', 5, mode='hybrid')
+    by_id = {result.id: result for result in results}
+    assert {'quantum_1', 'zebra'} <= set(by_id)
+    assert by_id['quantum_1'].dense_score > 0.7
+    assert by_id['quantum_1'].lexical_score > 0
+    # Ranked first by BM25 alone, which puts its fused score above a cosine cutoff
+    assert by_id['zebra'].dense_score is None
+    assert by_id['zebra'].score >= 0.3
+    assert by_id['zebra'].term_coverage < 1.0
+
+def test_irrelevant_lexical_only_hit_is_dropped(generator, service):
+    # Nothing in the knowledge base is about this. The zebra document shares one word with it, so it tops
+    # the BM25 list, and the top dense results are unrelated; both get a fused score above 0.3
+    query = 'zebra migration patterns'
+    results = {result.id: result for result in service.search(query, 5)}
+    assert results['zebra'].dense_score is None
+    assert results['zebra'].score >= generator.kb_source_min_score
+
+    retrieval = generator._retrieve(query, 5, use_web_search=False)
+    assert retrieval['sources'] == []
+
+def test_relevant_results_pass_the_gates(generator):
+    retrieval = generator._retrieve('quantum entanglement zebra', 5, use_web_search=False)
+    ids = [source['id'] for source in retrieval['sources']]
+    assert 'quantum_1' in ids and 'zebra' not in ids
+    assert all(source['dense_score'] >= generator.kb_source_min_score for source in retrieval['sources'])
+
+def test_lexical_only_hit_with_every_query_term_is_kept(generator):
+    retrieval = generator._retrieve('zebra savanna', 5, use_web_search=False)
+    assert 'zebra' in [source['id'] for source in retrieval['sources']]
+
+def test_kb_confidence_uses_cosine_or_full_term_match(generator, service):
+    assert generator._kb_confident(service.search('quantum entanglement', 3))
+    assert not generator._kb_confident(service.search('quantum zebra gardening', 3))
@@ -0,0 +1,76 @@
+"""
+Binary id table: dict-like lookups over a memory-mapped sorted hash table, with pending changes on top
+"""
+import os
+import pickle
+
+import pytest
+
+from src.services.id_table import IdTable
+
+def test_lookups_like_a_dict():
+    table = IdTable.from_rows(['a', 'b', 'a', 'c'], [0, 1, 2, 3])
+    # The last row of a repeated id wins
+    assert len(table) == 3 and table['a'] == 2 and table.get('c') == 3
+    assert 'b' in table and 'z' not in table
+    assert table.get('z', -5) == -5
+    with pytest.raises(KeyError):
+        table['z']
+    with pytest.raises(KeyError):
+        del table['z']
+
+    empty = IdTable.from_rows([], [])
+    assert len(empty) == 0 and 'a' not in empty
+
+def test_changes_after_loading_are_saved_with_the_table(tmp_path):
+    path = str(tmp_path / 'ids.bin')
+    IdTable.from_mapping({f'doc_{i}': i for i in range(1000)}).save(path)
+
+    table = IdTable.load(path)
+    assert table.mapped and len(table) == 1000
+    assert table['doc_0'] == 0 and table['doc_999'] == 999
+
+    table['new'] = 1000
+    table['doc_5'] = 1001
+    del table['doc_7']
+    table['added_then_deleted'] = 1002
+    del table['added_then_deleted']
+    assert len(table) == 1000
+    assert table['doc_5'] == 1001 and 'doc_7' not in table and 'added_then_deleted' not in table
+    assert table.get_stats()['pending_changes'] == 3
+
+    table.save(str(tmp_path / 'ids2.bin'))
+    saved = IdTable.load(str(tmp_path / 'ids2.bin'))
+    assert len(saved) == 1000 and saved.get_stats()['pending_changes'] == 0
+    assert saved['new'] == 1000 and saved['doc_5'] == 1001 and 'doc_7' not in saved
+    assert all(saved[f'doc_{i}'] == i for i in range(0, 1000, 37) if i not in (5, 7))
+    assert os.path.getsize(tmp_path / 'ids2.bin') == saved.get_stats()['table_bytes']
+
+def test_damaged_files_are_rejected(tmp_path):
+    path = tmp_path / 'ids.bin'
+    IdTable.from_mapping({'a': 0, 'b': 1}).save(str(path))
+    data = path.read_bytes()
+
+    path.write_bytes(data[:-4])
+    with pytest.raises(ValueError):
+        IdTable.load(str(path))
+    path.write_bytes(b'NOTATABL' + data[8:])
+    with pytest.raises(ValueError):
+        IdTable.load(str(path))
+
+def test_pickled_mapping_of_older_snapshots_is_read(make_vector_service):
+    service = make_vector_service()
+    service.add_documents([
+        {'id': f'doc_{i}', 'title': f'Doc {i}', 'url': f'https://example.com/{i}',
+         'content': f'note {i} on subject s{i}', 'metadata': {}}
+        for i in range(5)
+    ])
+    assert service.rebuild_index()
+    os.remove(f"{service.index_path}_ids.bin")
+    with open(f"{service.index_path}_mapping.pkl", 'wb') as f:
+        pickle.dump({f'doc_{i}': i for i in range(5)}, f)
+
+    reopened = make_vector_service()
+    assert reopened.get_document_by_id('doc_3')['content'] == 'note 3 on subject s3'
+    assert reopened.delete_document('doc_3')
+    assert reopened.get_stats()['total_documents'] == 4
@@ -0,0 +1,69 @@
+"""
+Approximate index types: flat, IVF and HNSW indexes, their settings, per-request overrides and recall
+"""
+import numpy as np
+import pytest
+
+from src.services.index_factory import IndexSettings, describe_index, evaluate_recall
+
+TOPICS = ['neural networks', 'databases', 'cooking', 'astronomy', 'finance', 'music', 'travel', 'biology']
+
+def documents(count: int = 300):
+    return [
+        {
+            'id': f'doc_{i}',
+            'title': f'Document {i}',
+            'url': f'https://example.com/{i}',
+            'content': f'Document {i} discusses {TOPICS[i % len(TOPICS)]} and subject code{i}.',
+            'metadata': {}
+        }
+        for i in range(count)
+    ]
+
+def test_settings_from_config():
+    settings = IndexSettings.from_config({'FAISS_INDEX_TYPE': 'HNSW', 'FAISS_EF_SEARCH': '128'})
+    assert settings.index_type == 'hnsw' and settings.ef_search == 128
+    assert IndexSettings.from_config({'FAISS_INDEX_TYPE': 'annoy'}).index_type == 'flat'
+    # IVF with PQ storage is IVF-PQ, and IVF-PQ always stores PQ codes
+    assert IndexSettings.from_config({'FAISS_INDEX_TYPE': 'ivf_flat', 'FAISS_STORAGE': 'pq'}).index_type == 'ivf_pq'
+    assert IndexSettings.from_config({'FAISS_INDEX_TYPE': 'ivf_pq'}).storage == 'pq'
+    assert IndexSettings(index_type='ivf_flat').requires_training
+    assert not IndexSettings(index_type='hnsw').requires_training
+
+@pytest.mark.parametrize('index_type', ['flat', 'ivf_flat', 'ivf_pq', 'hnsw'])
+def test_each_index_type_finds_documents(make_vector_service, index_type):
+    config = {'FAISS_INDEX_TYPE': index_type, 'FAISS_PQ_M': 8, 'FAISS_PQ_NBITS': 4, 'SEARCH_MODE': 'dense'}
+    service = make_vector_service(**config)
+    service.add_documents(documents())
+    assert service.get_stats()['index_type'] == index_type
+    assert service.get_stats()['index_size'] == 300
+
+    # IVF indexes are trained on the first batch, and later batches are added to the trained index
+    service.add_documents([{'id': 'late', 'title': 'Late', 'url': 'https://example.com/late',
+                            'content': 'a late note about volcano eruptions', 'metadata': {}}])
+    top = 5 if index_type == 'ivf_pq' else 1
+    for doc in documents()[::50]:
+        assert doc['id'] in [result.id for result in service.search(doc['content'], top)]
+    assert service.search('volcano eruptions', 1, nprobe=2, ef_search=16)[0].id == 'late'
+
+    reopened = make_vector_service(**config)
+    assert reopened.get_stats()['index_type'] == index_type
+    assert reopened.search('volcano eruptions', 1)[0].id == 'late'
+
+def test_more_probes_mean_better_recall():
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(2000, 32)).astype('float32')
+    queries = rng.normal(size=(50, 32)).astype('float32')
+    report = evaluate_recall(vectors, queries, [
+        {'settings': IndexSettings(index_type='ivf_flat', nlist=32), 'sweep': [{'nprobe': 1}, {'nprobe': 32}]},
+        {'settings': IndexSettings(index_type='hnsw', hnsw_m=16), 'sweep': [{'ef_search': 128}]},
+    ], k=10)
+
+    exact, one_probe, all_probes, hnsw = report
+    assert exact['index_type'] == 'flat' and exact['recall_at_k'] == 1.0
+    assert one_probe['index_type'] == 'ivf_flat'
+    assert one_probe['recall_at_k'] < all_probes['recall_at_k'] == 1.0
+    assert hnsw['index_type'] == 'hnsw' and hnsw['recall_at_k'] > 0.9
+
+def test_describe_index_without_an_index():
+    assert describe_index(None) == 'none'
@@ -0,0 +1,163 @@
+"""
+Background jobs: broker claims, leases and idempotency, the dispatcher, and ingestion through the queue
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from src.services.job_queue import Job, JobQueue, MemoryBroker, SQLiteBroker
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def broker(request, tmp_path):
+    return MemoryBroker() if request.param == 'memory' else SQLiteBroker(str(tmp_path / 'jobs.db'))
+
+def wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+def finished(queue: JobQueue, job_id: str):
+    def check():
+        return queue.get(job_id).status in ('succeeded', 'failed')
+    return check
+
+def test_repeated_idempotency_key_returns_the_original_job(broker):
+    first, created = broker.add(Job('ingest', {'n': 1}, idempotency_key='ingest:k'))
+    again, created_again = broker.add(Job('ingest', {'n': 2}, idempotency_key='ingest:k'))
+    assert created and not created_again
+    assert again.job_id == first.job_id and again.payload == {'n': 1}
+
+def test_claims_respect_per_type_limits(broker):
+    for i in range(3):
+        broker.add(Job('ingest', {'n': i}))
+    broker.add(Job('compact', {}))
+
+    limits = {'ingest': 2, 'compact': 1}
+    claimed = [broker.claim(limits, 60) for _ in range(4)]
+    assert sorted(job.job_type for job in claimed if job) == ['compact', 'ingest', 'ingest']
+    assert claimed[-1] is None
+    assert all(job.status == 'running' and job.attempts == 1 for job in claimed if job)
+
+def test_expired_lease_is_claimed_again_until_out_of_attempts(broker):
+    job, _ = broker.add(Job('ingest', {}, max_attempts=2))
+    assert broker.claim({'ingest': 1}, 0.05).job_id == job.job_id
+    # The worker died: nothing is claimable until its lease expires
+    assert broker.claim({'ingest': 1}, 0.05) is None
+    time.sleep(0.1)
+
+    retried = broker.claim({'ingest': 1}, 0.05)
+    assert retried.job_id == job.job_id and retried.attempts == 2
+    time.sleep(0.1)
+    assert broker.claim({'ingest': 1}, 0.05) is None
+    lost = broker.get(job.job_id)
+    assert lost.status == 'failed' and 'lease expired' in lost.error
+
+def test_idle_sqlite_claim_does_not_take_the_write_lock(tmp_path):
+    broker = SQLiteBroker(str(tmp_path / 'jobs.db'))
+    writer = sqlite3.connect(str(tmp_path / 'jobs.db'), isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        start = time.monotonic()
+        assert broker.claim({'ingest': 1}, 60) is None
+        assert time.monotonic() - start < 1
+    finally:
+        writer.execute('ROLLBACK')
+
+def make_queue(broker, **config) -> JobQueue:
+    return JobQueue(broker, {'JOB_RETRY_BACKOFF': 0.01, 'JOB_POLL_INTERVAL': 0.05, 'JOB_MAX_POLL_INTERVAL': 0.4,
+                             'JOB_CONCURRENCY': 'ingest=2', **config})
+
+def test_failed_jobs_are_retried_and_repeats_are_idempotent(broker):
+    queue = make_queue(broker)
+    calls = []
+
+    def flaky(payload):
+        calls.append(payload)
+        if len(calls) < 2:
+            raise RuntimeError('transient')
+        return {'processed_count': payload['n']}
+
+    queue.register('ingest', flaky)
+    queue.start()
+    try:
+        job, created = queue.submit('ingest', {'n': 3}, idempotency_key='batch-1')
+        repeat, repeat_created = queue.submit('ingest', {'n': 3}, idempotency_key='batch-1')
+        assert created and not repeat_created and repeat.job_id == job.job_id
+
+        wait_for(finished(queue, job.job_id))
+        done = queue.get(job.job_id)
+        assert done.status == 'succeeded' and done.attempts == 2
+        assert done.result == {'processed_count': 3}
+        assert len(calls) == 2
+    finally:
+        queue.stop(5)
+
+def test_one_dispatcher_runs_jobs_up_to_the_concurrency_limit(broker):
+    queue = make_queue(broker)
+    running = []
+    peak = []
+    release = threading.Event()
+
+    def slow(payload):
+        running.append(payload)
+        peak.append(len(running))
+        release.wait(5)
+        running.remove(payload)
+
+    queue.register('ingest', slow)
+    queue.start()
+    try:
+        jobs = [queue.submit('ingest', {'n': i})[0] for i in range(4)]
+        wait_for(lambda: len(running) == 2)
+        time.sleep(0.2)
+        assert max(peak) == 2
+        assert [thread.name for thread in threading.enumerate()].count('job-dispatcher') == 1
+        release.set()
+        for job in jobs:
+            wait_for(finished(queue, job.job_id))
+    finally:
+        release.set()
+        queue.stop(5)
+
+def test_idle_dispatcher_backs_off_and_wakes_on_submit(broker):
+    queue = make_queue(broker)
+    claims = []
+    claim = broker.claim
+    broker.claim = lambda *args: claims.append(time.monotonic()) or claim(*args)
+    queue.register('ingest', lambda payload: 'done')
+    queue.start()
+    try:
+        time.sleep(1.5)
+        # 0.05s doubling up to 0.4s: a handful of polls, where fixed polling would make 30
+        assert len(claims) <= 8
+        gaps = [later - earlier for earlier, later in zip(claims, claims[1:])]
+        assert gaps[-1] > 0.3
+
+        job, _ = queue.submit('ingest')
+        start = time.monotonic()
+        wait_for(finished(queue, job.job_id))
+        assert time.monotonic() - start < 0.3
+    finally:
+        queue.stop(5)
+
+def test_ingest_endpoint_queues_a_job(make_app):
+    app = make_app()
+    client = app.test_client()
+    documents = [{'id': 'doc_1', 'title': 'Quantum', 'url': 'https://example.com/1',
+                  'content': 'quantum entanglement explained', 'metadata': {}}]
+
+    response = client.post('/api/ingest', json={'documents': documents}, headers={'Idempotency-Key': 'once'})
+    assert response.status_code == 202
+    job_id = response.json['job_id']
+    assert response.json['status_url'] == f"/api/jobs/{job_id}"
+    repeat = client.post('/api/ingest', json={'documents': documents}, headers={'Idempotency-Key': 'once'})
+    assert repeat.json['job_id'] == job_id and not repeat.json['created']
+
+    wait_for(lambda: client.get(f"/api/jobs/{job_id}").json['status'] == 'succeeded')
+    assert client.get(f"/api/jobs/{job_id}").json['result'] == {'processed_count': 1}
+    assert app.extensions['vector_service'].search('quantum entanglement', 1)[0].id == 'doc_1'
+
+    assert client.post('/api/ingest', json={'documents': 'not a list'}).status_code == 400
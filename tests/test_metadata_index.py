@@ -0,0 +1,72 @@
+"""
+Metadata inverted index: equality, any-of and range filters, and their posting lists
+"""
+import pickle
+
+from src.services.metadata_index import MetadataIndex
+
+def build(metadatas):
+    index = MetadataIndex()
+    for row, metadata in enumerate(metadatas):
+        index.add(row, metadata)
+    return index
+
+def test_equality_any_of_and_range_filters():
+    index = build([
+        {'category': 'ai', 'year': 2021, 'published': '2021-05-01'},
+        {'category': 'ml', 'year': 2023, 'published': '2023-02-10T08:00:00Z'},
+        {'category': 'ai', 'year': 2024, 'published': '2024-01-01'},
+    ])
+    assert index.select({'category': 'ai'}).tolist() == [0, 2]
+    assert index.select({'category': ['ml', 'ai']}).tolist() == [0, 1, 2]
+    assert index.select({'year': {'gte': 2023}}).tolist() == [1, 2]
+    assert index.select({'category': 'ai', 'published': {'gt': '2022-01-01'}}).tolist() == [2]
+    assert index.select({'category': 'none'}).tolist() == []
+    assert index.select({}).tolist() == [0, 1, 2]
+
+def test_repeated_list_values_index_a_row_once():
+    index = build([
+        {'tags': ['a', 'a'], 'kind': 'y'},
+        {'tags': ['b'], 'kind': 'x'},
+        {'tags': ['a', 'b', 'a'], 'kind': 'x'},
+    ])
+    assert index.postings['tags'][('str', 'a')].tolist() == [0, 2]
+    assert index.select({'tags': 'a'}).tolist() == [0, 2]
+    # With row 0 in the posting list twice, the intersection would also return it
+    assert index.select({'tags': 'a', 'kind': 'x'}).tolist() == [2]
+    assert index.select({'kind': 'x', 'tags': 'a'}).tolist() == [2]
+
+def test_booleans_and_numbers_are_different_values():
+    index = build([{'flag': True}, {'flag': 1}, {'flag': 1.0}, {'flag': False}, {'flag': 0}])
+    assert index.select({'flag': True}).tolist() == [0]
+    assert index.select({'flag': 1}).tolist() == [1, 2]
+    assert index.select({'flag': False}).tolist() == [3]
+    assert index.select({'flag': 0}).tolist() == [4]
+    assert index.select({'flag': [True, 0]}).tolist() == [0, 4]
+
+def test_save_and_load_round_trip(tmp_path):
+    index = build([{'tags': ['a', 'a'], 'flag': True}, {'tags': ['b'], 'flag': 1, 'year': 2020}])
+    index.save(str(tmp_path / 'metadata.pkl'))
+    loaded = MetadataIndex.load(str(tmp_path / 'metadata.pkl'))
+    assert loaded.rows == 2
+    assert loaded.select({'flag': True}).tolist() == [0]
+    assert loaded.select({'year': {'lt': 2021}}).tolist() == [1]
+    # Rows keep being appended after a load
+    loaded.add(2, {'tags': ['a']})
+    assert loaded.select({'tags': 'a'}).tolist() == [0, 2]
+
+def test_older_format_is_rebuilt(tmp_path):
+    with open(tmp_path / 'metadata.pkl', 'wb') as f:
+        pickle.dump({'rows': 1, 'postings': {'flag': {True: None}}, 'range_values': {}, 'range_rows': {}}, f)
+    assert MetadataIndex.load(str(tmp_path / 'metadata.pkl')).rows == 0
+
+def test_filtered_search_with_repeated_tags(make_vector_service):
+    service = make_vector_service(SEARCH_MODE='dense')
+    service.add_documents([
+        {'id': 'a', 'title': 'A', 'url': 'https://example.com/a', 'content': 'alpha notes',
+         'metadata': {'tags': ['x', 'x'], 'public': True}},
+        {'id': 'b', 'title': 'B', 'url': 'https://example.com/b', 'content': 'alpha notes again',
+         'metadata': {'tags': ['y'], 'public': 1}},
+    ])
+    assert [r.id for r in service.search('alpha notes', 5, filters={'tags': 'x', 'public': 1})] == []
+    assert [r.id for r in service.search('alpha notes', 5, filters={'tags': 'x', 'public': True})] == ['a']
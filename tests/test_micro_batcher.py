@@ -0,0 +1,72 @@
+"""
+Micro-batching: concurrent single searches are coalesced into one encode and one index search
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.services.micro_batcher import MicroBatcher
+
+def run_concurrently(function, items):
+    """Call function on every item from its own thread, all released at once"""
+    barrier = threading.Barrier(len(items))
+
+    def call(item):
+        barrier.wait()
+        return function(item)
+
+    with ThreadPoolExecutor(len(items)) as pool:
+        return list(pool.map(call, items))
+
+def test_concurrent_calls_share_batches_and_get_their_own_results():
+    batches = []
+
+    def square(items):
+        batches.append(list(items))
+        return [item * item for item in items]
+
+    batcher = MicroBatcher(square, max_batch_size=4, max_wait_ms=50)
+    assert run_concurrently(lambda item: batcher.submit(item, 5), list(range(8))) == [i * i for i in range(8)]
+
+    assert sorted(item for batch in batches for item in batch) == list(range(8))
+    assert len(batches) < 8
+    assert max(len(batch) for batch in batches) <= 4
+    stats = batcher.get_stats()
+    assert stats['items'] == 8 and stats['batches'] == len(batches) and stats['max_batch'] <= 4
+
+def test_a_single_call_waits_at_most_max_wait():
+    batcher = MicroBatcher(lambda items: items, max_wait_ms=1)
+    assert batcher.submit('only', 1) == 'only'
+
+def test_a_failed_batch_fails_its_calls_and_the_worker_continues():
+    def process(items):
+        if 'bad' in items:
+            raise ValueError('bad item')
+        return items
+
+    batcher = MicroBatcher(process, max_wait_ms=1)
+    with pytest.raises(ValueError):
+        batcher.submit('bad', 5)
+    assert batcher.submit('good', 5) == 'good'
+
+def test_batched_searches_match_unbatched_ones(make_vector_service):
+    documents = [
+        {'id': f'doc_{i}', 'title': f'Doc {i}', 'url': f'https://example.com/{i}',
+         'content': f'note {i} about subject s{i}', 'metadata': {}}
+        for i in range(40)
+    ]
+    plain = make_vector_service('plain', SEARCH_MODE='dense')
+    batched = make_vector_service('batched', SEARCH_MODE='dense', SEARCH_BATCH_ENABLED=True, SEARCH_BATCH_WAIT_MS=50)
+    plain.add_documents(documents)
+    batched.add_documents(documents)
+
+    queries = [f'subject s{i}' for i in range(0, 40, 5)]
+    results = run_concurrently(lambda query: batched.search(query, 3), queries)
+    for query, found in zip(queries, results):
+        expected = plain.search(query, 3)
+        assert [result.id for result in found] == [result.id for result in expected]
+        assert [result.score for result in found] == pytest.approx([result.score for result in expected], abs=1e-5)
+
+    stats = batched.get_stats()['search_batching']
+    assert stats['items'] == len(queries) and stats['batches'] < len(queries)
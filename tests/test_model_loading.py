@@ -0,0 +1,94 @@
+"""
+Embedding model loading: lazy, eager and background modes, readiness, and load failures
+"""
+import threading
+import time
+
+import pytest
+
+from conftest import HashingBackend
+from src.services import vector_service as vector_service_module
+
+DOCUMENT = {'id': 'doc', 'title': 'Doc', 'url': 'https://example.com/doc', 'content': 'glacier melt', 'metadata': {}}
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Counts backend loads; set 'release' to hold loads back, or 'error' to fail them"""
+    state = {'count': 0, 'release': None, 'error': None}
+
+    def create(config, backend=None):
+        state['count'] += 1
+        if state['release'] is not None:
+            state['release'].wait(5)
+        if state['error'] is not None:
+            raise state['error']
+        return HashingBackend()
+
+    monkeypatch.setattr(vector_service_module, 'create_embedding_backend', create)
+    return state
+
+def wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+def test_lazy_mode_loads_the_model_once_on_first_use(make_vector_service, loads):
+    service = make_vector_service(EMBEDDINGS_LOAD_MODE='lazy')
+    assert loads['count'] == 0
+    assert service.readiness()['ready'] and service.readiness()['state'] == 'pending'
+
+    loads['release'] = threading.Event()
+    threads = [threading.Thread(target=service.embed_query, args=('glacier',)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    loads['release'].set()
+    for thread in threads:
+        thread.join(5)
+
+    assert loads['count'] == 1
+    assert service.readiness()['state'] == 'ready' and service.model_load_time is not None
+
+def test_eager_mode_loads_before_returning(make_vector_service, loads):
+    service = make_vector_service(EMBEDDINGS_LOAD_MODE='eager')
+    assert loads['count'] == 1
+    assert service.readiness()['ready'] and service.get_stats()['embedding_backend'] == 'hashing'
+
+def test_background_mode_is_not_ready_until_loaded(make_vector_service, loads):
+    loads['release'] = threading.Event()
+    service = make_vector_service(EMBEDDINGS_LOAD_MODE='background')
+    wait_for(lambda: service.model_state == 'loading')
+    assert not service.readiness()['ready']
+
+    loads['release'].set()
+    wait_for(lambda: service.readiness()['ready'])
+    service.add_documents([DOCUMENT])
+    assert service.search('glacier melt', 1)[0].id == 'doc'
+    assert loads['count'] == 1
+
+def test_a_failed_load_is_reported(make_vector_service, loads):
+    loads['error'] = RuntimeError('model download failed')
+    service = make_vector_service(EMBEDDINGS_LOAD_MODE='lazy')
+    assert service.add_documents([DOCUMENT]) == 0
+
+    readiness = service.readiness()
+    assert not readiness['ready'] and readiness['state'] == 'failed'
+    assert readiness['error'] == 'model download failed'
+
+def test_vector_dimension_comes_from_the_loaded_model(make_vector_service, loads):
+    service = make_vector_service(VECTOR_DIMENSION=384)
+    service.add_documents([DOCUMENT])
+    assert service.get_stats()['vector_dimension'] == HashingBackend.dimension
+    assert service.search('glacier melt', 1)[0].id == 'doc'
+
+def test_ready_endpoint(make_app, loads):
+    loads['release'] = threading.Event()
+    app = make_app(EMBEDDINGS_LOAD_MODE='background')
+    client = app.test_client()
+    response = client.get('/api/ready')
+    assert response.status_code == 503 and response.json['status'] in ('pending', 'loading')
+
+    loads['release'].set()
+    wait_for(lambda: client.get('/api/ready').status_code == 200)
+    assert client.get('/api/ready').json['status'] == 'ready'
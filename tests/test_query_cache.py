@@ -0,0 +1,78 @@
+"""
+Query-embedding LRU: repeated searches skip the encoder, and the cache stays within its size
+"""
+import numpy as np
+
+from src.services.embedding_cache import EmbeddingCache, QueryEmbeddingCache
+
+DIM = 4
+
+def encoder(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(text)] * DIM for text in texts], dtype='float32')
+    return encode
+
+class FakeRedis:
+    redis_available = True
+
+    def __init__(self):
+        self.store = {}
+
+    def get_cached_embeddings_many(self, keys):
+        return {key: self.store[key] for key in keys if key in self.store}
+
+    def cache_embeddings_many(self, values, ttl=None):
+        self.store.update(values)
+
+def test_least_recently_used_queries_are_evicted():
+    cache = QueryEmbeddingCache('model', DIM, max_size=2)
+    calls = []
+    encode = encoder(calls)
+    cache.get_or_encode('a', encode)
+    cache.get_or_encode('bb', encode)
+    cache.get_or_encode('a', encode)
+    # 'bb' is now the least recently used
+    cache.get_or_encode('ccc', encode)
+    cache.get_or_encode('a', encode)
+    cache.get_or_encode('bb', encode)
+
+    assert calls == [['a'], ['bb'], ['ccc'], ['bb']]
+    stats = cache.get_stats()
+    assert stats['size'] == 2 and stats['hits'] == 2 and stats['misses'] == 4
+    assert stats['hit_rate'] == 2 / 6
+
+def test_misses_in_a_batch_are_encoded_together():
+    cache = QueryEmbeddingCache('model', DIM)
+    calls = []
+    cache.get_or_encode('a', encoder(calls))
+    vectors = cache.get_or_encode_many(['a', 'bb', 'ccc', 'bb'], encoder(calls))
+    assert calls == [['a'], ['bb', 'ccc']]
+    assert vectors[:, 0].tolist() == [1, 2, 3, 2]
+
+    cache.clear()
+    assert cache.get_stats()['size'] == 0
+
+def test_redis_tier_shares_ingested_text_embeddings(tmp_path):
+    redis = FakeRedis()
+    EmbeddingCache(str(tmp_path), 'model', DIM, redis).get_or_encode(['exact chunk text'], encoder([]))
+
+    cache = QueryEmbeddingCache('model', DIM, cache_service=redis)
+    calls = []
+    cache.get_or_encode('exact chunk text', encoder(calls))
+    assert calls == [] and cache.get_stats()['redis_hits'] == 1
+
+def test_repeated_searches_encode_the_query_once(make_vector_service, monkeypatch):
+    service = make_vector_service(SEARCH_MODE='dense', QUERY_EMBEDDING_CACHE_SIZE=100)
+    service.add_documents([
+        {'id': 'doc', 'title': 'Doc', 'url': 'https://example.com/doc', 'content': 'tidal energy', 'metadata': {}}
+    ])
+    encoded = []
+    encode = service.model.encode
+    monkeypatch.setattr(service.model, 'encode', lambda texts, **kwargs: encoded.extend(texts) or encode(texts))
+
+    for _ in range(3):
+        assert service.search('tidal energy', 1)[0].id == 'doc'
+    np.testing.assert_array_equal(service.embed_query('tidal energy'), service.embed_query('tidal energy'))
+    assert encoded == ['tidal energy']
+    assert service.get_stats()['query_cache']['hits'] == 4
@@ -0,0 +1,118 @@
+"""
+Cross-encoder reranking: reordering, the latency budget, score caching, and requests that arrive before the model
+"""
+import time
+
+import pytest
+
+from src.services.reranker import CrossEncoderReranker
+from src.services.vector_service import SearchResult
+
+class FakeCrossEncoder:
+    """Scores a pair by how many query words the text contains, taking delay seconds per batch"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay)
+        return [sum(word in text.split() for word in query.split()) for query, text in pairs]
+
+class FakeRedis:
+    redis_available = True
+
+    def __init__(self):
+        self.store = {}
+
+    def get_multiple(self, keys, prefix_type='default'):
+        return {key: self.store[key] for key in keys if key in self.store}
+
+    def set_multiple(self, values, ttl=None, prefix_type='default'):
+        self.store.update(values)
+        return True
+
+def candidates(*texts):
+    return [SearchResult(id=f'r{i}', content=text, title='', score=1 - i / 100, metadata={}, url='')
+            for i, text in enumerate(texts)]
+
+def make_reranker(model=None, cache_service=None, **config) -> CrossEncoderReranker:
+    reranker = CrossEncoderReranker({'RERANK_BATCH_SIZE': 2, 'RERANK_BUDGET_MS': 1000, **config}, cache_service)
+    reranker._model = model
+    return reranker
+
+QUERY = 'solar panel efficiency'
+TEXTS = ['wind farms', 'solar panel efficiency gains', 'panel wiring', 'solar heating', 'efficiency of solar panel']
+
+def test_candidates_are_reordered_by_cross_encoder_score():
+    reranker = make_reranker(FakeCrossEncoder())
+    reranked, report = reranker.rerank(QUERY, candidates(*TEXTS), top_k=3)
+
+    # Ties keep their retrieval order
+    assert [result.id for result in reranked] == ['r1', 'r4', 'r2']
+    assert [result.rerank_score for result in reranked] == [3, 3, 1]
+    assert report['scored'] == 5 and report['batches'] == 3 and not report['truncated']
+    assert report['top_score'] == 3 and report['reordered'] == 2
+
+def test_scores_are_cached_per_query_and_text():
+    model = FakeCrossEncoder()
+    reranker = make_reranker(model)
+    reranker.rerank(QUERY, candidates(*TEXTS))
+    _, report = reranker.rerank(QUERY, candidates(*TEXTS[::-1]))
+    assert report['cache_hits'] == 5 and report['scored'] == 0
+    _, report = reranker.rerank('wind farms', candidates(*TEXTS[:2]))
+    assert report['cache_hits'] == 0 and report['scored'] == 2
+
+    small = make_reranker(FakeCrossEncoder(), RERANK_CACHE_SIZE=3)
+    small.rerank(QUERY, candidates(*TEXTS))
+    assert small.get_stats()['cache_size'] == 3
+
+def test_scoring_stops_at_the_latency_budget():
+    reranker = make_reranker(FakeCrossEncoder(delay=0.05), RERANK_BUDGET_MS=80)
+    reranked, report = reranker.rerank(QUERY, candidates(*TEXTS))
+
+    # The first batch always runs; the second would end past the budget
+    assert report['truncated'] and report['batches'] == 1 and report['scored'] == 2
+    # Scored candidates first, then the unscored ones in retrieval order
+    assert [result.id for result in reranked] == ['r1', 'r0', 'r2', 'r3', 'r4']
+    assert [result.rerank_score for result in reranked][2:] == [None, None, None]
+    assert reranker.get_stats()['truncated'] == 1
+
+def test_redis_shares_scores_between_processes():
+    redis = FakeRedis()
+    make_reranker(FakeCrossEncoder(), redis, RERANK_CACHE_REDIS=True).rerank(QUERY, candidates(*TEXTS))
+
+    model = FakeCrossEncoder()
+    reranked, report = make_reranker(model, redis, RERANK_CACHE_REDIS=True).rerank(QUERY, candidates(*TEXTS))
+    assert report['cache_hits'] == 5 and model.batches == []
+    assert reranked[0].id == 'r1'
+
+def test_requests_before_the_model_is_loaded_are_not_reranked():
+    reranker = make_reranker(None, RERANK_MODEL='missing/model')
+    results = candidates(*TEXTS)
+    reranked, report = reranker.rerank(QUERY, results, top_k=2)
+
+    assert reranked == results[:2]
+    assert not report['model_ready'] and report['truncated']
+    assert reranker.get_stats()['skipped_loading'] == 1
+    # The request started the load in the background instead of waiting for it
+    reranker._load_thread.join(30)
+    assert reranker.model_error is not None and not reranker.ready
+
+@pytest.mark.parametrize('rerank', [True, False])
+def test_search_endpoint_reranks_on_request(make_app, rerank):
+    app = make_app(RERANK_ENABLED=True, RERANK_CANDIDATES=5)
+    app.extensions['reranker']._model = FakeCrossEncoder()
+    app.extensions['vector_service'].add_documents([
+        {'id': f'doc_{i}', 'title': f'Doc {i}', 'url': f'https://example.com/{i}', 'content': text, 'metadata': {}}
+        for i, text in enumerate(TEXTS)
+    ])
+
+    response = app.test_client().post('/api/search', json={'query': QUERY, 'limit': 2, 'rerank': rerank})
+    assert response.status_code == 200 and response.json['count'] == 2
+    if rerank:
+        assert response.json['rerank']['candidates'] == 5
+        assert [result['rerank_score'] for result in response.json['results']] == [3, 3]
+    else:
+        assert response.json['rerank'] is None
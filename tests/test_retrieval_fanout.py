@@ -0,0 +1,92 @@
+"""
+Knowledge base and web retrieval for generation: skipping the web when the KB is confident, and per-source deadlines
+"""
+import threading
+import time
+
+import pytest
+
+from src.services.content_generator import ContentGenerator
+
+DOCUMENTS = [
+    {'id': 'quantum', 'title': 'Entanglement', 'url': 'https://example.com/quantum',
+     'content': 'quantum entanglement links the states of particles', 'metadata': {}},
+    {'id': 'tides', 'title': 'Tides', 'url': 'https://example.com/tides',
+     'content': 'ocean tides follow the moon', 'metadata': {}},
+]
+
+class FakeWebSearcher:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.queries = []
+
+    def search_web(self, query, num_results=5):
+        self.queries.append(query)
+        time.sleep(self.delay)
+        return [
+            {'title': f'Web result {i}', 'url': f'https://web.example.com/{i}', 'snippet': f'about {query}',
+             'score': 0.9 - i / 10}
+            for i in range(2)
+        ]
+
+@pytest.fixture
+def make_generator(make_vector_service):
+    def make(web_delay: float = 0.0, **config) -> ContentGenerator:
+        service = make_vector_service(SEARCH_MODE='hybrid')
+        service.add_documents(DOCUMENTS)
+        generator = ContentGenerator(None, service, None, config)
+        generator.web_searcher = FakeWebSearcher(web_delay)
+        return generator
+    return make
+
+def test_confident_knowledge_base_never_calls_the_web(make_generator):
+    generator = make_generator()
+    assert not generator.speculative_web_search
+
+    retrieval = generator._retrieve('quantum entanglement', 5, use_web_search=True)
+    assert retrieval['kb_confident']
+    assert retrieval['stages']['web_search']['skipped']
+    assert generator.web_searcher.queries == []
+    assert generator.stats['web_searches_skipped'] == 1
+
+def test_web_is_searched_when_the_knowledge_base_is_not_confident(make_generator):
+    generator = make_generator()
+    retrieval = generator._retrieve('volcano eruption forecasts', 5, use_web_search=True)
+    assert not retrieval['kb_confident']
+    assert generator.web_searcher.queries == ['volcano eruption forecasts']
+    assert retrieval['web_sources_count'] == 2
+    assert retrieval['sources'][0]['source_type'] == 'web'
+
+def test_speculative_search_overlaps_the_two_sources(make_generator, monkeypatch):
+    generator = make_generator(web_delay=0.3, WEB_SEARCH_SPECULATIVE=True)
+    search = generator._search_knowledge_base
+
+    def slow_kb(*args):
+        time.sleep(0.3)
+        return search(*args)
+    monkeypatch.setattr(generator, '_search_knowledge_base', slow_kb)
+
+    start = time.monotonic()
+    retrieval = generator._retrieve('volcano eruption forecasts', 5, use_web_search=True)
+    assert time.monotonic() - start < 0.55
+    assert retrieval['web_sources_count'] == 2
+
+def test_knowledge_base_past_its_deadline_is_left_out(make_generator, monkeypatch):
+    generator = make_generator(KB_SEARCH_TIMEOUT_MS=100)
+    release = threading.Event()
+    monkeypatch.setattr(generator, '_search_knowledge_base', lambda *args: release.wait(5))
+    try:
+        retrieval = generator._retrieve('quantum entanglement', 5, use_web_search=True)
+    finally:
+        release.set()
+    assert retrieval['stages']['retrieval']['timed_out']
+    assert generator.stats['kb_search_timeouts'] == 1
+    # Without the knowledge base there is nothing to be confident in, so the web answers
+    assert retrieval['web_sources_count'] == 2 and retrieval['kb_sources_count'] == 0
+
+def test_web_search_past_its_deadline_is_left_out(make_generator):
+    generator = make_generator(web_delay=1.0, WEB_SEARCH_TIMEOUT_MS=100)
+    retrieval = generator._retrieve('ocean tides moon gravity', 5, use_web_search=True)
+    assert retrieval['stages']['web_search']['timed_out']
+    assert generator.stats['web_search_timeouts'] == 1
+    assert retrieval['web_sources_count'] == 0
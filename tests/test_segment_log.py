@@ -0,0 +1,105 @@
+"""
+Append-only segment persistence: ingest batches are committed through a write-ahead log and survive a crash at any point
+"""
+import os
+
+import numpy as np
+import pytest
+
+from src.services.segment_log import SegmentLog
+
+class Crash(BaseException):
+    """The process dies here; nothing after this point runs"""
+
+def batch(prefix: str, count: int = 5):
+    return [
+        {'id': f'{prefix}_{i}', 'title': f'{prefix} {i}', 'url': f'https://example.com/{prefix}/{i}',
+         'content': f'{prefix} note {i} about topic t{i}', 'metadata': {'batch': prefix}}
+        for i in range(count)
+    ]
+
+def vectors(rows: int, seed: int = 0):
+    return np.random.default_rng(seed).normal(size=(rows, 8)).astype('float32')
+
+def test_replay_returns_committed_segments_and_deletes(tmp_path):
+    log = SegmentLog(str(tmp_path / 'index'))
+    first, second = vectors(3, 1), vectors(2, 2)
+    log.append(0, first)
+    log.append_delete([1])
+    log.append(3, second)
+    assert log.segment_count() == 3
+
+    records = list(log.replay(0))
+    assert [record['op'] for record in records] == ['add', 'delete', 'add']
+    np.testing.assert_array_equal(records[0]['vectors'], first)
+    assert records[1]['deleted'] == [1]
+    # Segments already folded into a snapshot of 3 rows are skipped
+    assert [record['start_row'] for record in log.replay(3) if record['op'] == 'add'] == [3]
+
+    log.reset()
+    assert log.segment_count() == 0 and list(log.replay(0)) == []
+
+def test_torn_and_uncommitted_records_are_ignored(tmp_path):
+    log = SegmentLog(str(tmp_path / 'index'))
+    log.append(0, vectors(3))
+    # A segment written without its commit record, and a half-written record
+    np.save(log._segment_file(2), vectors(4))
+    with open(log.wal_file, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 2, "op": "add", "sta')
+
+    assert [record['rows'] for record in log.replay(0)] == [3]
+    assert log.segment_count() == 1
+
+def test_each_batch_is_a_segment_until_the_threshold(make_vector_service):
+    service = make_vector_service(SEGMENT_COMPACT_THRESHOLD=3)
+    service.add_documents(batch('a'))
+    service.add_documents(batch('b'))
+    assert service.segment_log.segment_count() == 2
+    assert not os.path.exists(f"{service.index_path}_snapshot.json")
+
+    reopened = make_vector_service()
+    assert reopened.get_stats()['total_documents'] == 10
+    assert reopened.search('b note 3 about topic t3', 1)[0].id == 'b_3'
+
+    # The third segment folds everything into a snapshot
+    service.add_documents(batch('c'))
+    assert service.segment_log.segment_count() == 0
+    assert os.path.exists(f"{service.index_path}_snapshot.json")
+    assert make_vector_service().get_stats()['total_documents'] == 15
+
+def test_crash_before_the_commit_record_loses_only_that_batch(make_vector_service, monkeypatch):
+    service = make_vector_service()
+    service.add_documents(batch('a'))
+
+    def crash(self, record):
+        raise Crash()
+    with monkeypatch.context() as patch, pytest.raises(Crash):
+        patch.setattr(SegmentLog, '_commit', crash)
+        service.add_documents(batch('b'))
+
+    reopened = make_vector_service()
+    assert reopened.get_stats()['total_documents'] == 5
+    assert len(reopened.documents) == 5
+    assert reopened.get_document_by_id('b_0') is None
+    # The lost batch can simply be sent again
+    assert reopened.add_documents(batch('b')) == 5
+    assert reopened.search('b note 2 about topic t2', 1)[0].id == 'b_2'
+
+def test_crash_while_committing_a_snapshot_is_rolled_forward(make_vector_service, monkeypatch):
+    service = make_vector_service(SEGMENT_COMPACT_THRESHOLD=2)
+    service.add_documents(batch('a'))
+
+    def crash():
+        raise Crash()
+    # The list of staged files is durable, but none of them have been moved into place
+    monkeypatch.setattr(service, '_finish_commit', crash)
+    with pytest.raises(Crash):
+        service.add_documents(batch('b'))
+    assert os.path.exists(f"{service.index_path}_commit.json")
+
+    reopened = make_vector_service()
+    assert not os.path.exists(f"{service.index_path}_commit.json")
+    assert reopened.segment_log.segment_count() == 0
+    assert reopened.get_stats()['total_documents'] == 10
+    assert reopened.search('a note 1 about topic t1', 1)[0].id == 'a_1'
+    assert reopened.search('b note 4 about topic t4', 1)[0].id == 'b_4'
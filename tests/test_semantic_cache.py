@@ -0,0 +1,142 @@
+"""
+Semantic response cache: queries with the same meaning share a cached answer, within the same generation parameters
+"""
+import time
+
+import numpy as np
+import pytest
+
+from src.services.content_generator import ContentGenerator
+from src.services.semantic_cache import SemanticCache
+
+def unit(*values):
+    vector = np.array(values, dtype='float32')
+    return vector / np.linalg.norm(vector)
+
+class FakeCacheService:
+    redis_available = False
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key, prefix_type='content'):
+        return dict(self.store[key]) if key in self.store else None
+
+    def set(self, key, value, ttl=None, prefix_type='content'):
+        self.store[key] = dict(value)
+        return True
+
+def wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+def test_closest_query_above_the_threshold_matches():
+    cache = SemanticCache(threshold=0.9)
+    cache.add(unit(1, 0, 0), 'rag', 'first', 'key1')
+    cache.add(unit(0, 1, 0), 'rag', 'second', 'key2')
+
+    match = cache.lookup(unit(1, 0.1, 0), 'rag')
+    assert match['cache_key'] == 'key1' and match['query'] == 'first' and match['similarity'] > 0.99
+    assert cache.lookup(unit(1, 1, 0), 'rag') is None
+    # The same query under other generation parameters is a different answer
+    assert cache.lookup(unit(1, 0, 0), 'qa') is None
+
+    stats = cache.get_stats()
+    assert stats['lookups'] == 3 and stats['hits'] == 1 and stats['entries'] == 2
+
+def test_least_recently_matched_entry_is_replaced_when_full():
+    cache = SemanticCache(threshold=0.9, max_entries=2)
+    cache.add(unit(1, 0, 0), 'rag', 'first', 'key1')
+    cache.add(unit(0, 1, 0), 'rag', 'second', 'key2')
+    assert cache.lookup(unit(1, 0, 0), 'rag')['cache_key'] == 'key1'
+
+    cache.add(unit(0, 0, 1), 'rag', 'third', 'key3')
+    assert len(cache) == 2
+    assert cache.lookup(unit(0, 1, 0), 'rag') is None
+    assert cache.lookup(unit(1, 0, 0), 'rag')['cache_key'] == 'key1'
+
+    # Adding under a known key replaces its entry rather than taking a new slot
+    cache.add(unit(0, 1, 0), 'rag', 'third again', 'key3')
+    assert len(cache) == 2 and cache.lookup(unit(0, 1, 0), 'rag')['query'] == 'third again'
+
+def test_discard_keeps_the_other_entries_reachable():
+    cache = SemanticCache(threshold=0.9)
+    for i, vector in enumerate([unit(1, 0, 0), unit(0, 1, 0), unit(0, 0, 1)]):
+        cache.add(vector, 'rag', f'query {i}', f'key{i}')
+
+    cache.discard('key0', stale=True)
+    cache.discard('unknown')
+    assert len(cache) == 2
+    assert cache.lookup(unit(1, 0, 0), 'rag') is None
+    assert cache.lookup(unit(0, 0, 1), 'rag')['cache_key'] == 'key2'
+    assert cache.lookup(unit(0, 1, 0), 'rag')['cache_key'] == 'key1'
+
+    stats = cache.get_stats()
+    assert stats['stale_hits'] == 1
+    assert stats['hit_rate'] == pytest.approx((2 - 1) / 3)
+
+def test_audits_count_false_hits():
+    cache = SemanticCache()
+    cache.record_audit('a', 'b', 0.95, 0.97, False)
+    cache.record_audit('c', 'd', 0.93, 0.40, True)
+
+    stats = cache.get_stats()
+    assert stats['audits'] == 2 and stats['false_hits'] == 1 and stats['false_hit_rate'] == 0.5
+    assert [entry['query'] for entry in stats['recent_false_hits']] == ['c']
+
+@pytest.fixture
+def make_generator(make_vector_service):
+    def make(**config) -> ContentGenerator:
+        config = {'SEMANTIC_CACHE_ENABLED': True, 'SEMANTIC_CACHE_AUDIT_RATE': 0, **config}
+        return ContentGenerator(None, make_vector_service(), FakeCacheService(), config)
+    return make
+
+def store(generator, query, content, max_length=500, temperature=0.7, template_type='rag'):
+    cache_key = generator._create_cache_key(query, max_length, temperature, template_type)
+    generator._store_result(query, cache_key, {'content': content, 'query': query},
+                            (max_length, temperature, template_type))
+
+def cached(generator, query, max_length=500, temperature=0.7, template_type='rag'):
+    cache_key = generator._create_cache_key(query, max_length, temperature, template_type)
+    return generator._get_cached(query, cache_key, max_length, temperature, template_type)
+
+def test_a_reworded_query_gets_the_cached_answer(make_generator):
+    generator = make_generator()
+    store(generator, 'explain quantum entanglement', 'particles share one state')
+
+    # The hashing embedder gives the same words in any order and case the same vector
+    result = cached(generator, 'Entanglement quantum explain')
+    assert result['content'] == 'particles share one state'
+    assert result['semantic_match'] == {'query': 'explain quantum entanglement', 'similarity': pytest.approx(1.0)}
+    assert generator.stats['semantic_cache_hits'] == 1
+
+    assert cached(generator, 'ocean tides and the moon') is None
+    assert cached(generator, 'Entanglement quantum explain', temperature=0.2) is None
+
+def test_an_expired_answer_is_a_miss(make_generator):
+    generator = make_generator()
+    store(generator, 'explain quantum entanglement', 'particles share one state')
+    generator.cache_service.store.clear()
+
+    assert cached(generator, 'Entanglement quantum explain') is None
+    assert len(generator.semantic_cache) == 0
+    assert generator.semantic_cache.get_stats()['stale_hits'] == 1
+
+def test_a_false_hit_found_by_an_audit_stops_serving(make_generator, monkeypatch):
+    generator = make_generator(SEMANTIC_CACHE_AUDIT_RATE=1.0)
+    store(generator, 'explain quantum entanglement', 'particles share one state')
+    monkeypatch.setattr(generator, 'generate_with_rag',
+                        lambda query, *args, **kwargs: {'content': 'volcanoes erupt molten rock', 'query': query})
+
+    assert cached(generator, 'Entanglement quantum explain')['content'] == 'particles share one state'
+    # The audit frees its slot once it has stored the fresh answer
+    wait_for(lambda: generator._audit_slot.acquire(blocking=False))
+    assert generator.semantic_cache.get_stats()['false_hits'] == 1
+
+    # The fresh answer now serves the audited query, and the matched entry is gone
+    assert cached(generator, 'Entanglement quantum explain')['content'] == 'volcanoes erupt molten rock'
+    assert generator.semantic_cache.lookup(
+        generator.vector_service.embed_query('explain quantum entanglement'), (500, 0.7, 'rag')
+    )['query'] == 'Entanglement quantum explain'
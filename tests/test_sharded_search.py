@@ -0,0 +1,116 @@
+"""
+Sharded scatter-gather search ranks like one index holding every document
+"""
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from src.services.sharding import ShardServer, ShardedVectorService
+
+AUTHKEY = b'test-shard-key'
+
+WORDS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliet']
+
+def documents(count: int = 150):
+    docs = [
+        {
+            'id': f'd{i}',
+            'title': f'Note {i}',
+            'url': f'https://example.com/{i}',
+            # A unique word and length per document, so no two tie in either ranking
+            'content': f'{WORDS[i % 10]} {WORDS[(i * 3) % 10]} {WORDS[(i * 7) % 10]} reference r{i % 13} entry u{i} '
+                       + 'pad ' * i,
+            'metadata': {'group': i % 3}
+        }
+        for i in range(count)
+    ]
+    docs.append({
+        'id': 'target',
+        'title': 'Quantum entanglement',
+        'url': 'https://example.com/target',
+        'content': 'quantum entanglement explained with alpha examples',
+        'metadata': {'group': 0}
+    })
+    return docs
+
+@pytest.fixture
+def services(make_vector_service):
+    """A single index and a coordinator over three shards, holding the same documents"""
+    servers = []
+    for i in range(3):
+        server = ShardServer(make_vector_service(f'shard_{i}'), ('127.0.0.1', 0), AUTHKEY)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+    single = make_vector_service('single')
+    coordinator = ShardedVectorService(
+        {'VECTOR_SHARD_AUTHKEY': AUTHKEY.decode(), 'INDEX_WATCH_INTERVAL': 0},
+        [server.address for server in servers]
+    )
+    single.add_documents(documents())
+    coordinator.add_documents(documents())
+    assert all(server.service.get_stats()['total_documents'] for server in servers)
+
+    yield single, coordinator
+    for client in coordinator.clients.values():
+        client.close()
+    for server in servers:
+        server.stop()
+
+def ranking(results):
+    # Equal scores may come back in either order
+    return sorted((round(result.score, 5), result.id) for result in results)[::-1]
+
+@pytest.mark.parametrize('mode', ['hybrid', 'lexical', 'dense'])
+@pytest.mark.parametrize('fusion', ['rrf', 'weighted'])
+def test_sharded_results_match_single_index(services, mode, fusion):
+    single, coordinator = services
+    for service in (single, coordinator):
+        service.fusion = fusion
+
+    for query in ['quantum entanglement', 'alpha delta entry', 'golf r7']:
+        expected = single.search(query, 10, mode=mode)
+        found = coordinator.search(query, 10, mode=mode)
+        assert ranking(found) == ranking(expected), query
+
+    filtered = coordinator.search('alpha delta', 10, mode=mode, filters={'group': 1})
+    assert ranking(filtered) == ranking(single.search('alpha delta', 10, mode=mode, filters={'group': 1}))
+    assert all(result.metadata['group'] == 1 for result in filtered)
+
+def test_hybrid_shard_winners_do_not_tie_with_the_match(services):
+    _, coordinator = services
+    results = coordinator.search('quantum entanglement', 5, mode='hybrid')
+    assert results[0].id == 'target'
+    assert results[1].score < results[0].score
+
+def test_search_many_matches_search(services):
+    _, coordinator = services
+    queries = ['quantum entanglement', 'bravo echo']
+    batched = coordinator.search_many(queries, 5, mode='hybrid')
+    assert [ranking(results) for results in batched] == [ranking(coordinator.search(q, 5, mode='hybrid')) for q in queries]
+
+@pytest.mark.parametrize('authkey', [None, '', '  '])
+def test_coordinator_refuses_to_start_without_an_authkey(authkey):
+    config = {'VECTOR_SHARDS': '127.0.0.1:7101', 'INDEX_WATCH_INTERVAL': 0}
+    if authkey is not None:
+        config['VECTOR_SHARD_AUTHKEY'] = authkey
+    with pytest.raises(ValueError, match='VECTOR_SHARD_AUTHKEY'):
+        ShardedVectorService(config)
+
+def test_shard_refuses_to_serve_without_an_authkey(make_vector_service):
+    with pytest.raises(ValueError):
+        ShardServer(make_vector_service(), ('127.0.0.1', 0), b'')
+
+def test_shard_worker_exits_without_an_authkey(tmp_path):
+    root = Path(__file__).resolve().parent.parent
+    env = {'PATH': '', 'VECTOR_SHARD_AUTHKEY': '', 'FAISS_INDEX_PATH': str(tmp_path / 'faiss_index'),
+           'LOG_FILE': str(tmp_path / 'shard.log')}
+    worker = subprocess.run(
+        [sys.executable, str(root / 'shard_worker.py'), '--port', '0'], cwd=tmp_path, env=env,
+        capture_output=True, text=True, timeout=60
+    )
+    assert worker.returncode != 0
+    assert 'VECTOR_SHARD_AUTHKEY' in worker.stderr
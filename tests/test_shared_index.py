@@ -0,0 +1,93 @@
+"""
+Sharing one index between preloaded gunicorn workers: memory-mapped snapshots and writers in several processes
+"""
+import os
+import runpy
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.services.embedding_cache import EmbeddingCache
+
+def batch(prefix: str, count: int = 5):
+    return [
+        {'id': f'{prefix}_{i}', 'title': f'{prefix} {i}', 'url': f'https://example.com/{prefix}/{i}',
+         'content': f'{prefix} note {i} about topic t{i}', 'metadata': {}}
+        for i in range(count)
+    ]
+
+def test_memory_mapped_index_is_copied_before_the_first_write(make_vector_service):
+    make_vector_service().add_documents(batch('a'))
+    make_vector_service().rebuild_index()
+
+    service = make_vector_service(FAISS_MMAP=True, SEARCH_MODE='dense')
+    assert service._index_mmapped
+    assert service.search('a note 2 about topic t2', 1)[0].id == 'a_2'
+
+    service.add_documents(batch('b'))
+    assert not service._index_mmapped
+    assert service.search('b note 3 about topic t3', 1)[0].id == 'b_3'
+    assert make_vector_service(FAISS_MMAP=True).get_stats()['total_documents'] == 10
+
+def test_writers_sharing_an_index_do_not_lose_each_others_rows(make_vector_service):
+    # Two workers with the same index directory, writing at the same time
+    workers = [make_vector_service(SEARCH_MODE='dense') for _ in range(2)]
+    threads = [
+        threading.Thread(target=lambda worker=worker, n=n: [worker.add_documents(batch(f'w{n}_{b}'))
+                                                           for b in range(4)])
+        for n, worker in enumerate(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    reopened = make_vector_service(SEARCH_MODE='dense')
+    assert reopened.get_stats()['total_documents'] == 40
+    for prefix in ('w0_3', 'w1_0'):
+        assert reopened.search(f'{prefix} note 1 about topic t1', 1)[0].id == f'{prefix}_1'
+    # Each worker picks up the other's rows when it refreshes
+    workers[0].refresh()
+    assert workers[0].get_stats()['total_documents'] == 40
+
+def test_embedding_caches_sharing_a_directory_stay_row_aligned(tmp_path):
+    def encode(texts):
+        return np.array([[float(len(text))] * 4 for text in texts], dtype='float32')
+
+    first = EmbeddingCache(str(tmp_path), 'model', 4)
+    second = EmbeddingCache(str(tmp_path), 'model', 4)
+    first.get_or_encode(['a', 'bb'], encode)
+    second.get_or_encode(['ccc', 'a'], encode)
+    first.get_or_encode(['dddd'], encode)
+
+    reopened = EmbeddingCache(str(tmp_path), 'model', 4)
+    assert len(reopened) == 4
+    never = []
+    vectors = reopened.get_or_encode(['a', 'bb', 'ccc', 'dddd'], lambda texts: never.extend(texts))
+    assert never == [] and vectors[:, 0].tolist() == [1, 2, 3, 4]
+
+def test_preload_mode_loads_the_weights_before_forking(make_vector_service):
+    service = make_vector_service(EMBEDDINGS_LOAD_MODE='preload')
+    assert service.model_state == 'ready'
+    assert service.readiness()['ready']
+
+def test_gunicorn_preloads_and_warms_up_each_worker(monkeypatch):
+    for name in ('EMBEDDINGS_LOAD_MODE', 'FAISS_MMAP', 'GUNICORN_PRELOAD'):
+        monkeypatch.delenv(name, raising=False)
+    settings = runpy.run_path(str(Path(__file__).parent.parent / 'gunicorn.conf.py'))
+    assert settings['preload_app']
+    assert os.environ['EMBEDDINGS_LOAD_MODE'] == 'preload' and os.environ['FAISS_MMAP'] == 'True'
+
+    warmed, started = threading.Event(), []
+    app = SimpleNamespace(
+        config={'JOB_WORKERS_ENABLED': True},
+        extensions={
+            'vector_service': SimpleNamespace(warm_up=warmed.set),
+            'job_queue': SimpleNamespace(start=lambda: started.append(True)),
+            'reranker': None
+        }
+    )
+    settings['post_fork'](None, SimpleNamespace(app=SimpleNamespace(wsgi=lambda: app)))
+    assert warmed.wait(5) and started == [True]
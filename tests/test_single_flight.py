@@ -0,0 +1,189 @@
+"""
+Single-flight coalescing: concurrent identical generations share one upstream call, in a process and across workers
+"""
+import threading
+import time
+
+import pytest
+
+from src.services.content_generator import ContentGenerator
+from src.services.single_flight import SingleFlight
+
+def wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+def run_concurrently(count: int, fn):
+    results = [None] * count
+
+    def run(i):
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+def test_concurrent_callers_share_the_first_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return 'answer'
+
+    threads, results = run_concurrently(5, lambda: flight.do('key', work))
+    wait_for(lambda: flight.get_stats()['in_flight'] == 1 and len(calls) == 1)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results, key=lambda result: result[1]) == [('answer', False)] + [('answer', True)] * 4
+    assert flight.get_stats() == {'calls': 1, 'shared': 4, 'timeouts': 0, 'in_flight': 0}
+    # Once it is done the next call runs again
+    assert flight.do('key', lambda: 'later') == ('later', False)
+
+def test_waiters_get_the_same_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError('upstream down')
+
+    threads, results = run_concurrently(3, lambda: flight.do('key', fail))
+    wait_for(lambda: flight.get_stats()['in_flight'] == 1)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.get_stats()['shared'] == 2 and flight.get_stats()['in_flight'] == 0
+
+def test_a_waiter_past_its_timeout_runs_the_call_itself():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader, _ = run_concurrently(1, lambda: flight.do('key', lambda: release.wait(5) and 'slow'))
+    wait_for(lambda: flight.get_stats()['in_flight'] == 1)
+
+    try:
+        assert flight.do('key', lambda: 'own', timeout=0.05) == ('own', False)
+        # Other keys never wait
+        assert flight.do('other', lambda: 'other') == ('other', False)
+    finally:
+        release.set()
+        leader[0].join(5)
+    assert flight.get_stats()['timeouts'] == 1
+
+class FakeLock:
+    def __init__(self, locks, key):
+        self.locks, self.key = locks, key
+
+    def release(self):
+        self.locks.discard(self.key)
+
+class FakeCacheService:
+    """Shared between generators like Redis is shared between workers"""
+
+    redis_available = True
+
+    def __init__(self):
+        self.store = {}
+        self.locks = set()
+
+    def get(self, key, prefix_type='content'):
+        return dict(self.store[key]) if key in self.store else None
+
+    def set(self, key, value, ttl=None, prefix_type='content'):
+        self.store[key] = dict(value)
+        return True
+
+    def get_with_lock(self, key, lock_timeout=10, prefix_type='content'):
+        if key in self.locks:
+            return None, None
+        self.locks.add(key)
+        return self.get(key), FakeLock(self.locks, key)
+
+    def is_locked(self, key):
+        return key in self.locks
+
+QUERY = 'what is quantum entanglement'
+
+@pytest.fixture
+def make_generator(make_vector_service, monkeypatch):
+    service = make_vector_service()
+
+    def make(cache_service, release: threading.Event, calls: list, **config) -> ContentGenerator:
+        generator = ContentGenerator(None, service, cache_service, {'SINGLE_FLIGHT_POLL_MS': 10, **config})
+
+        def generate(query, cache_key, *args):
+            calls.append(query)
+            release.wait(5)
+            result = {'content': f'answer {len(calls)}', 'query': query, 'cached': False}
+            cache_service.set(cache_key, result)
+            return result
+        monkeypatch.setattr(generator, '_generate_rag', generate)
+        return generator
+    return make
+
+def test_identical_requests_in_a_process_generate_once(make_generator):
+    cache_service, release, calls = FakeCacheService(), threading.Event(), []
+    cache_service.redis_available = False
+    generator = make_generator(cache_service, release, calls)
+
+    threads, results = run_concurrently(4, lambda: generator.generate_with_rag(QUERY))
+    wait_for(lambda: calls and generator.single_flight.get_stats()['in_flight'] == 1)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [QUERY]
+    assert all(result['content'] == 'answer 1' for result in results)
+    assert sum(bool(result.get('coalesced')) for result in results) == 3
+    assert generator.get_stats()['single_flight']['upstream_calls_saved'] == 3
+
+    # Without the cache every request generates
+    generator.generate_with_rag(QUERY, use_cache=False)
+    assert calls == [QUERY, QUERY]
+
+def test_another_worker_waits_for_the_lock_holder(make_generator):
+    cache_service, release, calls = FakeCacheService(), threading.Event(), []
+    first = make_generator(cache_service, release, calls)
+    second = make_generator(cache_service, release, calls)
+
+    threads, results = run_concurrently(1, lambda: first.generate_with_rag(QUERY))
+    wait_for(lambda: calls)
+    waiter, waiter_results = run_concurrently(1, lambda: second.generate_with_rag(QUERY))
+    time.sleep(0.05)
+    release.set()
+    for thread in threads + waiter:
+        thread.join(5)
+
+    assert calls == [QUERY]
+    assert waiter_results[0]['content'] == 'answer 1' and waiter_results[0]['coalesced']
+    assert second.stats['coalesced_across_workers'] == 1
+    assert not cache_service.locks
+
+def test_a_waiting_worker_generates_when_the_holder_leaves_nothing(make_generator):
+    cache_service, release, calls = FakeCacheService(), threading.Event(), []
+    release.set()
+    generator = make_generator(cache_service, release, calls)
+
+    # A lock held by a worker that then gives up without caching a result
+    cache_key = generator._create_cache_key(QUERY, 500, 0.7, 'rag')
+    cache_service.locks.add(cache_key)
+    threading.Timer(0.05, cache_service.locks.discard, args=(cache_key,)).start()
+
+    assert generator.generate_with_rag(QUERY)['content'] == 'answer 1'
+    assert calls == [QUERY] and generator.stats['coalesced_across_workers'] == 0
@@ -0,0 +1,32 @@
+"""
+Standalone job worker
+Runs queued background jobs (ingest, index rebuilds, compaction, crawls) in its own process.
+Point it at the same JOB_BROKER as the web app and start the web app with JOB_WORKERS_ENABLED=False.
+
+    JOB_BROKER=redis python worker.py
+"""
+import os
+import signal
+import threading
+
+# Load the model before taking jobs rather than lazily on the first one
+os.environ.setdefault('EMBEDDINGS_LOAD_MODE', 'eager')
+os.environ['JOB_WORKERS_ENABLED'] = 'False'
+
+# Importing app creates the application (and its services) once
+from app import app
+
+def main():
+    job_queue = app.extensions['job_queue']
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+
+    job_queue.start()
+    stopped.wait()
+    # Jobs still running are picked up by another worker once their lease expires
+    job_queue.stop(timeout=30)
+
+if __name__ == '__main__':
+    main()